@@ -39,7 +39,7 @@ async def query_enterprise_credit(request: CreditQueryRequest):
         logger.info(f"收到征信查询请求: {request.company_name}, 提供商: {request.provider}")
         
         # 调用征信API服务
-        result = credit_api_service.query_enterprise_credit(
+        result = await credit_api_service.query_enterprise_credit(
             company_name=request.company_name,
             provider=request.provider
         )
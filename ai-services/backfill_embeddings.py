@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+知识库嵌入向量回填
+分批流式读取、整批编码、COPY写回，按检查点断点续跑
+
+用法:
+    python backfill_embeddings.py [--batch-size 256] [--workers 2] [--reembed] [--all] [--restart]
+    python backfill_embeddings.py --model <新模型> --register 512 --activate   # 影子列回填并切换
+"""
+import argparse
+import asyncio
+
+from services.database import database
+from services.embedding_backfill import EmbeddingBackfill
+from services.embedding_models import embedding_model_registry
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="知识库嵌入向量回填")
+    parser.add_argument("--model", help="嵌入模型（默认取当前active版本）")
+    parser.add_argument("--register", type=int, metavar="DIMENSION", help="登记新模型版本并添加影子列")
+    parser.add_argument("--activate", action="store_true", help="回填完成后切换为读取版本")
+    parser.add_argument("--batch-size", type=int, help="每批行数（一次模型调用）")
+    parser.add_argument("--workers", type=int, help="并行编码的批数")
+    parser.add_argument("--page-size", type=int, help="keyset分页行数")
+    parser.add_argument("--job-name", help="检查点任务名（默认按模型区分）")
+    parser.add_argument("--reembed", action="store_true", help="同时重新生成由其他模型生成的嵌入")
+    parser.add_argument("--all", dest="reembed_all", action="store_true",
+                        help="不论模型标注重新生成全部行（嵌入文本规则变更后使用）")
+    parser.add_argument("--restart", action="store_true", help="忽略检查点从头开始")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    try:
+        await database.initialize()
+        await embedding_model_registry.refresh()
+        model_id = args.model or embedding_model_registry.active.model_id
+        if args.register:
+            await embedding_model_registry.register_model(model_id, args.register)
+        version = embedding_model_registry.get(model_id)
+        if version is None:
+            raise SystemExit(f"未登记的嵌入模型: {model_id}（使用 --register 维度 登记）")
+
+        backfill = EmbeddingBackfill(
+            model_name=model_id,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            page_size=args.page_size,
+            job_name=args.job_name,
+            reembed=args.reembed,
+            reembed_all=args.reembed_all,
+            embedding_column=version.column_name
+        )
+        stats = await backfill.run(restart=args.restart)
+        if args.activate:
+            result = await embedding_model_registry.activate(model_id)
+            print(f"读取版本切换: {result.get('previous_model_id', model_id)} -> {model_id}")
+    finally:
+        await database.close()
+
+    print(f"回填完成: {stats.rows} 行, {stats.batches} 批, 耗时 {stats.total_seconds:.1f}秒")
+    print(f"吞吐: {stats.rows_per_second:.1f} 行/秒 "
+          f"(读取 {stats.read_seconds:.1f}秒, 编码 {stats.encode_seconds:.1f}秒, 写回 {stats.write_seconds:.1f}秒)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
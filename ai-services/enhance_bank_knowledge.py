@@ -4,18 +4,11 @@
 """
 
 import asyncio
-import asyncpg
 import json
 from typing import List, Dict, Any
 
-# 数据库配置
-DB_CONFIG = {
-    'host': 'ai-loan-postgresql',
-    'port': 5432,
-    'database': 'ai_loan_rag',
-    'user': 'ai_loan',
-    'password': 'ai_loan123'
-}
+from services.database import database
+from services.embedding_backfill import backfill_embeddings
 
 # 银行产品知识数据
 BANK_PRODUCTS = [
@@ -155,7 +148,8 @@ async def insert_knowledge_data():
     """插入知识数据到数据库"""
     try:
         # 连接数据库
-        conn = await asyncpg.connect(**DB_CONFIG)
+        await database.initialize()
+        conn = await database.acquire()
         print("✅ 数据库连接成功")
         
         # 清空现有数据
@@ -207,50 +201,17 @@ async def insert_knowledge_data():
         result = await conn.fetch("SELECT COUNT(*) as count FROM knowledge_base")
         print(f"✅ 知识库中共有 {result[0]['count']} 条记录")
         
-        await conn.close()
+        await database.release(conn)
         print("✅ 数据库连接关闭")
         
     except Exception as e:
         print(f"❌ 插入知识数据失败: {e}")
 
 async def generate_embeddings():
-    """生成向量嵌入"""
+    """生成向量嵌入（分批回填，见backfill_embeddings.py）"""
     try:
-        from sentence_transformers import SentenceTransformer
-        
-        # 加载嵌入模型
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-        print("✅ 嵌入模型加载成功")
-        
-        # 连接数据库
-        conn = await asyncpg.connect(**DB_CONFIG)
-        print("✅ 数据库连接成功")
-        
-        # 获取所有知识数据
-        records = await conn.fetch("SELECT id, title, content FROM knowledge_base WHERE embedding IS NULL")
-        print(f"✅ 找到 {len(records)} 条需要生成嵌入的记录")
-        
-        # 生成嵌入
-        for record in records:
-            # 组合标题和内容
-            text = f"{record['title']} {record['content']}"
-            
-            # 生成嵌入向量
-            embedding = model.encode(text)
-            
-            # 更新数据库 - 将向量转换为字符串格式
-            embedding_str = '[' + ','.join(map(str, embedding.tolist())) + ']'
-            await conn.execute("""
-                UPDATE knowledge_base 
-                SET embedding = $1::vector, updated_at = NOW()
-                WHERE id = $2
-            """, embedding_str, record['id'])
-            
-            print(f"✅ 已生成记录 {record['id']} 的嵌入向量")
-        
-        print("✅ 所有嵌入向量生成完成")
-        await conn.close()
-        
+        stats = await backfill_embeddings()
+        print(f"✅ 所有嵌入向量生成完成: {stats.rows} 条, {stats.rows_per_second:.1f} 条/秒")
     except Exception as e:
         print(f"❌ 生成嵌入向量失败: {e}")
 
@@ -263,6 +224,7 @@ async def main():
     
     # 生成嵌入向量
     await generate_embeddings()
+    await database.close()
     
     print("知识库增强完成！")
 
@@ -12,25 +12,31 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel, ValidationError
 from typing import List, Optional, Dict, Any
 import uvicorn
+import asyncio
+import importlib
 import os
 import json
 import uuid
 from datetime import datetime
 from dotenv import load_dotenv
 
-from services.document_processor import DocumentProcessor
-from services.document_rag import DocumentRAGService
-from services.risk_assessor import RiskAssessor
-from services.smart_matcher import SmartMatcher
-from services.recommendation_engine import RecommendationEngine
-from services.ai_model_manager import AIModelManager
+import time
+_eager_import_started = time.perf_counter()
+
+# 重型服务（torch、pandas、sklearn、cv2等）经服务注册表在首次使用时导入
+from services.service_registry import service_registry
 from services.ai_chatbot import AIChatbot, ChatbotRole
 from services.llm_provider import llm_provider_manager
 from services.vector_rag import vector_rag_service
+from services.vector_index_manager import vector_index_manager, IndexType
+from services.memory_vector_index import memory_vector_index
+from services.embedding_models import embedding_model_registry
+from services.onnx_embedding import onnx_embedding_backend
 from services.enhanced_web_search import enhanced_web_search_service
 from services.loan_agent import LoanAgent
 from services.loan_rfq_service import LoanRFQService
 from services.cache_service import cache_service
+from services.single_flight import single_flight_manager
 from services.universal_bank_search import universal_bank_search_service
 from services.real_web_search import real_web_search_service
 from services.credit_api_service import credit_api_service
@@ -41,16 +47,27 @@ from services.multi_turn_dialog import MultiTurnDialogManager
 from services.advanced_risk_engine import AdvancedRiskEngine
 from services.advanced_pricing_engine import AdvancedPricingEngine
 from services.approval_workflow_engine import ApprovalWorkflowEngine
-from services.compliance_checker import ComplianceChecker
+from services.compliance_checker import ComplianceChecker, ComplianceRule, BATCH_SCREENING_RULES
 from services.third_party_integrator import third_party_integrator
 from services.data_sync_manager import data_sync_manager
 from services.api_stability_manager import api_stability_manager
+from services.adaptive_concurrency import adaptive_concurrency_manager
+from services.resilience import resilience_registry
+from services.resilience_benchmark import benchmark_resilience_overhead
 from services.monitoring_system import system_monitor
 from services.performance_optimizer import performance_optimizer
-from services.advanced_ocr import advanced_ocr_service
+from services.database import database
+from services import pgvector_codec
+from services.advanced_ocr import advanced_ocr_service, OCREngine
+from services.upload_manager import upload_manager, UploadTooLargeError, UploadBudgetExhaustedError
+from services.ingestion_jobs import ingestion_job_queue
 from middleware.error_handler import ErrorHandler, PerformanceMiddleware, LoggingMiddleware
+from middleware.load_shedding import LoadSheddingMiddleware
+from middleware.upload_limit import UploadLimitMiddleware
 from loguru import logger
 
+service_registry.eager_import_seconds = time.perf_counter() - _eager_import_started
+
 # 加载环境变量
 load_dotenv()
 
@@ -61,7 +78,19 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# 添加CORS中间件
+# 添加上传限额中间件（在路由读取multipart请求体之前检查限额与全局额度）
+app.add_middleware(UploadLimitMiddleware)
+
+# 添加过载保护中间件（位于性能与日志中间件之内，被拒绝的请求同样被记录）
+app.middleware("http")(LoadSheddingMiddleware.load_shedding_middleware)
+
+# 添加性能监控中间件
+app.middleware("http")(PerformanceMiddleware.performance_middleware)
+
+# 添加日志中间件
+app.middleware("http")(LoggingMiddleware.logging_middleware)
+
+# 添加CORS中间件（最后注册即最外层，过载与上传限额返回的429/413/503同样带CORS响应头）
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -71,47 +100,18 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
-# 添加性能监控中间件
-app.middleware("http")(PerformanceMiddleware.performance_middleware)
-
-# 添加日志中间件
-app.middleware("http")(LoggingMiddleware.logging_middleware)
-
 # 设置错误处理器
 ErrorHandler.setup_error_handlers(app)
 
 # 启动事件
 @app.on_event("startup")
 async def startup_event():
-    """应用启动时初始化服务"""
+    """应用启动时初始化服务（互不依赖的服务并发初始化，重型模型后台预热）"""
     try:
-        # 初始化缓存服务
-        await cache_service.initialize()
-        logger.info("缓存服务初始化成功")
-        
-        # 初始化向量RAG服务
-        await vector_rag_service.initialize()
-        logger.info("向量RAG服务初始化成功")
+        await service_registry.initialize()
         
-        # 初始化LLM提供商
-        await llm_provider_manager.initialize()
-        logger.info("LLM提供商初始化成功")
-        
-        # 初始化增强版网络搜索服务
-        await enhanced_web_search_service.initialize()
-        logger.info("增强版网络搜索服务初始化成功")
-        
-        # 初始化通用银行搜索服务
-        await universal_bank_search_service.initialize()
-        logger.info("通用银行搜索服务初始化成功")
-        
-        # 初始化真正的外网搜索服务
-        await real_web_search_service.initialize()
-        logger.info("真正的外网搜索服务初始化成功")
-        
-        # 初始化文档RAG服务
-        await document_rag.initialize()
-        logger.info("文档RAG服务初始化成功")
+        # 后台预热嵌入模型、OCR工作进程与重型模型，完成前 /ready 返回503
+        service_registry.start_warm_up()
         
         # 初始化AI增强服务
         knowledge_enhance_result = knowledge_enhancer.enhance_knowledge_base()
@@ -122,26 +122,6 @@ async def startup_event():
         
         logger.info("AI增强服务初始化完成")
         
-        # 初始化集成服务
-        await third_party_integrator.initialize()
-        await data_sync_manager.initialize()
-        await system_monitor.start_monitoring()
-        
-        # 初始化性能优化器
-        await performance_optimizer.initialize()
-        await performance_optimizer.connection_pool_manager.create_pool(
-            "main_db", 
-            {
-                "host": os.getenv("POSTGRES_HOST", "localhost"),
-                "port": int(os.getenv("POSTGRES_PORT", "5432")),
-                "database": os.getenv("POSTGRES_DB", "ai_loan_rag"),
-                "user": os.getenv("POSTGRES_USER", "ai_loan"),
-                "password": os.getenv("POSTGRES_PASSWORD", "ai_loan123"),
-                "min_size": 5,
-                "max_size": 20
-            }
-        )
-        
         # 配置API稳定性管理器
         from services.api_stability_manager import CircuitBreakerConfig, RateLimitConfig
         api_stability_manager.add_circuit_breaker("ai_chatbot", CircuitBreakerConfig())
@@ -151,7 +131,7 @@ async def startup_event():
         
         logger.info("集成服务初始化完成")
         
-        logger.info("AI服务启动完成")
+        logger.info(f"AI服务启动完成，初始化耗时 {service_registry.startup_seconds:.3f}秒")
     except Exception as e:
         logger.error(f"服务初始化失败: {e}")
 
@@ -160,18 +140,7 @@ async def startup_event():
 async def shutdown_event():
     """应用关闭时清理资源"""
     try:
-        await vector_rag_service.close()
-        logger.info("向量RAG服务已关闭")
-        
-        await enhanced_web_search_service.close()
-        logger.info("增强版网络搜索服务已关闭")
-        
-        await universal_bank_search_service.close()
-        logger.info("通用银行搜索服务已关闭")
-        
-        await real_web_search_service.close()
-        logger.info("真正的外网搜索服务已关闭")
-        
+        await service_registry.shutdown()
         logger.info("AI服务已关闭")
     except Exception as e:
         logger.error(f"服务关闭失败: {e}")
@@ -186,13 +155,73 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         content={"detail": exc.errors(), "body": exc.body}
     )
 
-# 初始化AI服务
-document_processor = DocumentProcessor()
-document_rag = DocumentRAGService()
-risk_assessor = RiskAssessor()
-smart_matcher = SmartMatcher()
-recommendation_engine = RecommendationEngine()
-ai_model_manager = AIModelManager()
+# 注册服务：互不依赖的初始化器在启动时并发执行，关闭时按注册逆序清理
+service_registry.register("database", instance=database,
+                          initializer=lambda service: service.initialize(),
+                          closer=lambda service: service.close())
+service_registry.register("cache", instance=cache_service,
+                          initializer=lambda service: service.initialize(), critical=False)
+service_registry.register("vector_rag", instance=vector_rag_service,
+                          initializer=lambda service: service.initialize(),
+                          closer=lambda service: service.close(), depends_on=("database",))
+service_registry.register("llm_provider", instance=llm_provider_manager,
+                          initializer=lambda service: service.initialize())
+service_registry.register("enhanced_web_search", instance=enhanced_web_search_service,
+                          initializer=lambda service: service.initialize(),
+                          closer=lambda service: service.close(), critical=False)
+service_registry.register("universal_bank_search", instance=universal_bank_search_service,
+                          initializer=lambda service: service.initialize(),
+                          closer=lambda service: service.close(), critical=False)
+service_registry.register("real_web_search", instance=real_web_search_service,
+                          initializer=lambda service: service.initialize(),
+                          closer=lambda service: service.close(), critical=False)
+service_registry.register("third_party_integrator", instance=third_party_integrator,
+                          initializer=lambda service: service.initialize(), critical=False)
+service_registry.register("data_sync_manager", instance=data_sync_manager,
+                          initializer=lambda service: service.initialize(), critical=False)
+service_registry.register("system_monitor", instance=system_monitor,
+                          initializer=lambda service: service.start_monitoring(), critical=False)
+service_registry.register("performance_optimizer", instance=performance_optimizer,
+                          initializer=lambda service: service.initialize(), critical=False)
+service_registry.register("advanced_ocr", instance=advanced_ocr_service,
+                          closer=lambda service: service.shutdown())
+
+# 初始化AI服务（重型服务懒加载，首次使用或后台预热时构建）
+document_processor = service_registry.register(
+    "document_processor", module="services.document_processor",
+    factory=lambda module: module.DocumentProcessor()
+)
+document_rag = service_registry.register(
+    "document_rag", module="services.document_rag",
+    factory=lambda module: module.DocumentRAGService(),
+    initializer=lambda service: service.initialize(),
+    closer=lambda service: service.batch_pipeline.shutdown(),
+    depends_on=("vector_rag",)
+)
+service_registry.register("ingestion_jobs", instance=ingestion_job_queue,
+                          initializer=lambda service: service.start(document_rag),
+                          closer=lambda service: service.stop(),
+                          depends_on=("document_rag",), critical=False)
+risk_assessor = service_registry.register(
+    "risk_assessor", module="services.risk_assessor", factory=lambda module: module.RiskAssessor()
+)
+smart_matcher = service_registry.register(
+    "smart_matcher", module="services.smart_matcher", factory=lambda module: module.SmartMatcher()
+)
+recommendation_engine = service_registry.register(
+    "recommendation_engine", module="services.recommendation_engine",
+    factory=lambda module: module.RecommendationEngine()
+)
+ai_model_manager = service_registry.register(
+    "ai_model_manager", module="services.ai_model_manager", factory=lambda module: module.AIModelManager()
+)
+
+# 后台预热：嵌入模型、OCR工作进程，以及导入torch/sklearn等的重型服务
+service_registry.register_warm_up("embedding_model", vector_rag_service.warm_up)
+service_registry.register_warm_up("ocr_worker_pool", advanced_ocr_service.warm_up)
+for _heavy_service in ("risk_assessor", "smart_matcher", "recommendation_engine", "ai_model_manager"):
+    service_registry.register_background_build(_heavy_service)
+
 ai_chatbot = AIChatbot(vector_rag_service=vector_rag_service, llm_service=llm_provider_manager)
 
 # 全局贷款智能体实例
@@ -273,7 +302,8 @@ class AIResponse(BaseModel):
 # 健康检查
 @app.get("/health")
 async def health_check():
-    import torch
+    # 存活检查不等待服务就绪；torch在线程中导入，避免首次检查阻塞事件循环
+    torch = await asyncio.to_thread(importlib.import_module, "torch")
     from datetime import datetime
     
     return {
@@ -285,6 +315,12 @@ async def health_check():
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """就绪检查：关键服务初始化完成且后台预热结束后返回200，否则503"""
+    report = service_registry.get_report()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
 # 学习状态监控接口
 @app.get("/api/v1/learning/status")
 async def get_learning_status():
@@ -603,22 +639,20 @@ async def compare_products(products_to_compare: dict):
 @app.post("/api/v1/ai/document/process", response_model=AIResponse)
 async def process_document(file: UploadFile = File(...)):
     try:
-        # 保存上传的文件
-        file_path = f"uploads/{file.filename}"
-        os.makedirs("uploads", exist_ok=True)
-        
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # 处理文档
-        result = document_processor.process_document(file_path, file.content_type)
+        # 分块流式保存上传文件，处理结束后自动清理
+        async with upload_manager.receive_one(file) as upload:
+            result = await document_processor.process_document(upload.path, upload.extension or upload.content_type)
+            result["file_info"].update({"filename": upload.filename, "sha256": upload.sha256})
         
         return AIResponse(
             success=True,
             message="文档处理成功",
             data=result
         )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadBudgetExhaustedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"文档处理失败: {str(e)}")
 
@@ -682,27 +716,25 @@ async def batch_process(files: List[UploadFile] = File(...)):
     try:
         results = []
         
-        for file in files:
-            # 保存文件
-            file_path = f"uploads/{file.filename}"
-            os.makedirs("uploads", exist_ok=True)
-            
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
-            
-            # 处理文档
-            result = document_processor.process_document(file_path, file.content_type)
-            results.append({
-                "filename": file.filename,
-                "result": result
-            })
+        # 分块流式保存全部上传文件（受单请求字节限额约束），处理结束后自动清理
+        async with upload_manager.receive(files) as uploads:
+            for upload in uploads:
+                result = await document_processor.process_document(upload.path, upload.extension or upload.content_type)
+                results.append({
+                    "filename": upload.filename,
+                    "sha256": upload.sha256,
+                    "result": result
+                })
         
         return AIResponse(
             success=True,
             message="批量处理完成",
             data={"results": results}
         )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadBudgetExhaustedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"批量处理失败: {str(e)}")
 
@@ -1229,6 +1261,7 @@ async def get_rag_stats():
     """获取RAG知识库统计信息"""
     try:
         stats = await vector_rag_service.get_knowledge_stats()
+        stats["hybrid_retrieval"] = vector_rag_service.hybrid_retriever.get_stats()
         
         return AIResponse(
             success=True,
@@ -1239,11 +1272,157 @@ async def get_rag_stats():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取统计信息失败: {str(e)}")
 
+@app.get("/api/v1/rag/index/status")
+async def get_vector_index_status():
+    """获取向量索引状态"""
+    try:
+        return AIResponse(
+            success=True,
+            message="向量索引状态获取成功",
+            data=vector_index_manager.get_status()
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取向量索引状态失败: {str(e)}")
+
+@app.post("/api/v1/rag/index/rebuild")
+async def rebuild_vector_index(request: Dict[str, Any]):
+    """按当前数据量并发重建向量索引"""
+    try:
+        index_type = request.get("index_type")
+        result = await vector_index_manager.rebuild_index(
+            vector_rag_service.connection_pool,
+            index_type=IndexType(index_type) if index_type else None,
+            concurrently=request.get("concurrently", True)
+        )
+        return AIResponse(
+            success=True,
+            message="向量索引重建完成",
+            data=result
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"不支持的索引类型: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"向量索引重建失败: {str(e)}")
+
+@app.post("/api/v1/rag/index/benchmark")
+async def benchmark_vector_index(request: Dict[str, Any]):
+    """向量索引召回率-延迟基准测试（与精确搜索对比）"""
+    try:
+        result = await vector_index_manager.benchmark(
+            vector_rag_service.connection_pool,
+            num_queries=request.get("num_queries", 50),
+            k=request.get("k", 10),
+            param_values=request.get("param_values")
+        )
+        return AIResponse(
+            success="error" not in result,
+            message="向量索引基准测试完成",
+            data=result
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"向量索引基准测试失败: {str(e)}")
+
+@app.get("/api/v1/rag/memory-index/status")
+async def get_memory_index_status():
+    """获取进程内向量索引状态（常驻分类、命中率与检索耗时）"""
+    try:
+        return AIResponse(
+            success=True,
+            message="进程内向量索引状态获取成功",
+            data=memory_vector_index.get_status()
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取进程内向量索引状态失败: {str(e)}")
+
+@app.post("/api/v1/rag/memory-index/reload")
+async def reload_memory_index():
+    """全量重新加载进程内向量索引"""
+    try:
+        if not memory_vector_index.started:
+            raise HTTPException(status_code=400, detail="进程内向量索引未启用")
+        await memory_vector_index.reload()
+        return AIResponse(
+            success=True,
+            message="进程内向量索引重新加载完成",
+            data=memory_vector_index.get_status()
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"进程内向量索引重新加载失败: {str(e)}")
+
+@app.get("/api/v1/rag/embedding-models")
+async def get_embedding_models():
+    """获取嵌入模型版本、双写版本与各版本嵌入列覆盖情况"""
+    try:
+        return AIResponse(
+            success=True,
+            message="嵌入模型版本获取成功",
+            data=await embedding_model_registry.get_status()
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取嵌入模型版本失败: {str(e)}")
+
+@app.post("/api/v1/rag/embedding-models")
+async def register_embedding_model(request: Dict[str, Any]):
+    """登记新嵌入模型版本：添加影子列并开始双写"""
+    try:
+        version = await embedding_model_registry.register_model(request["model_id"], int(request["dimension"]))
+        return AIResponse(
+            success=True,
+            message="嵌入模型版本登记成功",
+            data=version.to_dict()
+        )
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"嵌入模型版本参数无效: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"登记嵌入模型版本失败: {str(e)}")
+
+@app.post("/api/v1/rag/embedding-models/backfill")
+async def backfill_embedding_model(request: Dict[str, Any]):
+    """在后台回填指定版本的嵌入列（断点续跑）"""
+    try:
+        model_id = request.get("model_id") or embedding_model_registry.active.model_id
+        started = embedding_model_registry.start_backfill(
+            model_id,
+            batch_size=request.get("batch_size"),
+            workers=request.get("workers"),
+            reembed_all=bool(request.get("reembed_all", False)),
+            restart=request.get("restart", False)
+        )
+        return AIResponse(
+            success=True,
+            message="嵌入回填已启动" if started else "嵌入回填正在运行",
+            data={"model_id": model_id, "started": started}
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"启动嵌入回填失败: {str(e)}")
+
+@app.post("/api/v1/rag/embedding-models/activate")
+async def activate_embedding_model(request: Dict[str, Any]):
+    """回填完成后原子切换读取版本"""
+    try:
+        result = await embedding_model_registry.activate(
+            request["model_id"], build_index=request.get("build_index", True)
+        )
+        return AIResponse(
+            success=True,
+            message="嵌入模型读取版本已切换" if result["changed"] else "嵌入模型已是读取版本",
+            data=result
+        )
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"无法切换嵌入模型: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"切换嵌入模型失败: {str(e)}")
+
 @app.get("/api/v1/cache/stats")
 async def get_cache_stats():
     """获取缓存统计信息"""
     try:
         stats = await cache_service.get_stats()
+        stats["semantic_answer_cache"] = ai_chatbot.answer_cache.get_stats()
         return AIResponse(
             success=True,
             message="缓存统计信息获取成功",
@@ -1650,6 +1829,86 @@ async def advanced_risk_assessment(request: Dict[str, Any]):
         logger.error(f"高级风险评估失败: {e}")
         raise HTTPException(status_code=500, detail=f"高级风险评估失败: {str(e)}")
 
+@app.post("/api/v1/risk/batch-assessment")
+async def batch_risk_assessment(request: Dict[str, Any]):
+    """批量风险评分（explain_indices 指定需要生成解释的行）"""
+    try:
+        applicants = request.get("applicants", [])
+        explain_indices = [index for index in request.get("explain_indices", []) if 0 <= index < len(applicants)]
+        include_factors = request.get("include_factors", False)
+
+        batch = await asyncio.to_thread(advanced_risk_engine.assess_risk_batch, applicants)
+        explanations = advanced_risk_engine.explain_batch(batch, explain_indices)
+
+        results = []
+        for index in range(len(batch)):
+            item = {
+                "overall_risk_score": float(batch.overall_risk_scores[index]),
+                "risk_level": batch.risk_level(index).value,
+                "approval_recommendation": batch.approval_recommendation(index),
+                "confidence_score": float(batch.confidence_scores[index])
+            }
+            if include_factors:
+                item["risk_factors"] = {
+                    factor.value: float(score) for factor, score in zip(batch.factors, batch.factor_scores[index])
+                }
+            results.append(item)
+
+        level_distribution = {}
+        for index in range(len(batch)):
+            level = batch.risk_level(index).value
+            level_distribution[level] = level_distribution.get(level, 0) + 1
+
+        return JSONResponse(
+            status_code=200,
+            content={
+                "success": True,
+                "message": f"批量风险评分完成，共 {len(batch)} 笔",
+                "data": {
+                    "results": results,
+                    "explanations": {
+                        str(index): {
+                            "risk_explanations": {factor.value: text for factor, text in assessment.risk_explanations.items()},
+                            "mitigation_suggestions": assessment.mitigation_suggestions
+                        }
+                        for index, assessment in explanations.items()
+                    },
+                    "summary": {
+                        "total": len(batch),
+                        "risk_level_distribution": level_distribution,
+                        "processing_time": batch.processing_time,
+                        "rows_per_second": len(batch) / batch.processing_time if batch.processing_time > 0 else 0.0
+                    },
+                    "model_version": advanced_risk_engine.model_version
+                }
+            }
+        )
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"批量风险评分参数错误: {str(e)}")
+    except Exception as e:
+        logger.error(f"批量风险评分失败: {e}")
+        raise HTTPException(status_code=500, detail=f"批量风险评分失败: {str(e)}")
+
+@app.post("/api/v1/risk/batch-assessment/benchmark")
+async def benchmark_batch_risk_assessment(request: Dict[str, Any]):
+    """批量风险评分吞吐量基准测试（与逐笔评估对比）"""
+    try:
+        result = await asyncio.to_thread(
+            advanced_risk_engine.benchmark_batch,
+            int(request.get("sample_size", 100000)),
+            int(request.get("scalar_sample_size", 2000))
+        )
+        return AIResponse(
+            success=True,
+            message="批量风险评分基准测试完成",
+            data=result
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"批量风险评分基准测试参数错误: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量风险评分基准测试失败: {str(e)}")
+
 @app.get("/api/v1/risk/model-info")
 async def get_risk_model_info():
     """获取风控模型信息"""
@@ -1748,6 +2007,60 @@ async def optimize_pricing(request: Dict[str, Any]):
         logger.error(f"定价方案优化失败: {e}")
         raise HTTPException(status_code=500, detail=f"定价方案优化失败: {str(e)}")
 
+@app.post("/api/v1/pricing/grid")
+async def calculate_pricing_grid(request: Dict[str, Any]):
+    """批量计算 (金额, 期限, 利率) 报价网格，供报价对比界面使用"""
+    try:
+        loan_request = request.get("loan_request", {})
+        risk_assessment = request.get("risk_assessment", {})
+        loan_amounts = request.get("loan_amounts") or [loan_request.get("loan_amount", 100000)]
+        loan_terms = request.get("loan_terms") or [loan_request.get("loan_term_months", 12)]
+        interest_rates = request.get("interest_rates")
+        include_schedules = request.get("include_schedules", False)
+        
+        from services.advanced_pricing_engine import PricingStrategy
+        strategy = PricingStrategy(request.get("pricing_strategy", "risk_based"))
+        
+        scenario_count = len(loan_amounts) * len(loan_terms) * max(len(interest_rates or []), 1)
+        if scenario_count > 100000:
+            raise HTTPException(status_code=400, detail=f"场景数量过多: {scenario_count}，最多100000")
+        
+        grid = advanced_pricing_engine.calculate_pricing_grid(
+            loan_request, risk_assessment, loan_amounts, loan_terms, interest_rates, strategy
+        )
+        data = {
+            "scenario_count": int(grid["loan_amount"].size),
+            "columns": {name: values.tolist() for name, values in grid.items()}
+        }
+        
+        # 还款计划表数据量随期限线性增长，只为前若干个场景生成
+        if include_schedules:
+            max_schedules = min(int(request.get("max_schedules", 20)), 100)
+            data["schedules"] = [
+                {
+                    name: values.tolist()
+                    for name, values in advanced_pricing_engine.get_amortization_schedule(
+                        float(grid["loan_amount"][i]), float(grid["interest_rate"][i]), int(grid["term_months"][i])
+                    ).items()
+                }
+                for i in range(min(max_schedules, data["scenario_count"]))
+            ]
+        
+        return JSONResponse(
+            status_code=200,
+            content={
+                "success": True,
+                "message": "报价网格计算完成",
+                "data": data
+            }
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"报价网格计算失败: {e}")
+        raise HTTPException(status_code=500, detail=f"报价网格计算失败: {str(e)}")
+
 # 审批流程服务API
 @app.post("/api/v1/approval/process")
 async def process_approval(request: Dict[str, Any]):
@@ -1785,6 +2098,44 @@ async def process_approval(request: Dict[str, Any]):
         logger.error(f"审批处理失败: {e}")
         raise HTTPException(status_code=500, detail=f"审批处理失败: {str(e)}")
 
+@app.post("/api/v1/approval/process-batch")
+async def process_approval_batch(request: Dict[str, Any]):
+    """批量处理贷款审批（如日终重新决策）"""
+    try:
+        applications = request.get("applications", [])
+        store_decisions = request.get("store_decisions", True)
+
+        if not applications:
+            return JSONResponse(
+                status_code=400,
+                content={
+                    "success": False,
+                    "message": "申请列表不能为空"
+                }
+            )
+
+        application_data = [item.get("application_data", {}) for item in applications]
+        risk_assessments = [item.get("risk_assessment", {}) for item in applications]
+
+        # 规则评估为CPU密集计算，放到线程中避免阻塞事件循环
+        result = await asyncio.to_thread(
+            approval_workflow_engine.process_applications_batch,
+            application_data, risk_assessments, store_decisions
+        )
+
+        return JSONResponse(
+            status_code=200,
+            content={
+                "success": True,
+                "message": f"批量审批处理完成，共 {len(applications)} 笔",
+                "data": result
+            }
+        )
+
+    except Exception as e:
+        logger.error(f"批量审批处理失败: {e}")
+        raise HTTPException(status_code=500, detail=f"批量审批处理失败: {str(e)}")
+
 @app.get("/api/v1/approval/status/{application_id}")
 async def get_approval_status(application_id: str):
     """获取审批状态"""
@@ -1864,6 +2215,56 @@ async def check_compliance(request: Dict[str, Any]):
         logger.error(f"合规检查失败: {e}")
         raise HTTPException(status_code=500, detail=f"合规检查失败: {str(e)}")
 
+@app.post("/api/v1/compliance/screen-batch")
+async def screen_compliance_batch(request: Dict[str, Any]):
+    """批量合规筛查（列式输入columns，或申请列表applications）"""
+    try:
+        columns = request.get("columns")
+        if columns is None:
+            columns = ComplianceChecker.to_columns(request.get("applications", []))
+        rules = [ComplianceRule(rule) for rule in request.get("rules", [])] or BATCH_SCREENING_RULES
+
+        # 掩码计算为CPU密集操作，放到线程中避免阻塞事件循环
+        result = await asyncio.to_thread(compliance_checker.screen_batch, columns, rules)
+
+        flagged_reports = []
+        for row_index, report in zip(result.flagged_indices, result.reports):
+            flagged_reports.append({
+                "row_index": row_index,
+                "report_id": report.report_id,
+                "application_id": report.application_id,
+                "overall_compliance_score": report.overall_compliance_score,
+                "compliance_level": report.compliance_level.value,
+                "violations": {
+                    check.rule_type.value: check.violation_details
+                    for check in report.checks if not check.is_compliant
+                },
+                "critical_violations": report.critical_violations,
+                "requires_manual_review": report.requires_manual_review
+            })
+
+        return JSONResponse(
+            status_code=200,
+            content={
+                "success": True,
+                "message": f"批量合规筛查完成，{result.flagged_count}/{result.total} 行存在违规",
+                "data": {
+                    "total": result.total,
+                    "flagged_count": result.flagged_count,
+                    "violation_counts": result.violation_counts,
+                    "screened_rules": [rule.value for rule in result.screened_rules],
+                    "processing_time": result.processing_time,
+                    "flagged_reports": flagged_reports
+                }
+            }
+        )
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"批量合规筛查参数错误: {str(e)}")
+    except Exception as e:
+        logger.error(f"批量合规筛查失败: {e}")
+        raise HTTPException(status_code=500, detail=f"批量合规筛查失败: {str(e)}")
+
 # 第三方服务集成API
 @app.post("/api/v1/third-party/credit-report")
 async def get_credit_report(request: Dict[str, Any]):
@@ -2048,6 +2449,56 @@ async def get_stability_metrics():
         logger.error(f"稳定性指标获取失败: {e}")
         raise HTTPException(status_code=500, detail=f"稳定性指标获取失败: {str(e)}")
 
+@app.get("/api/v1/stability/concurrency")
+async def get_concurrency_limits():
+    """获取自适应并发限制状态（当前上限、在途与排队数、各优先级放行与拒绝次数）"""
+    try:
+        return JSONResponse(
+            status_code=200,
+            content={
+                "success": True,
+                "message": "并发限制状态获取成功",
+                "data": adaptive_concurrency_manager.get_stats()
+            }
+        )
+    except Exception as e:
+        logger.error(f"并发限制状态获取失败: {e}")
+        raise HTTPException(status_code=500, detail=f"并发限制状态获取失败: {str(e)}")
+
+@app.get("/api/v1/stability/resilience")
+async def get_resilience_policies():
+    """获取出站调用弹性策略状态（LLM、第三方服务、征信API、外网抓取的熔断、限流、舱壁与重试统计）"""
+    try:
+        return JSONResponse(
+            status_code=200,
+            content={
+                "success": True,
+                "message": "弹性策略状态获取成功",
+                "data": resilience_registry.get_stats()
+            }
+        )
+    except Exception as e:
+        logger.error(f"弹性策略状态获取失败: {e}")
+        raise HTTPException(status_code=500, detail=f"弹性策略状态获取失败: {str(e)}")
+
+@app.post("/api/v1/stability/resilience-benchmark")
+async def benchmark_resilience(request: Dict[str, Any]):
+    """测量熔断、限流、重试、超时、舱壁各组件的单次调用开销"""
+    try:
+        # 基准循环不让出事件循环，限制迭代次数
+        result = await benchmark_resilience_overhead(min(int(request.get("iterations", 20000)), 100000))
+        return JSONResponse(
+            status_code=200,
+            content={
+                "success": True,
+                "message": "弹性组件基准测试完成",
+                "data": result
+            }
+        )
+    except Exception as e:
+        logger.error(f"弹性组件基准测试失败: {e}")
+        raise HTTPException(status_code=500, detail=f"弹性组件基准测试失败: {str(e)}")
+
 @app.get("/api/v1/stability/health")
 async def get_stability_health():
     """获取API稳定性健康状态"""
@@ -2139,28 +2590,15 @@ async def process_document(
         except json.JSONDecodeError:
             metadata_dict = {}
         
-        # 保存上传的文件
-        upload_dir = "uploads"
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        file_path = os.path.join(upload_dir, file.filename)
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
-        
-        # 处理文档并添加到RAG系统
-        result = await document_rag.process_and_add_document(
-            file_path=file_path,
-            file_type=file.filename.split('.')[-1].lower(),
-            category=category,
-            metadata=metadata_dict
-        )
-        
-        # 清理临时文件（在处理完成后）
-        try:
-            os.remove(file_path)
-        except Exception as e:
-            logger.warning(f"清理临时文件失败: {e}")
+        # 分块流式保存上传文件，处理完成后自动清理临时文件
+        async with upload_manager.receive_one(file) as upload:
+            # 处理文档并添加到RAG系统
+            result = await document_rag.process_and_add_document(
+                file_path=upload.path,
+                file_type=upload.extension,
+                category=category,
+                metadata={"filename": upload.filename, "sha256": upload.sha256, **metadata_dict}
+            )
         
         response_data = AIResponse(
             success=True,
@@ -2180,6 +2618,10 @@ async def process_document(
         
         return response_data
         
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadBudgetExhaustedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         logger.error(f"文档处理失败: {e}")
         raise HTTPException(status_code=500, detail=f"文档处理失败: {str(e)}")
@@ -2208,6 +2650,130 @@ async def batch_process_documents(
         logger.error(f"批量文档处理失败: {e}")
         raise HTTPException(status_code=500, detail=f"批量文档处理失败: {str(e)}")
 
+# 文档导入任务API
+@app.post("/api/v1/rag/jobs")
+async def submit_ingestion_jobs(
+    files: List[UploadFile] = File(...),
+    category: str = "general",
+    metadata: str = "{}"
+):
+    """上传文档并提交异步导入任务，立即返回任务ID"""
+    try:
+        try:
+            metadata_dict = json.loads(metadata) if metadata else {}
+        except json.JSONDecodeError:
+            metadata_dict = {}
+        
+        jobs = []
+        async with upload_manager.receive(files) as uploads:
+            for upload in uploads:
+                # 文件移入任务目录，由任务队列负责清理
+                job_path = ingestion_job_queue.persist_upload(upload)
+                try:
+                    job_id = await ingestion_job_queue.enqueue(
+                        file_path=job_path,
+                        file_type=upload.extension,
+                        category=category,
+                        metadata={"filename": upload.filename, "sha256": upload.sha256, **metadata_dict},
+                        file_name=upload.filename,
+                        file_sha256=upload.sha256,
+                        owns_file=True
+                    )
+                except Exception:
+                    # 入队失败时文件没有任务负责清理
+                    os.remove(job_path)
+                    raise
+                jobs.append({"job_id": job_id, "filename": upload.filename, "size": upload.size})
+        
+        return JSONResponse(
+            status_code=202,
+            content={
+                "success": True,
+                "message": "导入任务已提交",
+                "data": {"jobs": jobs}
+            }
+        )
+        
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadBudgetExhaustedError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        logger.error(f"提交导入任务失败: {e}")
+        raise HTTPException(status_code=500, detail=f"提交导入任务失败: {str(e)}")
+
+@app.post("/api/v1/rag/jobs/batch")
+async def submit_batch_ingestion_jobs(request: Dict[str, Any]):
+    """为服务器上已有的文件批量提交异步导入任务"""
+    try:
+        file_paths = request.get("file_paths", [])
+        category = request.get("category", "general")
+        metadata = request.get("metadata", {})
+        
+        if not file_paths:
+            raise HTTPException(status_code=400, detail="文件路径不能为空")
+        
+        jobs = []
+        for file_path in file_paths:
+            if not os.path.exists(file_path):
+                jobs.append({"file_path": file_path, "error": "文件不存在"})
+                continue
+            job_id = await ingestion_job_queue.enqueue(
+                file_path=file_path,
+                file_type=os.path.splitext(file_path)[1][1:].lower(),
+                category=category,
+                metadata=metadata
+            )
+            jobs.append({"job_id": job_id, "file_path": file_path})
+        
+        return JSONResponse(
+            status_code=202,
+            content={
+                "success": True,
+                "message": "批量导入任务已提交",
+                "data": {"jobs": jobs}
+            }
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"提交批量导入任务失败: {e}")
+        raise HTTPException(status_code=500, detail=f"提交批量导入任务失败: {str(e)}")
+
+@app.get("/api/v1/rag/jobs/stats")
+async def get_ingestion_job_stats():
+    """获取导入任务队列统计"""
+    try:
+        return AIResponse(
+            success=True,
+            message="导入任务统计获取成功",
+            data=await ingestion_job_queue.get_stats()
+        )
+    except Exception as e:
+        logger.error(f"获取导入任务统计失败: {e}")
+        raise HTTPException(status_code=500, detail=f"获取导入任务统计失败: {str(e)}")
+
+@app.get("/api/v1/rag/jobs/{job_id}")
+async def get_ingestion_job(job_id: str):
+    """查询导入任务状态、分阶段进度与结果"""
+    try:
+        job = await ingestion_job_queue.get_job(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="导入任务不存在")
+        
+        return AIResponse(
+            success=True,
+            message="导入任务查询成功",
+            data=job
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"查询导入任务失败: {e}")
+        raise HTTPException(status_code=500, detail=f"查询导入任务失败: {str(e)}")
+
 # 网络搜索API
 @app.post("/api/v1/web/search/bank")
 async def search_bank_info(request: Dict[str, Any]):
@@ -2362,6 +2928,7 @@ async def search_knowledge_advanced(request: Dict[str, Any]):
         category = request.get("category")
         search_type = request.get("search_type", "hybrid")  # vector, text, hybrid
         max_results = request.get("max_results", 5)
+        timings = None
         
         if not query:
             raise HTTPException(status_code=400, detail="查询内容不能为空")
@@ -2385,11 +2952,14 @@ async def search_knowledge_advanced(request: Dict[str, Any]):
                 max_results=max_results
             )
         else:  # hybrid
-            results = await vector_rag_service.search_knowledge_hybrid(
+            hybrid_result = await vector_rag_service.hybrid_retriever.retrieve(
                 query=query,
                 category=category,
-                max_results=max_results
+                max_results=max_results,
+                rerank=request.get("rerank")
             )
+            results = hybrid_result["results"]
+            timings = hybrid_result["timings"]
         
         return AIResponse(
             success=True,
@@ -2399,7 +2969,8 @@ async def search_knowledge_advanced(request: Dict[str, Any]):
                 "search_type": search_type,
                 "category": category,
                 "results": results,
-                "total_results": len(results)
+                "total_results": len(results),
+                "timings": timings
             }
         )
         
@@ -2421,7 +2992,7 @@ async def query_enterprise_credit(request: Dict[str, Any]):
         logger.info(f"收到征信查询请求: {company_name}, 提供商: {provider}")
         
         # 调用征信API服务
-        result = credit_api_service.query_enterprise_credit(
+        result = await credit_api_service.query_enterprise_credit(
             company_name=company_name,
             provider=provider
         )
@@ -2546,6 +3117,110 @@ async def get_performance_summary():
         logger.error(f"获取性能摘要失败: {e}")
         raise HTTPException(status_code=500, detail=f"获取性能摘要失败: {str(e)}")
 
+@app.get("/api/v1/performance/database")
+async def get_database_stats():
+    """获取数据库连接池饱和度与查询统计"""
+    try:
+        return JSONResponse(
+            status_code=200,
+            content={
+                "success": True,
+                "message": "数据库统计获取成功",
+                "data": database.get_stats()
+            }
+        )
+    except Exception as e:
+        logger.error(f"获取数据库统计失败: {e}")
+        raise HTTPException(status_code=500, detail=f"获取数据库统计失败: {str(e)}")
+
+@app.get("/api/v1/performance/single-flight")
+async def get_single_flight_stats():
+    """获取请求合并统计（合并次数、缓存命中、提前刷新与旧值返回次数）"""
+    try:
+        return JSONResponse(
+            status_code=200,
+            content={
+                "success": True,
+                "message": "请求合并统计获取成功",
+                "data": single_flight_manager.get_stats()
+            }
+        )
+    except Exception as e:
+        logger.error(f"获取请求合并统计失败: {e}")
+        raise HTTPException(status_code=500, detail=f"获取请求合并统计失败: {str(e)}")
+
+@app.post("/api/v1/performance/vector-codec-benchmark")
+async def benchmark_vector_codec(request: Dict[str, Any]):
+    """对比vector文本格式与二进制编解码的线上字节数和客户端CPU耗时"""
+    try:
+        result = await asyncio.to_thread(
+            pgvector_codec.benchmark_vector_codec,
+            int(request.get("dimension", 384)),
+            int(request.get("rows_per_query", 10)),
+            int(request.get("iterations", 2000))
+        )
+        return JSONResponse(
+            status_code=200,
+            content={
+                "success": True,
+                "message": "vector编解码基准测试完成",
+                "data": result
+            }
+        )
+    except Exception as e:
+        logger.error(f"vector编解码基准测试失败: {e}")
+        raise HTTPException(status_code=500, detail=f"vector编解码基准测试失败: {str(e)}")
+
+@app.post("/api/v1/performance/embedding-benchmark")
+async def benchmark_embedding_backends(request: Dict[str, Any]):
+    """对比PyTorch与ONNX Runtime（int8）嵌入后端的吞吐、单条延迟与嵌入一致性（仅限已登记的嵌入模型）"""
+    try:
+        model_id = request.get("model_id") or embedding_model_registry.active.model_id
+        if embedding_model_registry.get(model_id) is None:
+            raise HTTPException(status_code=400, detail=f"未登记的嵌入模型: {model_id}")
+        result = await asyncio.to_thread(
+            onnx_embedding_backend.benchmark,
+            model_id,
+            int(request.get("batch_size", 32)),
+            int(request.get("num_texts", 256)),
+            int(request.get("single_queries", 50))
+        )
+        return JSONResponse(
+            status_code=200,
+            content={
+                "success": True,
+                "message": "嵌入后端基准测试完成",
+                "data": result
+            }
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"嵌入后端基准测试失败: {e}")
+        raise HTTPException(status_code=500, detail=f"嵌入后端基准测试失败: {str(e)}")
+
+@app.post("/api/v1/performance/embedding-parity")
+async def check_embedding_parity(request: Dict[str, Any]):
+    """校验ONNX嵌入与PyTorch嵌入的余弦相似度（阈值0.99，仅限已登记的嵌入模型）"""
+    try:
+        model_id = request.get("model_id") or embedding_model_registry.active.model_id
+        if embedding_model_registry.get(model_id) is None:
+            raise HTTPException(status_code=400, detail=f"未登记的嵌入模型: {model_id}")
+        result = await asyncio.to_thread(onnx_embedding_backend.check_parity, model_id, request.get("texts"))
+        return JSONResponse(
+            status_code=200,
+            content={
+                "success": True,
+                "message": "嵌入一致性校验通过" if result["passed"] else "嵌入一致性校验未通过",
+                "data": result
+            }
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"嵌入一致性校验失败: {e}")
+        raise HTTPException(status_code=500, detail=f"嵌入一致性校验失败: {str(e)}")
+
 @app.post("/api/v1/performance/optimize")
 async def optimize_performance():
     """执行性能优化"""
@@ -2617,15 +3292,27 @@ async def recognize_text(request: Dict[str, Any]):
             elif engine == "baidu":
                 ocr_engines.append(OCREngine.BAIDU)
         
-        # 执行OCR识别
-        results = await advanced_ocr_service.recognize_text(
-            image_path, 
-            ocr_engines, 
-            language
-        )
-        
-        # 获取最佳结果
-        best_result = await advanced_ocr_service.get_best_result(results)
+        # 执行OCR识别：默认all运行全部引擎；cascade（需显式指定）按成本逐级执行，满足置信度与文本密度即停止
+        mode = request.get("mode", "all")
+        skipped_engines = []
+        time_saved = 0.0
+        cached = False
+        if mode == "cascade":
+            outcome = await advanced_ocr_service.recognize_cascade(image_path, ocr_engines, language)
+            results = outcome["results"]
+            best_result = outcome["best_result"]
+            skipped_engines = outcome["skipped_engines"]
+            time_saved = outcome["time_saved"]
+            cached = outcome["cached"]
+        else:
+            results = await advanced_ocr_service.recognize_text(
+                image_path, 
+                ocr_engines, 
+                language
+            )
+            
+            # 获取最佳结果
+            best_result = await advanced_ocr_service.get_best_result(results)
         
         return JSONResponse(
             status_code=200,
@@ -2637,6 +3324,11 @@ async def recognize_text(request: Dict[str, Any]):
                     "confidence": best_result.confidence if best_result else 0.0,
                     "engine": best_result.engine if best_result else "none",
                     "processing_time": best_result.processing_time if best_result else 0.0,
+                    "mode": mode,
+                    "skipped_engines": skipped_engines,
+                    "time_saved": time_saved,
+                    "cached": cached,
+                    "worker_pool": advanced_ocr_service.worker_pool.get_status(),
                     "all_results": [
                         {
                             "text": result.text,
@@ -0,0 +1,61 @@
+"""
+过载保护中间件
+LLM、OCR、嵌入等重型接口经自适应并发限制器放行，过载时返回429并附带Retry-After
+"""
+
+import asyncio
+import time
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from loguru import logger
+
+from services.adaptive_concurrency import LoadShedError, adaptive_concurrency_manager
+
+
+class LoadSheddingMiddleware:
+    """过载保护中间件"""
+
+    @staticmethod
+    async def load_shedding_middleware(request: Request, call_next):
+        """过载保护中间件"""
+        route = adaptive_concurrency_manager.match(request.method, request.url.path)
+        if route is None:
+            return await call_next(request)
+
+        priority = adaptive_concurrency_manager.resolve_priority(
+            route, request.headers.get(adaptive_concurrency_manager.PRIORITY_HEADER)
+        )
+        try:
+            permit = await adaptive_concurrency_manager.acquire(route, priority)
+        except LoadShedError as e:
+            logger.warning(f"请求被限流: {request.method} {request.url.path} - {e} - {e.retry_after}s后重试")
+            return JSONResponse(
+                status_code=429,
+                headers={"Retry-After": str(e.retry_after)},
+                content={
+                    "success": False,
+                    "error": {
+                        "type": "TooManyRequests",
+                        "code": 429,
+                        "message": "服务繁忙，请稍后重试",
+                        "limiter": e.limiter,
+                        "reason": e.reason,
+                        "retry_after": e.retry_after,
+                        "timestamp": time.time()
+                    }
+                }
+            )
+
+        try:
+            response = await call_next(request)
+        except asyncio.CancelledError:
+            # 客户端断开，不作为延迟样本
+            permit.release(sample=False)
+            raise
+        except Exception:
+            permit.release(dropped=True)
+            raise
+        # 5xx视为过载信号收缩上限；4xx多为参数错误，不计入延迟样本
+        status = response.status_code
+        permit.release(dropped=status >= 500, sample=status < 400)
+        return response
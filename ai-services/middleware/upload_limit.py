@@ -0,0 +1,106 @@
+"""
+上传限额中间件
+Starlette在路由拿到UploadFile之前就会读完并缓存整个multipart请求体，因此限额必须在读取请求体之前生效：
+Content-Length超过单请求限额直接返回413；按声明长度占用全局在途额度，额度不足时在读取请求体之前等待（背压）；
+读取请求体时逐块累计字节数，超出限额立即中止读取并返回413
+"""
+
+import time
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from loguru import logger
+
+from services.upload_manager import UploadBudgetExhaustedError, UploadTooLargeError, upload_manager
+
+
+def _error_response(status_code: int, error_type: str, message: str, headers: dict = None) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        headers=headers,
+        content={
+            "success": False,
+            "error": {
+                "type": error_type,
+                "code": status_code,
+                "message": message,
+                "timestamp": time.time()
+            }
+        }
+    )
+
+
+class UploadLimitMiddleware:
+    """上传限额中间件（ASGI层实现，需要包装receive逐块计数）"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if not headers.get("content-type", "").startswith("multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = upload_manager.max_request_bytes
+        try:
+            declared = int(headers["content-length"]) if "content-length" in headers else None
+        except ValueError:
+            declared = None
+        if declared is not None and declared > limit:
+            upload_manager.stats["rejected_too_large"] += 1
+            logger.warning(f"上传请求超过限额: {scope['path']} - Content-Length {declared}")
+            await _error_response(413, "PayloadTooLarge", f"上传内容超过单请求限额 {limit} 字节")(scope, receive, send)
+            return
+
+        # 未声明长度（分块传输）时按单请求上限占用额度
+        try:
+            reserved = await upload_manager.reserve_request(declared if declared is not None else limit)
+        except UploadBudgetExhaustedError as e:
+            await _error_response(
+                503, "ServiceUnavailable", str(e), {"Retry-After": str(int(upload_manager.budget_wait_timeout))}
+            )(scope, receive, send)
+            return
+
+        try:
+            await self._call_limited(scope, receive, send, limit)
+        finally:
+            await upload_manager.release_request(reserved)
+
+    async def _call_limited(self, scope: Scope, receive: Receive, send: Send, limit: int):
+        """逐块累计请求体字节数，超限后丢弃应用的响应，改由中间件返回413"""
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise UploadTooLargeError(f"上传内容超过单请求限额 {limit} 字节")
+            return message
+
+        async def guarded_send(message: Message):
+            nonlocal response_started
+            if exceeded:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+
+        if exceeded and not response_started:
+            upload_manager.stats["rejected_too_large"] += 1
+            logger.warning(f"上传请求体超过限额，已中止读取: {scope['path']} - {received} 字节")
+            await _error_response(413, "PayloadTooLarge", f"上传内容超过单请求限额 {limit} 字节")(scope, receive, send)
@@ -9,6 +9,9 @@ import asyncio
 import asyncpg
 from typing import List, Dict, Any
 
+from services.database import database
+from services.embedding_backfill import backfill_embeddings
+
 # 数据库配置
 DB_CONFIG = {
     'host': 'ai-loan-postgresql',
@@ -260,43 +263,10 @@ async def search_and_store_faqs():
         print(f"❌ 搜索和存储FAQ失败: {e}")
 
 async def generate_embeddings():
-    """生成向量嵌入"""
+    """生成向量嵌入（分批回填，见backfill_embeddings.py）"""
     try:
-        from sentence_transformers import SentenceTransformer
-        
-        # 加载嵌入模型
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-        print("✅ 嵌入模型加载成功")
-        
-        # 连接数据库
-        conn = await asyncpg.connect(**DB_CONFIG)
-        print("✅ 数据库连接成功")
-        
-        # 获取所有知识数据
-        records = await conn.fetch("SELECT id, title, content FROM knowledge_base WHERE embedding IS NULL")
-        print(f"✅ 找到 {len(records)} 条需要生成嵌入的记录")
-        
-        # 生成嵌入
-        for record in records:
-            # 组合标题和内容
-            text = f"{record['title']} {record['content']}"
-            
-            # 生成嵌入向量
-            embedding = model.encode(text)
-            
-            # 更新数据库 - 将向量转换为字符串格式
-            embedding_str = '[' + ','.join(map(str, embedding.tolist())) + ']'
-            await conn.execute("""
-                UPDATE knowledge_base 
-                SET embedding = $1::vector, updated_at = NOW()
-                WHERE id = $2
-            """, embedding_str, record['id'])
-            
-            print(f"✅ 已生成记录 {record['id']} 的嵌入向量")
-        
-        print("✅ 所有嵌入向量生成完成")
-        await conn.close()
-        
+        stats = await backfill_embeddings()
+        print(f"✅ 所有嵌入向量生成完成: {stats.rows} 条, {stats.rows_per_second:.1f} 条/秒")
     except Exception as e:
         print(f"❌ 生成嵌入向量失败: {e}")
 
@@ -309,6 +279,7 @@ async def main():
     
     # 生成嵌入向量
     await generate_embeddings()
+    await database.close()
     
     print("FAQ知识库构建完成！")
 
@@ -0,0 +1,373 @@
+"""
+自适应并发限制
+按观测到的延迟动态调整LLM、OCR、嵌入等重型接口的并发上限（梯度算法或AIMD）：
+超过上限的请求按优先级短暂排队，排队超过期限或队列已满时立即拒绝（429 + Retry-After），
+交互式对话优先于批处理与后台学习流量，过载时快速失败而不是层层超时
+"""
+
+import asyncio
+import itertools
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+
+class RequestPriority(Enum):
+    """请求优先级（值越小越优先）"""
+    INTERACTIVE = 0   # 在线对话
+    BATCH = 1         # 批处理
+    BACKGROUND = 2    # 后台学习
+
+
+class LimitAlgorithm(Enum):
+    """并发上限调整算法"""
+    GRADIENT = "gradient"
+    AIMD = "aimd"
+
+
+class LoadShedError(Exception):
+    """请求被限流拒绝"""
+
+    def __init__(self, limiter: str, retry_after: int, reason: str):
+        super().__init__(f"{limiter} 过载: {reason}")
+        self.limiter = limiter
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def _env_float(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+@dataclass
+class AdaptiveLimitConfig:
+    """自适应并发限制配置"""
+    initial_limit: float = 16
+    min_limit: float = 1
+    max_limit: float = 128
+    algorithm: LimitAlgorithm = LimitAlgorithm.GRADIENT
+    # 梯度算法：允许短期延迟超过空载基线的倍数、上限平滑系数、空载基线的滚动窗口（样本数）
+    tolerance: float = 2.0
+    smoothing: float = 0.2
+    baseline_window: int = 500
+    # AIMD：延迟超过该值（秒）或请求失败时按backoff_ratio收缩
+    latency_threshold: float = 10.0
+    backoff_ratio: float = 0.9
+    max_queue: int = 64
+    # 各优先级的排队期限（秒）
+    queue_timeouts: Dict[RequestPriority, float] = field(default_factory=lambda: {
+        RequestPriority.INTERACTIVE: 2.0,
+        RequestPriority.BATCH: 1.0,
+        RequestPriority.BACKGROUND: 0.5
+    })
+    # 各优先级可占用的并发上限比例，为交互式请求预留余量
+    priority_shares: Dict[RequestPriority, float] = field(default_factory=lambda: {
+        RequestPriority.INTERACTIVE: 1.0,
+        RequestPriority.BATCH: 0.75,
+        RequestPriority.BACKGROUND: 0.5
+    })
+
+    @classmethod
+    def from_env(cls, name: str, initial_limit: float, min_limit: float, max_limit: float) -> "AdaptiveLimitConfig":
+        """按 CONCURRENCY_<NAME>_* 环境变量覆盖默认值"""
+        prefix = f"CONCURRENCY_{name.upper()}_"
+        config = cls(
+            initial_limit=_env_float(prefix + "INITIAL", initial_limit),
+            min_limit=_env_float(prefix + "MIN", min_limit),
+            max_limit=_env_float(prefix + "MAX", max_limit),
+            algorithm=LimitAlgorithm(os.getenv(prefix + "ALGORITHM", os.getenv("CONCURRENCY_LIMIT_ALGORITHM", "gradient"))),
+            latency_threshold=_env_float(prefix + "LATENCY_THRESHOLD", 10.0),
+            max_queue=int(os.getenv(prefix + "MAX_QUEUE", os.getenv("CONCURRENCY_MAX_QUEUE", "64")))
+        )
+        for priority in RequestPriority:
+            config.queue_timeouts[priority] = _env_float(
+                f"CONCURRENCY_QUEUE_TIMEOUT_{priority.name}", config.queue_timeouts[priority]
+            )
+        return config
+
+
+@dataclass
+class _Waiter:
+    priority: RequestPriority
+    seq: int
+    future: asyncio.Future
+
+    @property
+    def order(self):
+        return self.priority.value, self.seq
+
+
+class Permit:
+    """已获得的并发许可，完成后调用release上报延迟"""
+
+    __slots__ = ("_limiter", "_started", "_in_flight", "_released")
+
+    def __init__(self, limiter: "AdaptiveConcurrencyLimiter", in_flight: int):
+        self._limiter = limiter
+        self._started = time.monotonic()
+        self._in_flight = in_flight
+        self._released = False
+
+    def release(self, dropped: bool = False, sample: bool = True):
+        """释放许可；dropped表示失败/超时（收缩上限），sample为False时不计入延迟（如客户端错误）"""
+        if self._released:
+            return
+        self._released = True
+        rtt = time.monotonic() - self._started if sample or dropped else None
+        self._limiter._release(rtt, dropped, self._in_flight)
+
+
+class AdaptiveConcurrencyLimiter:
+    """自适应并发限制器"""
+
+    def __init__(self, name: str, config: AdaptiveLimitConfig):
+        self.name = name
+        self.config = config
+        self.limit = float(config.initial_limit)
+        self.in_flight = 0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        # 短期延迟的指数滑动平均，与空载延迟基线（滚动窗口内的最小延迟）（秒）
+        self.short_rtt: Optional[float] = None
+        self.baseline_rtt: Optional[float] = None
+        self._window_min_rtt: Optional[float] = None
+        self._window_samples = 0
+        self.stats = {
+            "accepted": {priority.name.lower(): 0 for priority in RequestPriority},
+            "enqueued": {priority.name.lower(): 0 for priority in RequestPriority},
+            "rejected": {priority.name.lower(): 0 for priority in RequestPriority},
+            "dropped": 0,
+            "max_in_flight": 0
+        }
+
+    def capacity(self, priority: RequestPriority) -> int:
+        """该优先级可用的并发上限"""
+        return max(1, int(self.limit * self.config.priority_shares[priority]))
+
+    def retry_after(self) -> int:
+        """按当前排队长度与平均延迟估算的重试等待秒数"""
+        rtt = self.short_rtt or 1.0
+        return max(1, math.ceil(rtt * (len(self._waiters) + 1) / max(self.limit, 1.0)))
+
+    def _shed(self, priority: RequestPriority, reason: str) -> LoadShedError:
+        self.stats["rejected"][priority.name.lower()] += 1
+        return LoadShedError(self.name, self.retry_after(), reason)
+
+    def _admit(self, priority: RequestPriority) -> Permit:
+        self.in_flight += 1
+        self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.in_flight)
+        self.stats["accepted"][priority.name.lower()] += 1
+        return Permit(self, self.in_flight)
+
+    async def acquire(self, priority: RequestPriority = RequestPriority.INTERACTIVE) -> Permit:
+        """获取并发许可：有空闲直接放行，否则按优先级排队，超过期限或队列已满抛出LoadShedError"""
+        ahead = any(waiter.priority.value <= priority.value for waiter in self._waiters)
+        if not ahead and self.in_flight < self.capacity(priority):
+            return self._admit(priority)
+
+        if len(self._waiters) >= self.config.max_queue:
+            # max_queue=0时不排队，队列为空也没有可挤出的请求
+            lowest = max(self._waiters, key=lambda waiter: waiter.order, default=None)
+            if lowest is None or lowest.priority.value <= priority.value:
+                raise self._shed(priority, "排队已满")
+            # 队列已满时挤出优先级最低的排队请求
+            self._waiters.remove(lowest)
+            lowest.future.set_exception(self._shed(lowest.priority, "被更高优先级请求挤出队列"))
+
+        waiter = _Waiter(priority, next(self._seq), asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        self.stats["enqueued"][priority.name.lower()] += 1
+        try:
+            await asyncio.wait({waiter.future}, timeout=self.config.queue_timeouts[priority])
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        if not waiter.future.done():
+            self._abandon(waiter)
+            raise self._shed(priority, "排队超时")
+        return waiter.future.result()
+
+    def _abandon(self, waiter: _Waiter):
+        """放弃排队；若许可已在同一时刻发放则归还"""
+        if waiter in self._waiters:
+            self._waiters.remove(waiter)
+            waiter.future.cancel()
+        elif waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+            waiter.future.result().release(sample=False)
+
+    def _drain(self):
+        """按优先级放行排队请求"""
+        while self._waiters:
+            waiter = min(self._waiters, key=lambda item: item.order)
+            if self.in_flight >= self.capacity(waiter.priority):
+                return
+            self._waiters.remove(waiter)
+            # 许可从放行时开始计时，排队等待不计入延迟样本
+            waiter.future.set_result(self._admit(waiter.priority))
+
+    def _release(self, rtt: Optional[float], dropped: bool, in_flight: int):
+        self.in_flight -= 1
+        if dropped:
+            self.stats["dropped"] += 1
+        if rtt is not None or dropped:
+            self._update_limit(rtt, dropped, in_flight)
+        self._drain()
+
+    def _update_limit(self, rtt: Optional[float], dropped: bool, in_flight: int):
+        """按延迟样本调整并发上限"""
+        config = self.config
+        if rtt is not None:
+            self.short_rtt = rtt if self.short_rtt is None else self.short_rtt * 0.8 + rtt * 0.2
+            self._update_baseline(rtt)
+
+        if dropped:
+            new_limit = self.limit * config.backoff_ratio
+        elif config.algorithm == LimitAlgorithm.AIMD:
+            if rtt > config.latency_threshold:
+                new_limit = self.limit * config.backoff_ratio
+            elif in_flight * 2 >= self.limit:
+                # 约每一轮满载请求加1
+                new_limit = self.limit + 1.0 / self.limit
+            else:
+                new_limit = self.limit
+        else:
+            gradient = max(0.5, min(1.0, config.tolerance * self.baseline_rtt / self.short_rtt))
+            # 排队余量随上限的平方根增长
+            new_limit = self.limit * gradient + math.sqrt(self.limit)
+            # 并发未用到一半时不再增长，避免空闲时上限无限膨胀
+            if in_flight * 2 < self.limit:
+                new_limit = min(new_limit, self.limit)
+            new_limit = self.limit * (1 - config.smoothing) + new_limit * config.smoothing
+
+        previous = self.limit
+        self.limit = max(config.min_limit, min(config.max_limit, new_limit))
+        if int(previous) != int(self.limit) and self.limit < previous:
+            logger.info(f"并发上限下调: {self.name} {previous:.1f} -> {self.limit:.1f}")
+
+    def _update_baseline(self, rtt: float):
+        """空载基线取上一窗口与当前窗口最小延迟中的较小者，窗口滚动使基线能随负载特征变化而上调"""
+        self._window_min_rtt = rtt if self._window_min_rtt is None else min(self._window_min_rtt, rtt)
+        self._window_samples += 1
+        if self.baseline_rtt is None or self._window_min_rtt < self.baseline_rtt:
+            self.baseline_rtt = self._window_min_rtt
+        if self._window_samples >= self.config.baseline_window:
+            self.baseline_rtt = self._window_min_rtt
+            self._window_min_rtt = None
+            self._window_samples = 0
+
+    def get_state(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "algorithm": self.config.algorithm.value,
+            "limit": round(self.limit, 2),
+            "min_limit": self.config.min_limit,
+            "max_limit": self.config.max_limit,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "short_rtt_ms": self.short_rtt * 1000 if self.short_rtt is not None else None,
+            "baseline_rtt_ms": self.baseline_rtt * 1000 if self.baseline_rtt is not None else None,
+            "capacity": {priority.name.lower(): self.capacity(priority) for priority in RequestPriority},
+            "retry_after": self.retry_after(),
+            **self.stats
+        }
+
+
+@dataclass
+class RouteLimit:
+    """接口到并发限制器的映射"""
+    method: str
+    path: str
+    limiter: str
+    priority: RequestPriority = RequestPriority.INTERACTIVE
+    # 为True时按路径前缀匹配（含路径参数的接口）
+    prefix: bool = False
+
+    def matches(self, method: str, path: str) -> bool:
+        if method != self.method:
+            return False
+        return path.startswith(self.path) if self.prefix else path == self.path
+
+
+class AdaptiveConcurrencyManager:
+    """重型接口的自适应并发限制"""
+
+    PRIORITY_HEADER = "X-Request-Priority"
+
+    def __init__(self):
+        self.enabled = os.getenv("CONCURRENCY_LIMIT_ENABLED", "true").lower() == "true"
+        cpu_count = os.cpu_count() or 1
+        self.limiters: Dict[str, AdaptiveConcurrencyLimiter] = {
+            "llm": AdaptiveConcurrencyLimiter("llm", AdaptiveLimitConfig.from_env("llm", 16, 2, 128)),
+            "ocr": AdaptiveConcurrencyLimiter("ocr", AdaptiveLimitConfig.from_env("ocr", cpu_count, 1, cpu_count * 4)),
+            "embedding": AdaptiveConcurrencyLimiter(
+                "embedding", AdaptiveLimitConfig.from_env("embedding", cpu_count * 4, 2, cpu_count * 16)
+            )
+        }
+        interactive, batch, background = RequestPriority.INTERACTIVE, RequestPriority.BATCH, RequestPriority.BACKGROUND
+        self.routes: List[RouteLimit] = [
+            # LLM生成
+            RouteLimit("POST", "/api/v1/chat/message", "llm", interactive),
+            RouteLimit("POST", "/api/v1/ai/enhanced-chat", "llm", interactive),
+            RouteLimit("POST", "/api/v1/loan-agent/chat", "llm", interactive),
+            RouteLimit("POST", "/api/v1/llm/generate", "llm", interactive),
+            RouteLimit("POST", "/api/v1/llm/test", "llm", batch),
+            RouteLimit("GET", "/api/v1/ai/dialog-summary/", "llm", batch, prefix=True),
+            RouteLimit("POST", "/api/v1/learning/trigger", "llm", background),
+            # OCR与文档解析
+            RouteLimit("POST", "/api/v1/ocr/recognize", "ocr", interactive),
+            RouteLimit("POST", "/api/v1/ai/document/process", "ocr", interactive),
+            RouteLimit("POST", "/api/v1/rag/process-document", "ocr", batch),
+            RouteLimit("POST", "/api/v1/rag/batch-process", "ocr", batch),
+            RouteLimit("POST", "/api/v1/ai/batch/process", "ocr", batch),
+            # 嵌入计算与向量检索
+            RouteLimit("POST", "/api/v1/rag/search", "embedding", interactive),
+            RouteLimit("POST", "/api/v1/chat/knowledge/search", "embedding", interactive),
+            RouteLimit("POST", "/api/v1/ai/enhanced-knowledge/search", "embedding", interactive),
+            RouteLimit("POST", "/api/v1/rag/knowledge", "embedding", batch),
+            RouteLimit("PUT", "/api/v1/rag/knowledge/", "embedding", batch, prefix=True),
+        ]
+
+    def match(self, method: str, path: str) -> Optional[RouteLimit]:
+        """查找接口对应的并发限制规则"""
+        if not self.enabled:
+            return None
+        for route in self.routes:
+            if route.matches(method, path):
+                return route
+        return None
+
+    def resolve_priority(self, route: RouteLimit, header_value: Optional[str]) -> RequestPriority:
+        """请求头 X-Request-Priority（interactive/batch/background）可覆盖接口的默认优先级"""
+        if header_value:
+            try:
+                return RequestPriority[header_value.strip().upper()]
+            except KeyError:
+                logger.warning(f"未知的请求优先级: {header_value}")
+        return route.priority
+
+    async def acquire(self, route: RouteLimit, priority: RequestPriority) -> Permit:
+        return await self.limiters[route.limiter].acquire(priority)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "limiters": {name: limiter.get_state() for name, limiter in self.limiters.items()},
+            "routes": [
+                {
+                    "method": route.method,
+                    "path": route.path + ("*" if route.prefix else ""),
+                    "limiter": route.limiter,
+                    "priority": route.priority.name.lower()
+                }
+                for route in self.routes
+            ]
+        }
+
+
+# 全局实例
+adaptive_concurrency_manager = AdaptiveConcurrencyManager()
@@ -7,8 +7,12 @@
 import asyncio
 import aiohttp
 import base64
+import hashlib
 import json
 import logging
+import re
+from abc import ABC, abstractmethod
+from collections import OrderedDict
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 from enum import Enum
@@ -16,6 +20,8 @@ import os
 from PIL import Image
 import io
 
+from .ocr_worker_pool import OCRWorkerPool, preprocess_image
+
 logger = logging.getLogger(__name__)
 
 class OCREngine(Enum):
@@ -36,6 +42,46 @@ class OCRResult:
     bounding_boxes: List[Dict[str, Any]] = None
     language: str = "zh"
 
+# 有效字符：中文、字母、数字
+_VALID_CHAR_PATTERN = re.compile(r'[\u4e00-\u9fffA-Za-z0-9]')
+
+# 引擎成本顺序（由低到高），级联模式按此顺序执行
+ENGINE_COST_ORDER = [OCREngine.TESSERACT, OCREngine.PADDLEOCR, OCREngine.BAIDU, OCREngine.TENCENT, OCREngine.ALIYUN]
+
+def text_density(result: OCRResult, image_size: tuple) -> float:
+    """文本密度：每百万像素的有效字符数"""
+    megapixels = max(image_size[0] * image_size[1] / 1_000_000, 0.01)
+    return len(_VALID_CHAR_PATTERN.findall(result.text)) / megapixels
+
+class CascadePolicy(ABC):
+    """级联策略：判断当前结果是否足够好，可以跳过更昂贵的引擎
+
+    自定义策略继承本类并实现 accept
+    """
+    
+    @abstractmethod
+    def accept(self, result: OCRResult, image_size: tuple) -> bool:
+        """结果是否可接受"""
+
+@dataclass
+class ConfidenceDensityPolicy(CascadePolicy):
+    """按置信度与文本密度判断的默认策略"""
+    min_confidence: float = float(os.getenv("OCR_CASCADE_MIN_CONFIDENCE", "0.85"))
+    min_text_density: float = float(os.getenv("OCR_CASCADE_MIN_DENSITY", "20"))
+    min_valid_ratio: float = float(os.getenv("OCR_CASCADE_MIN_VALID_RATIO", "0.6"))
+    
+    def accept(self, result: OCRResult, image_size: tuple) -> bool:
+        text = re.sub(r'\s', '', result.text)
+        if not text:
+            return False
+        # 乱码识别结果中符号占比高
+        valid_ratio = len(_VALID_CHAR_PATTERN.findall(text)) / len(text)
+        return (
+            result.confidence >= self.min_confidence
+            and valid_ratio >= self.min_valid_ratio
+            and text_density(result, image_size) >= self.min_text_density
+        )
+
 class AdvancedOCRService:
     """高级OCR服务"""
     
@@ -48,6 +94,23 @@ class AdvancedOCRService:
             OCREngine.PADDLEOCR: self._paddleocr_ocr
         }
         
+        # 常驻OCR工作进程池（本地引擎）
+        self.worker_pool = OCRWorkerPool()
+        
+        # 级联策略与按图片内容哈希的结果缓存
+        self.cascade_policy: CascadePolicy = ConfidenceDensityPolicy()
+        self.result_cache: OrderedDict = OrderedDict()
+        self.result_cache_size = int(os.getenv("OCR_RESULT_CACHE_SIZE", "512"))
+        # 各引擎历史平均耗时，用于估算级联节省的时间
+        self.engine_timings: Dict[str, Dict[str, float]] = {}
+        self.cascade_stats = {
+            "requests": 0,
+            "cache_hits": 0,
+            "engines_run": 0,
+            "engines_skipped": 0,
+            "estimated_time_saved": 0.0
+        }
+        
         # OCR引擎配置
         self.config = {
             "baidu": {
@@ -73,55 +136,147 @@ class AdvancedOCRService:
         engines: List[OCREngine] = None,
         language: str = "chi_sim+eng"
     ) -> List[OCRResult]:
-        """识别图片中的文字"""
+        """识别图片中的文字（多个引擎并行执行，结果按请求顺序返回）"""
         if engines is None:
             engines = [OCREngine.TESSERACT, OCREngine.PADDLEOCR]
         
-        results = []
+        outcomes = await asyncio.gather(
+            *[self._run_engine(engine, image_path, language) for engine in engines]
+        )
+        return [result for result in outcomes if result]
+    
+    def set_cascade_policy(self, policy: CascadePolicy):
+        """设置级联策略"""
+        self.cascade_policy = policy
+    
+    async def recognize_cascade(
+        self,
+        image_path: str,
+        engines: List[OCREngine] = None,
+        language: str = "chi_sim+eng",
+        policy: CascadePolicy = None
+    ) -> Dict[str, Any]:
+        """级联识别：按成本由低到高执行引擎，结果满足策略即停止
+
+        返回 {"results", "best_result", "skipped_engines", "time_saved", "cached", "image_hash"}
+        """
+        if engines is None:
+            engines = [OCREngine.TESSERACT, OCREngine.PADDLEOCR]
+        policy = policy or self.cascade_policy
+        ordered = sorted(engines, key=ENGINE_COST_ORDER.index)
+        self.cascade_stats["requests"] += 1
         
-        for engine in engines:
-            try:
-                logger.info(f"使用 {engine.value} 引擎进行OCR识别")
-                result = await self.engines[engine](image_path, language)
-                if result:
-                    results.append(result)
-                    logger.info(f"{engine.value} OCR识别成功: {len(result.text)} 个字符")
-                else:
-                    logger.warning(f"{engine.value} OCR识别失败")
-            except Exception as e:
-                logger.error(f"{engine.value} OCR识别异常: {e}")
+        image_hash, image_size = await asyncio.to_thread(self._inspect_image, image_path)
+        cache_key = f"{image_hash}:{language}:{','.join(e.value for e in ordered)}"
+        cached = self.result_cache.get(cache_key)
+        if cached is not None:
+            self.result_cache.move_to_end(cache_key)
+            self.cascade_stats["cache_hits"] += 1
+            logger.info(f"OCR结果缓存命中: {image_hash[:12]}")
+            return {**cached, "cached": True}
+        
+        results: List[OCRResult] = []
+        accepted = None
+        for index, engine in enumerate(ordered):
+            result = await self._run_engine(engine, image_path, language)
+            self.cascade_stats["engines_run"] += 1
+            if not result:
+                continue
+            self._record_timing(result)
+            results.append(result)
+            if policy.accept(result, image_size):
+                accepted = result
+                skipped = ordered[index + 1:]
+                break
+        else:
+            skipped = []
+        
+        best_result = accepted or await self.get_best_result(results)
+        time_saved = sum(self._average_time(engine.value) for engine in skipped)
+        self.cascade_stats["engines_skipped"] += len(skipped)
+        self.cascade_stats["estimated_time_saved"] += time_saved
+        if skipped:
+            logger.info(f"级联OCR由 {accepted.engine} 提前结束，跳过 {[e.value for e in skipped]}，预计节省 {time_saved:.2f}秒")
         
-        return results
+        outcome = {
+            "results": results,
+            "best_result": best_result,
+            "skipped_engines": [engine.value for engine in skipped],
+            "time_saved": time_saved,
+            "image_hash": image_hash
+        }
+        if best_result:
+            self.result_cache[cache_key] = outcome
+            if len(self.result_cache) > self.result_cache_size:
+                self.result_cache.popitem(last=False)
+        return {**outcome, "cached": False}
+    
+    @staticmethod
+    def _inspect_image(image_path: str) -> tuple:
+        """计算图片内容哈希并读取尺寸"""
+        digest = hashlib.sha256()
+        with open(image_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        with Image.open(image_path) as image:
+            size = image.size
+        return digest.hexdigest(), size
+    
+    def _record_timing(self, result: OCRResult):
+        """累计引擎耗时"""
+        timing = self.engine_timings.setdefault(result.engine, {"count": 0, "total": 0.0})
+        timing["count"] += 1
+        timing["total"] += result.processing_time
+    
+    def _average_time(self, engine: str) -> float:
+        """引擎历史平均耗时，无记录时为0"""
+        timing = self.engine_timings.get(engine)
+        return timing["total"] / timing["count"] if timing else 0.0
+    
+    def get_cascade_stats(self) -> Dict[str, Any]:
+        """获取级联统计"""
+        return {
+            **self.cascade_stats,
+            "cache_size": len(self.result_cache),
+            "average_engine_time": {engine: self._average_time(engine) for engine in self.engine_timings}
+        }
+    
+    async def _run_engine(self, engine: OCREngine, image_path: str, language: str) -> Optional[OCRResult]:
+        """执行单个引擎并记录日志"""
+        try:
+            logger.info(f"使用 {engine.value} 引擎进行OCR识别")
+            result = await self.engines[engine](image_path, language)
+            if result:
+                logger.info(f"{engine.value} OCR识别成功: {len(result.text)} 个字符")
+            else:
+                logger.warning(f"{engine.value} OCR识别失败")
+            return result
+        except Exception as e:
+            logger.error(f"{engine.value} OCR识别异常: {e}")
+            return None
+    
+    async def warm_up(self):
+        """预热常驻OCR工作进程"""
+        try:
+            await self.worker_pool.warm_up()
+        except Exception as e:
+            logger.error(f"OCR工作进程预热失败: {e}")
+    
+    def shutdown(self):
+        """关闭OCR工作进程池"""
+        self.worker_pool.shutdown()
     
     async def _tesseract_ocr(self, image_path: str, language: str) -> Optional[OCRResult]:
-        """使用Tesseract OCR"""
+        """使用Tesseract OCR（常驻工作进程，单次识别同时得到文字与置信度）"""
         try:
-            import pytesseract
-            from PIL import Image
-            
-            start_time = asyncio.get_event_loop().time()
-            
-            # 打开图片
-            image = Image.open(image_path)
-            
-            # 图片预处理
-            image = self._preprocess_image(image)
-            
-            # OCR识别
-            text = pytesseract.image_to_string(image, lang=language)
-            
-            # 获取置信度
-            data = pytesseract.image_to_data(image, lang=language, output_type=pytesseract.Output.DICT)
-            confidences = [int(conf) for conf in data['conf'] if int(conf) > 0]
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-            
-            processing_time = asyncio.get_event_loop().time() - start_time
+            result = await self.worker_pool.run("tesseract", image_path, language)
             
             return OCRResult(
-                text=text.strip(),
-                confidence=avg_confidence / 100.0,
+                text=result["text"],
+                confidence=result["confidence"],
                 engine="tesseract",
-                processing_time=processing_time,
+                processing_time=result["processing_time"],
+                bounding_boxes=result["bounding_boxes"],
                 language=language
             )
             
@@ -133,45 +288,16 @@ class AdvancedOCRService:
             return None
     
     async def _paddleocr_ocr(self, image_path: str, language: str) -> Optional[OCRResult]:
-        """使用PaddleOCR"""
+        """使用PaddleOCR（常驻工作进程，模型每个进程只加载一次）"""
         try:
-            from paddleocr import PaddleOCR
-            
-            start_time = asyncio.get_event_loop().time()
-            
-            # 初始化PaddleOCR
-            ocr = PaddleOCR(use_angle_cls=True, lang='ch')
-            
-            # OCR识别
-            result = ocr.ocr(image_path, cls=True)
-            
-            # 提取文字和置信度
-            text_parts = []
-            confidences = []
-            bounding_boxes = []
-            
-            if result and result[0]:
-                for line in result[0]:
-                    if line:
-                        text_parts.append(line[1][0])
-                        confidences.append(line[1][1])
-                        bounding_boxes.append({
-                            "bbox": line[0],
-                            "text": line[1][0],
-                            "confidence": line[1][1]
-                        })
-            
-            text = '\n'.join(text_parts)
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-            
-            processing_time = asyncio.get_event_loop().time() - start_time
+            result = await self.worker_pool.run("paddleocr", image_path, language)
             
             return OCRResult(
-                text=text,
-                confidence=avg_confidence,
+                text=result["text"],
+                confidence=result["confidence"],
                 engine="paddleocr",
-                processing_time=processing_time,
-                bounding_boxes=bounding_boxes,
+                processing_time=result["processing_time"],
+                bounding_boxes=result["bounding_boxes"],
                 language="zh"
             )
             
@@ -277,29 +403,7 @@ class AdvancedOCRService:
     
     def _preprocess_image(self, image: Image.Image) -> Image.Image:
         """图片预处理"""
-        try:
-            # 转换为RGB
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # 调整图片大小（如果太大）
-            width, height = image.size
-            if width > 2000 or height > 2000:
-                ratio = min(2000/width, 2000/height)
-                new_width = int(width * ratio)
-                new_height = int(height * ratio)
-                image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
-            
-            # 增强对比度
-            from PIL import ImageEnhance
-            enhancer = ImageEnhance.Contrast(image)
-            image = enhancer.enhance(1.5)
-            
-            return image
-            
-        except Exception as e:
-            logger.error(f"图片预处理失败: {e}")
-            return image
+        return preprocess_image(image)
     
     async def get_best_result(self, results: List[OCRResult]) -> Optional[OCRResult]:
         """获取最佳OCR结果"""
@@ -11,6 +11,9 @@ from loguru import logger
 from dataclasses import dataclass
 from enum import Enum
 import uuid
+import numpy as np
+
+from . import pricing_kernel
 
 class PricingStrategy(Enum):
     """定价策略"""
@@ -143,18 +146,10 @@ class AdvancedPricingEngine:
             loan_type = loan_request.get("loan_type", "personal_loan")
             risk_level = risk_assessment.get("risk_level", "medium")
             
-            # 获取基础利率
-            base_rate = self.base_rates.get(loan_type, 0.08)
-            
-            # 计算风险调整
-            risk_adjustment = self._calculate_risk_adjustment(risk_level, risk_assessment)
-            
-            # 计算市场调整
-            market_adjustment = self._calculate_market_adjustment(pricing_strategy)
-            
-            # 计算最终利率
-            final_rate = base_rate + risk_adjustment + market_adjustment
-            final_rate = max(final_rate, 0.03)  # 最低3%
+            # 计算基础利率、风险调整、市场调整和最终利率
+            base_rate, risk_adjustment, market_adjustment, final_rate = self._calculate_rate_components(
+                loan_type, risk_level, risk_assessment, pricing_strategy
+            )
             
             # 计算月供
             monthly_payment = self._calculate_monthly_payment(loan_amount, final_rate, loan_term_months)
@@ -197,6 +192,16 @@ class AdvancedPricingEngine:
             logger.error(f"定价计算失败: {e}")
             return self._create_default_pricing_result(loan_request)
     
+    def _calculate_rate_components(self, loan_type: str, risk_level: str,
+                                   risk_assessment: Dict[str, Any],
+                                   pricing_strategy: PricingStrategy) -> Tuple[float, float, float, float]:
+        """计算 (基础利率, 风险调整, 市场调整, 最终利率)"""
+        base_rate = self.base_rates.get(loan_type, 0.08)
+        risk_adjustment = self._calculate_risk_adjustment(risk_level, risk_assessment)
+        market_adjustment = self._calculate_market_adjustment(pricing_strategy)
+        final_rate = max(base_rate + risk_adjustment + market_adjustment, 0.03)  # 最低3%
+        return base_rate, risk_adjustment, market_adjustment, final_rate
+    
     def _calculate_risk_adjustment(self, risk_level: str, risk_assessment: Dict[str, Any]) -> float:
         """计算风险调整"""
         base_adjustment = self.risk_adjustments.get(risk_level, 0.0)
@@ -233,11 +238,7 @@ class AdvancedPricingEngine:
     
     def _calculate_monthly_payment(self, principal: float, annual_rate: float, months: int) -> float:
         """计算月供"""
-        if annual_rate == 0:
-            return principal / months
-        
-        monthly_rate = annual_rate / 12
-        return principal * (monthly_rate * (1 + monthly_rate) ** months) / ((1 + monthly_rate) ** months - 1)
+        return principal * pricing_kernel.annuity_factor(annual_rate, months)
     
     def _calculate_fees(self, loan_request: Dict[str, Any], 
                        loan_amount: float, loan_term_months: int) -> Dict[FeeType, float]:
@@ -284,24 +285,44 @@ class AdvancedPricingEngine:
         
         return fees
     
+    def _calculate_fees_vectorized(self, loan_type: str, loan_amounts: np.ndarray,
+                                   loan_term_months: np.ndarray) -> Dict[FeeType, np.ndarray]:
+        """向量化费用计算，规则与_calculate_fees一致"""
+        amounts = np.asarray(loan_amounts, dtype=np.float64)
+        terms = np.asarray(loan_term_months)
+        zeros = np.zeros_like(amounts)
+        
+        processing_config = self.fee_structures[FeeType.PROCESSING_FEE]
+        if processing_config["type"] == "percentage":
+            processing_fee = np.clip(
+                amounts * processing_config["rate"],
+                processing_config["min_amount"],
+                processing_config["max_amount"]
+            )
+        else:
+            processing_fee = zeros + processing_config["amount"]
+        
+        insurance_config = self.fee_structures[FeeType.INSURANCE_FEE]
+        return {
+            FeeType.PROCESSING_FEE: processing_fee,
+            FeeType.INSURANCE_FEE: amounts * insurance_config["rate"] if insurance_config["required"] else zeros,
+            FeeType.NOTARY_FEE: np.where(amounts > 100000, self.fee_structures[FeeType.NOTARY_FEE]["amount"], 0.0),
+            FeeType.APPRAISAL_FEE: zeros + (
+                self.fee_structures[FeeType.APPRAISAL_FEE]["amount"] if loan_type == "mortgage" else 0
+            ),
+            FeeType.EARLY_REPAYMENT_FEE: np.where(
+                terms > 12, amounts * self.fee_structures[FeeType.EARLY_REPAYMENT_FEE]["rate"], 0.0
+            ),
+            FeeType.LATE_FEE: zeros
+        }
+    
     def _calculate_apr(self, principal: float, monthly_payment: float, 
                       months: int, total_fees: float) -> float:
-        """计算年化利率(APR)"""
+        """计算年化利率(APR)：以扣除费用后的到手本金为现值求解内部收益率"""
         if principal == 0:
             return 0
         
-        # 使用牛顿法求解APR
-        total_payment = monthly_payment * months
-        effective_principal = principal - total_fees
-        
-        if effective_principal <= 0:
-            return 0
-        
-        # 简化的APR计算
-        total_interest = total_payment - principal
-        apr = (total_interest / effective_principal) * (12 / months)
-        
-        return min(apr, 1.0)  # 最高100%
+        return float(pricing_kernel.solve_apr(principal - total_fees, monthly_payment, months)[0])
     
     def _calculate_profit_margin(self, interest_rate: float, loan_amount: float, 
                                total_fees: float) -> float:
@@ -358,7 +379,10 @@ class AdvancedPricingEngine:
     def optimize_pricing(self, loan_request: Dict[str, Any], 
                         risk_assessment: Dict[str, Any],
                         target_profit_margin: float = 0.05) -> List[PricingResult]:
-        """优化定价方案"""
+        """优化定价方案
+        
+        各策略只有市场调整不同，费用、置信度只计算一次，月供和APR按策略利率向量化求解
+        """
         strategies = [
             PricingStrategy.COMPETITIVE,
             PricingStrategy.PROFIT_OPTIMIZED,
@@ -366,42 +390,122 @@ class AdvancedPricingEngine:
             PricingStrategy.MARKET_LEADER
         ]
         
-        results = []
-        for strategy in strategies:
-            pricing = self.calculate_pricing(loan_request, risk_assessment, strategy)
-            results.append(pricing)
+        try:
+            loan_amount = loan_request.get("loan_amount", 0)
+            loan_term_months = loan_request.get("loan_term_months", 12)
+            loan_type = loan_request.get("loan_type", "personal_loan")
+            risk_level = risk_assessment.get("risk_level", "medium")
+            
+            components = [
+                self._calculate_rate_components(loan_type, risk_level, risk_assessment, strategy)
+                for strategy in strategies
+            ]
+            final_rates = np.array([c[3] for c in components])
+            payments = pricing_kernel.monthly_payments(loan_amount, final_rates, loan_term_months)
+            
+            fees = self._calculate_fees(loan_request, loan_amount, loan_term_months)
+            total_fees = sum(fees.values())
+            aprs = pricing_kernel.solve_apr(loan_amount - total_fees, payments, loan_term_months, final_rates)
+            confidence_score = self._calculate_pricing_confidence(risk_assessment, loan_request)
+            timestamp = datetime.now()
+            
+            results = []
+            for strategy, (base_rate, risk_adjustment, market_adjustment, final_rate), payment, apr in zip(
+                strategies, components, payments, aprs
+            ):
+                total_interest = float(payment) * loan_term_months - loan_amount
+                results.append(PricingResult(
+                    base_interest_rate=base_rate,
+                    final_interest_rate=final_rate,
+                    monthly_payment=float(payment),
+                    total_interest=total_interest,
+                    total_amount=loan_amount + total_interest + total_fees,
+                    fees=fees,
+                    total_fees=total_fees,
+                    apr=float(apr) if loan_amount else 0,
+                    pricing_strategy=strategy,
+                    risk_adjustment=risk_adjustment,
+                    market_adjustment=market_adjustment,
+                    profit_margin=self._calculate_profit_margin(final_rate, loan_amount, total_fees),
+                    confidence_score=confidence_score,
+                    pricing_timestamp=timestamp,
+                    model_version=self.model_version
+                ))
+        except Exception as e:
+            logger.error(f"定价方案优化失败: {e}")
+            results = [self.calculate_pricing(loan_request, risk_assessment, strategy) for strategy in strategies]
         
         # 按利润空间排序
         results.sort(key=lambda x: x.profit_margin, reverse=True)
         
         return results
     
+    def calculate_pricing_grid(self, loan_request: Dict[str, Any],
+                               risk_assessment: Dict[str, Any],
+                               loan_amounts: List[float],
+                               loan_terms: List[int],
+                               interest_rates: List[float] = None,
+                               pricing_strategy: PricingStrategy = PricingStrategy.RISK_BASED) -> Dict[str, np.ndarray]:
+        """批量计算 (金额, 期限, 利率) 场景网格
+        
+        interest_rates为空时使用按风险评估和策略得出的最终利率，返回扁平数组字典
+        """
+        loan_type = loan_request.get("loan_type", "personal_loan")
+        if not interest_rates:
+            risk_level = risk_assessment.get("risk_level", "medium")
+            interest_rates = [self._calculate_rate_components(
+                loan_type, risk_level, risk_assessment, pricing_strategy
+            )[3]]
+        
+        grid = pricing_kernel.scenario_grid(loan_amounts, loan_terms, interest_rates)
+        amounts = grid["loan_amount"]
+        terms = grid["term_months"]
+        rates = grid["interest_rate"]
+        
+        payments = pricing_kernel.monthly_payments(amounts, rates, terms)
+        total_interest = payments * terms - amounts
+        total_fees = sum(self._calculate_fees_vectorized(loan_type, amounts, terms).values())
+        apr = np.where(amounts > 0, pricing_kernel.solve_apr(amounts - total_fees, payments, terms, rates), 0.0)
+        
+        return {
+            **grid,
+            "monthly_payment": payments,
+            "total_interest": total_interest,
+            "total_fees": total_fees,
+            "total_amount": amounts + total_interest + total_fees,
+            "apr": apr
+        }
+    
+    def get_amortization_schedule(self, loan_amount: float, interest_rate: float,
+                                  loan_term_months: int) -> Dict[str, np.ndarray]:
+        """获取等额本息还款计划表"""
+        return pricing_kernel.amortization_schedule(loan_amount, interest_rate, loan_term_months)
+    
     def compare_pricing_scenarios(self, loan_request: Dict[str, Any], 
                                 risk_assessment: Dict[str, Any]) -> Dict[str, Any]:
-        """比较不同定价场景"""
+        """比较不同定价场景（不同期限、不同金额，向量化计算）"""
         scenarios = {}
+        base_amount = loan_request.get("loan_amount", 100000)
+        base_term = loan_request.get("loan_term_months", 12)
         
         # 不同贷款期限
-        for term in [12, 24, 36, 60]:
-            request = loan_request.copy()
-            request["loan_term_months"] = term
-            pricing = self.calculate_pricing(request, risk_assessment)
+        terms = [12, 24, 36, 60]
+        by_term = self.calculate_pricing_grid(loan_request, risk_assessment, [base_amount], terms)
+        for i, term in enumerate(terms):
             scenarios[f"{term}个月"] = {
-                "monthly_payment": pricing.monthly_payment,
-                "total_interest": pricing.total_interest,
-                "apr": pricing.apr
+                "monthly_payment": float(by_term["monthly_payment"][i]),
+                "total_interest": float(by_term["total_interest"][i]),
+                "apr": float(by_term["apr"][i])
             }
         
         # 不同贷款金额
-        base_amount = loan_request.get("loan_amount", 100000)
-        for amount in [base_amount * 0.5, base_amount, base_amount * 1.5, base_amount * 2]:
-            request = loan_request.copy()
-            request["loan_amount"] = amount
-            pricing = self.calculate_pricing(request, risk_assessment)
+        amounts = [base_amount * 0.5, base_amount, base_amount * 1.5, base_amount * 2]
+        by_amount = self.calculate_pricing_grid(loan_request, risk_assessment, amounts, [base_term])
+        for i, amount in enumerate(amounts):
             scenarios[f"{amount/10000:.0f}万"] = {
-                "monthly_payment": pricing.monthly_payment,
-                "total_interest": pricing.total_interest,
-                "apr": pricing.apr
+                "monthly_payment": float(by_amount["monthly_payment"][i]),
+                "total_interest": float(by_amount["total_interest"][i]),
+                "apr": float(by_amount["apr"][i])
             }
         
         return scenarios
@@ -5,13 +5,17 @@
 
 import json
 import math
-from typing import Dict, List, Any, Optional, Tuple
+import numbers
+import time
+from typing import Dict, List, Any, Optional, Tuple, Sequence
 from datetime import datetime, timedelta
 from loguru import logger
 from dataclasses import dataclass
 from enum import Enum
 import uuid
 
+import numpy as np
+
 class RiskLevel(Enum):
     """风险等级"""
     LOW = "low"
@@ -69,6 +73,62 @@ class IncomeProfile:
     additional_income: float
     income_verification: str
 
+# 批量评分的数值特征及缺省值（与单笔评估的取值缺省一致）
+_BATCH_NUMERIC_FEATURES = {
+    "credit_score": 600,
+    "payment_delinquencies": 0,
+    "credit_utilization": 0.3,
+    "annual_income": 0,
+    "income_stability": 0.5,
+    "employment_years": 0,
+    "monthly_income": 0,
+    "monthly_debt": 0,
+    "loan_count": 0,
+    "default_count": 0,
+    "age": 30
+}
+
+# 基准测试的样本量上限（逐笔对比样本同样受限）
+_BENCHMARK_MAX_SAMPLE_SIZE = 200000
+_BENCHMARK_MAX_SCALAR_SAMPLE_SIZE = 20000
+
+# 批量评分的因子顺序（与单笔评估中风险因子的计算顺序一致）
+_BATCH_FACTOR_ORDER = (
+    RiskFactor.CREDIT_SCORE,
+    RiskFactor.INCOME_STABILITY,
+    RiskFactor.DEBT_RATIO,
+    RiskFactor.EMPLOYMENT_HISTORY,
+    RiskFactor.LOAN_HISTORY,
+    RiskFactor.AGE,
+    RiskFactor.MARITAL_STATUS,
+    RiskFactor.EDUCATION,
+    RiskFactor.INDUSTRY_RISK
+)
+
+_RISK_LEVEL_ORDER = (RiskLevel.LOW, RiskLevel.MEDIUM, RiskLevel.HIGH, RiskLevel.VERY_HIGH)
+_APPROVAL_RECOMMENDATIONS = ("建议批准", "建议有条件批准", "建议拒绝")
+
+@dataclass
+class BatchRiskAssessment:
+    """批量风险评分结果（列式），解释文本按需生成"""
+    applicants: List[Dict[str, Any]]
+    factor_scores: np.ndarray  # [申请人数, 因子数]，列顺序见 factors
+    overall_risk_scores: np.ndarray
+    risk_level_codes: np.ndarray  # _RISK_LEVEL_ORDER 下标
+    recommendation_codes: np.ndarray  # _APPROVAL_RECOMMENDATIONS 下标
+    confidence_scores: np.ndarray
+    factors: Tuple[RiskFactor, ...]
+    processing_time: float
+    
+    def __len__(self) -> int:
+        return len(self.applicants)
+    
+    def risk_level(self, index: int) -> RiskLevel:
+        return _RISK_LEVEL_ORDER[self.risk_level_codes[index]]
+    
+    def approval_recommendation(self, index: int) -> str:
+        return _APPROVAL_RECOMMENDATIONS[self.recommendation_codes[index]]
+
 class AdvancedRiskEngine:
     """高级风控引擎"""
     
@@ -77,6 +137,14 @@ class AdvancedRiskEngine:
         self.risk_weights = self._initialize_risk_weights()
         self.industry_risk_scores = self._initialize_industry_risks()
         self.risk_thresholds = self._initialize_risk_thresholds()
+        self._education_risk_scores = {
+            "phd": 0.1,
+            "master": 0.15,
+            "bachelor": 0.2,
+            "associate": 0.3,
+            "high_school": 0.4,
+            "below_high_school": 0.6
+        }
     
     def _initialize_risk_weights(self) -> Dict[RiskFactor, float]:
         """初始化风险权重"""
@@ -403,17 +471,7 @@ class AdvancedRiskEngine:
     def _calculate_education_risk(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """计算教育背景风险"""
         education = data.get("education", "high_school")
-        
-        education_scores = {
-            "phd": 0.1,
-            "master": 0.15,
-            "bachelor": 0.2,
-            "associate": 0.3,
-            "high_school": 0.4,
-            "below_high_school": 0.6
-        }
-        
-        risk_score = education_scores.get(education, 0.4)
+        risk_score = self._education_risk_scores.get(education, 0.4)
         education_names = {
             "phd": "博士",
             "master": "硕士",
@@ -539,6 +597,198 @@ class AdvancedRiskEngine:
             model_version=self.model_version
         )
     
+    def assess_risk_batch(self, applicants: List[Dict[str, Any]]) -> BatchRiskAssessment:
+        """批量风险评分
+        
+        申请人映射为特征矩阵，九个风险因子与综合得分整列计算，
+        不生成解释文本；需要解释时对指定行调用 explain_batch
+        """
+        start_time = time.perf_counter()
+        features = self._build_batch_features(applicants)
+        factor_scores = self._calculate_batch_factor_scores(features, applicants)
+        
+        # 按因子顺序逐列累加，与单笔评估的累加顺序相同，得分仅有浮点误差级差异
+        weighted_score = np.zeros(len(applicants))
+        for column, factor in enumerate(_BATCH_FACTOR_ORDER):
+            weighted_score = weighted_score + factor_scores[:, column] * self.risk_weights.get(factor, 0.1)
+        overall_risk_scores = np.minimum(weighted_score, 1.0)
+        
+        risk_level_codes = np.select(
+            [
+                overall_risk_scores <= self.risk_thresholds["low_risk_max"],
+                overall_risk_scores <= self.risk_thresholds["medium_risk_max"],
+                overall_risk_scores <= self.risk_thresholds["high_risk_max"]
+            ],
+            [0, 1, 2], default=3
+        )
+        recommendation_codes = np.select(
+            [overall_risk_scores <= self.risk_thresholds["approval_threshold"], overall_risk_scores <= 0.8],
+            [0, 1], default=2
+        )
+        
+        # 置信度 = (数据完整性 + 因子一致性) / 2
+        required_fields = ["credit_score", "annual_income", "age", "employment_years"]
+        completeness = np.array([
+            sum(1 for field in required_fields if applicant.get(field) is not None) for applicant in applicants
+        ], dtype=np.float64) / len(required_fields)
+        consistency = 1.0 - np.minimum(factor_scores.var(axis=1), 1.0) if len(applicants) else np.zeros(0)
+        confidence_scores = np.minimum((completeness + consistency) / 2, 1.0)
+        
+        return BatchRiskAssessment(
+            applicants=applicants,
+            factor_scores=factor_scores,
+            overall_risk_scores=overall_risk_scores,
+            risk_level_codes=risk_level_codes,
+            recommendation_codes=recommendation_codes,
+            confidence_scores=confidence_scores,
+            factors=_BATCH_FACTOR_ORDER,
+            processing_time=time.perf_counter() - start_time
+        )
+    
+    def explain_batch(self, batch: BatchRiskAssessment, indices: Sequence[int]) -> Dict[int, RiskAssessment]:
+        """为批量结果中的指定行生成完整评估（含解释与缓解建议）"""
+        return {index: self.assess_risk(batch.applicants[index]) for index in indices}
+    
+    def _build_batch_features(self, applicants: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        """构建数值特征列，缺失或为None的字段取单笔评估的缺省值；存在非数值字段时报告所在行"""
+        features = {}
+        invalid_rows: Dict[int, List[str]] = {}
+        for name, default in _BATCH_NUMERIC_FEATURES.items():
+            column = np.empty(len(applicants))
+            for index, applicant in enumerate(applicants):
+                value = applicant.get(name)
+                if value is None:
+                    column[index] = default
+                elif isinstance(value, numbers.Real):
+                    column[index] = value
+                else:
+                    column[index] = np.nan
+                    invalid_rows.setdefault(index, []).append(name)
+            features[name] = column
+        if invalid_rows:
+            details = "; ".join(
+                f"第{index}行: {', '.join(names)}" for index, names in sorted(invalid_rows.items())[:20]
+            )
+            raise ValueError(f"{len(invalid_rows)}行存在非数值字段（{details}）")
+        return features
+    
+    def _calculate_batch_factor_scores(self, features: Dict[str, np.ndarray],
+                                       applicants: List[Dict[str, Any]]) -> np.ndarray:
+        """整列计算九个风险因子得分，阈值与各 _calculate_*_risk 方法一致"""
+        factor_scores = np.empty((len(applicants), len(_BATCH_FACTOR_ORDER)))
+        
+        # 信用评分风险
+        credit_score = features["credit_score"]
+        credit_risk = np.select(
+            [credit_score >= 750, credit_score >= 700, credit_score >= 650, credit_score >= 600],
+            [0.1, 0.2, 0.4, 0.6], default=0.9
+        )
+        credit_risk = np.where(features["payment_delinquencies"] > 3, credit_risk + 0.2, credit_risk)
+        credit_risk = np.where(features["credit_utilization"] > 0.8, credit_risk + 0.1, credit_risk)
+        factor_scores[:, 0] = np.minimum(credit_risk, 1.0)
+        
+        # 收入稳定性风险
+        annual_income = features["annual_income"]
+        income_risk = np.select(
+            [annual_income < 50000, annual_income < 100000, annual_income < 200000],
+            [0.7, 0.4, 0.2], default=0.1
+        )
+        stability = features["income_stability"]
+        income_risk = np.where(stability < 0.3, income_risk + 0.3,
+                               np.where(stability < 0.6, income_risk + 0.1, income_risk))
+        employment_years = features["employment_years"]
+        income_risk = np.where(employment_years < 1, income_risk + 0.2, income_risk)
+        factor_scores[:, 1] = np.minimum(income_risk, 1.0)
+        
+        # 负债比率风险
+        monthly_income = features["monthly_income"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            debt_ratio = features["monthly_debt"] / monthly_income
+        factor_scores[:, 2] = np.where(
+            monthly_income == 0, 1.0,
+            np.select([debt_ratio > 0.5, debt_ratio > 0.4, debt_ratio > 0.3], [0.9, 0.6, 0.3], default=0.1)
+        )
+        
+        # 就业历史风险
+        factor_scores[:, 3] = np.select(
+            [employment_years < 0.5, employment_years < 2, employment_years < 5], [0.8, 0.5, 0.2], default=0.1
+        )
+        
+        # 贷款历史风险
+        loan_count = features["loan_count"]
+        factor_scores[:, 4] = np.select(
+            [features["default_count"] > 0, loan_count == 0, loan_count < 3], [0.9, 0.6, 0.3], default=0.1
+        )
+        
+        # 年龄风险
+        age = features["age"]
+        factor_scores[:, 5] = np.select(
+            [age < 22, age < 25, age < 35, age < 50, age < 60], [0.7, 0.4, 0.1, 0.2, 0.3], default=0.6
+        )
+        
+        # 婚姻状况、教育背景、行业：低基数类别按取值查表
+        marital_scores = {"married": 0.1, "divorced": 0.4}
+        factor_scores[:, 6] = [marital_scores.get(applicant.get("marital_status", "single"), 0.3) for applicant in applicants]
+        factor_scores[:, 7] = [
+            self._education_risk_scores.get(applicant.get("education", "high_school"), 0.4) for applicant in applicants
+        ]
+        factor_scores[:, 8] = [
+            self.industry_risk_scores.get(applicant.get("industry", "其他"), 0.5) for applicant in applicants
+        ]
+        return factor_scores
+    
+    def benchmark_batch(self, sample_size: int = 100000, scalar_sample_size: int = 2000,
+                        seed: int = 42) -> Dict[str, Any]:
+        """批量评分吞吐量基准测试：与逐笔 assess_risk 对比，得分在浮点误差内一致（报告最大绝对差）"""
+        if not 1 <= sample_size <= _BENCHMARK_MAX_SAMPLE_SIZE:
+            raise ValueError(f"sample_size 应在 1 到 {_BENCHMARK_MAX_SAMPLE_SIZE} 之间")
+        if not 0 <= scalar_sample_size <= _BENCHMARK_MAX_SCALAR_SAMPLE_SIZE:
+            raise ValueError(f"scalar_sample_size 应在 0 到 {_BENCHMARK_MAX_SCALAR_SAMPLE_SIZE} 之间")
+        rng = np.random.default_rng(seed)
+        marital_choices = ["married", "single", "divorced"]
+        education_choices = list(self._education_risk_scores)
+        industry_choices = list(self.industry_risk_scores)
+        applicants = [
+            {
+                "credit_score": int(rng.integers(450, 850)),
+                "payment_delinquencies": int(rng.integers(0, 6)),
+                "credit_utilization": float(rng.random()),
+                "annual_income": float(rng.integers(20000, 400000)),
+                "income_stability": float(rng.random()),
+                "employment_years": float(rng.random() * 10),
+                "monthly_income": float(rng.integers(0, 30000)),
+                "monthly_debt": float(rng.integers(0, 15000)),
+                "loan_count": int(rng.integers(0, 6)),
+                "default_count": int(rng.integers(0, 2)),
+                "age": int(rng.integers(18, 70)),
+                "marital_status": marital_choices[int(rng.integers(len(marital_choices)))],
+                "education": education_choices[int(rng.integers(len(education_choices)))],
+                "industry": industry_choices[int(rng.integers(len(industry_choices)))]
+            }
+            for _ in range(sample_size)
+        ]
+        
+        batch = self.assess_risk_batch(applicants)
+        
+        scalar_sample = applicants[:min(scalar_sample_size, sample_size)]
+        scalar_start = time.perf_counter()
+        scalar_scores = [self.assess_risk(applicant).overall_risk_score for applicant in scalar_sample]
+        scalar_elapsed = time.perf_counter() - scalar_start
+        
+        batch_rate = sample_size / batch.processing_time if batch.processing_time > 0 else 0.0
+        scalar_rate = len(scalar_sample) / scalar_elapsed if scalar_elapsed > 0 else 0.0
+        max_abs_diff = float(np.max(np.abs(batch.overall_risk_scores[:len(scalar_sample)] - scalar_scores))) if scalar_sample else 0.0
+        return {
+            "sample_size": sample_size,
+            "batch_seconds": round(batch.processing_time, 4),
+            "batch_rows_per_second": round(batch_rate, 1),
+            "scalar_sample_size": len(scalar_sample),
+            "scalar_seconds": round(scalar_elapsed, 4),
+            "scalar_rows_per_second": round(scalar_rate, 1),
+            "speedup": round(batch_rate / scalar_rate, 1) if scalar_rate > 0 else None,
+            "max_abs_score_diff": max_abs_diff
+        }
+    
     def get_risk_model_info(self) -> Dict[str, Any]:
         """获取风控模型信息"""
         return {
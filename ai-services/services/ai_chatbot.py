@@ -2,11 +2,14 @@
 """
 AI聊天机器人服务
 """
+import asyncio
 import uuid
+import numpy as np
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 from enum import Enum
 from loguru import logger
+from .semantic_cache import semantic_answer_cache
 
 class ChatbotRole(Enum):
     """聊天机器人角色"""
@@ -24,6 +27,11 @@ class AIChatbot:
         self.rag_kb = vector_rag_service  # 添加rag_kb属性
         self.sessions: Dict[str, Dict[str, Any]] = {}
         
+        # 语义答案缓存：引用的知识被更新或删除时失效
+        self.answer_cache = semantic_answer_cache
+        if vector_rag_service and hasattr(vector_rag_service, "add_change_handler"):
+            vector_rag_service.add_change_handler(self._on_knowledge_changed)
+        
         # 导入自主学习服务
         try:
             from .auto_learning_bank import auto_learning_bank_service
@@ -73,6 +81,26 @@ class AIChatbot:
             logger.warning("智能贷款推荐系统导入失败")
             self.loan_recommendation = None
     
+    def _on_knowledge_changed(self, change: Dict[str, Any]):
+        """知识库变更回调"""
+        if change.get("op") == "EMBEDDING_MODEL":
+            # 嵌入模型切换后缓存的查询向量与新向量不可比
+            self.answer_cache.clear()
+        elif change.get("op") in ("UPDATE", "DELETE") and change.get("id") is not None:
+            self.answer_cache.invalidate_knowledge(int(change["id"]))
+    
+    async def _get_cache_embedding(self, user_message: str) -> Optional[np.ndarray]:
+        """获取语义缓存使用的查询向量，仅在加载了嵌入模型时启用"""
+        if not self.answer_cache.enabled or not self.vector_rag_service:
+            return None
+        if getattr(self.vector_rag_service, "embedding_model", None) is None:
+            return None
+        try:
+            return await asyncio.to_thread(self.vector_rag_service._get_embedding, user_message)
+        except Exception as e:
+            logger.warning(f"语义缓存向量生成失败: {e}")
+            return None
+    
     def create_session(self, user_id: str, role: ChatbotRole) -> str:
         """创建聊天会话"""
         session_id = str(uuid.uuid4())
@@ -226,6 +254,14 @@ class AIChatbot:
             if not self.llm_service:
                 return "抱歉，AI服务暂时不可用，请稍后再试。"
             
+            # 语义缓存：相近问题且检索到的知识集合不变时复用回答
+            knowledge_ids = [r.get('id') for r in knowledge_results if r.get('id') is not None]
+            cache_embedding = await self._get_cache_embedding(user_message)
+            if cache_embedding is not None:
+                cached_answer = self.answer_cache.lookup(cache_embedding, knowledge_ids)
+                if cached_answer:
+                    return cached_answer
+            
             # 构建知识库上下文
             knowledge_context = ""
             if knowledge_results:
@@ -263,7 +299,12 @@ class AIChatbot:
             # 处理LLM返回结果
             if isinstance(result, dict):
                 if result.get("success", False):
-                    return result.get("response", "抱歉，我暂时无法处理您的请求，请稍后再试。")
+                    answer = result.get("response")
+                    if not answer:
+                        return "抱歉，我暂时无法处理您的请求，请稍后再试。"
+                    if cache_embedding is not None:
+                        self.answer_cache.store(user_message, cache_embedding, knowledge_ids, answer)
+                    return answer
                 else:
                     logger.error(f"LLM+RAG调用失败: {result.get('error', '未知错误')}")
                     return "抱歉，我暂时无法处理您的请求，请稍后再试。"
@@ -4,13 +4,17 @@
 """
 
 import json
-from typing import Dict, List, Any, Optional, Tuple
+import operator
+import time
+from typing import Dict, List, Any, Optional, Tuple, Callable
 from datetime import datetime, timedelta
 from loguru import logger
 from dataclasses import dataclass
 from enum import Enum
 import uuid
 
+import numpy as np
+
 class ApprovalStatus(Enum):
     """审批状态"""
     PENDING = "pending"
@@ -65,6 +69,39 @@ class ApprovalRuleConfig:
     is_mandatory: bool
     error_message: str
 
+@dataclass
+class CompiledApprovalRule:
+    """编译后的审批规则：predicate对特征列做向量化判断"""
+    config: ApprovalRuleConfig
+    feature: str
+    predicate: Callable[[np.ndarray], np.ndarray]
+
+# 比较运算符（标量与数组通用）
+_COMPARATORS = {
+    ">": operator.gt,
+    "<": operator.lt,
+    ">=": operator.ge,
+    "<=": operator.le,
+    "==": operator.eq
+}
+
+# 规则 -> 参与判断的特征列
+_RULE_FEATURES = {
+    ApprovalRule.CREDIT_SCORE_MIN: "credit_score",
+    ApprovalRule.INCOME_DEBT_RATIO_MAX: "debt_ratio",
+    ApprovalRule.LOAN_AMOUNT_MAX: "loan_amount",
+    ApprovalRule.EMPLOYMENT_YEARS_MIN: "employment_years",
+    ApprovalRule.AGE_RANGE: "age",
+    ApprovalRule.INDUSTRY_RESTRICTION: "industry"
+}
+
+def _to_float(value: Any) -> float:
+    """将单个字段转为浮点数，非数值（如"N/A"、None）记为NaN，相关规则判定为未通过"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
 class ApprovalWorkflowEngine:
     """审批流程引擎"""
     
@@ -73,6 +110,7 @@ class ApprovalWorkflowEngine:
         self.workflow_stages = self._initialize_workflow_stages()
         self.approval_decisions: Dict[str, ApprovalDecision] = {}
         self.pending_applications: Dict[str, Dict[str, Any]] = {}
+        self._compile_rules()
     
     def _initialize_approval_rules(self) -> List[ApprovalRuleConfig]:
         """初始化审批规则"""
@@ -181,17 +219,31 @@ class ApprovalWorkflowEngine:
     def _execute_approval_workflow(self, application_id: str, 
                                  application_data: Dict[str, Any],
                                  risk_assessment: Dict[str, Any]) -> ApprovalDecision:
-        """执行审批工作流"""
+        """执行审批工作流（规则结果与得分只计算一次，各阶段复用）"""
+        rule_results = self._check_approval_rules(application_data, risk_assessment)
+        approval_score = self._calculate_approval_score(rule_results, risk_assessment)
+        return self._resolve_workflow(
+            application_id, application_data, risk_assessment, rule_results, approval_score
+        )
+    
+    def _resolve_workflow(self, application_id: str,
+                        application_data: Dict[str, Any],
+                        risk_assessment: Dict[str, Any],
+                        rule_results: Dict[ApprovalRule, bool],
+                        approval_score: float) -> ApprovalDecision:
+        """根据预先计算的规则结果与得分逐阶段确定审批决策"""
+        if np.isnan(approval_score):
+            raise ValueError(f"风险评分无效: {risk_assessment.get('overall_risk_score')}")
         current_stage = 0
         decision_reason = ""
         conditions = []
         risk_factors = []
+        failed_conditions = None
+        stage_risk_factors = None
         
         # 逐步执行审批阶段
         for stage_config in self.workflow_stages:
-            stage_result = self._process_approval_stage(
-                application_data, risk_assessment, stage_config
-            )
+            stage_result = self._process_approval_stage(approval_score, stage_config)
             
             if stage_result["status"] == "auto_approved":
                 return self._create_approval_decision(
@@ -206,8 +258,11 @@ class ApprovalWorkflowEngine:
                     conditions, risk_factors, application_data
                 )
             elif stage_result["status"] == "manual_review":
-                conditions.extend(stage_result["conditions"])
-                risk_factors.extend(stage_result["risk_factors"])
+                if failed_conditions is None:
+                    failed_conditions = self._get_failed_conditions(rule_results)
+                    stage_risk_factors = self._get_risk_factors(risk_assessment)
+                conditions.extend(failed_conditions)
+                risk_factors.extend(stage_risk_factors)
                 decision_reason = stage_result["reason"]
                 current_stage += 1
             else:
@@ -227,16 +282,9 @@ class ApprovalWorkflowEngine:
             conditions, risk_factors, application_data
         )
     
-    def _process_approval_stage(self, application_data: Dict[str, Any],
-                              risk_assessment: Dict[str, Any],
+    def _process_approval_stage(self, approval_score: float,
                               stage_config: Dict[str, Any]) -> Dict[str, Any]:
         """处理审批阶段"""
-        # 执行规则检查
-        rule_results = self._check_approval_rules(application_data, risk_assessment)
-        
-        # 计算综合得分
-        approval_score = self._calculate_approval_score(rule_results, risk_assessment)
-        
         # 确定阶段结果
         if approval_score >= stage_config["auto_approval_threshold"]:
             return {
@@ -254,111 +302,116 @@ class ApprovalWorkflowEngine:
             return {
                 "status": "manual_review",
                 "reason": f"需要人工审核 - 得分: {approval_score:.2f}",
-                "score": approval_score,
-                "conditions": self._get_failed_conditions(rule_results),
-                "risk_factors": self._get_risk_factors(risk_assessment)
+                "score": approval_score
             }
     
-    def _check_approval_rules(self, application_data: Dict[str, Any],
-                            risk_assessment: Dict[str, Any]) -> Dict[ApprovalRule, bool]:
-        """检查审批规则"""
-        rule_results = {}
+    def set_approval_rules(self, rules: List[ApprovalRuleConfig]):
+        """替换审批规则并重新编译"""
+        self.approval_rules = rules
+        self._compile_rules()
+    
+    def _compile_rules(self):
+        """将规则配置编译为向量化判断函数，运算符只解析一次"""
+        self._compiled_rules = [self._compile_rule(rule) for rule in self.approval_rules]
+        self._rule_weights = np.array([rule.weight for rule in self.approval_rules], dtype=np.float64)
+        self._rule_features = sorted({compiled.feature for compiled in self._compiled_rules})
+    
+    def _compile_rule(self, rule: ApprovalRuleConfig) -> CompiledApprovalRule:
+        """编译单个规则"""
+        feature = _RULE_FEATURES.get(rule.rule_type)
+        threshold = rule.threshold_value
         
-        for rule in self.approval_rules:
-            result = self._evaluate_rule(rule, application_data, risk_assessment)
-            rule_results[rule.rule_type] = result
+        if rule.rule_type == ApprovalRule.AGE_RANGE:
+            min_age, max_age = threshold
+            predicate = lambda values: (values >= min_age) & (values <= max_age)
+        elif rule.operator in _COMPARATORS:
+            compare = _COMPARATORS[rule.operator]
+            # 缺失值（NaN，如收入为0时的负债率）比较结果为False
+            predicate = lambda values: compare(values, threshold)
+        elif rule.operator in ("in", "not_in"):
+            allowed = np.asarray(list(threshold), dtype=object)
+            negate = rule.operator == "not_in"
+            predicate = lambda values: np.isin(values, allowed, invert=negate)
+        else:
+            predicate = lambda values: np.zeros(len(values), dtype=bool)
         
-        return rule_results
-    
-    def _evaluate_rule(self, rule: ApprovalRuleConfig, application_data: Dict[str, Any],
-                      risk_assessment: Dict[str, Any]) -> bool:
-        """评估单个规则"""
-        try:
-            if rule.rule_type == ApprovalRule.CREDIT_SCORE_MIN:
-                credit_score = application_data.get("credit_score", 0)
-                return self._compare_values(credit_score, rule.threshold_value, rule.operator)
-            
-            elif rule.rule_type == ApprovalRule.INCOME_DEBT_RATIO_MAX:
-                monthly_income = application_data.get("monthly_income", 0)
-                monthly_debt = application_data.get("monthly_debt", 0)
-                if monthly_income == 0:
-                    return False
-                debt_ratio = monthly_debt / monthly_income
-                return self._compare_values(debt_ratio, rule.threshold_value, rule.operator)
-            
-            elif rule.rule_type == ApprovalRule.LOAN_AMOUNT_MAX:
-                loan_amount = application_data.get("loan_amount", 0)
-                return self._compare_values(loan_amount, rule.threshold_value, rule.operator)
-            
-            elif rule.rule_type == ApprovalRule.EMPLOYMENT_YEARS_MIN:
-                employment_years = application_data.get("employment_years", 0)
-                return self._compare_values(employment_years, rule.threshold_value, rule.operator)
-            
-            elif rule.rule_type == ApprovalRule.AGE_RANGE:
-                age = application_data.get("age", 0)
-                min_age, max_age = rule.threshold_value
-                return min_age <= age <= max_age
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"规则评估失败: {rule.rule_type.value}, {e}")
-            return False
+        if feature is None:
+            feature = "_always"
+            predicate = lambda values: np.ones(len(values), dtype=bool)
+        return CompiledApprovalRule(config=rule, feature=feature, predicate=predicate)
     
-    def _compare_values(self, actual: Any, expected: Any, operator: str) -> bool:
-        """比较值"""
-        try:
-            if operator == ">":
-                return actual > expected
-            elif operator == "<":
-                return actual < expected
-            elif operator == ">=":
-                return actual >= expected
-            elif operator == "<=":
-                return actual <= expected
-            elif operator == "==":
-                return actual == expected
-            elif operator == "in":
-                return actual in expected
-            elif operator == "not_in":
-                return actual not in expected
+    def _build_feature_columns(self, applications: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        """将申请列表转为规则所需的特征列"""
+        def column(name: str) -> np.ndarray:
+            # 逐条转换，单笔申请的脏数据只影响该申请自身的规则结果
+            return np.fromiter((_to_float(app.get(name, 0)) for app in applications),
+                               dtype=np.float64, count=len(applications))
+        
+        columns: Dict[str, np.ndarray] = {}
+        for feature in self._rule_features:
+            if feature == "debt_ratio":
+                income = column("monthly_income")
+                debt = column("monthly_debt")
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    columns[feature] = np.where(income == 0, np.nan, debt / income)
+            elif feature == "industry":
+                columns[feature] = np.array([app.get("industry", "") for app in applications], dtype=object)
+            elif feature == "_always":
+                columns[feature] = np.zeros(len(applications))
             else:
-                return False
-        except Exception:
-            return False
+                columns[feature] = column(feature)
+        return columns
     
-    def _calculate_approval_score(self, rule_results: Dict[ApprovalRule, bool],
-                                risk_assessment: Dict[str, Any]) -> float:
-        """计算审批得分"""
-        total_weight = 0
-        weighted_score = 0
+    def evaluate_rules_batch(self, applications: List[Dict[str, Any]],
+                           risk_assessments: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """向量化评估全部申请的全部规则
         
-        # 基于规则结果计算得分
-        for rule in self.approval_rules:
-            rule_passed = rule_results.get(rule.rule_type, False)
-            weight = rule.weight
-            
-            if rule.is_mandatory and not rule_passed:
-                # 强制规则未通过，得分大幅降低
-                weighted_score += 0
-            else:
-                # 非强制规则，按权重计算
-                weighted_score += (1 if rule_passed else 0) * weight
-            
-            total_weight += weight
+        返回 (规则通过矩阵[申请数, 规则数], 审批得分[申请数])
+        """
+        columns = self._build_feature_columns(applications)
+        passed = np.empty((len(applications), len(self._compiled_rules)), dtype=bool)
+        for index, compiled in enumerate(self._compiled_rules):
+            try:
+                passed[:, index] = compiled.predicate(columns[compiled.feature])
+            except Exception as e:
+                logger.error(f"规则评估失败: {compiled.config.rule_type.value}, {e}")
+                passed[:, index] = False
         
-        # 基于风险评估调整得分
-        risk_score = risk_assessment.get("overall_risk_score", 0.5)
-        risk_adjustment = 1 - risk_score  # 风险越高，得分越低
+        risk_scores = np.fromiter(
+            (_to_float(assessment.get("overall_risk_score", 0.5)) for assessment in risk_assessments),
+            dtype=np.float64, count=len(risk_assessments)
+        )
+        return passed, self._scores_from_results(passed, risk_scores)
+    
+    def _scores_from_results(self, passed: np.ndarray, risk_scores: np.ndarray) -> np.ndarray:
+        """由规则通过矩阵与风险评分计算审批得分
         
-        # 综合得分
+        强制规则未通过计0分，其余按权重计分，与风险调整(1 - 风险分)取平均
+        """
+        risk_adjustment = 1 - risk_scores  # 风险越高，得分越低
+        total_weight = self._rule_weights.sum()
         if total_weight > 0:
-            rule_score = weighted_score / total_weight
+            rule_score = (passed @ self._rule_weights) / total_weight
             final_score = (rule_score + risk_adjustment) / 2
         else:
             final_score = risk_adjustment
-        
-        return min(max(final_score, 0), 1)
+        return np.clip(final_score, 0, 1)
+    
+    def _check_approval_rules(self, application_data: Dict[str, Any],
+                            risk_assessment: Dict[str, Any]) -> Dict[ApprovalRule, bool]:
+        """检查审批规则"""
+        passed, _ = self.evaluate_rules_batch([application_data], [risk_assessment])
+        return {
+            compiled.config.rule_type: bool(passed[0, index])
+            for index, compiled in enumerate(self._compiled_rules)
+        }
+    
+    def _calculate_approval_score(self, rule_results: Dict[ApprovalRule, bool],
+                                risk_assessment: Dict[str, Any]) -> float:
+        """计算审批得分"""
+        passed = np.array([[rule_results.get(rule.rule_type, False) for rule in self.approval_rules]], dtype=bool)
+        risk_score = np.array([_to_float(risk_assessment.get("overall_risk_score", 0.5))], dtype=np.float64)
+        return float(self._scores_from_results(passed, risk_score)[0])
     
     def _get_failed_conditions(self, rule_results: Dict[ApprovalRule, bool]) -> List[str]:
         """获取未通过的条件"""
@@ -450,6 +503,55 @@ class ApprovalWorkflowEngine:
             confidence_score=0.3
         )
     
+    def process_applications_batch(self, applications: List[Dict[str, Any]],
+                                 risk_assessments: List[Dict[str, Any]],
+                                 store_decisions: bool = True) -> Dict[str, Any]:
+        """批量审批：全部申请的规则一次向量化评估，再逐条确定工作流决策"""
+        start_time = time.perf_counter()
+        passed, scores = self.evaluate_rules_batch(applications, risk_assessments)
+        rule_types = [compiled.config.rule_type for compiled in self._compiled_rules]
+        
+        decisions = []
+        status_counts: Dict[str, int] = {}
+        for index, (application_data, risk_assessment) in enumerate(zip(applications, risk_assessments)):
+            application_id = application_data.get("application_id", str(uuid.uuid4()))
+            rule_results = dict(zip(rule_types, passed[index].tolist()))
+            try:
+                decision = self._resolve_workflow(
+                    application_id, application_data, risk_assessment, rule_results, float(scores[index])
+                )
+            except Exception as e:
+                logger.error(f"批量审批处理失败: {application_id}, {e}")
+                decision = self._create_default_decision(application_data)
+            
+            if store_decisions:
+                self.approval_decisions[application_id] = decision
+            status_counts[decision.status.value] = status_counts.get(decision.status.value, 0) + 1
+            decisions.append({
+                "application_id": application_id,
+                "decision_id": decision.decision_id,
+                "status": decision.status.value,
+                "approval_level": decision.approval_level.value,
+                "approval_score": round(float(scores[index]), 4),
+                "failed_rules": [rule_type.value for rule_type, ok in rule_results.items() if not ok],
+                "decision_reason": decision.decision_reason,
+                "approval_amount": decision.approval_amount,
+                "approved_term": decision.approved_term,
+                "confidence_score": decision.confidence_score
+            })
+        
+        elapsed = time.perf_counter() - start_time
+        logger.info(f"批量审批完成: {len(applications)} 笔, 耗时 {elapsed:.3f}秒")
+        return {
+            "decisions": decisions,
+            "summary": {
+                "total": len(applications),
+                "status_distribution": status_counts,
+                "processing_time": elapsed,
+                "applications_per_second": len(applications) / elapsed if elapsed > 0 else 0.0
+            }
+        }
+    
     def get_approval_status(self, application_id: str) -> Optional[ApprovalDecision]:
         """获取审批状态"""
         return self.approval_decisions.get(application_id)
@@ -4,14 +4,18 @@
 """
 
 import json
+import numbers
 import re
-from typing import Dict, List, Any, Optional, Tuple
+import time
+from typing import Dict, List, Any, Optional, Tuple, Callable, Sequence
 from datetime import datetime, timedelta
 from loguru import logger
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 import uuid
 
+import numpy as np
+
 class ComplianceRule(Enum):
     """合规规则"""
     ANTI_MONEY_LAUNDERING = "anti_money_laundering"
@@ -64,6 +68,25 @@ class ComplianceReport:
     report_timestamp: datetime
     requires_manual_review: bool
 
+@dataclass
+class BatchScreeningResult:
+    """批量合规筛查结果（仅对存在违规的行生成报告）"""
+    total: int
+    flagged_count: int
+    flagged_indices: List[int]
+    violation_counts: Dict[str, int]
+    reports: List[ComplianceReport]
+    processing_time: float
+    screened_rules: List[ComplianceRule] = field(default_factory=list)
+
+# 支持向量化批量筛查的规则
+BATCH_SCREENING_RULES = (
+    ComplianceRule.ANTI_MONEY_LAUNDERING,
+    ComplianceRule.KNOW_YOUR_CUSTOMER,
+    ComplianceRule.CREDIT_LIMIT,
+    ComplianceRule.INTEREST_RATE_CAP
+)
+
 class ComplianceChecker:
     """合规性检查器"""
     
@@ -589,6 +612,162 @@ class ComplianceChecker:
             checker_version=self.checker_version
         )
     
+    @staticmethod
+    def to_columns(applications: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+        """将申请列表转换为列式数据（缺失字段以None填充）"""
+        keys = {}
+        for application in applications:
+            keys.update(dict.fromkeys(application))
+        return {key: [application.get(key) for application in applications] for key in keys}
+    
+    def screen_batch(self, columns: Dict[str, Sequence[Any]],
+                     rules: Sequence[ComplianceRule] = BATCH_SCREENING_RULES,
+                     risk_assessments: List[Dict[str, Any]] = None) -> BatchScreeningResult:
+        """列式批量合规筛查
+        
+        反洗钱、了解客户、信贷限额、利率上限规则以掩码方式对整列一次计算，
+        只对存在违规的行按单笔检查逻辑生成合规报告；各列长度必须一致
+        """
+        start_time = time.perf_counter()
+        rules = [rule for rule in rules if rule in BATCH_SCREENING_RULES]
+        lengths = {name: len(values) for name, values in columns.items()}
+        row_count = max(lengths.values(), default=0)
+        mismatched = {name: length for name, length in lengths.items() if length != row_count}
+        if mismatched:
+            raise ValueError(f"列长度不一致（应为{row_count}行）: {mismatched}")
+        
+        violation_masks = {rule: self._violation_mask(rule, columns, row_count) for rule in rules}
+        flagged = np.zeros(row_count, dtype=bool)
+        for mask in violation_masks.values():
+            flagged |= mask
+        flagged_indices = np.flatnonzero(flagged)
+        
+        reports = []
+        for index in flagged_indices.tolist():
+            application_data = {
+                key: values[index] for key, values in columns.items()
+                if index < len(values) and values[index] is not None
+            }
+            risk_assessment = risk_assessments[index] if risk_assessments else {}
+            reports.append(self._build_report(application_data, risk_assessment, rules))
+        
+        elapsed = time.perf_counter() - start_time
+        logger.info(f"批量合规筛查完成: {row_count} 行, 违规 {len(flagged_indices)} 行, 耗时 {elapsed:.3f}秒")
+        return BatchScreeningResult(
+            total=row_count,
+            flagged_count=len(flagged_indices),
+            flagged_indices=flagged_indices.tolist(),
+            violation_counts={rule.value: int(mask.sum()) for rule, mask in violation_masks.items()},
+            reports=reports,
+            processing_time=elapsed,
+            screened_rules=list(rules)
+        )
+    
+    def _build_report(self, application_data: Dict[str, Any], risk_assessment: Dict[str, Any],
+                      rules: Sequence[ComplianceRule]) -> ComplianceReport:
+        """按指定规则生成单笔合规报告"""
+        checks = [self._perform_compliance_check(rule, application_data, risk_assessment) for rule in rules]
+        overall_score = self._calculate_overall_compliance_score(checks)
+        compliance_level = self._determine_compliance_level(overall_score)
+        critical_violations = self._identify_critical_violations(checks)
+        return ComplianceReport(
+            report_id=str(uuid.uuid4()),
+            application_id=application_data.get("application_id", "unknown"),
+            overall_compliance_score=overall_score,
+            compliance_level=compliance_level,
+            checks=checks,
+            critical_violations=critical_violations,
+            recommendations=self._generate_compliance_recommendations(checks, critical_violations),
+            report_timestamp=datetime.now(),
+            requires_manual_review=self._requires_manual_review(compliance_level, critical_violations)
+        )
+    
+    def _violation_mask(self, rule_type: ComplianceRule, columns: Dict[str, Sequence[Any]],
+                        row_count: int) -> np.ndarray:
+        """计算单条规则的违规掩码，与对应的单笔 _check_* 判断条件一致
+        
+        数值字段中的非数值（单笔检查会比较失败、判为不合规）在该规则下直接标记违规
+        """
+        rule_config = self.compliance_rules[rule_type]
+        invalid = np.zeros(row_count, dtype=bool)
+        
+        def numeric(name: str) -> np.ndarray:
+            values = columns.get(name)
+            if values is None:
+                return np.zeros(row_count)
+            # None与非数值转为NaN，比较结果为False；非数值另行标记
+            numbers_column = np.full(row_count, np.nan)
+            for index, value in enumerate(values):
+                if isinstance(value, numbers.Real):
+                    numbers_column[index] = value
+                elif value is not None:
+                    invalid[index] = True
+            return numbers_column
+        
+        def flag(name: str) -> np.ndarray:
+            values = columns.get(name)
+            if values is None:
+                return np.zeros(row_count, dtype=bool)
+            # None转为False
+            return np.asarray(values, dtype=bool)
+        
+        if rule_type == ComplianceRule.ANTI_MONEY_LAUNDERING:
+            patterns = rule_config["suspicious_patterns"]
+            required_docs = rule_config["required_documents"]
+            mask = (
+                (numeric("loan_amount") > rule_config["max_single_transaction"])
+                | self._categorical_mask(columns, "income_source", row_count,
+                                         lambda source: any(pattern in (source or "") for pattern in patterns))
+                | self._categorical_mask(columns, "provided_documents", row_count,
+                                         lambda docs: any(doc not in (docs or []) for doc in required_docs))
+            )
+        elif rule_type == ComplianceRule.KNOW_YOUR_CUSTOMER:
+            risk_categories = set(rule_config["risk_categories"])
+            mask = (
+                ~flag("identity_verified")
+                | ~flag("address_verified")
+                | ~flag("income_verified")
+                | self._categorical_mask(columns, "customer_category", row_count,
+                                         lambda category: category in risk_categories)
+            )
+        elif rule_type == ComplianceRule.CREDIT_LIMIT:
+            loan_amount = numeric("loan_amount")
+            annual_income = numeric("annual_income")
+            monthly_income = numeric("monthly_income")
+            with np.errstate(divide="ignore", invalid="ignore"):
+                income_multiple = loan_amount / annual_income
+                debt_ratio = numeric("monthly_debt") / monthly_income
+            mask = (
+                ((annual_income > 0) & (income_multiple > rule_config["max_annual_income_multiple"]))
+                | ((monthly_income > 0) & (debt_ratio > rule_config["max_credit_ratio"]))
+            )
+        elif rule_type == ComplianceRule.INTEREST_RATE_CAP:
+            interest_rate = numeric("interest_rate")
+            mask = (
+                (interest_rate > rule_config["max_annual_rate"])
+                | (interest_rate > rule_config["usury_threshold"])
+            )
+        else:
+            mask = np.zeros(row_count, dtype=bool)
+        return mask | invalid
+    
+    @staticmethod
+    def _categorical_mask(columns: Dict[str, Sequence[Any]], name: str, row_count: int,
+                          predicate: Callable[[Any], bool]) -> np.ndarray:
+        """对低基数列按不同取值各判断一次，再映射回整列"""
+        values = columns.get(name)
+        if values is None:
+            return np.full(row_count, predicate(None), dtype=bool)
+        cache: Dict[Any, bool] = {}
+        mask = np.zeros(row_count, dtype=bool)
+        for index, value in enumerate(values):
+            key = tuple(value) if isinstance(value, list) else value
+            result = cache.get(key)
+            if result is None:
+                result = cache[key] = bool(predicate(value))
+            mask[index] = result
+        return mask
+    
     # 生成各种建议的方法
     def _generate_aml_recommendations(self, violations: List[str]) -> List[str]:
         """生成反洗钱建议"""
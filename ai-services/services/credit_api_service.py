@@ -3,8 +3,10 @@
 支持京东万象、企查查等免费试用API
 """
 
+import asyncio
 import requests
 import json
+import threading
 import time
 from typing import Dict, Any, Optional
 from loguru import logger
@@ -13,14 +15,17 @@ import hashlib
 import hmac
 import base64
 
+from .resilience import BulkheadFullError, PolicyConfig, ResiliencePolicy, UpstreamHTTPError, resilience_registry
+
 class CreditAPIService:
     """征信API服务"""
     
     def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
+        self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        }
+        # requests.Session不保证线程安全，请求在线程池中执行，每个线程使用各自的会话
+        self._local = threading.local()
         
         # API配置
         self.apis = {
@@ -60,6 +65,16 @@ class CreditAPIService:
             }
         }
         
+        self.policy_config = PolicyConfig.from_env(
+            "CREDIT_API", timeout=12.0, max_retries=1, failure_threshold=3, breaker_timeout=60,
+            max_concurrent=8, queue_wait=2.0
+        )
+        # 在工作线程内持有的并发槽位：超时后线程仍在执行请求，异步舱壁的槽位已释放，
+        # 由该信号量限制实际占用线程的请求数
+        self._thread_slots = {
+            provider: threading.BoundedSemaphore(self.policy_config.max_concurrent) for provider in self.apis
+        }
+        
         # 使用统计
         self.usage_stats = {
             'jingdong': {'used': 0, 'last_reset': datetime.now()},
@@ -98,7 +113,42 @@ class CreditAPIService:
         # MD5加密
         return hashlib.md5(sign_string.encode('utf-8')).hexdigest()
     
-    def _call_jingdong_api(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    def _get_policy(self, provider: str) -> ResiliencePolicy:
+        """每个提供商独立的熔断、重试与超时策略"""
+        return resilience_registry.policy(
+            f"credit_api:{provider}",
+            lambda name: ResiliencePolicy.from_config(name, self.policy_config)
+        )
+    
+    def _session(self) -> requests.Session:
+        """当前线程的HTTP会话（首次使用时创建）"""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers.update(self.headers)
+        return session
+    
+    async def _request(self, provider: str, method: str, url: str, **kwargs) -> Dict[str, Any]:
+        """在线程池中执行同步HTTP请求（不阻塞事件循环），经该提供商的弹性策略
+        
+        线程内持有并发槽位直至请求结束，策略超时返回后仍在执行的请求同样计入并发数
+        """
+        slots = self._thread_slots[provider]
+        
+        def send() -> Dict[str, Any]:
+            if not slots.acquire(timeout=self.policy_config.queue_wait):
+                raise BulkheadFullError(f"credit_api:{provider}")
+            try:
+                response = self._session().request(method, url, **kwargs)
+            finally:
+                slots.release()
+            if response.status_code >= 400:
+                raise UpstreamHTTPError(response.status_code, f"HTTP {response.status_code}: {response.text[:200]}")
+            return response.json()
+        
+        return await self._get_policy(provider).call(asyncio.to_thread, send)
+    
+    async def _call_jingdong_api(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """调用京东万象API"""
         if not self._check_quota('jingdong'):
             return {'error': '免费额度已用完', 'provider': 'jingdong'}
@@ -117,10 +167,7 @@ class CreditAPIService:
         params['sign'] = signature
         
         try:
-            response = self.session.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            result = response.json()
+            result = await self._request('jingdong', 'GET', url, params=params, timeout=10)
             self._update_usage('jingdong')
             
             if result.get('code') == '10000':  # 成功
@@ -145,7 +192,7 @@ class CreditAPIService:
                 'provider': 'jingdong'
             }
     
-    def _call_qichacha_api(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    async def _call_qichacha_api(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """调用企查查API"""
         if not self._check_quota('qichacha'):
             return {'error': '免费额度已用完', 'provider': 'qichacha'}
@@ -161,10 +208,7 @@ class CreditAPIService:
         }
         
         try:
-            response = self.session.post(url, json=params, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            result = response.json()
+            result = await self._request('qichacha', 'POST', url, json=params, headers=headers, timeout=10)
             self._update_usage('qichacha')
             
             if result.get('Status') == '200':  # 成功
@@ -189,7 +233,7 @@ class CreditAPIService:
                 'provider': 'qichacha'
             }
     
-    def _call_apispace_api(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    async def _call_apispace_api(self, endpoint: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """调用APISpace API"""
         if not self._check_quota('apispace'):
             return {'error': '免费额度已用完', 'provider': 'apispace'}
@@ -204,10 +248,7 @@ class CreditAPIService:
         }
         
         try:
-            response = self.session.post(url, json=params, headers=headers, timeout=10)
-            response.raise_for_status()
-            
-            result = response.json()
+            result = await self._request('apispace', 'POST', url, json=params, headers=headers, timeout=10)
             self._update_usage('apispace')
             
             if result.get('code') == 200:  # 成功
@@ -232,21 +273,21 @@ class CreditAPIService:
                 'provider': 'apispace'
             }
     
-    def query_enterprise_credit(self, company_name: str, provider: str = 'jingdong') -> Dict[str, Any]:
+    async def query_enterprise_credit(self, company_name: str, provider: str = 'jingdong') -> Dict[str, Any]:
         """查询企业信用评分"""
         logger.info(f"查询企业信用: {company_name}, 提供商: {provider}")
         
         if provider == 'jingdong':
             params = {'companyName': company_name}
-            return self._call_jingdong_api('enterprise_credit', params)
+            return await self._call_jingdong_api('enterprise_credit', params)
         
         elif provider == 'qichacha':
             params = {'keyword': company_name}
-            return self._call_qichacha_api('enterprise_credit', params)
+            return await self._call_qichacha_api('enterprise_credit', params)
         
         elif provider == 'apispace':
             params = {'company_name': company_name}
-            return self._call_apispace_api('enterprise_credit', params)
+            return await self._call_apispace_api('enterprise_credit', params)
         
         else:
             return {
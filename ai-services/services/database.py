@@ -0,0 +1,268 @@
+"""
+统一数据库访问层
+进程内唯一的asyncpg连接池：连接初始化时注册vector二进制编解码器，
+固定SQL文本的热点查询由连接的预编译语句缓存复用；
+记录每类查询的延迟与行数，以及连接获取等待时间等连接池饱和度指标
+"""
+
+import asyncio
+import os
+import re
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+import asyncpg
+from loguru import logger
+
+from .pgvector_codec import register_vector_codec
+from .vector_index_manager import _percentile
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _query_label(query: str) -> str:
+    """未命名查询以压缩空白后的SQL前缀作为统计键"""
+    return _WHITESPACE.sub(" ", query).strip()[:80]
+
+
+def _status_rows(status: str) -> int:
+    """从命令状态（如 'UPDATE 3'）解析影响行数"""
+    try:
+        return int(status.rsplit(" ", 1)[-1])
+    except (ValueError, AttributeError):
+        return 0
+
+
+@dataclass
+class QueryStats:
+    """单类查询的统计"""
+    count: int = 0
+    errors: int = 0
+    rows: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    recent: Deque[float] = field(default_factory=lambda: deque(maxlen=512))
+
+    def record(self, seconds: float, rows: int, error: bool):
+        self.count += 1
+        self.errors += int(error)
+        self.rows += rows
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.recent.append(seconds)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "rows": self.rows,
+            "avg_rows": self.rows / self.count if self.count else 0.0,
+            "avg_ms": self.total_seconds / self.count * 1000 if self.count else 0.0,
+            "p95_ms": _percentile([seconds * 1000 for seconds in self.recent], 95),
+            "max_ms": self.max_seconds * 1000
+        }
+
+
+class _AcquireContext:
+    """连接获取上下文：记录等待时间与排队数，用法同 pool.acquire()"""
+
+    def __init__(self, database: "Database", timeout: Optional[float]):
+        self._database = database
+        self._timeout = timeout
+        self._conn = None
+
+    async def _acquire(self):
+        database = self._database
+        database._waiting += 1
+        start_time = time.perf_counter()
+        try:
+            return await database.pool.acquire(timeout=self._timeout or database.acquire_timeout)
+        except asyncio.TimeoutError:
+            database._acquire_timeouts += 1
+            raise
+        finally:
+            database._waiting -= 1
+            database._record_acquire(time.perf_counter() - start_time)
+
+    async def __aenter__(self):
+        self._conn = await self._acquire()
+        return self._conn
+
+    async def __aexit__(self, exc_type, exc, tb):
+        conn, self._conn = self._conn, None
+        await self._database.pool.release(conn)
+
+    def __await__(self):
+        return self._acquire().__await__()
+
+
+class Database:
+    """统一数据库访问层"""
+
+    def __init__(self):
+        self.db_config = {
+            "host": os.getenv("POSTGRES_HOST", "ai-loan-postgresql"),
+            "port": int(os.getenv("POSTGRES_PORT", "5432")),
+            "database": os.getenv("POSTGRES_DB", "ai_loan_rag"),
+            "user": os.getenv("POSTGRES_USER", "ai_loan"),
+            "password": os.getenv("POSTGRES_PASSWORD", "ai_loan123")
+        }
+        self.min_size = int(os.getenv("DB_POOL_MIN_SIZE", "10"))
+        self.max_size = int(os.getenv("DB_POOL_MAX_SIZE", "50"))
+        # 每个连接缓存的预编译语句数，热点查询SQL文本固定，命中后不再重复解析/规划
+        self.statement_cache_size = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+        self.command_timeout = float(os.getenv("DB_COMMAND_TIMEOUT", "60"))
+        self.acquire_timeout = float(os.getenv("DB_ACQUIRE_TIMEOUT", "30"))
+        self.application_name = os.getenv("DB_APPLICATION_NAME", "ai_loan_rag")
+        self.pool: Optional[asyncpg.Pool] = None
+        self.vector_codec_enabled = False
+        self._init_lock: Optional[asyncio.Lock] = None
+        self.query_stats: Dict[str, QueryStats] = {}
+        self._waiting = 0
+        self._max_waiting = 0
+        self._acquires = 0
+        self._acquire_timeouts = 0
+        self._acquire_wait_total = 0.0
+        self._acquire_waits: Deque[float] = deque(maxlen=1024)
+
+    async def initialize(self):
+        """创建连接池（重复调用只创建一次）"""
+        if self.pool is not None:
+            return
+        if self._init_lock is None:
+            self._init_lock = asyncio.Lock()
+        async with self._init_lock:
+            if self.pool is not None:
+                return
+            self.pool = await asyncpg.create_pool(
+                **self.db_config,
+                min_size=self.min_size,
+                max_size=self.max_size,
+                max_queries=50000,  # 每个连接最大查询数
+                max_inactive_connection_lifetime=300.0,  # 非活跃连接最大生存时间
+                command_timeout=self.command_timeout,
+                statement_cache_size=self.statement_cache_size,
+                init=self._init_connection,
+                server_settings={
+                    'jit': 'off',  # 关闭JIT以提高连接速度
+                    'application_name': self.application_name
+                }
+            )
+            logger.info(f"PostgreSQL连接池初始化成功 - 配置: min={self.min_size}, max={self.max_size}")
+
+    async def _init_connection(self, conn):
+        """新建连接时注册vector二进制编解码器"""
+        try:
+            await register_vector_codec(conn)
+            self.vector_codec_enabled = True
+        except Exception as e:
+            logger.warning(f"注册vector编解码器失败（pgvector扩展未安装？）: {e}")
+
+    async def connect(self) -> asyncpg.Connection:
+        """创建独立连接（LISTEN等需要长期占用连接的场景，不占用连接池）"""
+        conn = await asyncpg.connect(**self.db_config)
+        await self._init_connection(conn)
+        return conn
+
+    def acquire(self, timeout: float = None) -> _AcquireContext:
+        """从连接池获取连接：async with database.acquire() as conn"""
+        return _AcquireContext(self, timeout)
+
+    async def release(self, conn):
+        """归还通过 await database.acquire() 获取的连接"""
+        await self.pool.release(conn)
+
+    async def close(self):
+        """关闭连接池"""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+            logger.info("PostgreSQL连接池已关闭")
+
+    def _record_acquire(self, seconds: float):
+        self._acquires += 1
+        self._acquire_wait_total += seconds
+        self._acquire_waits.append(seconds)
+        self._max_waiting = max(self._max_waiting, self._waiting + 1)
+
+    def record_query(self, name: str, seconds: float, rows: int = 0, error: bool = False):
+        """记录一次查询的耗时与行数"""
+        stats = self.query_stats.get(name)
+        if stats is None:
+            stats = self.query_stats[name] = QueryStats()
+        stats.record(seconds, rows, error)
+
+    async def _run(self, method: str, query: str, args, name: Optional[str], conn, timeout: Optional[float]):
+        """在给定连接（或从池中获取的连接）上执行查询并记录指标"""
+        label = name or _query_label(query)
+        start_time = time.perf_counter()
+        error = False
+        result = None
+        try:
+            if conn is not None:
+                result = await getattr(conn, method)(query, *args, timeout=timeout)
+            else:
+                async with self.acquire() as pooled:
+                    result = await getattr(pooled, method)(query, *args, timeout=timeout)
+            return result
+        except Exception:
+            error = True
+            raise
+        finally:
+            if method == "fetch":
+                rows = len(result) if result is not None else 0
+            elif method == "execute":
+                rows = _status_rows(result)
+            else:
+                rows = int(result is not None)
+            self.record_query(label, time.perf_counter() - start_time, rows, error)
+
+    async def fetch(self, query: str, *args, name: str = None, conn=None, timeout: float = None) -> List[asyncpg.Record]:
+        return await self._run("fetch", query, args, name, conn, timeout)
+
+    async def fetchrow(self, query: str, *args, name: str = None, conn=None, timeout: float = None):
+        return await self._run("fetchrow", query, args, name, conn, timeout)
+
+    async def fetchval(self, query: str, *args, name: str = None, conn=None, timeout: float = None):
+        return await self._run("fetchval", query, args, name, conn, timeout)
+
+    async def execute(self, query: str, *args, name: str = None, conn=None, timeout: float = None) -> str:
+        return await self._run("execute", query, args, name, conn, timeout)
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """连接池饱和度：在用/空闲连接数、排队数与获取等待时间"""
+        if self.pool is None:
+            return {"status": "not_initialized"}
+        size = self.pool.get_size()
+        idle = self.pool.get_idle_size()
+        in_use = size - idle
+        return {
+            "status": "active",
+            "size": size,
+            "min_size": self.pool.get_min_size(),
+            "max_size": self.pool.get_max_size(),
+            "idle": idle,
+            "in_use": in_use,
+            "utilization": in_use / self.pool.get_max_size() if self.pool.get_max_size() else 0.0,
+            "waiting": self._waiting,
+            "max_waiting": self._max_waiting,
+            "acquires": self._acquires,
+            "acquire_timeouts": self._acquire_timeouts,
+            "acquire_wait_avg_ms": self._acquire_wait_total / self._acquires * 1000 if self._acquires else 0.0,
+            "acquire_wait_p95_ms": _percentile([seconds * 1000 for seconds in self._acquire_waits], 95),
+            "statement_cache_size": self.statement_cache_size,
+            "vector_codec": "binary" if self.vector_codec_enabled else "text"
+        }
+
+    def get_query_stats(self) -> Dict[str, Any]:
+        """各类查询的延迟与行数统计"""
+        return {name: stats.to_dict() for name, stats in self.query_stats.items()}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"pool": self.get_pool_stats(), "queries": self.get_query_stats()}
+
+
+# 全局实例
+database = Database()
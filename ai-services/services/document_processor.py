@@ -8,7 +8,10 @@
 import os
 import json
 import logging
-from typing import Dict, Any, Optional, List
+import asyncio
+import tempfile
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, Optional, List, Iterator, AsyncIterator
 import pytesseract
 from PIL import Image
 import PyPDF2
@@ -26,6 +29,22 @@ import magic
 from loguru import logger
 from .advanced_ocr import advanced_ocr_service, OCREngine
 
+@dataclass
+class PageRecord:
+    """PDF单页解析结果"""
+    page_number: int
+    text: str
+    source: str  # text_layer / ocr / empty
+    has_images: bool = False
+    ocr_engine: Optional[str] = None
+    image_path: Optional[str] = None  # 待OCR的页面渲染图（OCR后删除）
+    
+    def to_dict(self) -> Dict[str, Any]:
+        record = asdict(self)
+        record.pop("image_path")
+        record["char_count"] = len(self.text)
+        return record
+
 class DocumentProcessor:
     """文档处理服务类"""
     
@@ -43,6 +62,10 @@ class DocumentProcessor:
             'html', 'htm'
         ]
         self.logger = logger
+        # 页面文本层少于该字符数且含图片时视为扫描页，需要OCR
+        self.min_text_layer_chars = int(os.getenv("PDF_TEXT_LAYER_MIN_CHARS", "20"))
+        # 扫描页渲染分辨率
+        self.ocr_dpi = int(os.getenv("PDF_OCR_DPI", "200"))
         
     async def process_document(self, file_path: str, file_type: str) -> Dict[str, Any]:
         """
@@ -62,8 +85,13 @@ class DocumentProcessor:
             if not self._is_supported_type(file_type):
                 raise ValueError(f"不支持的文件类型: {file_type}")
             
-            # 提取文本（异步）
-            text = await self._extract_text_async(file_path, file_type)
+            # 提取文本（异步），PDF逐页流式解析并保留页面记录
+            pages = None
+            if file_type.lower().endswith('pdf'):
+                pages = [page async for page in self.stream_pdf_pages(file_path)]
+                text = "\n".join(page.text for page in pages if page.text).strip()
+            else:
+                text = await self._extract_text_async(file_path, file_type)
             
             # 分类文档
             doc_type = self._classify_document(text)
@@ -85,6 +113,8 @@ class DocumentProcessor:
                     "size": os.path.getsize(file_path)
                 }
             }
+            if pages is not None:
+                result["pages"] = [page.to_dict() for page in pages]
             
             self.logger.info(f"文档处理完成: {file_path}")
             return result
@@ -174,113 +204,167 @@ class DocumentProcessor:
             raise
     
     def _extract_pdf_text(self, file_path: str) -> str:
-        """提取PDF文本和图片OCR - 使用多种方法确保最佳效果"""
-        text = ""
+        """提取PDF文本（同步版本），扫描页使用Tesseract OCR"""
+        texts = []
+        for page in self._iter_pdf_pages(file_path):
+            if page.image_path:
+                self._ocr_page_sync(page)
+            if page.text:
+                texts.append(page.text)
+        
+        text = "\n".join(texts).strip()
+        if not text:
+            self.logger.error(f"所有PDF提取方法都失败了: {file_path}")
+        return text
+    
+    async def stream_pdf_pages(self, file_path: str) -> AsyncIterator[PageRecord]:
+        """逐页流式解析PDF，每解析完一页即产出页面记录
         
-        # 方法1: 尝试pdfplumber (通常效果最好)
+        页面解析在线程中执行，仅对无文本层的扫描页调用级联OCR，
+        任一时刻只持有一页的内容与渲染图
+        """
+        pages = self._iter_pdf_pages(file_path)
         try:
-            import pdfplumber
-            # 设置中文字体支持
-            import os
-            os.environ['FONTCONFIG_PATH'] = '/etc/fonts'
-            
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-                    
-                    # 提取图片并进行OCR
-                    images = page.images
-                    if images:
-                        self.logger.info(f"发现 {len(images)} 个图片，开始OCR处理")
-                        for i, img in enumerate(images):
-                            try:
-                                # 获取图片边界框
-                                bbox = [img.get('x0', 0), img.get('y0', 0), img.get('x1', 0), img.get('y1', 0)]
-                                if bbox[2] > bbox[0] and bbox[3] > bbox[1]:  # 确保边界框有效
-                                    # 提取图片区域
-                                    img_obj = page.within_bbox(bbox).to_image()
-                                    if img_obj:
-                                        # 转换为PIL图片
-                                        pil_img = img_obj.original
-                                        # OCR识别
-                                        img_text = pytesseract.image_to_string(pil_img, lang='chi_sim+eng')
-                                        if img_text.strip():
-                                            text += f"\n[图片{i+1}OCR内容]:\n{img_text.strip()}\n"
-                                            self.logger.info(f"图片{i+1} OCR成功: {len(img_text)}字符")
-                                        else:
-                                            self.logger.info(f"图片{i+1} OCR结果为空")
-                            except Exception as e:
-                                self.logger.warning(f"图片{i+1} OCR失败: {e}")
-            
-            if text.strip():
-                self.logger.info(f"pdfplumber成功提取PDF文本和图片OCR: {len(text)}字符")
-                return text.strip()
-        except Exception as e:
-            self.logger.warning(f"pdfplumber提取失败: {e}")
+            while True:
+                page = await asyncio.to_thread(next, pages, None)
+                if page is None:
+                    break
+                if page.image_path:
+                    await self._ocr_page(page)
+                yield page
+        finally:
+            pages.close()
+    
+    def _iter_pdf_pages(self, file_path: str) -> Iterator[PageRecord]:
+        """逐页解析PDF
+        
+        按PyMuPDF、pdfplumber、PyPDF2的顺序选择一个能打开文件的解析器，
+        文档只解析一遍；文本层不足且含图片的页面渲染为临时图片供OCR
+        """
+        os.environ['FONTCONFIG_PATH'] = '/etc/fonts'
+        
+        for parser in (self._iter_pages_pymupdf, self._iter_pages_pdfplumber, self._iter_pages_pypdf2):
+            pages = parser(file_path)
+            try:
+                first_page = next(pages, None)
+            except Exception as e:
+                self.logger.warning(f"{parser.__name__} 打开PDF失败: {e}")
+                continue
+            
+            if first_page is not None:
+                yield first_page
+                yield from pages
+            return
         
-        # 方法2: 尝试PyMuPDF (fitz) - 支持图片提取
+        self.logger.error(f"所有PDF解析器都无法打开文件: {file_path}")
+    
+    def _make_page_record(self, page_number: int, text: str, has_images: bool, render) -> PageRecord:
+        """根据文本层判断页面是否需要OCR，需要时渲染页面图片"""
+        text = (text or "").strip()
+        if len(text) >= self.min_text_layer_chars or not has_images:
+            return PageRecord(page_number, text, "text_layer" if text else "empty", has_images)
+        
+        record = PageRecord(page_number, text, "empty", has_images)
+        if render is None:
+            self.logger.warning(f"页面{page_number}为扫描页，但当前解析器不支持渲染，跳过OCR")
+            return record
         try:
-            import fitz
-            # 设置中文字体支持
-            import os
-            os.environ['FONTCONFIG_PATH'] = '/etc/fonts'
-            
-            doc = fitz.open(file_path)
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                page_text = page.get_text()
-                if page_text:
-                    text += page_text + "\n"
-                
-                # 提取图片并进行OCR
-                image_list = page.get_images()
-                if image_list:
-                    self.logger.info(f"页面{page_num+1}发现 {len(image_list)} 个图片，开始OCR处理")
-                    for img_index, img in enumerate(image_list):
-                        try:
-                            # 获取图片
-                            xref = img[0]
-                            pix = fitz.Pixmap(doc, xref)
-                            if pix.n - pix.alpha < 4:  # 确保不是CMYK
-                                # 转换为PIL图片
-                                img_data = pix.tobytes("png")
-                                from io import BytesIO
-                                pil_img = Image.open(BytesIO(img_data))
-                                
-                                # OCR识别
-                                img_text = pytesseract.image_to_string(pil_img, lang='chi_sim+eng')
-                                if img_text.strip():
-                                    text += f"\n[页面{page_num+1}图片{img_index+1}OCR内容]:\n{img_text.strip()}\n"
-                                    self.logger.info(f"页面{page_num+1}图片{img_index+1} OCR成功: {len(img_text)}字符")
-                            pix = None
-                        except Exception as e:
-                            self.logger.warning(f"页面{page_num+1}图片{img_index+1} OCR失败: {e}")
-            
-            doc.close()
-            if text.strip():
-                self.logger.info(f"PyMuPDF成功提取PDF文本和图片OCR: {len(text)}字符")
-                return text.strip()
+            fd, image_path = tempfile.mkstemp(prefix="pdf_page_", suffix=".png")
+            os.close(fd)
+            render(image_path)
+            record.image_path = image_path
         except Exception as e:
-            self.logger.warning(f"PyMuPDF提取失败: {e}")
+            self.logger.warning(f"页面{page_number}渲染失败: {e}")
+        return record
+    
+    def _iter_pages_pymupdf(self, file_path: str) -> Iterator[PageRecord]:
+        """PyMuPDF逐页解析"""
+        import fitz
         
-        # 方法3: 回退到PyPDF2
+        with fitz.open(file_path) as doc:
+            for index, page in enumerate(doc):
+                try:
+                    yield self._make_page_record(
+                        index + 1,
+                        page.get_text(),
+                        bool(page.get_images()),
+                        lambda path: page.get_pixmap(dpi=self.ocr_dpi).save(path)
+                    )
+                except Exception as e:
+                    self.logger.warning(f"PyMuPDF解析页面{index + 1}失败: {e}")
+                    yield PageRecord(index + 1, "", "empty")
+    
+    def _iter_pages_pdfplumber(self, file_path: str) -> Iterator[PageRecord]:
+        """pdfplumber逐页解析，解析完即释放页面缓存"""
+        import pdfplumber
+        
+        with pdfplumber.open(file_path) as pdf:
+            for index, page in enumerate(pdf.pages):
+                try:
+                    yield self._make_page_record(
+                        index + 1,
+                        page.extract_text(),
+                        bool(page.images),
+                        lambda path: page.to_image(resolution=self.ocr_dpi).original.save(path)
+                    )
+                except Exception as e:
+                    self.logger.warning(f"pdfplumber解析页面{index + 1}失败: {e}")
+                    yield PageRecord(index + 1, "", "empty")
+                finally:
+                    if hasattr(page, "close"):
+                        page.close()
+                    else:
+                        page.flush_cache()
+    
+    def _iter_pages_pypdf2(self, file_path: str) -> Iterator[PageRecord]:
+        """PyPDF2逐页解析（无法渲染扫描页）"""
+        with open(file_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            for index, page in enumerate(pdf_reader.pages):
+                try:
+                    yield self._make_page_record(index + 1, page.extract_text(), bool(getattr(page, "images", None)), None)
+                except Exception as e:
+                    self.logger.warning(f"PyPDF2解析页面{index + 1}失败: {e}")
+                    yield PageRecord(index + 1, "", "empty")
+    
+    async def _ocr_page(self, page: PageRecord):
+        """级联OCR识别扫描页，完成后删除渲染图"""
+        try:
+            outcome = await advanced_ocr_service.recognize_cascade(
+                page.image_path,
+                engines=[OCREngine.TESSERACT, OCREngine.PADDLEOCR],
+                language="chi_sim+eng"
+            )
+            best_result = outcome["best_result"]
+            if best_result and best_result.text.strip():
+                page.text = best_result.text.strip()
+                page.source = "ocr"
+                page.ocr_engine = best_result.engine
+                self.logger.info(f"页面{page.page_number} OCR成功: {best_result.engine}, {len(page.text)}字符")
+        except Exception as e:
+            self.logger.warning(f"页面{page.page_number} OCR失败: {e}")
+        finally:
+            self._discard_page_image(page)
+    
+    def _ocr_page_sync(self, page: PageRecord):
+        """Tesseract识别扫描页（同步版本），完成后删除渲染图"""
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text + "\n"
-            if text.strip():
-                self.logger.info(f"PyPDF2成功提取PDF文本: {len(text)}字符")
-                return text.strip()
+            text = pytesseract.image_to_string(Image.open(page.image_path), lang='chi_sim+eng').strip()
+            if text:
+                page.text = text
+                page.source = "ocr"
+                page.ocr_engine = "tesseract"
         except Exception as e:
-            self.logger.warning(f"PyPDF2提取失败: {e}")
-        
-        self.logger.error(f"所有PDF提取方法都失败了: {file_path}")
-        return ""
+            self.logger.warning(f"页面{page.page_number} OCR失败: {e}")
+        finally:
+            self._discard_page_image(page)
+    
+    @staticmethod
+    def _discard_page_image(page: PageRecord):
+        """删除页面渲染图"""
+        if page.image_path and os.path.exists(page.image_path):
+            os.remove(page.image_path)
+        page.image_path = None
     
     def _extract_word_text(self, file_path: str) -> str:
         """提取Word文档文本"""
@@ -704,28 +788,58 @@ class DocumentProcessor:
         
         return "\n".join(merged_lines)
     
-    def batch_process_documents(self, file_paths: List[str]) -> Dict[str, Any]:
-        """批量处理文档"""
-        results = {}
-        success_count = 0
-        error_count = 0
+    def extract_document_sync(self, file_path: str, file_type: str) -> Dict[str, Any]:
+        """同步提取文本、分类并抽取结构化数据（供批量导入的进程池调用）"""
+        pages = None
+        if file_type.lower().endswith('pdf'):
+            pages = []
+            for page in self._iter_pdf_pages(file_path):
+                if page.image_path:
+                    self._ocr_page_sync(page)
+                pages.append(page.to_dict())
+            text = "\n".join(page["text"] for page in pages if page["text"]).strip()
+        else:
+            text = self._extract_text(file_path, file_type)
         
-        for file_path in file_paths:
-            try:
-                file_type = os.path.splitext(file_path)[1][1:]  # 获取文件扩展名
-                result = self.process_document(file_path, file_type)
-                results[file_path] = result
-                success_count += 1
-            except Exception as e:
-                self.logger.error(f"批量处理失败: {file_path}, 错误: {str(e)}")
-                results[file_path] = {"error": str(e)}
-                error_count += 1
+        doc_type = self._classify_document(text)
+        return {
+            "text": text,
+            "document_type": doc_type,
+            "structured_data": self._extract_structured_data(text, doc_type),
+            "pages": pages
+        }
+    
+    async def batch_process_documents(self, file_paths: List[str], concurrency: int = None) -> Dict[str, Any]:
+        """批量处理文档（有限并发）"""
+        semaphore = asyncio.Semaphore(concurrency or int(os.getenv("DOCUMENT_BATCH_CONCURRENCY", "4")))
+        
+        async def process(file_path: str):
+            async with semaphore:
+                try:
+                    file_type = os.path.splitext(file_path)[1][1:]  # 获取文件扩展名
+                    return file_path, await self.process_document(file_path, file_type)
+                except Exception as e:
+                    self.logger.error(f"批量处理失败: {file_path}, 错误: {str(e)}")
+                    return file_path, {"error": str(e)}
+        
+        results = dict(await asyncio.gather(*[process(file_path) for file_path in file_paths]))
+        error_count = sum(1 for result in results.values() if "error" in result)
         
         return {
             "results": results,
             "summary": {
                 "total": len(file_paths),
-                "success": success_count,
+                "success": len(file_paths) - error_count,
                 "error": error_count
             }
         }
+
+# 批量导入进程池工作进程内的处理器实例
+_batch_processor: Optional[DocumentProcessor] = None
+
+def extract_document_in_worker(file_path: str, file_type: str) -> Dict[str, Any]:
+    """进程池入口：在工作进程内复用同一个DocumentProcessor提取文档"""
+    global _batch_processor
+    if _batch_processor is None:
+        _batch_processor = DocumentProcessor()
+    return _batch_processor.extract_document_sync(file_path, file_type)
@@ -8,13 +8,16 @@
 
 import os
 import uuid
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Awaitable
 from datetime import datetime
 from loguru import logger
 import asyncio
 
 from .document_processor import DocumentProcessor
 from .vector_rag import vector_rag_service
+from .vector_index_manager import vector_index_manager
+from .ingestion_pipeline import BatchIngestionPipeline
+from .semantic_chunker import SemanticChunker, Chunk
 
 class DocumentRAGService:
     """文档RAG服务"""
@@ -23,6 +26,10 @@ class DocumentRAGService:
         self.document_processor = DocumentProcessor()
         self.vector_rag = vector_rag_service
         self.logger = logger
+        # PDF流式索引时并发写入的块数
+        self.index_concurrency = int(os.getenv("DOCUMENT_INDEX_CONCURRENCY", "4"))
+        self.batch_pipeline = BatchIngestionPipeline(self)
+        self._chunker: Optional[SemanticChunker] = None
         
     async def initialize(self):
         """初始化文档RAG服务"""
@@ -40,23 +47,33 @@ class DocumentRAGService:
         file_path: str, 
         file_type: str,
         category: str = "documents",
-        metadata: Dict[str, Any] = None
+        metadata: Dict[str, Any] = None,
+        progress_callback: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
-        """处理文档并索引到向量数据库"""
+        """处理文档并索引到向量数据库
+        
+        progress_callback(stage, info) 在各阶段（extracting/chunking/indexing）推进时调用
+        """
+        if file_type.lower().endswith('pdf'):
+            return await self._process_and_index_pdf(file_path, file_type, category, metadata, progress_callback)
+        
         try:
             # 1. 处理文档（异步）
             self.logger.info(f"开始处理文档: {file_path}")
+            await self._report_progress(progress_callback, "extracting")
             doc_result = await self.document_processor.process_document(file_path, file_type)
             
             if not doc_result.get("text"):
                 raise ValueError("文档处理失败，未提取到文本内容")
             
             # 2. 将文档内容分块
-            chunks = self._chunk_document(doc_result["text"], doc_result["document_type"])
+            await self._report_progress(progress_callback, "chunking")
+            chunk_spans = self._chunk_document_spans(doc_result["text"], doc_result["document_type"])
+            chunks = [span.text for span in chunk_spans]
             
             # 3. 为每个块生成嵌入并存储
             indexed_chunks = []
-            for i, chunk in enumerate(chunks):
+            for i, (chunk, span) in enumerate(zip(chunks, chunk_spans)):
                 chunk_id = f"{os.path.basename(file_path)}_{i}"
                 chunk_title = f"{os.path.basename(file_path)} - 第{i+1}部分"
                 
@@ -67,6 +84,9 @@ class DocumentRAGService:
                     "document_type": doc_result["document_type"],
                     "chunk_index": i,
                     "total_chunks": len(chunks),
+                    "char_start": span.start,
+                    "char_end": span.end,
+                    "token_count": span.token_count,
                     "original_metadata": doc_result.get("structured_data", {}),
                     **(metadata or {})
                 }
@@ -86,6 +106,7 @@ class DocumentRAGService:
                         "content": chunk,
                         "metadata": chunk_metadata
                     })
+                await self._report_progress(progress_callback, "indexing", indexed=i + 1, total=len(chunks))
             
             self.logger.info(f"文档索引完成: {file_path}, 共{len(indexed_chunks)}个块")
             
@@ -108,164 +129,179 @@ class DocumentRAGService:
                 "error": str(e)
             }
     
-    def _chunk_document(self, text: str, document_type: str) -> List[str]:
-        """将文档分块"""
-        if not text.strip():
-            return []
-        
-        # 根据文档类型使用不同的分块策略
-        if document_type == "bank_statement":
-            return self._chunk_bank_statement(text)
-        elif document_type == "loan_application":
-            return self._chunk_loan_application(text)
-        elif document_type == "financial_report":
-            return self._chunk_financial_report(text)
-        else:
-            return self._chunk_general_document(text)
-    
-    def _chunk_general_document(self, text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-        """通用文档分块"""
-        if len(text) <= chunk_size:
-            return [text]
-        
-        chunks = []
-        start = 0
+    async def _process_and_index_pdf(
+        self,
+        file_path: str,
+        file_type: str,
+        category: str = "documents",
+        metadata: Dict[str, Any] = None,
+        progress_callback: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """PDF逐页流式处理：每页解析完成即分块并提交索引，不等待整份文档解析结束
         
-        while start < len(text):
-            end = start + chunk_size
+        在途写入数不超过index_concurrency，完成的写入随时收集；中途失败时取消在途写入，
+        并按document_id删除已写入的块，避免残留半份文档、重试后重复。
+        块偏移为在全文（各页文本以换行连接）中的偏移；文档类型与块总数在全文解析完成后
+        统一确定并补写到各块metadata
+        """
+        try:
+            processor = self.document_processor
+            file_name = os.path.basename(file_path)
+            document_id = (metadata or {}).get("document_id") or str(uuid.uuid4())
+            pending = set()
+            indexed_chunks = []
+            pages = []
+            # 流式阶段仅用于选择分块策略的类型判断，文档类型以全文分类为准
+            chunking_type = "other"
+            page_offset = 0
+            queued_count = 0
+            indexed_count = 0
             
-            # 尝试在句号、问号、感叹号处分割
-            if end < len(text):
-                for i in range(end, max(start + chunk_size - overlap, start), -1):
-                    if text[i] in '。！？\n':
-                        end = i + 1
-                        break
+            async def index_chunk(chunk_index: int, page_number: int, span: Chunk, offset: int):
+                nonlocal indexed_count
+                chunk = span.text
+                chunk_metadata = {
+                    "file_path": file_path,
+                    "file_type": file_type,
+                    "chunk_index": chunk_index,
+                    "page_number": page_number,
+                    "char_start": offset + span.start,
+                    "char_end": offset + span.end,
+                    "token_count": span.token_count,
+                    **(metadata or {}),
+                    "document_id": document_id
+                }
+                knowledge_id = await self.vector_rag.add_knowledge(
+                    category=category,
+                    title=f"{file_name} - 第{page_number}页 第{chunk_index + 1}部分",
+                    content=chunk,
+                    metadata=chunk_metadata
+                )
+                indexed_count += 1
+                await self._report_progress(
+                    progress_callback, "indexing", indexed=indexed_count, total=queued_count, pages=len(pages)
+                )
+                if knowledge_id:
+                    return {
+                        "chunk_id": f"{file_name}_{chunk_index}",
+                        "knowledge_id": knowledge_id,
+                        "content": chunk,
+                        "metadata": chunk_metadata
+                    }
+                return None
             
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
+            async def drain(limit: int):
+                """等待在途写入降到limit个以内，收集已完成的结果"""
+                nonlocal pending
+                while len(pending) > limit:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        chunk = task.result()
+                        if chunk:
+                            indexed_chunks.append(chunk)
             
-            start = end - overlap
-            if start >= len(text):
-                break
-        
-        return chunks
-    
-    def _chunk_bank_statement(self, text: str) -> List[str]:
-        """银行流水分块"""
-        # 按交易记录分块
-        lines = text.split('\n')
-        chunks = []
-        current_chunk = []
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
+            try:
+                async for page in processor.stream_pdf_pages(file_path):
+                    pages.append(page.to_dict())
+                    await self._report_progress(
+                        progress_callback, "extracting", pages=len(pages), chunks_queued=queued_count
+                    )
+                    if not page.text:
+                        continue
+                    if chunking_type == "other":
+                        chunking_type = processor._classify_document(page.text)
+                    for span in self._chunk_document_spans(page.text, chunking_type):
+                        await drain(self.index_concurrency - 1)
+                        pending.add(asyncio.create_task(
+                            index_chunk(queued_count, page.page_number, span, page_offset)
+                        ))
+                        queued_count += 1
+                    # 下一页在全文中的起点（页间以一个换行连接）
+                    page_offset += len(page.text) + 1
+                await drain(0)
+                
+                text = "\n".join(page["text"] for page in pages if page["text"])
+                if not text.strip():
+                    raise ValueError("文档处理失败，未提取到文本内容")
                 
-            # 如果是日期行（新交易记录开始）
-            if self._is_date_line(line):
-                if current_chunk:
-                    chunks.append('\n'.join(current_chunk))
-                    current_chunk = []
+                document_type = processor._classify_document(text)
+                document_metadata = {"document_type": document_type, "total_chunks": queued_count}
+                updated = await self.vector_rag.update_document_metadata(document_id, document_metadata)
+                if updated < len(indexed_chunks):
+                    raise RuntimeError(f"补写文档元数据失败: 更新{updated}个块，应为{len(indexed_chunks)}个")
+                for chunk in indexed_chunks:
+                    chunk["metadata"].update(document_metadata)
+            except BaseException:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+                removed = await self.vector_rag.delete_knowledge_by_document(document_id)
+                self.logger.warning(f"PDF流式索引中途失败，已删除该文档已写入的{removed}个块: {file_path}")
+                raise
             
-            current_chunk.append(line)
+            indexed_chunks.sort(key=lambda chunk: chunk["metadata"]["chunk_index"])
             
-            # 每10条交易记录一个块
-            if len(current_chunk) >= 10:
-                chunks.append('\n'.join(current_chunk))
-                current_chunk = []
-        
-        if current_chunk:
-            chunks.append('\n'.join(current_chunk))
-        
-        return chunks if chunks else [text]
-    
-    def _chunk_loan_application(self, text: str) -> List[str]:
-        """贷款申请分块"""
-        # 按章节分块
-        sections = [
-            "基本信息", "收入证明", "资产证明", "负债情况", 
-            "担保信息", "贷款用途", "还款计划"
-        ]
-        
-        chunks = []
-        lines = text.split('\n')
-        current_section = []
-        current_title = "基本信息"
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
+            structured_data = processor._extract_structured_data(text, document_type)
+            doc_result = {
+                "text": text,
+                "document_type": document_type,
+                "structured_data": structured_data,
+                "validation": processor._validate_data(structured_data, document_type),
+                "file_info": {
+                    "path": file_path,
+                    "type": file_type,
+                    "size": os.path.getsize(file_path)
+                },
+                "pages": pages
+            }
             
-            # 检查是否是新的章节
-            is_new_section = False
-            for section in sections:
-                if section in line:
-                    if current_section:
-                        chunks.append(f"{current_title}:\n" + '\n'.join(current_section))
-                    current_section = []
-                    current_title = section
-                    is_new_section = True
-                    break
+            self.logger.info(f"PDF流式索引完成: {file_path}, {len(pages)}页, 共{len(indexed_chunks)}个块")
             
-            if not is_new_section:
-                current_section.append(line)
-        
-        if current_section:
-            chunks.append(f"{current_title}:\n" + '\n'.join(current_section))
-        
-        return chunks if chunks else [text]
-    
-    def _chunk_financial_report(self, text: str) -> List[str]:
-        """财务报表分块"""
-        # 按表格和段落分块
-        chunks = []
-        lines = text.split('\n')
-        current_chunk = []
-        
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
+            return {
+                "success": True,
+                "file_path": file_path,
+                "file_type": file_type,
+                "document_type": document_type,
+                "document_id": document_id,
+                "total_chunks": queued_count,
+                "indexed_chunks": len(indexed_chunks),
+                "chunks": indexed_chunks,
+                "processing_result": doc_result
+            }
             
-            # 如果是表格行（包含多个数字）
-            if self._is_table_row(line):
-                current_chunk.append(line)
-                # 表格行积累到一定数量就分块
-                if len(current_chunk) >= 20:
-                    chunks.append('\n'.join(current_chunk))
-                    current_chunk = []
-            else:
-                # 非表格行，先处理之前的表格
-                if current_chunk:
-                    chunks.append('\n'.join(current_chunk))
-                    current_chunk = []
-                
-                # 段落文本
-                if len(line) > 50:  # 长段落单独成块
-                    chunks.append(line)
-                else:
-                    current_chunk.append(line)
-        
-        if current_chunk:
-            chunks.append('\n'.join(current_chunk))
-        
-        return chunks if chunks else [text]
+        except Exception as e:
+            self.logger.error(f"文档处理索引失败: {file_path}, 错误: {str(e)}")
+            return {
+                "success": False,
+                "file_path": file_path,
+                "error": str(e)
+            }
+    
+    async def _report_progress(self, progress_callback, stage: str, **info):
+        """上报处理进度，回调失败不影响处理"""
+        if progress_callback is None:
+            return
+        try:
+            await progress_callback(stage, info)
+        except Exception as e:
+            self.logger.warning(f"进度上报失败: {e}")
     
-    def _is_date_line(self, line: str) -> bool:
-        """判断是否是日期行"""
-        import re
-        date_pattern = r'\d{4}[-/]\d{1,2}[-/]\d{1,2}'
-        return bool(re.search(date_pattern, line))
+    @property
+    def chunker(self) -> SemanticChunker:
+        """按嵌入模型分词器与最大序列长度配置的分块器（延迟创建）"""
+        if self._chunker is None:
+            self._chunker = SemanticChunker.for_embedding_model(self.vector_rag.embedding_model)
+        return self._chunker
     
-    def _is_table_row(self, line: str) -> bool:
-        """判断是否是表格行"""
-        import re
-        # 包含多个数字的行可能是表格行
-        numbers = re.findall(r'\d+\.?\d*', line)
-        return len(numbers) >= 3
+    def _chunk_document_spans(self, text: str, document_type: str) -> List[Chunk]:
+        """将文档分块，保留每块在原文中的字符偏移"""
+        if not text.strip():
+            return []
+        return self.chunker.chunk(text, document_type)
+    
+    def _chunk_document(self, text: str, document_type: str) -> List[str]:
+        """将文档分块"""
+        return [chunk.text for chunk in self._chunk_document_spans(text, document_type)]
     
     async def search_documents(
         self, 
@@ -334,45 +370,30 @@ class DocumentRAGService:
         self, 
         file_paths: List[str],
         category: str = "documents",
-        metadata: Dict[str, Any] = None
+        metadata: Dict[str, Any] = None,
+        extract_workers: int = None,
+        embed_batch_size: int = None,
+        write_workers: int = None
     ) -> Dict[str, Any]:
-        """批量处理文档"""
-        results = {}
-        success_count = 0
-        error_count = 0
+        """批量处理文档
         
-        for file_path in file_paths:
-            try:
-                file_type = os.path.splitext(file_path)[1][1:]
-                result = await self.process_and_index_document(
-                    file_path=file_path,
-                    file_type=file_type,
-                    category=category,
-                    metadata=metadata
-                )
-                results[file_path] = result
-                
-                if result.get("success"):
-                    success_count += 1
-                else:
-                    error_count += 1
-                    
-            except Exception as e:
-                self.logger.error(f"批量处理失败: {file_path}, 错误: {str(e)}")
-                results[file_path] = {
-                    "success": False,
-                    "error": str(e)
-                }
-                error_count += 1
+        提取、嵌入、写库三阶段流水线并发执行，各阶段并发度可按次覆盖，
+        返回逐文档结果（含失败阶段）、汇总与吞吐量
+        """
+        result = await self.batch_pipeline.run(
+            file_paths,
+            category=category,
+            metadata=metadata,
+            extract_workers=extract_workers,
+            embed_batch_size=embed_batch_size,
+            write_workers=write_workers
+        )
         
-        return {
-            "results": results,
-            "summary": {
-                "total": len(file_paths),
-                "success": success_count,
-                "error": error_count
-            }
-        }
+        # 批量导入后按需重建向量索引
+        vector_index_manager.record_bulk_load(result["summary"]["indexed_chunks"])
+        vector_index_manager.schedule_rebuild(self.vector_rag.connection_pool)
+        
+        return result
     
     async def get_document_stats(self) -> Dict[str, Any]:
         """获取文档统计信息"""
@@ -0,0 +1,310 @@
+"""
+嵌入向量回填
+按主键分页（keyset）用服务端游标流式读取待回填的knowledge_base行，每批一次模型调用编码，
+COPY到临时表后以 UPDATE ... FROM 一条语句写回；每批写回与检查点在同一事务提交，
+中断后从检查点继续，模型变更时可按embedding_model重新生成
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+from .database import database as default_database
+from .onnx_embedding import load_embedding_model
+
+# 待回填行：缺少嵌入，（主嵌入列重新生成模式下）由其他模型生成，或全量重新生成（$5）
+_PENDING_SQL = """
+SELECT id, title, content
+FROM knowledge_base
+WHERE id > $1
+AND (embedding IS NULL OR $5::BOOLEAN OR ($3::BOOLEAN AND embedding_model IS DISTINCT FROM $4))
+ORDER BY id
+LIMIT $2
+"""
+
+# 影子列补齐空值（列本身对应一个模型版本），全量重新生成时（$3）包括已有值
+_PENDING_SHADOW_SQL = """
+SELECT id, title, content
+FROM knowledge_base
+WHERE id > $1 AND ({column} IS NULL OR $3::BOOLEAN)
+ORDER BY id
+LIMIT $2
+"""
+
+def knowledge_embedding_text(content: str) -> str:
+    """知识条目生成嵌入所用的文本（写入、双写、更新与回填共用，保证同一条目在各路径得到相同向量）
+
+    只使用正文：标题多为文件名与页码，且检索时查询嵌入同样只含问题文本
+    """
+    return content
+
+
+_CREATE_BATCH_TABLE_SQL = """
+CREATE TEMP TABLE IF NOT EXISTS embedding_backfill_batch (
+    id INTEGER PRIMARY KEY,
+    embedding VECTOR
+) ON COMMIT DELETE ROWS
+"""
+
+_APPLY_BATCH_SQL = """
+UPDATE knowledge_base AS kb
+SET embedding = batch.embedding,
+    embedding_model = $1,
+    updated_at = CURRENT_TIMESTAMP
+FROM embedding_backfill_batch AS batch
+WHERE kb.id = batch.id
+"""
+
+# 影子列不更新updated_at：回填期间读取仍走active列，行内容未变
+_APPLY_SHADOW_BATCH_SQL = """
+UPDATE knowledge_base AS kb
+SET {column} = batch.embedding
+FROM embedding_backfill_batch AS batch
+WHERE kb.id = batch.id
+"""
+
+_SAVE_CHECKPOINT_SQL = """
+INSERT INTO embedding_backfill_checkpoints (job_name, model, last_id, rows_done, started_at, updated_at)
+VALUES ($1, $2, $3, $4, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+ON CONFLICT (job_name) DO UPDATE
+SET model = EXCLUDED.model,
+    last_id = EXCLUDED.last_id,
+    rows_done = EXCLUDED.rows_done,
+    updated_at = CURRENT_TIMESTAMP,
+    finished_at = NULL
+"""
+
+
+@dataclass
+class BackfillStats:
+    """回填统计"""
+    job_name: str
+    model: str
+    resumed_from: int = 0
+    last_id: int = 0
+    # 此前运行已回填的行数（来自检查点）
+    previous_rows: int = 0
+    rows: int = 0
+    batches: int = 0
+    read_seconds: float = 0.0
+    encode_seconds: float = 0.0
+    write_seconds: float = 0.0
+    total_seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.total_seconds if self.total_seconds > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_name": self.job_name,
+            "model": self.model,
+            "resumed_from": self.resumed_from,
+            "last_id": self.last_id,
+            "previous_rows": self.previous_rows,
+            "rows": self.rows,
+            "batches": self.batches,
+            "read_seconds": self.read_seconds,
+            "encode_seconds": self.encode_seconds,
+            "write_seconds": self.write_seconds,
+            "total_seconds": self.total_seconds,
+            "rows_per_second": self.rows_per_second
+        }
+
+
+class EmbeddingBackfill:
+    """知识库嵌入向量回填"""
+
+    def __init__(
+        self,
+        model_name: str = None,
+        batch_size: int = None,
+        workers: int = None,
+        page_size: int = None,
+        job_name: str = None,
+        reembed: bool = False,
+        reembed_all: bool = False,
+        encoder: Callable[[List[str]], np.ndarray] = None,
+        database=None,
+        embedding_column: str = "embedding"
+    ):
+        self.model_name = model_name or os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        # 每批一次模型调用，同时是COPY写回的行数
+        self.batch_size = batch_size or int(os.getenv("EMBEDDING_BACKFILL_BATCH_SIZE", "256"))
+        # 并行编码的批数（线程数），写回按读取顺序串行以保证检查点单调
+        self.workers = workers or int(os.getenv("EMBEDDING_BACKFILL_WORKERS", "2"))
+        # 每个keyset分页的行数；一页对应一个服务端游标与一个短事务
+        self.page_size = max(page_size or int(os.getenv("EMBEDDING_BACKFILL_PAGE_SIZE", "10000")), self.batch_size)
+        # 写入的嵌入列：主嵌入列embedding，或新模型版本的影子列
+        self.embedding_column = embedding_column
+        self.job_name = job_name or (
+            f"knowledge_base:{self.model_name}" if embedding_column == "embedding"
+            else f"knowledge_base.{embedding_column}:{self.model_name}"
+        )
+        # 为True时同时重新生成由其他模型生成的嵌入
+        self.reembed = reembed
+        # 为True时不论模型标注重新生成全部行（嵌入文本规则变更后使用）
+        self.reembed_all = reembed_all
+        self.encoder = encoder
+        self.database = database or default_database
+        self._started: Optional[float] = None
+
+    def _load_encoder(self) -> Callable[[List[str]], np.ndarray]:
+        """加载默认编码器（按EMBEDDING_BACKEND选择PyTorch或ONNX后端）"""
+        model = load_embedding_model(self.model_name)
+        return lambda texts: model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
+
+    def _encode(self, rows) -> np.ndarray:
+        """整批文本一次模型调用编码"""
+        texts = [knowledge_embedding_text(row["content"]) for row in rows]
+        return np.asarray(self.encoder(texts), dtype=np.float32)
+
+    async def _load_checkpoint(self, conn, restart: bool) -> Dict[str, int]:
+        """读取检查点：未完成且模型相同的任务从上次的位置继续"""
+        row = await conn.fetchrow(
+            "SELECT model, last_id, rows_done, finished_at FROM embedding_backfill_checkpoints WHERE job_name = $1",
+            self.job_name
+        )
+        if restart or row is None or row["finished_at"] is not None or row["model"] != self.model_name:
+            return {"last_id": 0, "rows_done": 0}
+        return {"last_id": row["last_id"], "rows_done": row["rows_done"]}
+
+    async def _read_batches(self, conn, start_id: int, stats: BackfillStats):
+        """keyset分页读取待回填行，每页在短事务内用服务端游标按批拉取"""
+        last_id = start_id
+        while True:
+            page_rows = 0
+            async with conn.transaction(readonly=True):
+                if self.embedding_column == "embedding":
+                    cursor = await conn.cursor(
+                        _PENDING_SQL, last_id, self.page_size, self.reembed, self.model_name, self.reembed_all
+                    )
+                else:
+                    cursor = await conn.cursor(
+                        _PENDING_SHADOW_SQL.format(column=self.embedding_column), last_id, self.page_size,
+                        self.reembed_all
+                    )
+                while True:
+                    start_time = time.perf_counter()
+                    rows = await cursor.fetch(self.batch_size)
+                    stats.read_seconds += time.perf_counter() - start_time
+                    if not rows:
+                        break
+                    page_rows += len(rows)
+                    last_id = rows[-1]["id"]
+                    yield rows
+            if page_rows < self.page_size:
+                return
+
+    async def _write_batch(self, conn, rows, embeddings: np.ndarray, stats: BackfillStats):
+        """COPY到临时表后一条UPDATE写回，并在同一事务内推进检查点"""
+        start_time = time.perf_counter()
+        last_id = rows[-1]["id"]
+        async with conn.transaction():
+            await conn.execute(_CREATE_BATCH_TABLE_SQL)
+            await conn.copy_records_to_table(
+                "embedding_backfill_batch",
+                records=[(row["id"], embedding) for row, embedding in zip(rows, embeddings)],
+                columns=["id", "embedding"]
+            )
+            if self.embedding_column == "embedding":
+                await self.database.execute(_APPLY_BATCH_SQL, self.model_name, name="embedding_backfill.apply", conn=conn)
+            else:
+                await self.database.execute(
+                    _APPLY_SHADOW_BATCH_SQL.format(column=self.embedding_column),
+                    name="embedding_backfill.apply_shadow", conn=conn
+                )
+            await conn.execute(
+                _SAVE_CHECKPOINT_SQL, self.job_name, self.model_name, last_id, stats.previous_rows + stats.rows + len(rows)
+            )
+        stats.write_seconds += time.perf_counter() - start_time
+        stats.rows += len(rows)
+        stats.batches += 1
+        stats.last_id = last_id
+        elapsed = time.perf_counter() - self._started
+        logger.info(
+            f"嵌入回填进度: {stats.rows} 行, 最后ID {last_id}, "
+            f"{stats.rows / elapsed if elapsed > 0 else 0.0:.1f} 行/秒"
+        )
+
+    async def run(self, restart: bool = False) -> BackfillStats:
+        """执行回填；restart为True时忽略检查点从头开始"""
+        await self.database.initialize()
+        if self.encoder is None:
+            self.encoder = await asyncio.to_thread(self._load_encoder)
+
+        stats = BackfillStats(job_name=self.job_name, model=self.model_name)
+        self._started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="embedding-backfill")
+
+        async def encode(rows):
+            start_time = time.perf_counter()
+            embeddings = await loop.run_in_executor(executor, self._encode, rows)
+            stats.encode_seconds += time.perf_counter() - start_time
+            return embeddings
+
+        try:
+            async with self.database.acquire() as read_conn, self.database.acquire() as write_conn:
+                if not self.database.vector_codec_enabled:
+                    raise RuntimeError("vector二进制编解码器未注册（pgvector扩展未安装？）")
+                checkpoint = await self._load_checkpoint(write_conn, restart)
+                stats.resumed_from = stats.last_id = checkpoint["last_id"]
+                stats.previous_rows = checkpoint["rows_done"]
+                if stats.resumed_from:
+                    logger.info(f"从检查点继续嵌入回填: {self.job_name}, 最后ID {stats.resumed_from}")
+
+                # 最多workers批同时编码，按读取顺序写回
+                pending = deque()
+                batches = self._read_batches(read_conn, stats.resumed_from, stats)
+                try:
+                    async for rows in batches:
+                        pending.append((rows, asyncio.ensure_future(encode(rows))))
+                        if len(pending) >= self.workers:
+                            rows, task = pending.popleft()
+                            await self._write_batch(write_conn, rows, await task, stats)
+                    while pending:
+                        rows, task = pending.popleft()
+                        await self._write_batch(write_conn, rows, await task, stats)
+                finally:
+                    await batches.aclose()
+                    for _, task in pending:
+                        task.cancel()
+
+                await write_conn.execute(
+                    _SAVE_CHECKPOINT_SQL, self.job_name, self.model_name, stats.last_id, stats.previous_rows + stats.rows
+                )
+                await write_conn.execute(
+                    "UPDATE embedding_backfill_checkpoints SET finished_at = CURRENT_TIMESTAMP WHERE job_name = $1",
+                    self.job_name
+                )
+        finally:
+            executor.shutdown(wait=False)
+            stats.total_seconds = time.perf_counter() - self._started
+
+        logger.info(
+            f"嵌入回填完成: {self.job_name}, {stats.rows} 行, {stats.total_seconds:.1f}秒, "
+            f"{stats.rows_per_second:.1f} 行/秒"
+        )
+        return stats
+
+
+async def backfill_embeddings(restart: bool = False, **kwargs) -> BackfillStats:
+    """回填所有写入版本（active及回填中的影子版本）的嵌入列，返回active版本的统计"""
+    # 延迟导入，embedding_models依赖本模块
+    from .embedding_models import embedding_model_registry
+
+    await default_database.initialize()
+    await embedding_model_registry.refresh()
+    results = []
+    for version in embedding_model_registry.write_versions:
+        backfill = EmbeddingBackfill(model_name=version.model_id, embedding_column=version.column_name, **kwargs)
+        results.append(await backfill.run(restart=restart))
+    return results[0]
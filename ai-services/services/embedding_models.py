@@ -0,0 +1,310 @@
+"""
+嵌入模型版本管理
+knowledge_base的每个嵌入列对应一个模型版本（模型ID + 维度），登记在embedding_models表中。
+升级模型时先加影子列（可空、无默认值，只改系统目录），新写入双写到active与backfilling版本，
+存量数据由回填工具分批补齐；补齐并建好索引后在一个事务内切换active版本，
+各实例收到 NOTIFY embedding_model_changed 后原子替换读取列，全程无需停机或整表锁
+"""
+
+import asyncio
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+import asyncpg
+from loguru import logger
+
+from .database import database
+from .embedding_backfill import BackfillStats, EmbeddingBackfill, knowledge_embedding_text
+from .vector_index_manager import VectorIndexManager, vector_index_manager
+
+PRIMARY_EMBEDDING_COLUMN = "embedding"
+MODEL_CHANGED_CHANNEL = "embedding_model_changed"
+
+
+class EmbeddingModelStatus(Enum):
+    """嵌入模型版本状态"""
+    BACKFILLING = "backfilling"  # 影子列双写并回填中，不参与读取
+    ACTIVE = "active"            # 当前读取的版本
+    RETIRED = "retired"          # 已切换下线，不再写入
+
+
+@dataclass
+class EmbeddingModelVersion:
+    """嵌入模型版本"""
+    model_id: str
+    dimension: int
+    column_name: str
+    status: EmbeddingModelStatus
+    created_at: Optional[datetime] = None
+    activated_at: Optional[datetime] = None
+
+    @property
+    def vector_type(self) -> str:
+        return f"VECTOR({self.dimension})"
+
+    @property
+    def index_name(self) -> str:
+        return f"knowledge_base_{self.column_name}_idx"
+
+    @property
+    def is_primary(self) -> bool:
+        """主嵌入列，行级模型标注记录在embedding_model列"""
+        return self.column_name == PRIMARY_EMBEDDING_COLUMN
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "model_id": self.model_id,
+            "dimension": self.dimension,
+            "column_name": self.column_name,
+            "status": self.status.value,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "activated_at": self.activated_at.isoformat() if self.activated_at else None
+        }
+
+
+def column_for_model(model_id: str) -> str:
+    """由模型ID生成影子列名（小写字母、数字与下划线）"""
+    slug = re.sub(r"[^a-z0-9]+", "_", model_id.lower()).strip("_")
+    return f"{PRIMARY_EMBEDDING_COLUMN}_{slug}"[:63]
+
+
+class EmbeddingModelRegistry:
+    """嵌入模型版本注册表"""
+
+    def __init__(self):
+        # 未执行迁移006时，按环境变量把主嵌入列视为唯一的active版本
+        self.default_version = EmbeddingModelVersion(
+            model_id=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
+            dimension=int(os.getenv("EMBEDDING_DIMENSION", "384")),
+            column_name=PRIMARY_EMBEDDING_COLUMN,
+            status=EmbeddingModelStatus.ACTIVE
+        )
+        self.versions: Dict[str, EmbeddingModelVersion] = {self.default_version.model_id: self.default_version}
+        self.active: EmbeddingModelVersion = self.default_version
+        self.registry_available = False
+        # 加列时等待表锁的上限，避免排在长事务之后阻塞其他查询
+        self.ddl_lock_timeout = os.getenv("EMBEDDING_DDL_LOCK_TIMEOUT", "5s")
+        self.ddl_retries = int(os.getenv("EMBEDDING_DDL_RETRIES", "5"))
+        self.backfill_tasks: Dict[str, asyncio.Task] = {}
+        self.backfill_results: Dict[str, Dict[str, Any]] = {}
+        self._change_handlers: List[Callable[[EmbeddingModelVersion, EmbeddingModelVersion], None]] = []
+
+    @property
+    def write_versions(self) -> List[EmbeddingModelVersion]:
+        """写入时需要生成嵌入的版本：active及回填中的影子版本（双写）"""
+        return [self.active] + [
+            version for version in self.versions.values()
+            if version.status == EmbeddingModelStatus.BACKFILLING
+        ]
+
+    def get(self, model_id: str) -> Optional[EmbeddingModelVersion]:
+        return self.versions.get(model_id)
+
+    def add_change_handler(self, handler: Callable[[EmbeddingModelVersion, EmbeddingModelVersion], None]):
+        """注册active版本切换回调，参数为 (旧版本, 新版本)"""
+        self._change_handlers.append(handler)
+
+    async def refresh(self):
+        """从embedding_models表重新加载版本，active变化时切换读取列"""
+        try:
+            rows = await database.fetch(
+                "SELECT model_id, dimension, column_name, status, created_at, activated_at FROM embedding_models",
+                name="embedding_models.load"
+            )
+        except asyncpg.exceptions.UndefinedTableError:
+            self.registry_available = False
+            logger.warning("embedding_models表不存在（迁移006未执行），使用默认嵌入模型版本")
+            return
+
+        versions = {
+            row["model_id"]: EmbeddingModelVersion(
+                model_id=row["model_id"],
+                dimension=row["dimension"],
+                column_name=row["column_name"],
+                status=EmbeddingModelStatus(row["status"]),
+                created_at=row["created_at"],
+                activated_at=row["activated_at"]
+            )
+            for row in rows
+        }
+        active = next((v for v in versions.values() if v.status == EmbeddingModelStatus.ACTIVE), None)
+        if active is None:
+            logger.warning("embedding_models中没有active版本，使用默认嵌入模型版本")
+            versions.setdefault(self.default_version.model_id, self.default_version)
+            active = self.default_version
+        self.versions = versions
+        self.registry_available = True
+        await self._switch_active(active)
+
+    async def _switch_active(self, version: EmbeddingModelVersion):
+        """替换active版本（单次赋值，并发读取方要么看到旧版本要么看到新版本）"""
+        previous = self.active
+        self.active = version
+        if previous.model_id == version.model_id and previous.column_name == version.column_name:
+            return
+        logger.info(f"嵌入模型切换: {previous.model_id} -> {version.model_id} (列 {version.column_name})")
+        vector_index_manager.bind(version.column_name, version.index_name)
+        try:
+            await vector_index_manager.refresh_state(database)
+        except Exception as e:
+            logger.warning(f"读取向量索引状态失败: {e}")
+        for handler in self._change_handlers:
+            try:
+                handler(previous, version)
+            except Exception as e:
+                logger.error(f"嵌入模型切换回调失败: {e}")
+
+    def on_notification(self, connection, pid, channel, payload):
+        """asyncpg通知回调：其他实例注册或切换了模型版本"""
+        asyncio.get_event_loop().create_task(self._refresh_safely())
+
+    async def _refresh_safely(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error(f"刷新嵌入模型版本失败: {e}")
+
+    async def register_model(self, model_id: str, dimension: int) -> EmbeddingModelVersion:
+        """登记新模型：添加影子列并进入双写与回填"""
+        if not self.registry_available:
+            raise RuntimeError("embedding_models表不存在，请先执行迁移006")
+        existing = self.versions.get(model_id)
+        if existing is not None:
+            if existing.dimension != dimension:
+                raise ValueError(f"模型 {model_id} 已登记为 {existing.dimension} 维")
+            return existing
+
+        column = column_for_model(model_id)
+        dimension = int(dimension)
+        async with database.acquire() as conn:
+            for attempt in range(1, self.ddl_retries + 1):
+                try:
+                    async with conn.transaction():
+                        await conn.execute(f"SET LOCAL lock_timeout = '{self.ddl_lock_timeout}'")
+                        await conn.execute(
+                            f"ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS {column} VECTOR({dimension})"
+                        )
+                    break
+                except asyncpg.exceptions.LockNotAvailableError:
+                    if attempt == self.ddl_retries:
+                        raise
+                    logger.warning(f"添加影子列 {column} 等待表锁超时，第 {attempt} 次重试")
+                    await asyncio.sleep(attempt)
+
+            async with conn.transaction():
+                await conn.execute(
+                    """
+                    INSERT INTO embedding_models (model_id, dimension, column_name, status)
+                    VALUES ($1, $2, $3, $4)
+                    ON CONFLICT (model_id) DO NOTHING
+                    """,
+                    model_id, dimension, column, EmbeddingModelStatus.BACKFILLING.value
+                )
+                await conn.execute(f"SELECT pg_notify('{MODEL_CHANGED_CHANNEL}', $1)", model_id)
+
+        await self.refresh()
+        logger.info(f"嵌入模型已登记: {model_id} ({dimension}维, 影子列 {column})")
+        return self.versions[model_id]
+
+    async def backfill(self, model_id: str, restart: bool = False, **kwargs) -> BackfillStats:
+        """回填指定版本的嵌入列"""
+        version = self.versions.get(model_id)
+        if version is None:
+            raise ValueError(f"未登记的嵌入模型: {model_id}")
+        return await EmbeddingBackfill(
+            model_name=model_id, embedding_column=version.column_name, **kwargs
+        ).run(restart=restart)
+
+    def start_backfill(self, model_id: str, **kwargs) -> bool:
+        """在后台启动回填，已有回填在运行时返回False"""
+        if model_id not in self.versions:
+            raise ValueError(f"未登记的嵌入模型: {model_id}")
+        task = self.backfill_tasks.get(model_id)
+        if task is not None and not task.done():
+            return False
+
+        async def _run():
+            try:
+                stats = await self.backfill(model_id, **kwargs)
+                self.backfill_results[model_id] = stats.to_dict()
+            except Exception as e:
+                logger.error(f"嵌入回填失败: {model_id}, {e}")
+                self.backfill_results[model_id] = {"error": str(e)}
+
+        self.backfill_tasks[model_id] = asyncio.create_task(_run())
+        return True
+
+    async def get_coverage(self, version: EmbeddingModelVersion) -> Dict[str, int]:
+        """版本嵌入列的覆盖情况"""
+        row = await database.fetchrow(
+            f"SELECT COUNT(*) AS total, COUNT({version.column_name}) AS embedded FROM knowledge_base",
+            name="embedding_models.coverage"
+        )
+        return {"total": row["total"], "embedded": row["embedded"], "missing": row["total"] - row["embedded"]}
+
+    async def activate(self, model_id: str, build_index: bool = True) -> Dict[str, Any]:
+        """切换读取版本：影子列回填完整且索引就绪后，在一个事务内更新active版本"""
+        version = self.versions.get(model_id)
+        if version is None:
+            raise ValueError(f"未登记的嵌入模型: {model_id}")
+        if version.status == EmbeddingModelStatus.ACTIVE:
+            return {"model_id": model_id, "changed": False}
+
+        index_result = None
+        if build_index:
+            # 新列的索引并发创建，不阻塞读写
+            manager = VectorIndexManager(column=version.column_name, index_name=version.index_name)
+            await manager.refresh_state(database)
+            if manager.index_params is None:
+                index_result = await manager.rebuild_index(database)
+
+        async with database.acquire() as conn:
+            async with conn.transaction():
+                # 在切换事务内复核：回填完成后新写入的行也必须已双写
+                missing = await conn.fetchval(
+                    f"SELECT COUNT(*) FROM knowledge_base WHERE {version.column_name} IS NULL"
+                )
+                if missing:
+                    raise ValueError(f"回填未完成，仍有 {missing} 行缺少 {model_id} 的嵌入")
+                await conn.execute(
+                    "UPDATE embedding_models SET status = $1 WHERE status = $2",
+                    EmbeddingModelStatus.RETIRED.value, EmbeddingModelStatus.ACTIVE.value
+                )
+                await conn.execute(
+                    "UPDATE embedding_models SET status = $1, activated_at = CURRENT_TIMESTAMP WHERE model_id = $2",
+                    EmbeddingModelStatus.ACTIVE.value, model_id
+                )
+                await conn.execute(f"SELECT pg_notify('{MODEL_CHANGED_CHANNEL}', $1)", model_id)
+
+        previous = self.active.model_id
+        await self.refresh()
+        return {"model_id": model_id, "previous_model_id": previous, "changed": True, "index": index_result}
+
+    async def get_status(self) -> Dict[str, Any]:
+        """各版本状态与覆盖情况"""
+        versions = []
+        for version in self.versions.values():
+            info = version.to_dict()
+            if version.status != EmbeddingModelStatus.RETIRED:
+                try:
+                    info["coverage"] = await self.get_coverage(version)
+                except Exception as e:
+                    info["coverage"] = {"error": str(e)}
+            task = self.backfill_tasks.get(version.model_id)
+            info["backfill_running"] = task is not None and not task.done()
+            info["last_backfill"] = self.backfill_results.get(version.model_id)
+            versions.append(info)
+        return {
+            "registry_available": self.registry_available,
+            "active": self.active.model_id,
+            "write_models": [version.model_id for version in self.write_versions],
+            "versions": versions
+        }
+
+
+# 全局实例
+embedding_model_registry = EmbeddingModelRegistry()
@@ -14,6 +14,8 @@ from loguru import logger
 from datetime import datetime
 import time
 
+from .resilience import fetch_web_text
+
 class EnhancedWebSearchService:
     """增强版网络搜索服务"""
     
@@ -298,13 +300,9 @@ class EnhancedWebSearchService:
                 "category": "loan"
             }
             
-            async with self.session.get(search_url, params=params) as response:
-                if response.status == 200:
-                    content = await response.text()
-                    return await self._parse_bank_website(bank_name, content, query)
-                else:
-                    return {"error": f"HTTP {response.status}"}
-                    
+            content = await fetch_web_text(self.session, search_url, params=params)
+            return await self._parse_bank_website(bank_name, content, query)
+            
         except Exception as e:
             logger.error(f"实时获取银行信息失败: {e}")
             return {"error": str(e)}
@@ -0,0 +1,211 @@
+"""
+混合检索服务
+向量检索与全文检索分别占用连接池中的独立连接并发执行，
+结果按倒数排名融合（Reciprocal Rank Fusion）去重合并，可选交叉编码器重排
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from loguru import logger
+
+
+class HybridRetriever:
+    """倒数排名融合混合检索器"""
+
+    def __init__(self, vector_rag_service):
+        self.vector_rag = vector_rag_service
+        # RRF平滑常数，经验值60
+        self.rrf_k = int(os.getenv("RAG_RRF_K", "60"))
+        # 每路召回候选数 = max_results * candidate_multiplier
+        self.candidate_multiplier = int(os.getenv("RAG_RRF_CANDIDATE_MULTIPLIER", "4"))
+        self.rerank_enabled = os.getenv("RAG_RERANK_ENABLED", "false").lower() == "true"
+        self.reranker_model_name = os.getenv(
+            "RAG_RERANKER_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+        )
+        self.reranker = None
+        self._reranker_failed = False
+        self._rerank_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("RAG_RERANK_WORKERS", "2")),
+            thread_name_prefix="rag-rerank"
+        )
+        self.stats = {
+            "total_searches": 0,
+            "vector_failures": 0,
+            "text_failures": 0,
+            "reranked_searches": 0,
+            "latency_ms_sum": {
+                "embedding": 0.0,
+                "vector": 0.0,
+                "text": 0.0,
+                "fusion": 0.0,
+                "rerank": 0.0,
+                "total": 0.0
+            }
+        }
+
+    async def retrieve(
+        self,
+        query: str,
+        category: str = None,
+        max_results: int = 5,
+        rerank: bool = None
+    ) -> Dict[str, Any]:
+        """并发执行向量与全文两路检索并融合
+
+        返回 {"results": [...], "timings": {...}}，timings为各路耗时（毫秒）
+        """
+        total_start = time.perf_counter()
+        candidates = max_results * self.candidate_multiplier
+        rerank = self.rerank_enabled if rerank is None else rerank
+        timings: Dict[str, float] = {}
+
+        # 全文检索不依赖嵌入向量，先行启动
+        text_task = asyncio.create_task(self._text_leg(query, category, candidates, timings))
+        vector_task = asyncio.create_task(self._vector_leg(query, category, candidates, timings))
+        vector_rows, text_rows = await asyncio.gather(vector_task, text_task)
+
+        fusion_start = time.perf_counter()
+        fused = self.fuse([vector_rows, text_rows], ["vector", "text"])
+        timings["fusion"] = (time.perf_counter() - fusion_start) * 1000
+
+        if rerank and fused:
+            rerank_start = time.perf_counter()
+            fused = await self._rerank(query, fused[:candidates])
+            timings["rerank"] = (time.perf_counter() - rerank_start) * 1000
+
+        results = fused[:max_results]
+        timings["total"] = (time.perf_counter() - total_start) * 1000
+        self._record(timings, reranked="rerank" in timings)
+
+        logger.info(
+            f"混合检索完成，向量 {len(vector_rows)} 条，全文 {len(text_rows)} 条，"
+            f"融合后返回 {len(results)} 条，耗时 {timings['total']:.1f}ms"
+        )
+        return {
+            "results": results,
+            "timings": {name: round(value, 3) for name, value in timings.items()}
+        }
+
+    async def _vector_leg(
+        self, query: str, category: str, candidates: int, timings: Dict[str, float]
+    ) -> List[Dict[str, Any]]:
+        """向量检索路：嵌入在线程中计算，热点分类由进程内索引检索，其余查询使用独立连接"""
+        try:
+            start = time.perf_counter()
+            embedding = await asyncio.to_thread(self.vector_rag._get_embedding, query)
+            timings["embedding"] = (time.perf_counter() - start) * 1000
+            if embedding is None:
+                return []
+
+            start = time.perf_counter()
+            results = await self.vector_rag._search_vector(embedding, category, None, candidates)
+            timings["vector"] = (time.perf_counter() - start) * 1000
+            return results
+        except Exception as e:
+            self.stats["vector_failures"] += 1
+            logger.warning(f"混合检索向量路失败: {e}")
+            return []
+
+    async def _text_leg(
+        self, query: str, category: str, candidates: int, timings: Dict[str, float]
+    ) -> List[Dict[str, Any]]:
+        """全文检索路，使用独立连接"""
+        try:
+            start = time.perf_counter()
+            async with self.vector_rag.connection_pool.acquire() as conn:
+                rows = await self.vector_rag._fetch_text(conn, query, category, candidates)
+            timings["text"] = (time.perf_counter() - start) * 1000
+            return [self.vector_rag._row_to_result(row, "relevance_score") for row in rows]
+        except Exception as e:
+            self.stats["text_failures"] += 1
+            logger.warning(f"混合检索全文路失败: {e}")
+            return []
+
+    def fuse(self, ranked_lists: List[List[Dict[str, Any]]], sources: List[str]) -> List[Dict[str, Any]]:
+        """倒数排名融合：score(d) = Σ 1 / (k + rank_i(d))，按id去重
+
+        rrf_score只用于排序；similarity_score为相关度：向量路命中时取余弦相似度，
+        仅由全文路命中时取全文相关度；各路原始分分别保留在 <路>_score 字段
+        """
+        fused: Dict[Any, Dict[str, Any]] = {}
+        for results, source in zip(ranked_lists, sources):
+            for rank, item in enumerate(results, 1):
+                entry = fused.get(item["id"])
+                if entry is None:
+                    entry = dict(item)
+                    entry["rrf_score"] = 0.0
+                    entry["ranks"] = {}
+                    for name in sources:
+                        entry[f"{name}_score"] = None
+                    fused[item["id"]] = entry
+                entry["rrf_score"] += 1.0 / (self.rrf_k + rank)
+                entry["ranks"][source] = rank
+                entry[f"{source}_score"] = item["similarity_score"]
+
+        for entry in fused.values():
+            entry["similarity_score"] = next(
+                entry[f"{source}_score"] for source in sources if entry[f"{source}_score"] is not None
+            )
+
+        return sorted(fused.values(), key=lambda x: x["rrf_score"], reverse=True)
+
+    def _load_reranker(self):
+        """延迟加载交叉编码器"""
+        if self.reranker is None and not self._reranker_failed:
+            try:
+                from sentence_transformers import CrossEncoder
+                self.reranker = CrossEncoder(self.reranker_model_name, max_length=512)
+                logger.info(f"重排模型加载成功: {self.reranker_model_name}")
+            except Exception as e:
+                self._reranker_failed = True
+                logger.warning(f"重排模型加载失败，跳过重排: {e}")
+        return self.reranker
+
+    def _predict(self, query: str, contents: List[str]) -> List[float]:
+        """在线程池中执行交叉编码器打分"""
+        reranker = self._load_reranker()
+        if reranker is None:
+            return []
+        return [float(score) for score in reranker.predict([(query, content) for content in contents])]
+
+    async def _rerank(self, query: str, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """交叉编码器重排融合后的top-k"""
+        loop = asyncio.get_running_loop()
+        scores = await loop.run_in_executor(
+            self._rerank_executor, self._predict, query, [r["content"] for r in results]
+        )
+        if not scores:
+            return results
+        for result, score in zip(results, scores):
+            result["rerank_score"] = score
+        return sorted(results, key=lambda x: x["rerank_score"], reverse=True)
+
+    def _record(self, timings: Dict[str, float], reranked: bool):
+        """累计各路耗时"""
+        self.stats["total_searches"] += 1
+        if reranked:
+            self.stats["reranked_searches"] += 1
+        for name, value in timings.items():
+            self.stats["latency_ms_sum"][name] += value
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取检索统计（各路平均耗时）"""
+        total = self.stats["total_searches"]
+        return {
+            "total_searches": total,
+            "reranked_searches": self.stats["reranked_searches"],
+            "vector_failures": self.stats["vector_failures"],
+            "text_failures": self.stats["text_failures"],
+            "avg_latency_ms": {
+                name: round(value / count, 3) if count else 0.0
+                for name, value in self.stats["latency_ms_sum"].items()
+                for count in [self.stats["reranked_searches"] if name == "rerank" else total]
+            },
+            "rrf_k": self.rrf_k,
+            "rerank_enabled": self.rerank_enabled,
+            "reranker_model": self.reranker_model_name
+        }
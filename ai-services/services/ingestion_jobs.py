@@ -0,0 +1,333 @@
+"""
+文档导入任务队列
+上传文件落盘后写入Postgres任务表并立即返回任务ID，工作协程以有限并发领取任务，
+完成提取、OCR、分块、嵌入与索引并持续上报分阶段进度；任务表即持久化队列，
+服务重启或工作协程崩溃后，心跳超时的任务会被重新领取
+"""
+
+import asyncio
+import json
+import os
+import shutil
+import socket
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+class IngestionJobQueue:
+    """基于Postgres的文档导入任务队列"""
+
+    def __init__(self):
+        self.job_dir = os.getenv("INGESTION_JOB_DIR", "uploads/jobs")
+        self.concurrency = int(os.getenv("INGESTION_WORKERS", "2"))
+        self.poll_interval = float(os.getenv("INGESTION_POLL_INTERVAL", "2"))
+        # 心跳超过该秒数的running任务视为工作协程已失联，可被重新领取
+        self.stale_after = int(os.getenv("INGESTION_STALE_AFTER", "300"))
+        self.max_attempts = int(os.getenv("INGESTION_MAX_ATTEMPTS", "3"))
+        # 进度写库最小间隔，避免逐块更新任务行
+        self.progress_interval = float(os.getenv("INGESTION_PROGRESS_INTERVAL", "1"))
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.pool = None
+        self.document_rag = None
+        self._workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self.stats = {"enqueued": 0, "succeeded": 0, "failed": 0, "retried": 0}
+
+    async def start(self, document_rag):
+        """启动工作协程"""
+        self.document_rag = document_rag
+        self.pool = document_rag.vector_rag.connection_pool
+        if self.pool is None:
+            logger.warning("数据库连接池不可用，文档导入任务队列未启动")
+            return
+        os.makedirs(self.job_dir, exist_ok=True)
+        self._stopping = False
+        self._workers = [
+            asyncio.create_task(self._worker_loop(index)) for index in range(self.concurrency)
+        ]
+        logger.info(f"文档导入任务队列已启动: {self.concurrency} 个工作协程")
+
+    async def stop(self):
+        """停止工作协程；进行中的任务保持running，心跳超时后由其他实例重新领取"""
+        self._stopping = True
+        self._wakeup.set()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def persist_upload(self, upload) -> str:
+        """将请求级临时文件移入任务目录，使其在请求结束后保留"""
+        os.makedirs(self.job_dir, exist_ok=True)
+        job_path = os.path.join(self.job_dir, os.path.basename(upload.path))
+        shutil.move(upload.path, job_path)
+        return job_path
+
+    async def enqueue(
+        self,
+        file_path: str,
+        file_type: str,
+        category: str = "documents",
+        metadata: Dict[str, Any] = None,
+        file_name: str = None,
+        file_sha256: str = None,
+        owns_file: bool = False
+    ) -> str:
+        """任务入队，返回任务ID
+
+        owns_file为True时文件由队列管理，任务成功或最终失败后删除
+        """
+        job_id = str(uuid.uuid4())
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO ingestion_jobs
+                    (id, file_path, file_name, file_type, file_sha256, owns_file, category, metadata, max_attempts)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+                """,
+                uuid.UUID(job_id),
+                file_path,
+                file_name or os.path.basename(file_path),
+                file_type,
+                file_sha256,
+                owns_file,
+                category,
+                json.dumps(metadata or {}),
+                self.max_attempts
+            )
+        self.stats["enqueued"] += 1
+        self._wakeup.set()
+        logger.info(f"文档导入任务入队: {job_id} ({file_name or file_path})")
+        return job_id
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务状态、进度与结果"""
+        try:
+            job_uuid = uuid.UUID(job_id)
+        except ValueError:
+            return None
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow("SELECT * FROM ingestion_jobs WHERE id = $1", job_uuid)
+        return self._row_to_job(row) if row else None
+
+    async def _claim(self) -> Optional[Dict[str, Any]]:
+        """领取一个排队中或心跳超时的任务"""
+        async with self.pool.acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                UPDATE ingestion_jobs
+                SET status = 'running', stage = 'claimed', attempts = attempts + 1,
+                    worker_id = $1, heartbeat_at = CURRENT_TIMESTAMP,
+                    started_at = COALESCE(started_at, CURRENT_TIMESTAMP)
+                WHERE id = (
+                    SELECT id FROM ingestion_jobs
+                    WHERE status = 'queued'
+                       OR (status = 'running' AND heartbeat_at < CURRENT_TIMESTAMP - make_interval(secs => $2))
+                    ORDER BY created_at
+                    FOR UPDATE SKIP LOCKED
+                    LIMIT 1
+                )
+                RETURNING *
+                """,
+                self.worker_id,
+                float(self.stale_after)
+            )
+        return self._row_to_job(row) if row else None
+
+    async def _worker_loop(self, index: int):
+        """工作协程：领取并执行任务，无任务时等待入队通知或轮询"""
+        while not self._stopping:
+            try:
+                job = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"领取导入任务失败: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await self._run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 结果写库等环节失败：重新排队，不让单个任务终止工作协程
+                logger.error(f"执行导入任务异常: {job['id']}, {e}")
+                try:
+                    await self._requeue(job["id"], str(e))
+                except Exception as requeue_error:
+                    # 任务保持running，心跳超时后由工作协程重新领取
+                    logger.error(f"导入任务重新排队失败: {job['id']}, {requeue_error}")
+
+    async def _run_job(self, job: Dict[str, Any]):
+        """执行单个任务"""
+        job_id = job["id"]
+        if job["attempts"] > job["max_attempts"]:
+            await self._finish(job, JOB_FAILED, error=job.get("error") or "超过最大重试次数")
+            return
+
+        start_time = time.perf_counter()
+        last_report = 0.0
+        last_stage = None
+
+        async def report(stage: str, info: Dict[str, Any]):
+            nonlocal last_report, last_stage
+            now = time.perf_counter()
+            if stage == last_stage and now - last_report < self.progress_interval:
+                return
+            last_report = now
+            last_stage = stage
+            await self._update_progress(job_id, stage, info)
+
+        logger.info(f"开始执行导入任务: {job_id} (第{job['attempts']}次)")
+        heartbeat = asyncio.create_task(self._heartbeat_loop(job_id))
+        try:
+            if job["attempts"] > 1:
+                # 重试前清除上次执行已写入的知识块，避免重复索引
+                await self._discard_partial_chunks(job_id)
+            result = await self.document_rag.process_and_index_document(
+                file_path=job["file_path"],
+                file_type=job["file_type"],
+                category=job["category"],
+                metadata={"ingestion_job_id": job_id, **job["metadata"]},
+                progress_callback=report
+            )
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        finally:
+            heartbeat.cancel()
+
+        if result.get("success"):
+            summary = {
+                "document_type": result.get("document_type"),
+                "total_chunks": result.get("total_chunks", 0),
+                "indexed_chunks": result.get("indexed_chunks", 0),
+                "knowledge_ids": [chunk["knowledge_id"] for chunk in result.get("chunks", [])],
+                "pages": len(result.get("processing_result", {}).get("pages", [])),
+                "processing_time": time.perf_counter() - start_time
+            }
+            await self._finish(job, JOB_SUCCEEDED, result=summary)
+            self.stats["succeeded"] += 1
+            logger.info(f"导入任务完成: {job_id}, {summary['indexed_chunks']}个块")
+        elif job["attempts"] < job["max_attempts"]:
+            await self._requeue(job_id, result.get("error"))
+            self.stats["retried"] += 1
+            logger.warning(f"导入任务失败，重新排队: {job_id}, {result.get('error')}")
+        else:
+            await self._finish(job, JOB_FAILED, error=result.get("error"))
+            self.stats["failed"] += 1
+            logger.error(f"导入任务最终失败: {job_id}, {result.get('error')}")
+
+    async def _discard_partial_chunks(self, job_id: str):
+        """删除任务上次执行写入的知识块"""
+        async with self.pool.acquire() as conn:
+            deleted = await conn.execute(
+                "DELETE FROM knowledge_base WHERE metadata->>'ingestion_job_id' = $1", job_id
+            )
+        logger.info(f"导入任务 {job_id} 重试前清理: {deleted}")
+
+    async def _heartbeat_loop(self, job_id: str):
+        """长时间无进度的阶段（如整页OCR）也定期刷新心跳，避免任务被误判失联"""
+        while True:
+            await asyncio.sleep(self.stale_after / 3)
+            try:
+                async with self.pool.acquire() as conn:
+                    await conn.execute(
+                        "UPDATE ingestion_jobs SET heartbeat_at = CURRENT_TIMESTAMP WHERE id = $1 AND worker_id = $2",
+                        uuid.UUID(job_id), self.worker_id
+                    )
+            except Exception as e:
+                logger.warning(f"导入任务心跳失败: {job_id}, {e}")
+
+    async def _update_progress(self, job_id: str, stage: str, info: Dict[str, Any]):
+        """更新阶段进度并刷新心跳"""
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE ingestion_jobs
+                SET stage = $2, progress = $3, heartbeat_at = CURRENT_TIMESTAMP
+                WHERE id = $1 AND worker_id = $4
+                """,
+                uuid.UUID(job_id), stage, json.dumps(info), self.worker_id
+            )
+
+    async def _requeue(self, job_id: str, error: str):
+        """失败任务重新排队"""
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE ingestion_jobs
+                SET status = 'queued', stage = 'queued', error = $2, worker_id = NULL
+                WHERE id = $1
+                """,
+                uuid.UUID(job_id), error
+            )
+        self._wakeup.set()
+
+    async def _finish(self, job: Dict[str, Any], status: str, result: Dict[str, Any] = None, error: str = None):
+        """标记任务结束，并删除队列管理的文件"""
+        async with self.pool.acquire() as conn:
+            await conn.execute(
+                """
+                UPDATE ingestion_jobs
+                SET status = $2, stage = $2, result = $3, error = $4,
+                    heartbeat_at = CURRENT_TIMESTAMP, finished_at = CURRENT_TIMESTAMP
+                WHERE id = $1
+                """,
+                uuid.UUID(job["id"]), status, json.dumps(result) if result else None, error
+            )
+        if job["owns_file"]:
+            try:
+                os.remove(job["file_path"])
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"清理任务文件失败: {job['file_path']}, {e}")
+
+    @staticmethod
+    def _row_to_job(row) -> Dict[str, Any]:
+        """数据库行转为任务字典"""
+        job = dict(row)
+        job["id"] = str(job["id"])
+        for field in ("progress", "metadata", "result"):
+            if isinstance(job.get(field), str):
+                job[field] = json.loads(job[field])
+        for field in ("heartbeat_at", "created_at", "started_at", "finished_at"):
+            if job.get(field):
+                job[field] = job[field].isoformat()
+        return job
+
+    async def get_stats(self) -> Dict[str, Any]:
+        """获取队列统计"""
+        counts = {}
+        if self.pool is not None:
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch("SELECT status, COUNT(*) AS count FROM ingestion_jobs GROUP BY status")
+            counts = {row["status"]: row["count"] for row in rows}
+        return {
+            **self.stats,
+            "workers": len(self._workers),
+            "worker_id": self.worker_id,
+            "jobs_by_status": counts
+        }
+
+
+# 全局实例
+ingestion_job_queue = IngestionJobQueue()
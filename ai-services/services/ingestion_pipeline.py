@@ -0,0 +1,286 @@
+"""
+批量文档导入流水线
+提取、嵌入、写库三个阶段以有界队列衔接并发执行：
+提取在进程池中进行（图片走异步OCR工作进程池），嵌入按批调用模型，
+写库在连接池的多个连接上按批INSERT；各阶段并发度可配置，
+单个文档在任一阶段失败不影响其他文档，汇总报告吞吐量
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+from .document_processor import extract_document_in_worker
+from .embedding_models import knowledge_embedding_text
+from .spawn_pool import create_spawn_executor
+
+_IMAGE_TYPES = ('jpg', 'jpeg', 'png', 'bmp', 'tiff', 'gif')
+
+# 阶段结束标记
+_DONE = object()
+
+
+@dataclass
+class DocumentState:
+    """单个文档在流水线中的状态"""
+    file_path: str
+    file_type: str
+    document_type: str = "unknown"
+    total_chunks: int = 0
+    written_chunks: int = 0
+    failed_chunks: int = 0
+    knowledge_ids: List[int] = field(default_factory=list)
+    error: Optional[str] = None
+    failed_stage: Optional[str] = None
+
+    def to_result(self) -> Dict[str, Any]:
+        success = self.error is None and self.failed_chunks == 0 and self.written_chunks > 0
+        result = {
+            "success": success,
+            "file_path": self.file_path,
+            "file_type": self.file_type,
+            "document_type": self.document_type,
+            "total_chunks": self.total_chunks,
+            "indexed_chunks": self.written_chunks,
+            "knowledge_ids": self.knowledge_ids
+        }
+        if self.error is not None:
+            result.update({"error": self.error, "failed_stage": self.failed_stage})
+        elif self.failed_chunks:
+            result.update({
+                "error": f"{self.failed_chunks}个块写入失败",
+                "failed_stage": "partial",
+                "failed_chunks": self.failed_chunks
+            })
+        elif not self.written_chunks:
+            result.update({"error": "未提取到文本内容", "failed_stage": "extract"})
+        return result
+
+
+class BatchIngestionPipeline:
+    """批量文档导入流水线"""
+
+    def __init__(self, document_rag):
+        self.document_rag = document_rag
+        self.vector_rag = document_rag.vector_rag
+        self.extract_workers = int(os.getenv("INGEST_EXTRACT_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+        self.embed_batch_size = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "64"))
+        self.embed_workers = int(os.getenv("INGEST_EMBED_WORKERS", "1"))
+        self.write_batch_size = int(os.getenv("INGEST_WRITE_BATCH_SIZE", "200"))
+        self.write_workers = int(os.getenv("INGEST_WRITE_WORKERS", "4"))
+        # 阶段间队列容量（块数），下游跟不上时上游阻塞
+        self.queue_size = int(os.getenv("INGEST_QUEUE_SIZE", "2000"))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_workers = 0
+
+    def _get_executor(self, workers: int = None) -> ProcessPoolExecutor:
+        """提取进程池（spawn方式，避免fork已加载嵌入模型的进程；工作进程不重新导入主模块）
+
+        进程池在多次导入间共享，进程数取各次请求的提取并发度的最大值；
+        需要更多进程时新建进程池，旧进程池中已提交的任务继续执行完毕
+        """
+        workers = max(workers or 0, self.extract_workers)
+        if self._executor is not None and self._executor_workers < workers:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._executor is None:
+            self._executor = create_spawn_executor(workers)
+            self._executor_workers = workers
+        return self._executor
+
+    def _discard_executor(self, executor: ProcessPoolExecutor):
+        """丢弃已损坏的进程池（工作进程异常退出），下次提交时重建"""
+        if self._executor is executor:
+            self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _extract_in_pool(self, file_path: str, file_type: str, workers: int) -> Dict[str, Any]:
+        """在进程池中提取文档；进程池损坏时重建并重试一次"""
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            executor = self._get_executor(workers)
+            try:
+                return await loop.run_in_executor(executor, extract_document_in_worker, file_path, file_type)
+            except BrokenProcessPool:
+                self._discard_executor(executor)
+                if attempt:
+                    raise
+                logger.warning(f"提取进程池已损坏，重建后重试: {file_path}")
+
+    def shutdown(self):
+        """关闭提取进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(
+        self,
+        file_paths: List[str],
+        category: str = "documents",
+        metadata: Dict[str, Any] = None,
+        extract_workers: int = None,
+        embed_batch_size: int = None,
+        write_workers: int = None
+    ) -> Dict[str, Any]:
+        """执行批量导入，返回逐文档结果、汇总与吞吐量"""
+        start_time = time.perf_counter()
+        extract_workers = extract_workers or self.extract_workers
+        embed_batch_size = embed_batch_size or self.embed_batch_size
+        write_workers = write_workers or self.write_workers
+
+        states = {
+            file_path: DocumentState(file_path, os.path.splitext(file_path)[1][1:].lower())
+            for file_path in file_paths
+        }
+        path_queue: asyncio.Queue = asyncio.Queue()
+        for file_path in file_paths:
+            path_queue.put_nowait(file_path)
+        chunk_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        write_queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, self.queue_size // embed_batch_size))
+        stage_time = {"extract": 0.0, "embed": 0.0, "write": 0.0}
+
+        async def extract_worker():
+            while True:
+                try:
+                    file_path = path_queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                state = states[file_path]
+                stage_start = time.perf_counter()
+                try:
+                    if state.file_type in _IMAGE_TYPES:
+                        doc = await self.document_rag.document_processor.process_document(file_path, state.file_type)
+                    else:
+                        doc = await self._extract_in_pool(file_path, state.file_type, extract_workers)
+                    state.document_type = doc["document_type"]
+                    chunks = self.document_rag._chunk_document_spans(doc.get("text") or "", doc["document_type"])
+                except Exception as e:
+                    state.error, state.failed_stage = str(e), "extract"
+                    logger.error(f"批量导入提取失败: {file_path}, {e}")
+                    continue
+                finally:
+                    stage_time["extract"] += time.perf_counter() - stage_start
+
+                state.total_chunks = len(chunks)
+                file_name = os.path.basename(file_path)
+                for index, chunk in enumerate(chunks):
+                    await chunk_queue.put((state, {
+                        "category": category,
+                        "title": f"{file_name} - 第{index + 1}部分",
+                        "content": chunk.text,
+                        "metadata": {
+                            "file_path": file_path,
+                            "file_type": state.file_type,
+                            "document_type": state.document_type,
+                            "chunk_index": index,
+                            "total_chunks": len(chunks),
+                            "char_start": chunk.start,
+                            "char_end": chunk.end,
+                            "token_count": chunk.token_count,
+                            "original_metadata": doc.get("structured_data", {}),
+                            **(metadata or {})
+                        }
+                    }))
+
+        async def embed_worker():
+            while True:
+                item = await chunk_queue.get()
+                if item is _DONE:
+                    # 结束标记传递给其他嵌入协程
+                    chunk_queue.put_nowait(_DONE)
+                    return
+                batch = [item]
+                while len(batch) < embed_batch_size:
+                    try:
+                        item = chunk_queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        break
+                    if item is _DONE:
+                        chunk_queue.put_nowait(_DONE)
+                        break
+                    batch.append(item)
+
+                stage_start = time.perf_counter()
+                embeddings = await asyncio.to_thread(
+                    self.vector_rag._get_embeddings,
+                    [knowledge_embedding_text(record["content"]) for _, record in batch],
+                    embed_batch_size
+                )
+                stage_time["embed"] += time.perf_counter() - stage_start
+
+                ready = []
+                for (state, record), embedding in zip(batch, embeddings):
+                    if embedding is not None:
+                        record["embedding"] = embedding
+                        ready.append((state, record))
+                    else:
+                        state.failed_chunks += 1
+                for offset in range(0, len(ready), self.write_batch_size):
+                    await write_queue.put(ready[offset:offset + self.write_batch_size])
+
+        async def write_worker():
+            while True:
+                batch = await write_queue.get()
+                if batch is _DONE:
+                    return
+                stage_start = time.perf_counter()
+                try:
+                    ids = await self.vector_rag.add_knowledge_batch([record for _, record in batch])
+                    for (state, _), knowledge_id in zip(batch, ids):
+                        state.written_chunks += 1
+                        state.knowledge_ids.append(knowledge_id)
+                except Exception as e:
+                    logger.error(f"批量写入知识失败（{len(batch)}块）: {e}")
+                    for state, _ in batch:
+                        state.failed_chunks += 1
+                finally:
+                    stage_time["write"] += time.perf_counter() - stage_start
+
+        writers = [asyncio.create_task(write_worker()) for _ in range(write_workers)]
+        embedders = [asyncio.create_task(embed_worker()) for _ in range(self.embed_workers)]
+        extractors = [asyncio.create_task(extract_worker()) for _ in range(extract_workers)]
+
+        await asyncio.gather(*extractors)
+        await chunk_queue.put(_DONE)
+        await asyncio.gather(*embedders)
+        for _ in writers:
+            await write_queue.put(_DONE)
+        await asyncio.gather(*writers)
+
+        elapsed = time.perf_counter() - start_time
+        results = {file_path: state.to_result() for file_path, state in states.items()}
+        success_count = sum(1 for result in results.values() if result["success"])
+        total_chunks = sum(state.written_chunks for state in states.values())
+        throughput = {
+            "elapsed_seconds": round(elapsed, 3),
+            "docs_per_second": round(len(file_paths) / elapsed, 3) if elapsed else 0.0,
+            "chunks_per_second": round(total_chunks / elapsed, 3) if elapsed else 0.0,
+            "stage_busy_seconds": {stage: round(value, 3) for stage, value in stage_time.items()},
+            "concurrency": {
+                "extract_workers": extract_workers,
+                "embed_workers": self.embed_workers,
+                "embed_batch_size": embed_batch_size,
+                "write_workers": write_workers
+            }
+        }
+        logger.info(
+            f"批量导入完成: {success_count}/{len(file_paths)} 个文档, {total_chunks} 个块, "
+            f"{throughput['docs_per_second']} docs/s, {throughput['chunks_per_second']} chunks/s"
+        )
+
+        return {
+            "results": results,
+            "summary": {
+                "total": len(file_paths),
+                "success": success_count,
+                "error": len(file_paths) - success_count,
+                "indexed_chunks": total_chunks
+            },
+            "throughput": throughput
+        }
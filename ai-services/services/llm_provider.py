@@ -14,6 +14,8 @@ from enum import Enum
 from loguru import logger
 import json
 
+from .resilience import PolicyConfig, ResiliencePolicy, UpstreamHTTPError, resilience_registry
+
 class LLMProvider(Enum):
     """LLM提供商枚举"""
     OPENAI = "openai"
@@ -152,21 +154,21 @@ class LLMProviderManager:
             # 使用指定的模型或默认模型
             model_name = model or provider_config["model"]
             
-            # 根据提供商调用相应的API
-            if provider_enum == LLMProvider.OPENAI:
-                return await self._call_openai_api(provider_config, messages, model_name, temperature, max_tokens)
-            elif provider_enum == LLMProvider.DEEPSEEK:
-                return await self._call_deepseek_api(provider_config, messages, model_name, temperature, max_tokens)
-            elif provider_enum == LLMProvider.QWEN:
-                return await self._call_qwen_api(provider_config, messages, model_name, temperature, max_tokens)
-            elif provider_enum == LLMProvider.ZHIPU:
-                return await self._call_zhipu_api(provider_config, messages, model_name, temperature, max_tokens)
-            elif provider_enum == LLMProvider.BAIDU:
-                return await self._call_baidu_api(provider_config, messages, model_name, temperature, max_tokens)
-            elif provider_enum == LLMProvider.KIMI:
-                return await self._call_kimi_api(provider_config, messages, model_name, temperature, max_tokens)
-            else:
+            call_api = {
+                LLMProvider.OPENAI: self._call_openai_api,
+                LLMProvider.DEEPSEEK: self._call_deepseek_api,
+                LLMProvider.QWEN: self._call_qwen_api,
+                LLMProvider.ZHIPU: self._call_zhipu_api,
+                LLMProvider.BAIDU: self._call_baidu_api,
+                LLMProvider.KIMI: self._call_kimi_api
+            }.get(provider_enum)
+            if call_api is None:
                 raise ValueError(f"不支持的LLM提供商: {provider}")
+            
+            # 根据提供商调用相应的API（经该提供商的熔断、重试与超时策略）
+            return await self._get_policy(provider_enum).call(
+                call_api, provider_config, messages, model_name, temperature, max_tokens
+            )
                 
         except Exception as e:
             logger.error(f"LLM生成回复失败: {e}")
@@ -176,6 +178,15 @@ class LLMProviderManager:
                 "response": "抱歉，我暂时无法处理您的请求，请稍后再试。"
             }
     
+    def _get_policy(self, provider: LLMProvider) -> ResiliencePolicy:
+        """每个提供商独立的弹性策略，单个提供商故障时快速失败而不占满连接"""
+        return resilience_registry.policy(
+            f"llm:{provider.value}",
+            lambda name: ResiliencePolicy.from_config(name, PolicyConfig.from_env(
+                "LLM", timeout=30.0, max_retries=1, retry_base_delay=1.0, failure_threshold=5, breaker_timeout=30
+            ))
+        )
+    
     async def _call_openai_api(self, config: Dict, messages: List[Dict], model: str, temperature: float, max_tokens: int) -> Dict[str, Any]:
         """调用OpenAI API"""
         url = f"{config['base_url']}/chat/completions"
@@ -209,7 +220,7 @@ class LLMProviderManager:
                     }
                 else:
                     error_text = await response.text()
-                    raise Exception(f"OpenAI API调用失败: {response.status} - {error_text}")
+                    raise UpstreamHTTPError(response.status, f"OpenAI API调用失败: {response.status} - {error_text}")
     
     async def _call_deepseek_api(self, config: Dict, messages: List[Dict], model: str, temperature: float, max_tokens: int) -> Dict[str, Any]:
         """调用DeepSeek API"""
@@ -233,7 +244,7 @@ class LLMProviderManager:
                     }
                 else:
                     error_text = await response.text()
-                    raise Exception(f"DeepSeek API调用失败: {response.status} - {error_text}")
+                    raise UpstreamHTTPError(response.status, f"DeepSeek API调用失败: {response.status} - {error_text}")
     
     async def _call_qwen_api(self, config: Dict, messages: List[Dict], model: str, temperature: float, max_tokens: int) -> Dict[str, Any]:
         """调用通义千问API"""
@@ -261,7 +272,7 @@ class LLMProviderManager:
                     }
                 else:
                     error_text = await response.text()
-                    raise Exception(f"通义千问API调用失败: {response.status} - {error_text}")
+                    raise UpstreamHTTPError(response.status, f"通义千问API调用失败: {response.status} - {error_text}")
     
     async def _call_zhipu_api(self, config: Dict, messages: List[Dict], model: str, temperature: float, max_tokens: int) -> Dict[str, Any]:
         """调用智谱AI API"""
@@ -285,7 +296,7 @@ class LLMProviderManager:
                     }
                 else:
                     error_text = await response.text()
-                    raise Exception(f"智谱AI API调用失败: {response.status} - {error_text}")
+                    raise UpstreamHTTPError(response.status, f"智谱AI API调用失败: {response.status} - {error_text}")
     
     async def _call_baidu_api(self, config: Dict, messages: List[Dict], model: str, temperature: float, max_tokens: int) -> Dict[str, Any]:
         """调用百度文心一言API"""
@@ -311,7 +322,7 @@ class LLMProviderManager:
                     }
                 else:
                     error_text = await response.text()
-                    raise Exception(f"百度文心一言API调用失败: {response.status} - {error_text}")
+                    raise UpstreamHTTPError(response.status, f"百度文心一言API调用失败: {response.status} - {error_text}")
     
     async def _call_kimi_api(self, config: Dict, messages: List[Dict], model: str, temperature: float, max_tokens: int) -> Dict[str, Any]:
         """调用月之暗面API"""
@@ -335,7 +346,7 @@ class LLMProviderManager:
                     }
                 else:
                     error_text = await response.text()
-                    raise Exception(f"月之暗面API调用失败: {response.status} - {error_text}")
+                    raise UpstreamHTTPError(response.status, f"月之暗面API调用失败: {response.status} - {error_text}")
     
     async def _get_baidu_access_token(self, api_key: str, secret_key: str) -> str:
         """获取百度API的access_token"""
@@ -352,7 +363,7 @@ class LLMProviderManager:
                     result = await response.json()
                     return result["access_token"]
                 else:
-                    raise Exception(f"获取百度access_token失败: {response.status}")
+                    raise UpstreamHTTPError(response.status, f"获取百度access_token失败: {response.status}")
 
 # 创建全局实例
 llm_provider_manager = LLMProviderManager()
@@ -0,0 +1,357 @@
+"""
+进程内精确向量索引
+bank_info、faq、interest_rates等热点小分类的嵌入按分类常驻为连续的float32矩阵（行已归一化），
+查询时一次矩阵-向量乘得到全部余弦相似度，再用argpartition取top-k，不再经过pgvector往返；
+启动时全量加载，之后按knowledge_base_changed通知增量更新，并以updated_at轮询兜底漏掉的通知。
+未加载或行数超过上限的分类返回None，由调用方回退到PostgreSQL
+"""
+
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+from loguru import logger
+
+from .database import database
+from .embedding_models import embedding_model_registry
+
+
+@dataclass
+class CategorySnapshot:
+    """单个分类的不可变快照：更新时整体替换，查询无需加锁"""
+    category: str
+    model_id: str
+    ids: np.ndarray            # int64，与矩阵行一一对应
+    matrix: np.ndarray         # (行数, 维度) 连续float32，行已L2归一化
+    records: List[Dict[str, Any]]
+    updated_at: Optional[datetime] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.records)
+
+    def replace(self, upserts: Dict[int, Any], removed: Set[int]) -> "CategorySnapshot":
+        """合并变更生成新快照：upserts为 id -> (归一化向量, 记录)，removed为移出本分类的id"""
+        drop = removed | set(upserts)
+        keep = [i for i, row_id in enumerate(self.ids.tolist()) if row_id not in drop]
+        vectors = [self.matrix[keep]] + [vector[None, :] for vector, _ in upserts.values()]
+        return CategorySnapshot(
+            category=self.category,
+            model_id=self.model_id,
+            ids=np.array([self.ids[i] for i in keep] + list(upserts), dtype=np.int64),
+            matrix=np.ascontiguousarray(np.vstack(vectors), dtype=np.float32),
+            records=[self.records[i] for i in keep] + [record for _, record in upserts.values()],
+            updated_at=self.updated_at
+        )
+
+
+def _normalize(vector) -> Optional[np.ndarray]:
+    """转换为本机字节序float32并L2归一化（零向量返回None）"""
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    if norm == 0.0:
+        return None
+    return vector / norm
+
+
+def _row_record(row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "category": row["category"],
+        "title": row["title"],
+        "content": row["content"],
+        "metadata": json.loads(row["metadata"]) if row["metadata"] else {}
+    }
+
+
+class MemoryVectorIndex:
+    """热点分类的进程内精确向量索引"""
+
+    def __init__(self):
+        self.enabled = os.getenv("RAG_MEMORY_INDEX_ENABLED", "false").lower() == "true"
+        self.categories = [
+            category.strip()
+            for category in os.getenv("RAG_MEMORY_INDEX_CATEGORIES", "bank_info,faq,interest_rates").split(",")
+            if category.strip()
+        ]
+        # 超过该行数的分类不常驻内存，继续使用pgvector索引
+        self.max_rows = int(os.getenv("RAG_MEMORY_INDEX_MAX_ROWS", "20000"))
+        # updated_at轮询间隔（兜底通知丢失，如监听连接断开期间的变更）
+        self.poll_interval = float(os.getenv("RAG_MEMORY_INDEX_POLL_SECONDS", "60"))
+        self.snapshots: Dict[str, CategorySnapshot] = {}
+        self.skipped: Dict[str, str] = {}
+        self._pending_ids: Set[int] = set()
+        self._reload_requested = False
+        self._apply_task: Optional[asyncio.Task] = None
+        self._poll_task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self.started = False
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "search_seconds": 0.0,
+            "incremental_updates": 0,
+            "reloads": 0,
+            "last_load_seconds": None
+        }
+
+    async def start(self, vector_rag_service):
+        """全量加载热点分类并订阅知识库变更"""
+        if not self.enabled:
+            return
+        if not database.vector_codec_enabled:
+            logger.warning("vector二进制编解码器未注册，进程内向量索引不启用")
+            return
+        self._lock = asyncio.Lock()
+        self.started = True
+        vector_rag_service.add_change_handler(self._on_change)
+        try:
+            await self.reload()
+        except Exception as e:
+            logger.warning(f"进程内向量索引加载失败，由轮询重试: {e}")
+        if self.poll_interval > 0:
+            self._poll_task = asyncio.create_task(self._poll_loop())
+
+    async def stop(self):
+        for task in (self._poll_task, self._apply_task):
+            if task is not None and not task.done():
+                task.cancel()
+        self._poll_task = self._apply_task = None
+        self.started = False
+
+    @staticmethod
+    def _indexable_sql() -> str:
+        """可常驻的行：有嵌入且非零向量（零向量无法归一化）；加载与轮询行数核对共用"""
+        column = embedding_model_registry.active.column_name
+        return f"{column} IS NOT NULL AND vector_norm({column}) > 0"
+
+    def _select_sql(self, where: str) -> str:
+        column = embedding_model_registry.active.column_name
+        return f"""
+        SELECT id, category, title, content, metadata, {column} AS embedding, updated_at
+        FROM knowledge_base
+        WHERE {self._indexable_sql()} AND {where}
+        """
+
+    async def reload(self):
+        """全量加载各热点分类（启动、嵌入模型切换、轮询发现删除时）"""
+        async with self._lock:
+            start_time = time.perf_counter()
+            model_id = embedding_model_registry.active.model_id
+            snapshots: Dict[str, CategorySnapshot] = {}
+            skipped: Dict[str, str] = {}
+            async with database.acquire() as conn:
+                for category in self.categories:
+                    count = await database.fetchval(
+                        "SELECT COUNT(*) FROM knowledge_base WHERE category = $1", category,
+                        name="memory_index.count", conn=conn
+                    )
+                    if count > self.max_rows:
+                        skipped[category] = f"行数 {count} 超过上限 {self.max_rows}"
+                        continue
+                    rows = await database.fetch(
+                        self._select_sql("category = $1 ORDER BY id"), category,
+                        name="memory_index.load", conn=conn
+                    )
+                    snapshots[category] = self._build(category, model_id, rows)
+            self.snapshots = snapshots
+            self.skipped = skipped
+            self._pending_ids.clear()
+            self.stats["reloads"] += 1
+            self.stats["last_load_seconds"] = time.perf_counter() - start_time
+            logger.info(
+                f"进程内向量索引加载完成: "
+                f"{', '.join(f'{name}={snapshot.size}' for name, snapshot in snapshots.items()) or '无'}"
+                f"{'，跳过: ' + ', '.join(skipped) if skipped else ''}，"
+                f"耗时 {self.stats['last_load_seconds']:.3f}秒"
+            )
+
+    @staticmethod
+    def _build(category: str, model_id: str, rows) -> CategorySnapshot:
+        ids, vectors, records = [], [], []
+        updated_at = None
+        for row in rows:
+            vector = _normalize(row["embedding"])
+            if vector is None:
+                continue
+            ids.append(row["id"])
+            vectors.append(vector)
+            records.append(_row_record(row))
+            if row["updated_at"] is not None and (updated_at is None or row["updated_at"] > updated_at):
+                updated_at = row["updated_at"]
+        dimension = embedding_model_registry.active.dimension
+        matrix = np.vstack(vectors) if vectors else np.empty((0, dimension), dtype=np.float32)
+        return CategorySnapshot(
+            category=category,
+            model_id=model_id,
+            ids=np.array(ids, dtype=np.int64),
+            matrix=np.ascontiguousarray(matrix, dtype=np.float32),
+            records=records,
+            updated_at=updated_at
+        )
+
+    def search(
+        self,
+        category: Optional[str],
+        query_embedding: np.ndarray,
+        max_results: int,
+        similarity_threshold: Optional[float] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """精确余弦top-k；分类未常驻（或嵌入版本不一致）时返回None，由调用方查询PostgreSQL"""
+        snapshot = self.snapshots.get(category) if category else None
+        if (
+            snapshot is None
+            or snapshot.model_id != embedding_model_registry.active.model_id
+            or snapshot.matrix.shape[1] != query_embedding.shape[0]
+        ):
+            self.stats["misses"] += 1
+            return None
+        start_time = time.perf_counter()
+        query = _normalize(query_embedding)
+        if query is None or snapshot.size == 0:
+            self.stats["hits"] += 1
+            return []
+        scores = snapshot.matrix @ query
+        k = min(max_results, snapshot.size)
+        top = np.argpartition(-scores, k - 1)[:k] if k < snapshot.size else np.arange(snapshot.size)
+        top = top[np.argsort(-scores[top], kind="stable")]
+        results = []
+        for index in top:
+            score = float(scores[index])
+            if similarity_threshold is not None and score <= similarity_threshold:
+                break
+            record = snapshot.records[index]
+            results.append(dict(record, metadata=dict(record["metadata"]), similarity_score=score))
+        self.stats["hits"] += 1
+        self.stats["search_seconds"] += time.perf_counter() - start_time
+        return results
+
+    def _on_change(self, change: Dict[str, Any]):
+        """知识库变更回调：合并待更新的id，由后台任务批量拉取"""
+        op = change.get("op")
+        if op == "EMBEDDING_MODEL":
+            # 读取列切换，旧快照立即失效（search回退到PostgreSQL）后全量重载
+            self.snapshots = {}
+            self._reload_requested = True
+        elif change.get("id") is not None:
+            self._pending_ids.add(int(change["id"]))
+        else:
+            return
+        if self._apply_task is None or self._apply_task.done():
+            self._apply_task = asyncio.get_running_loop().create_task(self._apply_pending())
+
+    async def _apply_pending(self):
+        try:
+            while self._reload_requested or self._pending_ids:
+                if self._reload_requested:
+                    self._reload_requested = False
+                    await self.reload()
+                    continue
+                ids, self._pending_ids = self._pending_ids, set()
+                await self._apply_ids(ids)
+        except Exception as e:
+            logger.error(f"进程内向量索引增量更新失败: {e}")
+
+    async def _apply_ids(self, ids: Set[int]):
+        """按id拉取最新行：仍属于热点分类且有嵌入的行写入，其余（删除、改分类、嵌入置空）移出"""
+        async with self._lock:
+            rows = await database.fetch(
+                self._select_sql("id = ANY($1::INTEGER[])"), list(ids), name="memory_index.refresh"
+            )
+            self._merge(rows, removed=ids - {row["id"] for row in rows})
+
+    def _merge(self, rows, removed: Set[int]):
+        """合并变更行到各分类快照"""
+        upserts: Dict[str, Dict[int, Any]] = {}
+        moved = set(removed)
+        for row in rows:
+            vector = _normalize(row["embedding"])
+            if row["category"] in self.snapshots and vector is not None:
+                upserts.setdefault(row["category"], {})[row["id"]] = (vector, _row_record(row))
+            moved.add(row["id"])
+        for category, snapshot in list(self.snapshots.items()):
+            category_upserts = upserts.get(category, {})
+            category_removed = (moved - set(category_upserts)) & set(snapshot.ids.tolist())
+            if not category_upserts and not category_removed:
+                continue
+            updated = snapshot.replace(category_upserts, category_removed)
+            for row in rows:
+                if row["category"] == category and row["updated_at"] is not None and (
+                    updated.updated_at is None or row["updated_at"] > updated.updated_at
+                ):
+                    updated.updated_at = row["updated_at"]
+            if updated.size > self.max_rows:
+                del self.snapshots[category]
+                self.skipped[category] = f"行数超过上限 {self.max_rows}"
+                continue
+            self.snapshots[category] = updated
+            self.stats["incremental_updates"] += 1
+
+    async def _poll_loop(self):
+        """按updated_at拉取通知可能遗漏的新增/更新，行数不一致（漏掉删除）时重载"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self._poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"进程内向量索引轮询失败: {e}")
+
+    async def _poll(self):
+        snapshots = dict(self.snapshots)
+        if not snapshots:
+            # 启动时加载失败：重试全量加载
+            if not self.skipped and not self._reload_requested:
+                await self.reload()
+            return
+        since = min((s.updated_at for s in snapshots.values() if s.updated_at is not None), default=datetime.min)
+        rows = await database.fetch(
+            self._select_sql("category = ANY($1::VARCHAR[]) AND updated_at > $2"), list(snapshots), since,
+            name="memory_index.poll"
+        )
+        if rows:
+            async with self._lock:
+                self._merge(rows, removed=set())
+        counts = await database.fetch(
+            f"SELECT category, COUNT(*) AS count FROM knowledge_base "
+            f"WHERE category = ANY($1::VARCHAR[]) AND {self._indexable_sql()} "
+            f"GROUP BY category",
+            list(snapshots), name="memory_index.poll_counts"
+        )
+        actual = {row["category"]: row["count"] for row in counts}
+        if any(actual.get(category, 0) != snapshot.size for category, snapshot in self.snapshots.items()):
+            await self.reload()
+
+    def get_status(self) -> Dict[str, Any]:
+        hits = self.stats["hits"]
+        return {
+            "enabled": self.enabled,
+            "started": self.started,
+            "categories": {
+                category: {
+                    "rows": snapshot.size,
+                    "dimension": int(snapshot.matrix.shape[1]),
+                    "memory_bytes": int(snapshot.matrix.nbytes),
+                    "model_id": snapshot.model_id,
+                    "updated_at": snapshot.updated_at.isoformat() if snapshot.updated_at else None
+                }
+                for category, snapshot in self.snapshots.items()
+            },
+            "skipped": self.skipped,
+            "hits": hits,
+            "misses": self.stats["misses"],
+            "avg_search_us": self.stats["search_seconds"] / hits * 1e6 if hits else 0.0,
+            "incremental_updates": self.stats["incremental_updates"],
+            "reloads": self.stats["reloads"],
+            "last_load_seconds": self.stats["last_load_seconds"]
+        }
+
+
+# 全局实例
+memory_vector_index = MemoryVectorIndex()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+OCR常驻工作进程池
+每个工作进程启动时加载一次OCR引擎并预热，识别任务以有限并发分发到进程池，
+避免每次识别重新加载PaddleOCR检测/识别模型，也不阻塞事件循环
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional
+
+from PIL import Image, ImageEnhance
+
+from .spawn_pool import create_spawn_executor
+
+logger = logging.getLogger(__name__)
+
+# 当前进程内已加载的引擎（工作进程内常驻；进程池关闭时在主进程线程中懒加载）
+_ENGINES: Dict[str, Any] = {}
+
+
+def preprocess_image(image: Image.Image) -> Image.Image:
+    """图片预处理"""
+    try:
+        # 转换为RGB
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        # 调整图片大小（如果太大）
+        width, height = image.size
+        if width > 2000 or height > 2000:
+            ratio = min(2000 / width, 2000 / height)
+            image = image.resize((int(width * ratio), int(height * ratio)), Image.Resampling.LANCZOS)
+
+        # 增强对比度
+        return ImageEnhance.Contrast(image).enhance(1.5)
+
+    except Exception as e:
+        logger.error(f"图片预处理失败: {e}")
+        return image
+
+
+def _get_paddle_engine():
+    """获取常驻PaddleOCR实例"""
+    engine = _ENGINES.get("paddleocr")
+    if engine is None:
+        from paddleocr import PaddleOCR
+        engine = PaddleOCR(use_angle_cls=True, lang='ch', show_log=False)
+        _ENGINES["paddleocr"] = engine
+    return engine
+
+
+def _init_worker(engines: List[str]):
+    """工作进程初始化：加载引擎并用空白图片预热"""
+    for engine in engines:
+        try:
+            if engine == "paddleocr":
+                paddle = _get_paddle_engine()
+                warmup_path = os.path.join(
+                    os.getenv("TMPDIR", "/tmp"), f"ocr_warmup_{os.getpid()}.png"
+                )
+                Image.new("RGB", (64, 32), "white").save(warmup_path)
+                try:
+                    paddle.ocr(warmup_path, cls=True)
+                finally:
+                    os.remove(warmup_path)
+            elif engine == "tesseract":
+                import pytesseract
+                _ENGINES["tesseract"] = pytesseract.get_tesseract_version()
+        except Exception as e:
+            logger.error(f"OCR工作进程加载 {engine} 失败: {e}")
+
+
+def _worker_ready() -> List[str]:
+    """返回当前进程已加载的引擎"""
+    return list(_ENGINES.keys())
+
+
+def run_tesseract(image_path: str, language: str) -> Optional[Dict[str, Any]]:
+    """Tesseract识别：一次image_to_data同时得到文字、置信度和位置"""
+    import pytesseract
+
+    start_time = time.perf_counter()
+    image = preprocess_image(Image.open(image_path))
+    data = pytesseract.image_to_data(image, lang=language, output_type=pytesseract.Output.DICT)
+
+    lines: Dict[tuple, List[str]] = {}
+    confidences = []
+    bounding_boxes = []
+    for i, word in enumerate(data["text"]):
+        confidence = float(data["conf"][i])
+        word = word.strip()
+        if not word or confidence < 0:
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(word)
+        if confidence > 0:
+            confidences.append(confidence)
+        bounding_boxes.append({
+            "bbox": [data["left"][i], data["top"][i], data["width"][i], data["height"][i]],
+            "text": word,
+            "confidence": confidence / 100.0
+        })
+
+    # 按块/段/行还原文本，段落之间空行分隔
+    text_lines = []
+    previous_paragraph = None
+    for (block, paragraph, _), words in lines.items():
+        if previous_paragraph is not None and (block, paragraph) != previous_paragraph:
+            text_lines.append("")
+        text_lines.append(" ".join(words))
+        previous_paragraph = (block, paragraph)
+
+    return {
+        "text": "\n".join(text_lines).strip(),
+        "confidence": (sum(confidences) / len(confidences) / 100.0) if confidences else 0.0,
+        "processing_time": time.perf_counter() - start_time,
+        "bounding_boxes": bounding_boxes
+    }
+
+
+def run_paddleocr(image_path: str, language: str) -> Optional[Dict[str, Any]]:
+    """PaddleOCR识别（使用常驻实例）"""
+    start_time = time.perf_counter()
+    result = _get_paddle_engine().ocr(image_path, cls=True)
+
+    text_parts = []
+    confidences = []
+    bounding_boxes = []
+    if result and result[0]:
+        for line in result[0]:
+            if line:
+                text_parts.append(line[1][0])
+                confidences.append(line[1][1])
+                bounding_boxes.append({
+                    "bbox": line[0],
+                    "text": line[1][0],
+                    "confidence": line[1][1]
+                })
+
+    return {
+        "text": "\n".join(text_parts),
+        "confidence": sum(confidences) / len(confidences) if confidences else 0.0,
+        "processing_time": time.perf_counter() - start_time,
+        "bounding_boxes": bounding_boxes
+    }
+
+
+_RUNNERS = {
+    "tesseract": run_tesseract,
+    "paddleocr": run_paddleocr
+}
+
+
+class OCRWorkerPool:
+    """OCR常驻工作进程池"""
+
+    def __init__(self):
+        self.enabled = os.getenv("OCR_POOL_ENABLED", "true").lower() == "true"
+        self.max_workers = int(os.getenv("OCR_POOL_WORKERS", "2"))
+        self.max_concurrency = int(os.getenv("OCR_MAX_CONCURRENCY", str(self.max_workers * 2)))
+        self.engines = [e.strip() for e in os.getenv("OCR_POOL_ENGINES", "paddleocr,tesseract").split(",") if e.strip()]
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.ready = False
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "queued": 0}
+
+    def supports(self, engine: str) -> bool:
+        """是否为本地引擎"""
+        return engine in _RUNNERS
+
+    def start(self):
+        """创建进程池（spawn方式，避免fork后的深度学习框架状态问题；工作进程不重新导入主模块）"""
+        if not self.enabled or self.executor is not None:
+            return
+        self.executor = create_spawn_executor(
+            self.max_workers,
+            initializer=_init_worker,
+            initargs=(self.engines,)
+        )
+        logger.info(f"OCR工作进程池已创建: workers={self.max_workers}, engines={self.engines}")
+
+    def _rebuild(self, executor: ProcessPoolExecutor):
+        """工作进程异常退出导致进程池损坏时，关闭旧进程池并重新创建（并发请求只重建一次）"""
+        if self.executor is not executor:
+            return
+        executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = None
+        self.ready = False
+        logger.warning("OCR工作进程池已损坏，重新创建")
+        self.start()
+
+    async def warm_up(self):
+        """启动全部工作进程并等待引擎加载完成"""
+        self.start()
+        if self.executor is None:
+            return
+        loop = asyncio.get_running_loop()
+        start_time = time.perf_counter()
+        loaded = await asyncio.gather(
+            *[loop.run_in_executor(self.executor, _worker_ready) for _ in range(self.max_workers)],
+            return_exceptions=True
+        )
+        if any(isinstance(result, BrokenProcessPool) for result in loaded):
+            self._rebuild(self.executor)
+            return
+        self.ready = True
+        logger.info(f"OCR工作进程预热完成，耗时 {time.perf_counter() - start_time:.2f}秒: {loaded}")
+
+    async def run(self, engine: str, image_path: str, language: str) -> Optional[Dict[str, Any]]:
+        """以有限并发执行一次识别"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        runner = _RUNNERS[engine]
+
+        self.stats["submitted"] += 1
+        self.stats["queued"] += 1
+        async with self._semaphore:
+            self.stats["queued"] -= 1
+            try:
+                if self.enabled:
+                    self.start()
+                    loop = asyncio.get_running_loop()
+                    executor = self.executor
+                    try:
+                        result = await loop.run_in_executor(executor, runner, image_path, language)
+                    except BrokenProcessPool:
+                        # 重建后重新提交一次，仍失败则按识别失败处理
+                        self._rebuild(executor)
+                        result = await loop.run_in_executor(self.executor, runner, image_path, language)
+                else:
+                    result = await asyncio.to_thread(runner, image_path, language)
+                self.stats["completed"] += 1
+                return result
+            except Exception:
+                self.stats["failed"] += 1
+                raise
+
+    def shutdown(self):
+        """关闭进程池"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+            self.ready = False
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取进程池状态"""
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "engines": self.engines,
+            **self.stats
+        }
@@ -0,0 +1,331 @@
+"""
+ONNX Runtime嵌入后端
+将sentence-transformers模型导出为ONNX并做int8动态量化，在CPU上以ONNX Runtime推理；
+按工作进程设置算子内线程数，批内文本按长度排序并只补齐到所属长度桶，减少填充token上的无效计算。
+导出产物（模型、分词器、池化配置）缓存在本地目录，之后加载不再依赖PyTorch
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+from loguru import logger
+
+# 与PyTorch嵌入的最低余弦相似度，低于此值视为量化失真过大
+PARITY_THRESHOLD = 0.99
+
+# 校验与基准测试用的样本文本（覆盖短问句到长段落）
+SAMPLE_TEXTS = [
+    "贷款利率是多少",
+    "工商银行个人消费贷款的申请条件",
+    "提前还款需要支付违约金吗？",
+    "The annual percentage rate depends on credit score and loan term.",
+    "小微企业经营贷款需要提供营业执照、近六个月银行流水以及纳税证明，审批通常需要三到五个工作日。",
+    "等额本息与等额本金两种还款方式的区别在于每月还款额是否固定：等额本息每月还款额相同，"
+    "前期利息占比较高；等额本金每月偿还相同本金，月供逐月递减，总利息更少。",
+    "征信报告中的逾期记录会保留五年，期间申请房贷、车贷或信用卡时银行会综合评估逾期次数、金额与发生时间。",
+    "Loan-to-value ratio, debt-to-income ratio and employment history are the key factors "
+    "lenders review before approving a mortgage application.",
+]
+
+
+def _model_dir_name(model_id: str) -> str:
+    return re.sub(r"[^0-9A-Za-z_.-]+", "_", model_id)
+
+
+def default_intra_op_threads() -> int:
+    """每个工作进程的算子内线程数：CPU核数按工作进程数均分，避免多进程线程超订"""
+    configured = os.getenv("EMBEDDING_INTRA_OP_THREADS")
+    if configured:
+        return max(1, int(configured))
+    workers = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def _length_buckets() -> List[int]:
+    buckets = os.getenv("EMBEDDING_LENGTH_BUCKETS", "16,32,64,128,256,512")
+    return sorted(int(value) for value in buckets.split(",") if value.strip())
+
+
+class OnnxEmbeddingModel:
+    """ONNX Runtime嵌入模型，encode接口与SentenceTransformer一致"""
+
+    def __init__(self, model_dir: str, quantized: bool = True, intra_op_threads: int = None, length_buckets: List[int] = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, "embedding_config.json"), encoding="utf-8") as f:
+            self.config: Dict[str, Any] = json.load(f)
+        self.model_dir = model_dir
+        self.quantized = quantized
+        self.dimension = int(self.config["dimension"])
+        self.max_seq_length = int(self.config["max_seq_length"])
+        self.pooling = self.config.get("pooling", "mean")
+        self.normalize = bool(self.config.get("normalize", False))
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.pad_token_id = self.tokenizer.pad_token_id or 0
+        self.length_buckets = [bucket for bucket in (length_buckets or _length_buckets()) if bucket < self.max_seq_length]
+        self.length_buckets.append(self.max_seq_length)
+
+        self.intra_op_threads = intra_op_threads or default_intra_op_threads()
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.intra_op_threads
+        # 单个请求内串行执行算子，并行度只来自算子内线程
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        model_file = "model.int8.onnx" if quantized else "model.onnx"
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def _bucket(self, length: int) -> int:
+        """不小于length的最小长度桶"""
+        for bucket in self.length_buckets:
+            if bucket >= length:
+                return bucket
+        return self.max_seq_length
+
+    def _run_batch(self, token_ids: List[List[int]]) -> np.ndarray:
+        """补齐到长度桶后推理一批，返回池化后的句向量"""
+        seq_length = self._bucket(max(len(ids) for ids in token_ids))
+        input_ids = np.full((len(token_ids), seq_length), self.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((len(token_ids), seq_length), dtype=np.int64)
+        for row, ids in enumerate(token_ids):
+            input_ids[row, :len(ids)] = ids
+            attention_mask[row, :len(ids)] = 1
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self.session.run(["last_hidden_state"], feeds)[0]
+
+        if self.pooling == "cls":
+            pooled = hidden[:, 0]
+        else:
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.normalize:
+            pooled = pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled.astype(np.float32, copy=False)
+
+    def encode(
+        self,
+        sentences: Union[str, List[str]],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        **kwargs
+    ) -> np.ndarray:
+        """编码文本；批内按长度排序，使每批只补齐到接近的长度桶，结果按输入顺序返回"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        if not texts:
+            return embeddings
+        token_ids = self.tokenizer(texts, truncation=True, max_length=self.max_seq_length)["input_ids"]
+        order = np.argsort([len(ids) for ids in token_ids], kind="stable")
+        for start in range(0, len(texts), batch_size):
+            indices = order[start:start + batch_size]
+            embeddings[indices] = self._run_batch([token_ids[index] for index in indices])
+        return embeddings[0] if single else embeddings
+
+
+def _pooling_config(model) -> Dict[str, Any]:
+    """读取SentenceTransformer的池化方式与是否归一化"""
+    pooling = "mean"
+    normalize = False
+    for module in model:
+        name = type(module).__name__
+        if name == "Pooling":
+            config = module.get_config_dict()
+            if config.get("pooling_mode_cls_token"):
+                pooling = "cls"
+            elif not config.get("pooling_mode_mean_tokens", True):
+                raise ValueError(f"不支持的池化方式: {config}")
+        elif name == "Normalize":
+            normalize = True
+        elif name not in ("Transformer",):
+            raise ValueError(f"不支持导出的模块: {name}")
+    return {"pooling": pooling, "normalize": normalize}
+
+
+def cosine_parity(reference: np.ndarray, candidate: np.ndarray) -> Dict[str, float]:
+    """逐行余弦相似度统计"""
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosine = np.sum(reference * candidate, axis=1)
+    return {"min_cosine": float(cosine.min()), "mean_cosine": float(cosine.mean())}
+
+
+def export_onnx_model(model_id: str, model_dir: str, quantize: bool = True) -> Dict[str, Any]:
+    """导出ONNX模型（需要PyTorch），int8动态量化，并以PyTorch嵌入校验一致性"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    start_time = time.perf_counter()
+    os.makedirs(model_dir, exist_ok=True)
+    reference_model = SentenceTransformer(model_id, device="cpu")
+    config = _pooling_config(reference_model)
+    transformer = reference_model[0]
+    tokenizer = transformer.tokenizer
+    auto_model = transformer.auto_model.eval()
+
+    sample = tokenizer(["导出样本"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            auto_model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_path, os.path.join(model_dir, "model.int8.onnx"), weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(model_dir)
+    config.update({
+        "model_id": model_id,
+        "dimension": reference_model.get_sentence_embedding_dimension(),
+        "max_seq_length": reference_model.max_seq_length,
+        "opset_version": 14
+    })
+    with open(os.path.join(model_dir, "embedding_config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+    onnx_model = OnnxEmbeddingModel(model_dir, quantized=quantize)
+    parity = cosine_parity(
+        np.asarray(reference_model.encode(SAMPLE_TEXTS, convert_to_numpy=True), dtype=np.float32),
+        onnx_model.encode(SAMPLE_TEXTS)
+    )
+    config["parity"] = dict(parity, quantized=quantize, passed=parity["min_cosine"] >= PARITY_THRESHOLD)
+    with open(os.path.join(model_dir, "embedding_config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    logger.info(
+        f"ONNX嵌入模型导出完成: {model_id}, 最小余弦 {parity['min_cosine']:.4f}, "
+        f"耗时 {time.perf_counter() - start_time:.1f}秒"
+    )
+    return config
+
+
+class OnnxEmbeddingBackend:
+    """ONNX嵌入模型的导出缓存与加载"""
+
+    def __init__(self):
+        self.cache_dir = os.getenv("EMBEDDING_ONNX_DIR", os.path.join("models", "onnx"))
+        self.quantize = os.getenv("EMBEDDING_ONNX_QUANTIZE", "true").lower() == "true"
+        self._lock = threading.Lock()
+
+    def model_dir(self, model_id: str) -> str:
+        return os.path.join(self.cache_dir, _model_dir_name(model_id))
+
+    def _artifacts_ready(self, model_dir: str) -> bool:
+        model_file = "model.int8.onnx" if self.quantize else "model.onnx"
+        config_path = os.path.join(model_dir, "embedding_config.json")
+        if not (os.path.exists(os.path.join(model_dir, model_file)) and os.path.exists(config_path)):
+            return False
+        with open(config_path, encoding="utf-8") as f:
+            parity = json.load(f).get("parity") or {}
+        return parity.get("quantized") == self.quantize
+
+    def load(self, model_id: str) -> OnnxEmbeddingModel:
+        """加载ONNX模型，本地无导出产物时先导出；一致性校验未通过时抛出异常"""
+        model_dir = self.model_dir(model_id)
+        with self._lock:
+            if not self._artifacts_ready(model_dir):
+                logger.info(f"导出ONNX嵌入模型: {model_id} -> {model_dir}")
+                export_onnx_model(model_id, model_dir, quantize=self.quantize)
+        model = OnnxEmbeddingModel(model_dir, quantized=self.quantize)
+        parity = model.config.get("parity") or {}
+        if not parity.get("passed"):
+            raise ValueError(
+                f"ONNX嵌入与PyTorch嵌入不一致: 最小余弦 {parity.get('min_cosine')} < {PARITY_THRESHOLD}"
+            )
+        logger.info(
+            f"ONNX嵌入模型加载成功: {model_id} ({'int8' if self.quantize else 'fp32'}, "
+            f"{model.intra_op_threads}线程)"
+        )
+        return model
+
+    def check_parity(self, model_id: str, texts: List[str] = None) -> Dict[str, Any]:
+        """ONNX嵌入与PyTorch嵌入逐条比较余弦相似度"""
+        from sentence_transformers import SentenceTransformer
+
+        texts = texts or SAMPLE_TEXTS
+        reference = SentenceTransformer(model_id, device="cpu").encode(texts, convert_to_numpy=True)
+        candidate = self.load(model_id).encode(texts)
+        parity = cosine_parity(np.asarray(reference, dtype=np.float32), candidate)
+        parity.update({"texts": len(texts), "threshold": PARITY_THRESHOLD, "passed": parity["min_cosine"] >= PARITY_THRESHOLD})
+        return parity
+
+    def benchmark(self, model_id: str, batch_size: int = 32, num_texts: int = 256, single_queries: int = 50) -> Dict[str, Any]:
+        """对比PyTorch与ONNX后端的批量吞吐和单条查询延迟"""
+        from sentence_transformers import SentenceTransformer
+
+        texts = [SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)] for i in range(num_texts)]
+        backends = {
+            "torch": SentenceTransformer(model_id, device="cpu"),
+            "onnx": self.load(model_id)
+        }
+        results: Dict[str, Any] = {}
+        embeddings: Dict[str, np.ndarray] = {}
+        for name, model in backends.items():
+            model.encode(texts[:batch_size], batch_size=batch_size)  # 预热
+            start_time = time.perf_counter()
+            embeddings[name] = np.asarray(model.encode(texts, batch_size=batch_size, convert_to_numpy=True), dtype=np.float32)
+            batch_seconds = time.perf_counter() - start_time
+            start_time = time.perf_counter()
+            for i in range(single_queries):
+                model.encode(SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)])
+            single_seconds = (time.perf_counter() - start_time) / single_queries
+            results[name] = {
+                "texts_per_second": num_texts / batch_seconds if batch_seconds > 0 else None,
+                "single_query_ms": single_seconds * 1000
+            }
+        onnx_model = backends["onnx"]
+        return {
+            "model_id": model_id,
+            "batch_size": batch_size,
+            "num_texts": num_texts,
+            "quantized": onnx_model.quantized,
+            "intra_op_threads": onnx_model.intra_op_threads,
+            "length_buckets": onnx_model.length_buckets,
+            "torch": results["torch"],
+            "onnx": results["onnx"],
+            "speedup": (
+                results["onnx"]["texts_per_second"] / results["torch"]["texts_per_second"]
+                if results["torch"]["texts_per_second"] else None
+            ),
+            "parity": cosine_parity(embeddings["torch"], embeddings["onnx"])
+        }
+
+
+def load_embedding_model(model_id: str, backend: str = None) -> Optional[Any]:
+    """按配置的后端（EMBEDDING_BACKEND: torch | onnx）加载嵌入模型，ONNX加载失败时回退到PyTorch"""
+    backend = (backend or os.getenv("EMBEDDING_BACKEND", "torch")).lower()
+    if backend == "onnx":
+        try:
+            return onnx_embedding_backend.load(model_id)
+        except ImportError as e:
+            logger.warning(f"onnxruntime不可用，回退到PyTorch嵌入后端: {e}")
+        except Exception as e:
+            logger.error(f"ONNX嵌入模型加载失败，回退到PyTorch嵌入后端: {model_id}, {e}")
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_id)
+
+
+# 全局实例
+onnx_embedding_backend = OnnxEmbeddingBackend()
@@ -15,6 +15,8 @@ import json
 from functools import wraps
 import weakref
 
+from .database import database
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -271,11 +273,8 @@ class PerformanceOptimizer:
             disk_io = psutil.disk_io_counters()
             network_io = psutil.net_io_counters()
             
-            # 连接池指标
-            active_connections = 0
-            for pool_name in self.connection_pool_manager.pools:
-                pool_status = await self.connection_pool_manager.get_pool_status(pool_name)
-                active_connections += pool_status.get('idle_size', 0)
+            # 连接池指标（统一数据库访问层中正在使用的连接数）
+            active_connections = database.get_pool_stats().get('in_use', 0)
             
             # 响应时间（简化计算）
             response_time_avg = 0.0
@@ -361,7 +360,7 @@ class PerformanceOptimizer:
     async def get_performance_summary(self) -> Dict[str, Any]:
         """获取性能摘要"""
         if not self.metrics_history:
-            return {"status": "no_data"}
+            return {"status": "no_data", "database": database.get_stats()}
         
         latest_metrics = self.metrics_history[-1]
         recent_metrics = self.metrics_history[-10:] if len(self.metrics_history) >= 10 else self.metrics_history
@@ -388,6 +387,7 @@ class PerformanceOptimizer:
                 name: await self.connection_pool_manager.get_pool_status(name)
                 for name in self.connection_pool_manager.pools
             },
+            "database": database.get_stats(),
             "timestamp": latest_metrics.timestamp.isoformat()
         }
     
@@ -416,10 +416,13 @@ class PerformanceOptimizer:
             await self.cache_manager.clear()
             
             # 优化连接池
-            for pool_name in self.connection_pool_manager.pools:
-                pool_status = await self.connection_pool_manager.get_pool_status(pool_name)
-                if pool_status.get('idle_size', 0) > pool_status.get('size', 0) * 0.5:
-                    logger.info(f"连接池 {pool_name} 空闲连接过多，考虑减少池大小")
+            pool_stats = database.get_pool_stats()
+            if pool_stats.get('status') == 'active':
+                if pool_stats['waiting'] > 0 or pool_stats['acquire_wait_p95_ms'] > 100:
+                    logger.info(f"数据库连接池饱和（排队 {pool_stats['waiting']}，"
+                                f"获取等待P95 {pool_stats['acquire_wait_p95_ms']:.1f}ms），考虑增大DB_POOL_MAX_SIZE")
+                elif pool_stats['idle'] > pool_stats['size'] * 0.5:
+                    logger.info("数据库连接池空闲连接过多，考虑减少DB_POOL_MIN_SIZE")
             
             logger.info("性能优化完成")
             
@@ -0,0 +1,123 @@
+"""
+向量化定价内核
+以NumPy数组一次性计算 (金额, 期限, 利率) 场景网格的等额本息月供、总利息、
+精确APR（向量化牛顿迭代求解内部收益率）以及完整还款计划表
+"""
+
+from functools import lru_cache
+from typing import Dict
+
+import numpy as np
+
+# APR求解参数
+_APR_MAX_ITERATIONS = 50
+_APR_TOLERANCE = 1e-12
+_APR_CAP = 1.0  # 最高100%
+
+
+@lru_cache(maxsize=4096)
+def annuity_factor(annual_rate: float, months: int) -> float:
+    """等额本息年金系数：月供 = 本金 × 系数
+
+    标量版本带缓存，同一引擎中利率与期限组合高度重复
+    """
+    return float(annuity_factors(np.array([annual_rate]), np.array([months]))[0])
+
+
+def annuity_factors(annual_rates, months) -> np.ndarray:
+    """向量化年金系数 r / (1 - (1+r)^-n)，利率为0时为 1/n"""
+    monthly_rates = np.asarray(annual_rates, dtype=np.float64) / 12
+    months = np.asarray(months, dtype=np.float64)
+    # (1+r)^n - 1 用expm1(n·log1p(r))计算，小利率下无精度损失
+    growth_minus_one = np.expm1(months * np.log1p(monthly_rates))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factors = monthly_rates * (growth_minus_one + 1) / growth_minus_one
+    return np.where(monthly_rates == 0, 1.0 / months, factors)
+
+
+def monthly_payments(principals, annual_rates, months) -> np.ndarray:
+    """向量化月供"""
+    return np.asarray(principals, dtype=np.float64) * annuity_factors(annual_rates, months)
+
+
+def solve_apr(net_principals, payments, months, initial_annual_rates=None) -> np.ndarray:
+    """向量化牛顿迭代求解APR
+
+    求月利率r使 payment × (1 - (1+r)^-n) / r = 实际到手本金，APR = 12r。
+    到手本金非正或还款总额不超过到手本金的场景APR记为0
+    """
+    net, payments, months = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(net_principals, dtype=np.float64)),
+        np.atleast_1d(np.asarray(payments, dtype=np.float64)),
+        np.atleast_1d(np.asarray(months, dtype=np.float64))
+    )
+
+    solvable = (net > 0) & (payments * months > net)
+    if initial_annual_rates is None:
+        rate = np.full(net.shape, 0.01)
+    else:
+        rate = np.broadcast_to(np.asarray(initial_annual_rates, dtype=np.float64) / 12, net.shape).copy()
+    rate = np.maximum(rate, 1e-6).astype(np.float64)
+
+    active = solvable.copy()
+    for _ in range(_APR_MAX_ITERATIONS):
+        if not active.any():
+            break
+        r = rate[active]
+        n = months[active]
+        pmt = payments[active]
+        discount = np.exp(-n * np.log1p(r))           # (1+r)^-n
+        pv = pmt * (1 - discount) / r
+        dpv = pmt * (n * discount / (r * (1 + r)) - (1 - discount) / (r * r))
+        step = (pv - net[active]) / dpv
+        new_rate = np.maximum(r - step, 1e-9)
+        rate[active] = new_rate
+        converged = np.abs(new_rate - r) < _APR_TOLERANCE
+        active_idx = np.flatnonzero(active)
+        active[active_idx[converged]] = False
+
+    apr = np.where(solvable, rate * 12, 0.0)
+    return np.minimum(apr, _APR_CAP)
+
+
+def amortization_schedule(principal: float, annual_rate: float, months: int) -> Dict[str, np.ndarray]:
+    """等额本息还款计划表（闭式计算，无逐期循环）
+
+    第k期期末余额 B_k = P(1+r)^k - PMT((1+r)^k - 1)/r
+    """
+    months = int(months)
+    r = annual_rate / 12
+    payment = principal * annuity_factor(annual_rate, months)
+    periods = np.arange(1, months + 1, dtype=np.float64)
+    if r == 0:
+        balances = principal - payment * periods
+    else:
+        growth = np.exp(periods * np.log1p(r))
+        balances = principal * growth - payment * (growth - 1) / r
+    balances = np.maximum(balances, 0.0)
+    balances[-1] = 0.0
+    opening = np.concatenate(([principal], balances[:-1]))
+    interest = opening * r
+    principal_paid = opening - balances
+    return {
+        "period": periods.astype(np.int64),
+        "payment": interest + principal_paid,
+        "interest": interest,
+        "principal": principal_paid,
+        "balance": balances
+    }
+
+
+def scenario_grid(amounts, terms, rates) -> Dict[str, np.ndarray]:
+    """展开 (金额, 期限, 利率) 笛卡尔积为扁平数组"""
+    amount_grid, term_grid, rate_grid = np.meshgrid(
+        np.asarray(amounts, dtype=np.float64),
+        np.asarray(terms, dtype=np.int64),
+        np.asarray(rates, dtype=np.float64),
+        indexing="ij"
+    )
+    return {
+        "loan_amount": amount_grid.ravel(),
+        "term_months": term_grid.ravel(),
+        "interest_rate": rate_grid.ravel()
+    }
@@ -13,6 +13,8 @@ from loguru import logger
 from datetime import datetime
 import time
 
+from .resilience import fetch_web_text
+
 class RealWebSearchService:
     """真正的外网搜索服务"""
     
@@ -93,18 +95,9 @@ class RealWebSearchService:
             params = config["params"].copy()
             params[list(params.keys())[0]] = query
             
-            async with self.session.get(
-                config["url"], 
-                params=params, 
-                headers=config["headers"]
-            ) as response:
-                if response.status == 200:
-                    content = await response.text()
-                    return await self._parse_search_page(content, engine_name)
-                else:
-                    logger.warning(f"{engine_name}搜索失败: HTTP {response.status}")
-                    return []
-                    
+            content = await fetch_web_text(self.session, config["url"], params=params, headers=config["headers"])
+            return await self._parse_search_page(content, engine_name)
+            
         except Exception as e:
             logger.error(f"{engine_name}搜索异常: {e}")
             return []
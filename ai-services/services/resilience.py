@@ -0,0 +1,729 @@
+"""
+异步弹性组件
+熔断、限流、重试（全抖动退避）、超时与舱壁隔离，供LLM、第三方征信/KYC、外网搜索等出站调用共用。
+所有组件只在事件循环线程内使用，状态修改之间没有await，因此不加锁；计时统一使用单调时钟，
+滑动窗口按时间分桶计数，单次判定为O(1)
+"""
+
+import asyncio
+import inspect
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Any, Callable, Deque, Dict, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+from loguru import logger
+
+
+class CircuitState(Enum):
+    """熔断器状态"""
+    CLOSED = "closed"      # 正常状态
+    OPEN = "open"          # 熔断状态
+    HALF_OPEN = "half_open"  # 半开状态
+
+
+class RateLimitType(Enum):
+    """限流类型"""
+    FIXED_WINDOW = "fixed_window"
+    SLIDING_WINDOW = "sliding_window"
+    TOKEN_BUCKET = "token_bucket"
+    LEAKY_BUCKET = "leaky_bucket"
+
+
+@dataclass
+class CircuitBreakerConfig:
+    """熔断器配置"""
+    failure_threshold: int = 5      # 窗口内失败次数阈值
+    success_threshold: int = 3      # 半开状态恢复所需成功次数
+    timeout: int = 60               # 熔断持续时间（秒）
+    half_open_max_calls: int = 3    # 半开状态最大探测调用数
+    window_size: int = 60           # 失败统计滑动窗口（秒）
+    failure_rate_threshold: float = 0.5  # 窗口内失败率阈值，与失败次数阈值同时满足才熔断
+
+
+@dataclass
+class RateLimitConfig:
+    """限流配置"""
+    limit_type: RateLimitType = RateLimitType.SLIDING_WINDOW
+    max_requests: int = 100         # 窗口内最大请求数
+    window_size: int = 60           # 时间窗口（秒）
+    burst_size: int = 10            # 突发请求数（令牌桶容量/漏桶容忍度）
+    refill_rate: float = 1.0        # 令牌补充速率（个/秒）
+
+
+@dataclass
+class RetryConfig:
+    """重试配置"""
+    max_retries: int = 3            # 最大重试次数
+    base_delay: float = 1.0         # 基础延迟（秒）
+    max_delay: float = 60.0         # 最大延迟（秒）
+    exponential_base: float = 2.0   # 指数退避基数
+    jitter: bool = True             # 是否使用全抖动
+
+
+class ResilienceError(Exception):
+    """调用被弹性组件拒绝（未访问下游）"""
+
+    def __init__(self, name: str, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(ResilienceError):
+    """熔断器开启"""
+
+    def __init__(self, name: str, retry_after: float = 0.0):
+        super().__init__(name, f"熔断器 {name} 处于熔断状态", retry_after)
+
+
+class RateLimitedError(ResilienceError):
+    """触发限流"""
+
+    def __init__(self, name: str, retry_after: float = 0.0):
+        super().__init__(name, f"限流器 {name} 触发限流", retry_after)
+
+
+class BulkheadFullError(ResilienceError):
+    """舱壁并发已满"""
+
+    def __init__(self, name: str):
+        super().__init__(name, f"舱壁 {name} 并发已满")
+
+
+class UpstreamHTTPError(Exception):
+    """下游返回非成功状态码"""
+
+    def __init__(self, status: int, message: str = None):
+        super().__init__(message or f"HTTP {status}")
+        self.status = status
+
+    @property
+    def retryable(self) -> bool:
+        """429与5xx可重试；其余4xx为请求本身的问题，重试无意义"""
+        return self.status == 429 or self.status >= 500
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """默认重试判定：超时、连接错误、429/5xx"""
+    if isinstance(exc, ResilienceError):
+        return False
+    if isinstance(exc, UpstreamHTTPError):
+        return exc.retryable
+    # requests的连接/超时异常继承自OSError
+    return isinstance(exc, (asyncio.TimeoutError, OSError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError))
+
+
+def is_failure(exc: BaseException) -> bool:
+    """默认熔断失败判定：4xx不代表下游不可用，不计入失败"""
+    if isinstance(exc, UpstreamHTTPError):
+        return exc.retryable
+    return not isinstance(exc, ResilienceError)
+
+
+class SlidingWindowCounter:
+    """按时间分桶的滑动窗口计数器：环形数组保存各桶计数并维护总和，每次最多清理一轮桶"""
+
+    def __init__(self, window: float, buckets: int = 10):
+        self.window = float(window)
+        self.buckets = max(1, int(buckets))
+        self.width = self.window / self.buckets
+        self._counts = [0] * self.buckets
+        self._epoch = 0
+        self.total = 0
+
+    def _advance(self, now: float):
+        epoch = int(now / self.width)
+        gap = epoch - self._epoch
+        if gap <= 0:
+            return
+        if gap >= self.buckets:
+            for i in range(self.buckets):
+                self._counts[i] = 0
+            self.total = 0
+        else:
+            for step in range(1, gap + 1):
+                index = (self._epoch + step) % self.buckets
+                self.total -= self._counts[index]
+                self._counts[index] = 0
+        self._epoch = epoch
+
+    def add(self, n: int = 1, now: float = None):
+        self._advance(time.monotonic() if now is None else now)
+        self._counts[self._epoch % self.buckets] += n
+        self.total += n
+
+    def count(self, now: float = None) -> int:
+        self._advance(time.monotonic() if now is None else now)
+        return self.total
+
+    def next_expiry(self, now: float) -> float:
+        """最早一个非空桶滑出窗口的剩余秒数（仅在拒绝路径使用）"""
+        self._advance(now)
+        for step in range(1, self.buckets + 1):
+            epoch = self._epoch - self.buckets + step
+            if self._counts[epoch % self.buckets]:
+                return max((epoch + self.buckets) * self.width - now, 0.0)
+        return 0.0
+
+
+class CircuitBreaker:
+    """熔断器：滑动窗口内失败次数与失败率同时超限时熔断，超时后半开放行少量探测调用"""
+
+    def __init__(self, name: str, config: CircuitBreakerConfig = None):
+        self.name = name
+        self.config = config or CircuitBreakerConfig()
+        self.reset()
+
+    def reset(self):
+        """按当前配置重建状态"""
+        self.state = CircuitState.CLOSED
+        self._calls = SlidingWindowCounter(self.config.window_size)
+        self._failures = SlidingWindowCounter(self.config.window_size)
+        self.success_count = 0
+        self.half_open_calls = 0
+        self.opened_at = 0.0
+        self.last_failure_time: Optional[datetime] = None
+        self.trips = 0
+
+    @property
+    def failure_count(self) -> int:
+        return self._failures.count()
+
+    def retry_after(self) -> float:
+        if self.state != CircuitState.OPEN:
+            return 0.0
+        return max(self.opened_at + self.config.timeout - time.monotonic(), 0.0)
+
+    def can_execute(self) -> bool:
+        """检查是否可以执行（半开状态下会占用一个探测名额）"""
+        if self.state == CircuitState.CLOSED:
+            return True
+        if self.state == CircuitState.OPEN:
+            if time.monotonic() - self.opened_at < self.config.timeout:
+                return False
+            self.state = CircuitState.HALF_OPEN
+            self.success_count = 0
+            self.half_open_calls = 0
+        if self.half_open_calls < self.config.half_open_max_calls:
+            self.half_open_calls += 1
+            return True
+        return False
+
+    def record_success(self):
+        """记录成功"""
+        if self.state == CircuitState.CLOSED:
+            self._calls.add()
+        elif self.state == CircuitState.HALF_OPEN:
+            self.success_count += 1
+            if self.success_count >= self.config.success_threshold:
+                self.state = CircuitState.CLOSED
+                self._calls = SlidingWindowCounter(self.config.window_size)
+                self._failures = SlidingWindowCounter(self.config.window_size)
+                self.success_count = 0
+                logger.info(f"熔断器 {self.name} 恢复正常")
+
+    def record_failure(self):
+        """记录失败"""
+        self.last_failure_time = datetime.now()
+        if self.state == CircuitState.HALF_OPEN:
+            self._open()
+            logger.warning(f"熔断器 {self.name} 重新熔断")
+        elif self.state == CircuitState.CLOSED:
+            now = time.monotonic()
+            self._calls.add(1, now)
+            self._failures.add(1, now)
+            failures = self._failures.total
+            if failures >= self.config.failure_threshold and \
+                    failures >= self._calls.total * self.config.failure_rate_threshold:
+                self._open()
+                logger.warning(f"熔断器 {self.name} 触发熔断")
+
+    def record_ignored(self):
+        """调用既不算成功也不算失败（取消、4xx），归还半开探测名额"""
+        if self.state == CircuitState.HALF_OPEN and self.half_open_calls > 0:
+            self.half_open_calls -= 1
+
+    def _open(self):
+        self.state = CircuitState.OPEN
+        self.opened_at = time.monotonic()
+        self.trips += 1
+
+    def get_state(self) -> Dict[str, Any]:
+        """获取状态"""
+        return {
+            "name": self.name,
+            "state": self.state.value,
+            "failure_count": self.failure_count,
+            "call_count": self._calls.count(),
+            "success_count": self.success_count,
+            "half_open_calls": self.half_open_calls,
+            "trips": self.trips,
+            "retry_after": round(self.retry_after(), 3),
+            "last_failure_time": self.last_failure_time.isoformat() if self.last_failure_time else None
+        }
+
+
+class RateLimiter:
+    """限流器：令牌桶、分桶滑动窗口、固定窗口与漏桶（GCRA），判定均为O(1)"""
+
+    def __init__(self, name: str, config: RateLimitConfig = None):
+        self.name = name
+        self.config = config or RateLimitConfig()
+        self.reset()
+
+    def reset(self):
+        """按当前配置重建状态"""
+        now = time.monotonic()
+        self.tokens = float(self.config.burst_size)
+        self._last_refill = now
+        self._window = SlidingWindowCounter(self.config.window_size)
+        self._fixed_start = 0.0
+        self._fixed_count = 0
+        # 漏桶的理论到达时间
+        self._tat = now
+        self.allowed = 0
+        self.rejected = 0
+
+    def _wait_time(self, now: float) -> float:
+        """距离下一个可用名额的秒数，0表示当前可放行"""
+        limit_type = self.config.limit_type
+        if limit_type == RateLimitType.TOKEN_BUCKET:
+            self.tokens = min(float(self.config.burst_size),
+                              self.tokens + (now - self._last_refill) * self.config.refill_rate)
+            self._last_refill = now
+            if self.tokens >= 1:
+                return 0.0
+            if self.config.refill_rate <= 0:
+                return float(self.config.window_size)
+            return (1 - self.tokens) / self.config.refill_rate
+        if limit_type == RateLimitType.SLIDING_WINDOW:
+            if self._window.count(now) < self.config.max_requests:
+                return 0.0
+            return max(self._window.next_expiry(now), 1e-3)
+        if limit_type == RateLimitType.FIXED_WINDOW:
+            window_start = now - now % self.config.window_size
+            if window_start != self._fixed_start:
+                self._fixed_start = window_start
+                self._fixed_count = 0
+            if self._fixed_count < self.config.max_requests:
+                return 0.0
+            return window_start + self.config.window_size - now
+        if limit_type == RateLimitType.LEAKY_BUCKET:
+            interval = self.config.window_size / max(self.config.max_requests, 1)
+            tolerance = interval * max(self.config.burst_size - 1, 0)
+            return max(max(self._tat, now) - tolerance - now, 0.0)
+        return 0.0
+
+    def _consume(self, now: float):
+        limit_type = self.config.limit_type
+        if limit_type == RateLimitType.TOKEN_BUCKET:
+            self.tokens -= 1
+        elif limit_type == RateLimitType.SLIDING_WINDOW:
+            self._window.add(1, now)
+        elif limit_type == RateLimitType.FIXED_WINDOW:
+            self._fixed_count += 1
+        elif limit_type == RateLimitType.LEAKY_BUCKET:
+            self._tat = max(self._tat, now) + self.config.window_size / max(self.config.max_requests, 1)
+        self.allowed += 1
+
+    def try_acquire(self) -> bool:
+        """尝试获取一个名额，不等待"""
+        now = time.monotonic()
+        if self._wait_time(now) <= 0:
+            self._consume(now)
+            return True
+        self.rejected += 1
+        return False
+
+    # 兼容旧接口
+    is_allowed = try_acquire
+
+    def available(self) -> bool:
+        """当前是否有可用名额（不消耗）"""
+        return self._wait_time(time.monotonic()) <= 0
+
+    def retry_after(self) -> float:
+        return self._wait_time(time.monotonic())
+
+    async def acquire(self, max_wait: float = 0.0):
+        """获取名额，最多等待max_wait秒，等不到则抛出RateLimitedError"""
+        deadline = time.monotonic() + max_wait
+        while True:
+            now = time.monotonic()
+            wait = self._wait_time(now)
+            if wait <= 0:
+                self._consume(now)
+                return
+            if now + wait > deadline:
+                self.rejected += 1
+                raise RateLimitedError(self.name, wait)
+            await asyncio.sleep(wait)
+
+    def get_state(self) -> Dict[str, Any]:
+        """获取状态"""
+        limit_type = self.config.limit_type
+        if limit_type == RateLimitType.SLIDING_WINDOW:
+            current_requests = self._window.count()
+        elif limit_type == RateLimitType.FIXED_WINDOW:
+            current_requests = self._fixed_count
+        else:
+            current_requests = None
+        return {
+            "name": self.name,
+            "limit_type": limit_type.value,
+            "max_requests": self.config.max_requests,
+            "window_size": self.config.window_size,
+            "current_requests": current_requests,
+            "tokens": round(self.tokens, 3) if limit_type == RateLimitType.TOKEN_BUCKET else None,
+            "allowed": self.allowed,
+            "rejected": self.rejected
+        }
+
+
+class RetryPolicy:
+    """重试策略：指数退避 + 全抖动（在[0, 退避上限]内均匀取值，避免大量调用方同步重试）"""
+
+    def __init__(self, config: RetryConfig = None, retry_on: Callable[[BaseException], bool] = None):
+        self.config = config or RetryConfig()
+        self.retry_on = retry_on or is_transient_error
+
+    def delay(self, attempt: int) -> float:
+        cap = min(self.config.base_delay * (self.config.exponential_base ** attempt), self.config.max_delay)
+        return random.uniform(0, cap) if self.config.jitter else cap
+
+
+class Bulkhead:
+    """舱壁：限制同时进行的下游调用数，超出时最多排队max_wait秒"""
+
+    def __init__(self, name: str, max_concurrent: int, max_wait: float = 0.0):
+        self.name = name
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.rejected = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self):
+        # 清理队首已超时/取消的等待者
+        while self._waiters and self._waiters[0].done():
+            self._waiters.popleft()
+        if self.in_flight < self.max_concurrent and not self._waiters:
+            self.in_flight += 1
+            return
+        if self.max_wait <= 0:
+            self.rejected += 1
+            raise BulkheadFullError(self.name)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise BulkheadFullError(self.name)
+        except asyncio.CancelledError:
+            # 名额已移交但等待方被取消，归还名额
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        """释放名额：优先直接移交给排队中的调用（已超时/取消的等待者跳过）"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def get_state(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self.in_flight,
+            "queued": sum(1 for waiter in self._waiters if not waiter.done()),
+            "rejected": self.rejected
+        }
+
+
+def _env_float(key: str, default: float) -> float:
+    value = os.getenv(key)
+    return float(value) if value else default
+
+
+@dataclass
+class PolicyConfig:
+    """弹性策略配置，数值为0表示不启用对应组件"""
+    timeout: float = 30.0
+    max_retries: int = 1
+    retry_base_delay: float = 0.5
+    retry_max_delay: float = 5.0
+    failure_threshold: int = 5
+    breaker_timeout: int = 60
+    rate_per_second: float = 0.0
+    burst: int = 10
+    rate_limit_wait: float = 0.0
+    max_concurrent: int = 0
+    queue_wait: float = 0.0
+
+    @classmethod
+    def from_env(cls, prefix: str, **defaults) -> "PolicyConfig":
+        """按 <PREFIX>_* 环境变量覆盖默认值，如 LLM_TIMEOUT、WEB_SEARCH_RATE_PER_SECOND"""
+        config = cls(**defaults)
+        for name, value in list(vars(config).items()):
+            override = os.getenv(f"{prefix}_{name.upper()}")
+            if override:
+                setattr(config, name, int(float(override)) if isinstance(value, int) else float(override))
+        return config
+
+
+@dataclass
+class PolicyStats:
+    """单个策略的调用统计"""
+    calls: int = 0
+    successes: int = 0
+    failures: int = 0
+    retries: int = 0
+    timeouts: int = 0
+    short_circuited: int = 0
+    rate_limited: int = 0
+    bulkhead_rejected: int = 0
+    total_latency: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "successes": self.successes,
+            "failures": self.failures,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "short_circuited": self.short_circuited,
+            "rate_limited": self.rate_limited,
+            "bulkhead_rejected": self.bulkhead_rejected,
+            "average_latency": self.total_latency / self.calls if self.calls else 0.0,
+            "success_rate": self.successes / self.calls if self.calls else 0.0
+        }
+
+
+class ResiliencePolicy:
+    """组合策略：舱壁 → 重试{限流 → 熔断 → 超时(调用)}；各组件均可为空"""
+
+    def __init__(
+        self,
+        name: str,
+        breaker: CircuitBreaker = None,
+        limiter: RateLimiter = None,
+        retry: RetryPolicy = None,
+        timeout: float = None,
+        bulkhead: Bulkhead = None,
+        rate_limit_wait: float = 0.0,
+        failure_on: Callable[[BaseException], bool] = None
+    ):
+        self.name = name
+        self.breaker = breaker
+        self.limiter = limiter
+        self.retry = retry
+        self.timeout = timeout or None
+        self.bulkhead = bulkhead
+        self.rate_limit_wait = rate_limit_wait
+        self.failure_on = failure_on or is_failure
+        self.stats = PolicyStats()
+
+    @classmethod
+    def from_config(cls, name: str, config: PolicyConfig, retry_on: Callable[[BaseException], bool] = None) -> "ResiliencePolicy":
+        limiter = None
+        if config.rate_per_second > 0:
+            limiter = RateLimiter(name, RateLimitConfig(
+                limit_type=RateLimitType.TOKEN_BUCKET,
+                burst_size=max(1, config.burst),
+                refill_rate=config.rate_per_second
+            ))
+        return cls(
+            name,
+            breaker=CircuitBreaker(name, CircuitBreakerConfig(
+                failure_threshold=config.failure_threshold, timeout=config.breaker_timeout
+            )) if config.failure_threshold > 0 else None,
+            limiter=limiter,
+            retry=RetryPolicy(RetryConfig(
+                max_retries=config.max_retries, base_delay=config.retry_base_delay, max_delay=config.retry_max_delay
+            ), retry_on) if config.max_retries > 0 else None,
+            timeout=config.timeout,
+            bulkhead=Bulkhead(name, config.max_concurrent, config.queue_wait) if config.max_concurrent > 0 else None,
+            rate_limit_wait=config.rate_limit_wait
+        )
+
+    async def call(self, fn: Callable, *args, **kwargs) -> Any:
+        """按策略执行fn（协程函数或普通函数；超时只对可等待结果生效）"""
+        stats = self.stats
+        stats.calls += 1
+        start_time = time.perf_counter()
+        bulkhead = self.bulkhead
+        if bulkhead is not None:
+            try:
+                await bulkhead.acquire()
+            except BulkheadFullError:
+                stats.bulkhead_rejected += 1
+                stats.failures += 1
+                raise
+        try:
+            attempt = 0
+            while True:
+                try:
+                    result = await self._attempt(fn, args, kwargs)
+                except ResilienceError:
+                    raise
+                except Exception as e:
+                    retry = self.retry
+                    if retry is None or attempt >= retry.config.max_retries or not retry.retry_on(e):
+                        raise
+                    delay = retry.delay(attempt)
+                    attempt += 1
+                    stats.retries += 1
+                    logger.warning(f"{self.name} 调用失败，{delay:.2f}秒后重试 ({attempt}/{retry.config.max_retries}): {e}")
+                    await asyncio.sleep(delay)
+                    continue
+                stats.successes += 1
+                return result
+        except Exception:
+            stats.failures += 1
+            raise
+        finally:
+            if bulkhead is not None:
+                bulkhead.release()
+            stats.total_latency += time.perf_counter() - start_time
+
+    async def _attempt(self, fn: Callable, args: tuple, kwargs: dict) -> Any:
+        limiter = self.limiter
+        if limiter is not None:
+            if self.rate_limit_wait > 0:
+                try:
+                    await limiter.acquire(self.rate_limit_wait)
+                except RateLimitedError:
+                    self.stats.rate_limited += 1
+                    raise
+            elif not limiter.try_acquire():
+                self.stats.rate_limited += 1
+                raise RateLimitedError(self.name, limiter.retry_after())
+
+        breaker = self.breaker
+        if breaker is not None and not breaker.can_execute():
+            self.stats.short_circuited += 1
+            raise CircuitOpenError(self.name, breaker.retry_after())
+
+        try:
+            result = fn(*args, **kwargs)
+            if inspect.isawaitable(result):
+                result = await (self._with_timeout(result) if self.timeout else result)
+        except asyncio.CancelledError:
+            if breaker is not None:
+                breaker.record_ignored()
+            raise
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                self.stats.timeouts += 1
+            if breaker is not None:
+                if self.failure_on(e):
+                    breaker.record_failure()
+                else:
+                    breaker.record_ignored()
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+    async def _with_timeout(self, awaitable) -> Any:
+        """在当前任务内到期取消，避免asyncio.wait_for每次调用都新建任务"""
+        task = asyncio.current_task()
+        # Python 3.11+ 任务记录未撤销的取消请求数，asyncio.timeout与TaskGroup依赖该计数
+        cancelling = task.cancelling() if hasattr(task, "cancelling") else 0
+        expired = False
+
+        def expire():
+            nonlocal expired
+            expired = True
+            task.cancel()
+
+        handle = asyncio.get_running_loop().call_later(self.timeout, expire)
+        try:
+            return await awaitable
+        except asyncio.CancelledError:
+            if expired:
+                # 撤销本次到期发起的取消；期间另有外部取消时继续向上传播
+                if hasattr(task, "uncancel") and task.uncancel() > cancelling:
+                    raise
+                raise asyncio.TimeoutError() from None
+            raise
+        finally:
+            handle.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(
+            self.stats.to_dict(),
+            timeout=self.timeout,
+            max_retries=self.retry.config.max_retries if self.retry else 0,
+            circuit_breaker=self.breaker.get_state() if self.breaker else None,
+            rate_limiter=self.limiter.get_state() if self.limiter else None,
+            bulkhead=self.bulkhead.get_state() if self.bulkhead else None
+        )
+
+
+class ResilienceRegistry:
+    """弹性策略注册表，汇总各出站调用的状态"""
+
+    def __init__(self):
+        self.policies: Dict[str, ResiliencePolicy] = {}
+
+    def register(self, policy: ResiliencePolicy) -> ResiliencePolicy:
+        """注册（同名则替换）策略"""
+        self.policies[policy.name] = policy
+        return policy
+
+    def get(self, name: str) -> Optional[ResiliencePolicy]:
+        return self.policies.get(name)
+
+    def remove(self, name: str):
+        self.policies.pop(name, None)
+
+    def policy(self, name: str, factory: Callable[[str], ResiliencePolicy]) -> ResiliencePolicy:
+        """获取（不存在时用factory创建）指定名称的策略"""
+        policy = self.policies.get(name)
+        if policy is None:
+            policy = self.policies[name] = factory(name)
+        return policy
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {name: policy.get_stats() for name, policy in self.policies.items()}
+
+
+# 全局实例
+resilience_registry = ResilienceRegistry()
+
+
+def web_search_policy(url: str) -> ResiliencePolicy:
+    """外网抓取按站点隔离的弹性策略：单个站点故障不拖累其他站点，同一站点限速抓取"""
+    host = urlsplit(url).netloc or url
+    return resilience_registry.policy(
+        f"web:{host}",
+        lambda name: ResiliencePolicy.from_config(name, PolicyConfig.from_env(
+            "WEB_SEARCH", timeout=10.0, max_retries=1, failure_threshold=3, breaker_timeout=120,
+            rate_per_second=1.0, burst=3, rate_limit_wait=2.0, max_concurrent=4, queue_wait=2.0
+        ))
+    )
+
+
+async def fetch_web_text(session: aiohttp.ClientSession, url: str, **kwargs) -> str:
+    """经站点弹性策略GET页面文本，非200时抛出UpstreamHTTPError"""
+    async def fetch() -> str:
+        async with session.get(url, **kwargs) as response:
+            if response.status != 200:
+                raise UpstreamHTTPError(response.status)
+            return await response.text()
+
+    return await web_search_policy(url).call(fetch)
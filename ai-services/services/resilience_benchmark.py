@@ -0,0 +1,185 @@
+"""
+弹性组件开销基准
+对比异步弹性组件与原 api_stability_manager 中基于threading.Lock的熔断器、限流器及调用路径
+（execute_with_stability）的单次调用开销，下游为立即返回的协程
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Dict
+
+from .resilience import (
+    Bulkhead, CircuitBreaker, CircuitBreakerConfig, CircuitState, RateLimitConfig,
+    RateLimiter, RateLimitType, ResiliencePolicy, RetryPolicy
+)
+
+
+class _LegacyCircuitBreaker:
+    """原实现的熔断器：每次判定与记录都获取threading.Lock，计时使用datetime"""
+
+    def __init__(self, config: CircuitBreakerConfig):
+        self.config = config
+        self.state = CircuitState.CLOSED
+        self.failure_count = 0
+        self.success_count = 0
+        self.last_failure_time = None
+        self.half_open_calls = 0
+        self.lock = threading.Lock()
+
+    def can_execute(self) -> bool:
+        with self.lock:
+            if self.state == CircuitState.CLOSED:
+                return True
+            if self.state == CircuitState.OPEN:
+                if (
+                    self.last_failure_time is None
+                    or (datetime.now() - self.last_failure_time).total_seconds() >= self.config.timeout
+                ):
+                    self.state = CircuitState.HALF_OPEN
+                    self.half_open_calls = 0
+                    return True
+                return False
+            if self.half_open_calls < self.config.half_open_max_calls:
+                self.half_open_calls += 1
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            if self.state == CircuitState.HALF_OPEN:
+                self.success_count += 1
+                if self.success_count >= self.config.success_threshold:
+                    self.state = CircuitState.CLOSED
+                    self.failure_count = 0
+                    self.success_count = 0
+            elif self.state == CircuitState.CLOSED:
+                self.failure_count = 0
+
+
+class _LegacyRateLimiter:
+    """原实现的限流器：加锁后按类型判定（令牌桶 / 滑动窗口逐条时间戳）"""
+
+    def __init__(self, config: RateLimitConfig):
+        self.config = config
+        self.requests = deque()
+        self.tokens = config.burst_size
+        self.last_refill = time.time()
+        self.lock = threading.Lock()
+
+    def is_allowed(self) -> bool:
+        with self.lock:
+            current_time = time.time()
+            if self.config.limit_type == RateLimitType.TOKEN_BUCKET:
+                self.tokens = min(
+                    self.config.burst_size,
+                    self.tokens + (current_time - self.last_refill) * self.config.refill_rate
+                )
+                self.last_refill = current_time
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                return False
+            while self.requests and self.requests[0] <= current_time - self.config.window_size:
+                self.requests.popleft()
+            if len(self.requests) < self.config.max_requests:
+                self.requests.append(current_time)
+                return True
+            return False
+
+
+class _LegacyStabilityManager:
+    """原 execute_with_stability 的调用路径：指标加锁更新、熔断与限流判定、重试包装"""
+
+    def __init__(self, breaker: _LegacyCircuitBreaker = None, limiter: _LegacyRateLimiter = None):
+        self.breaker = breaker
+        self.limiter = limiter
+        self.lock = threading.Lock()
+        self.total_calls = 0
+        self.successful_calls = 0
+        self.average_response_time = 0.0
+        self.last_call_time = None
+
+    async def call(self, func: Callable, *args, **kwargs) -> Any:
+        start_time = time.time()
+        with self.lock:
+            self.total_calls += 1
+            self.last_call_time = datetime.now()
+        try:
+            if self.breaker and not self.breaker.can_execute():
+                raise Exception("熔断器处于熔断状态")
+            if self.limiter and not self.limiter.is_allowed():
+                raise Exception("限流器触发限流")
+            if asyncio.iscoroutinefunction(func):
+                result = await func(*args, **kwargs)
+            else:
+                result = func(*args, **kwargs)
+            if self.breaker:
+                self.breaker.record_success()
+            with self.lock:
+                self.successful_calls += 1
+            return result
+        finally:
+            response_time = time.time() - start_time
+            with self.lock:
+                self.average_response_time = (
+                    (self.average_response_time * (self.total_calls - 1) + response_time) / self.total_calls
+                )
+
+
+async def _measure(call: Callable, iterations: int) -> float:
+    """单次调用平均耗时（微秒）"""
+    start_time = time.perf_counter()
+    for _ in range(iterations):
+        await call()
+    return (time.perf_counter() - start_time) / iterations * 1e6
+
+
+async def benchmark_resilience_overhead(iterations: int = 20000) -> Dict[str, Any]:
+    """测量各组件的单次调用开销（微秒），并与原加锁实现的相同组合对比"""
+    async def noop():
+        return None
+
+    unlimited = RateLimitConfig(limit_type=RateLimitType.TOKEN_BUCKET, burst_size=iterations * 2, refill_rate=1e9)
+    variants = {
+        "circuit_breaker": ResiliencePolicy("bench", breaker=CircuitBreaker("bench")),
+        "rate_limiter": ResiliencePolicy("bench", limiter=RateLimiter("bench", unlimited)),
+        "retry": ResiliencePolicy("bench", retry=RetryPolicy()),
+        "timeout": ResiliencePolicy("bench", timeout=30.0),
+        "bulkhead": ResiliencePolicy("bench", bulkhead=Bulkhead("bench", 64)),
+        # 与原 execute_with_stability 相同的组合：熔断 + 限流 + 重试
+        "breaker_limiter_retry": ResiliencePolicy(
+            "bench", breaker=CircuitBreaker("bench"), limiter=RateLimiter("bench", unlimited), retry=RetryPolicy()
+        ),
+        "full_policy": ResiliencePolicy(
+            "bench", breaker=CircuitBreaker("bench"), limiter=RateLimiter("bench", unlimited),
+            retry=RetryPolicy(), timeout=30.0, bulkhead=Bulkhead("bench", 64)
+        )
+    }
+    legacy_variants = {
+        "circuit_breaker": _LegacyStabilityManager(breaker=_LegacyCircuitBreaker(CircuitBreakerConfig())),
+        "rate_limiter": _LegacyStabilityManager(limiter=_LegacyRateLimiter(unlimited)),
+        "breaker_limiter_retry": _LegacyStabilityManager(
+            breaker=_LegacyCircuitBreaker(CircuitBreakerConfig()), limiter=_LegacyRateLimiter(unlimited)
+        )
+    }
+
+    baseline = await _measure(noop, iterations)
+    results = {"baseline": baseline}
+    for name, policy in variants.items():
+        results[name] = await _measure(lambda: policy.call(noop), iterations)
+    legacy = {}
+    for name, manager in legacy_variants.items():
+        legacy[name] = await _measure(lambda: manager.call(noop), iterations)
+
+    return {
+        "iterations": iterations,
+        "per_call_us": {name: round(cost, 3) for name, cost in results.items()},
+        "overhead_us": {name: round(cost - baseline, 3) for name, cost in results.items() if name != "baseline"},
+        "legacy_per_call_us": {name: round(cost, 3) for name, cost in legacy.items()},
+        "speedup_vs_legacy": {
+            name: round((legacy[name] - baseline) / max(results[name] - baseline, 1e-9), 2) for name in legacy
+        }
+    }
@@ -0,0 +1,188 @@
+"""
+语义答案缓存
+缓存 (查询向量, 检索到的知识ID集合, LLM回答)，新查询与缓存查询的余弦相似度超过阈值
+且检索到的知识集合不变时直接返回缓存回答；引用的knowledge_base记录更新或删除时失效
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import numpy as np
+from loguru import logger
+
+
+@dataclass
+class SemanticCacheEntry:
+    """缓存条目"""
+    query: str
+    knowledge_ids: frozenset
+    answer: str
+    created_at: float
+    last_hit_at: float
+    hits: int = 0
+
+
+class SemanticAnswerCache:
+    """语义答案缓存
+
+    查询向量归一化后存放在预分配的float32矩阵中，一次矩阵乘法完成全部相似度计算
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = None,
+        max_entries: int = None,
+        ttl: int = None
+    ):
+        self.similarity_threshold = similarity_threshold or float(
+            os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")
+        )
+        self.max_entries = max_entries or int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+        self.ttl = ttl or int(os.getenv("SEMANTIC_CACHE_TTL", "3600"))
+        self.enabled = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+        self._vectors: Optional[np.ndarray] = None
+        self._valid = np.zeros(self.max_entries, dtype=bool)
+        self._entries: List[Optional[SemanticCacheEntry]] = [None] * self.max_entries
+        # 知识ID -> 引用它的槽位
+        self._knowledge_index: Dict[int, Set[int]] = {}
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "knowledge_set_mismatches": 0
+        }
+
+    @staticmethod
+    def _normalize(embedding) -> Optional[np.ndarray]:
+        """转为单位长度的float32向量"""
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
+
+    def lookup(self, query_embedding, knowledge_ids: Iterable[int]) -> Optional[str]:
+        """查找语义相近且知识集合相同的缓存回答"""
+        if not self.enabled or self._vectors is None or not self._valid.any():
+            self.stats["misses"] += 1
+            return None
+
+        vector = self._normalize(query_embedding)
+        if vector is None or vector.shape[0] != self._vectors.shape[1]:
+            self.stats["misses"] += 1
+            return None
+
+        now = time.time()
+        knowledge_set = frozenset(knowledge_ids)
+        similarities = self._vectors @ vector
+        similarities[~self._valid] = -1.0
+        candidates = np.flatnonzero(similarities >= self.similarity_threshold)
+
+        for slot in candidates[np.argsort(-similarities[candidates])]:
+            entry = self._entries[slot]
+            if now - entry.created_at > self.ttl:
+                self._remove(slot)
+                continue
+            if entry.knowledge_ids != knowledge_set:
+                self.stats["knowledge_set_mismatches"] += 1
+                continue
+            entry.hits += 1
+            entry.last_hit_at = now
+            self.stats["hits"] += 1
+            logger.info(
+                f"语义缓存命中: '{entry.query}' (相似度 {similarities[slot]:.3f})"
+            )
+            return entry.answer
+
+        self.stats["misses"] += 1
+        return None
+
+    def store(self, query: str, query_embedding, knowledge_ids: Iterable[int], answer: str):
+        """写入缓存"""
+        if not self.enabled:
+            return
+        vector = self._normalize(query_embedding)
+        if vector is None:
+            return
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+        elif vector.shape[0] != self._vectors.shape[1]:
+            # 嵌入模型维度变化，旧缓存全部作废
+            self.clear()
+            self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+
+        slot = self._free_slot()
+        now = time.time()
+        entry = SemanticCacheEntry(
+            query=query,
+            knowledge_ids=frozenset(knowledge_ids),
+            answer=answer,
+            created_at=now,
+            last_hit_at=now
+        )
+        self._vectors[slot] = vector
+        self._valid[slot] = True
+        self._entries[slot] = entry
+        for knowledge_id in entry.knowledge_ids:
+            self._knowledge_index.setdefault(knowledge_id, set()).add(slot)
+        self.stats["stores"] += 1
+
+    def _free_slot(self) -> int:
+        """获取空闲槽位，已满时淘汰最久未命中的条目"""
+        free = np.flatnonzero(~self._valid)
+        if free.size:
+            return int(free[0])
+        slot = min(range(self.max_entries), key=lambda i: self._entries[i].last_hit_at)
+        self._remove(slot)
+        self.stats["evictions"] += 1
+        return slot
+
+    def _remove(self, slot: int):
+        """移除槽位中的条目"""
+        entry = self._entries[slot]
+        if entry is None:
+            return
+        for knowledge_id in entry.knowledge_ids:
+            slots = self._knowledge_index.get(knowledge_id)
+            if slots:
+                slots.discard(slot)
+                if not slots:
+                    del self._knowledge_index[knowledge_id]
+        self._entries[slot] = None
+        self._valid[slot] = False
+
+    def invalidate_knowledge(self, knowledge_id: int) -> int:
+        """使引用指定知识的缓存条目失效，返回失效条目数"""
+        slots = list(self._knowledge_index.get(knowledge_id, ()))
+        for slot in slots:
+            self._remove(slot)
+        if slots:
+            self.stats["invalidations"] += len(slots)
+            logger.info(f"知识 {knowledge_id} 变更，语义缓存失效 {len(slots)} 条")
+        return len(slots)
+
+    def clear(self):
+        """清空缓存"""
+        self._valid[:] = False
+        self._entries = [None] * self.max_entries
+        self._knowledge_index.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "size": int(self._valid.sum()),
+            "max_entries": self.max_entries,
+            "similarity_threshold": self.similarity_threshold,
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0
+        }
+
+
+# 全局实例
+semantic_answer_cache = SemanticAnswerCache()
@@ -0,0 +1,216 @@
+"""
+语义分块引擎
+按嵌入模型最大序列长度设定token预算，在句子、交易记录、章节与表格边界处分块，
+每个块携带在原文中的字符偏移；普通文本相邻块之间按句子保留重叠
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from typing import Callable, List, Tuple
+
+# 句子结束位置（中英文句末标点，或换行）
+_SENTENCE_END = re.compile(r'[。！？!?；;]+[”’"\')]*|\n+')
+# 交易日期
+_DATE_LINE = re.compile(r'\d{4}[-/年.]\d{1,2}[-/月.]\d{1,2}')
+# 数字（表格行判断）
+_NUMBER = re.compile(r'\d+(?:[.,]\d+)*')
+# 非空行（带偏移）
+_LINE = re.compile(r'[^\n]+')
+# 中日韩字符
+_CJK_CHAR = re.compile(r'[\u3400-\u9fff\uf900-\ufaff]')
+# 非中日韩的连续词
+_NON_CJK_WORD = re.compile(r'[^\s\u3400-\u9fff\uf900-\ufaff]+')
+
+# 贷款申请材料章节标题
+_LOAN_SECTIONS = ("基本信息", "收入证明", "资产证明", "负债情况", "担保信息", "贷款用途", "还款计划")
+_LOAN_SECTION = re.compile("|".join(_LOAN_SECTIONS))
+
+
+@dataclass
+class Chunk:
+    """文本块，start/end为在原文中的字符偏移（左闭右开）"""
+    text: str
+    start: int
+    end: int
+    token_count: int
+    kind: str = "text"
+
+
+@dataclass
+class _Unit:
+    """不可再分的切分单元（句子、交易记录、表格行、章节行）"""
+    start: int
+    end: int
+    kind: str
+    # 该单元是否开启新块组（如新交易记录、新章节）
+    boundary: bool = False
+
+
+def estimate_tokens(text: str) -> int:
+    """无分词器时的token估算：中日韩字符各计1个，其他词按每4字符1个"""
+    cjk = len(_CJK_CHAR.findall(text))
+    other = sum(max(1, len(word) // 4) for word in _NON_CJK_WORD.findall(text))
+    return cjk + other
+
+
+class SemanticChunker:
+    """语义分块器"""
+
+    def __init__(self, max_tokens: int = None, token_counter: Callable[[List[str]], List[int]] = None):
+        # 默认匹配all-MiniLM-L6-v2的max_seq_length=256，预留特殊token
+        self.max_tokens = max_tokens or int(os.getenv("RAG_CHUNK_MAX_TOKENS", "240"))
+        self.min_tokens = int(os.getenv("RAG_CHUNK_MIN_TOKENS", "32"))
+        # 普通文本因预算换块时，新块重复上一块末尾不超过该token数的完整句子（约为预算的20%，同原200/1000字符重叠）
+        self.overlap_tokens = int(os.getenv("RAG_CHUNK_OVERLAP_TOKENS", str(self.max_tokens // 5)))
+        self._count_tokens = token_counter or (lambda texts: [estimate_tokens(text) for text in texts])
+
+    @classmethod
+    def for_embedding_model(cls, model) -> "SemanticChunker":
+        """按嵌入模型的分词器与最大序列长度创建分块器"""
+        if model is None or getattr(model, "tokenizer", None) is None:
+            return cls()
+        tokenizer = model.tokenizer
+        max_seq_length = int(getattr(model, "max_seq_length", 256) or 256)
+
+        def count_tokens(texts: List[str]) -> List[int]:
+            if not texts:
+                return []
+            encoded = tokenizer(texts, add_special_tokens=False)["input_ids"]
+            return [len(ids) for ids in encoded]
+
+        return cls(max_tokens=int(os.getenv("RAG_CHUNK_MAX_TOKENS", str(max_seq_length - 2))), token_counter=count_tokens)
+
+    def chunk(self, text: str, document_type: str = "other", start: int = 0, end: int = None) -> List[Chunk]:
+        """切分 text[start:end]，返回的偏移相对于整个text"""
+        end = len(text) if end is None else end
+        if not text[start:end].strip():
+            return []
+
+        if document_type == "bank_statement":
+            units = self._transaction_units(text, start, end)
+        elif document_type == "loan_application":
+            units = self._section_units(text, start, end)
+        elif document_type in ("financial_report", "financial_statement"):
+            units = self._table_units(text, start, end)
+        else:
+            units = self._sentence_units(text, start, end)
+        return self._pack(text, units)
+
+    def _sentence_units(self, text: str, start: int, end: int) -> List[_Unit]:
+        """按句末标点与换行切分为句子单元"""
+        units = []
+        position = start
+        for match in _SENTENCE_END.finditer(text, start, end):
+            if match.end() > position:
+                units.append(_Unit(position, match.end(), "text"))
+                position = match.end()
+        if position < end:
+            units.append(_Unit(position, end, "text"))
+        return units
+
+    def _line_units(self, text: str, start: int, end: int) -> List[Tuple[int, int, str]]:
+        """非空行及其偏移"""
+        return [(m.start(), m.end(), m.group()) for m in _LINE.finditer(text, start, end) if m.group().strip()]
+
+    def _transaction_units(self, text: str, start: int, end: int) -> List[_Unit]:
+        """银行流水：日期行开启一条交易记录，记录内各行不拆分"""
+        units = []
+        for line_start, line_end, line in self._line_units(text, start, end):
+            if _DATE_LINE.search(line) or not units:
+                units.append(_Unit(line_start, line_end, "transactions"))
+            else:
+                units[-1].end = line_end
+        return units
+
+    def _section_units(self, text: str, start: int, end: int) -> List[_Unit]:
+        """贷款申请：章节标题开启新块组，章节内按句子切分"""
+        units = []
+        for line_start, line_end, line in self._line_units(text, start, end):
+            sentences = self._sentence_units(text, line_start, line_end)
+            for unit in sentences:
+                unit.kind = "section"
+            if sentences and _LOAN_SECTION.search(line):
+                sentences[0].boundary = True
+            units.extend(sentences)
+        return units
+
+    def _table_units(self, text: str, start: int, end: int) -> List[_Unit]:
+        """财务报表：连续表格行作为表格块，段落按句子切分；表格与段落交界处优先分块"""
+        units = []
+        previous_kind = None
+        for line_start, line_end, line in self._line_units(text, start, end):
+            if len(_NUMBER.findall(line)) >= 3:
+                units.append(_Unit(line_start, line_end, "table", boundary=previous_kind != "table"))
+                previous_kind = "table"
+            else:
+                sentences = self._sentence_units(text, line_start, line_end)
+                if sentences and previous_kind == "table":
+                    sentences[0].boundary = True
+                units.extend(sentences)
+                previous_kind = "text"
+        return units
+
+    def _pack(self, text: str, units: List[_Unit]) -> List[Chunk]:
+        """按token预算贪心合并单元；超出预算的单个单元按预算比例切开"""
+        token_counts = self._count_tokens([text[unit.start:unit.end] for unit in units])
+        chunks: List[Chunk] = []
+        current: List[Tuple[_Unit, int]] = []
+        current_tokens = 0
+
+        def flush():
+            nonlocal current, current_tokens
+            if current:
+                chunk_start, chunk_end = current[0][0].start, current[-1][0].end
+                chunk_text = text[chunk_start:chunk_end]
+                stripped = chunk_text.strip()
+                if stripped:
+                    lead = len(chunk_text) - len(chunk_text.lstrip())
+                    chunks.append(Chunk(
+                        stripped, chunk_start + lead, chunk_start + lead + len(stripped),
+                        current_tokens, current[0][0].kind
+                    ))
+            current, current_tokens = [], 0
+
+        def overlap_tail(next_tokens: int) -> List[Tuple[_Unit, int]]:
+            """上一块末尾用作重叠的句子，与下一单元合计不超过预算"""
+            tail, tail_tokens = [], 0
+            budget = min(self.overlap_tokens, self.max_tokens - next_tokens)
+            for unit, tokens in reversed(current[1:]):
+                if unit.kind != "text" or tail_tokens + tokens > budget:
+                    break
+                tail.insert(0, (unit, tokens))
+                tail_tokens += tokens
+            return tail
+
+        for unit, tokens in zip(units, token_counts):
+            if tokens > self.max_tokens:
+                flush()
+                chunks.extend(self._split_oversized(text, unit, tokens))
+                continue
+            # 新交易/新章节/表格边界处，已达最小长度即换块
+            if unit.boundary and current_tokens >= self.min_tokens:
+                flush()
+            elif current and unit.kind != current[-1][0].kind and current_tokens >= self.min_tokens:
+                flush()
+            if current_tokens + tokens > self.max_tokens:
+                # 仅普通文本的句子之间保留重叠，交易记录、章节与表格各自完整成块
+                tail = overlap_tail(tokens) if unit.kind == "text" else []
+                flush()
+                current, current_tokens = tail, sum(tail_tokens for _, tail_tokens in tail)
+            current.append((unit, tokens))
+            current_tokens += tokens
+        flush()
+        return chunks
+
+    def _split_oversized(self, text: str, unit: _Unit, tokens: int) -> List[Chunk]:
+        """单个单元超过预算时按字符比例等分"""
+        pieces = -(-tokens // self.max_tokens)
+        step = -(-(unit.end - unit.start) // pieces)
+        chunks = []
+        for piece_start in range(unit.start, unit.end, step):
+            piece_end = min(piece_start + step, unit.end)
+            piece = text[piece_start:piece_end]
+            if piece.strip():
+                chunks.append(Chunk(piece, piece_start, piece_end, self._count_tokens([piece])[0], unit.kind))
+        return chunks
@@ -0,0 +1,327 @@
+"""
+服务注册表
+服务在首次使用时才导入模块并实例化；启动时按依赖关系并发初始化，
+重型模型在后台预热，就绪状态与存活检查分离；记录每个组件的导入、构建、初始化与预热耗时
+"""
+
+import asyncio
+import importlib
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+
+class ComponentState(Enum):
+    """组件状态"""
+    REGISTERED = "registered"
+    BUILT = "built"
+    INITIALIZING = "initializing"
+    READY = "ready"
+    FAILED = "failed"
+
+
+@dataclass
+class ServiceComponent:
+    """注册的服务组件"""
+    name: str
+    module: Optional[str] = None
+    attribute: Optional[str] = None
+    # 接收已导入模块、返回服务实例；为空时取模块的 attribute 属性
+    factory: Optional[Callable[[Any], Any]] = None
+    instance: Any = None
+    initializer: Optional[Callable[[Any], Awaitable[Any]]] = None
+    closer: Optional[Callable[[Any], Any]] = None
+    depends_on: Tuple[str, ...] = ()
+    # 关键组件未就绪时 /ready 返回503
+    critical: bool = True
+    state: ComponentState = ComponentState.REGISTERED
+    import_seconds: Optional[float] = None
+    build_seconds: Optional[float] = None
+    init_seconds: Optional[float] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class WarmUpTask:
+    """后台预热任务"""
+    name: str
+    warm_up: Callable[[], Awaitable[Any]]
+    depends_on: Tuple[str, ...] = ()
+    done: bool = False
+    seconds: Optional[float] = None
+    error: Optional[str] = None
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+
+class LazyService:
+    """服务代理：首次访问属性时才构建真实服务"""
+
+    __slots__ = ("_registry", "_name")
+
+    def __init__(self, registry: "ServiceRegistry", name: str):
+        object.__setattr__(self, "_registry", registry)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._registry.get(self._name), item)
+
+    def __setattr__(self, key: str, value: Any):
+        setattr(self._registry.get(self._name), key, value)
+
+    def __bool__(self) -> bool:
+        return self._registry.get(self._name) is not None
+
+    def __repr__(self) -> str:
+        return f"<LazyService {self._name}>"
+
+
+class ServiceRegistry:
+    """服务注册表"""
+
+    def __init__(self):
+        self.components: Dict[str, ServiceComponent] = {}
+        self.warm_ups: Dict[str, WarmUpTask] = {}
+        # 每个组件一把锁，不同组件可在多个线程中并行构建
+        self._locks: Dict[str, threading.RLock] = {}
+        self._startup_started: Optional[float] = None
+        self.startup_seconds: Optional[float] = None
+        # 主程序启动时直接导入的模块耗时（未纳入懒加载的轻量服务）
+        self.eager_import_seconds: Optional[float] = None
+
+    def register(
+        self,
+        name: str,
+        module: str = None,
+        attribute: str = None,
+        factory: Callable[[Any], Any] = None,
+        instance: Any = None,
+        initializer: Callable[[Any], Awaitable[Any]] = None,
+        closer: Callable[[Any], Any] = None,
+        depends_on: Tuple[str, ...] = (),
+        critical: bool = True
+    ) -> LazyService:
+        """注册服务组件，返回懒加载代理
+
+        传入 instance 表示已构建的服务（只参与初始化编排），
+        否则按 module/attribute 或 factory 在首次使用时导入并构建
+        """
+        component = ServiceComponent(
+            name=name,
+            module=module,
+            attribute=attribute,
+            factory=factory,
+            instance=instance,
+            initializer=initializer,
+            closer=closer,
+            depends_on=tuple(depends_on),
+            critical=critical,
+            state=ComponentState.REGISTERED if instance is None else ComponentState.BUILT
+        )
+        self.components[name] = component
+        self._locks[name] = threading.RLock()
+        return LazyService(self, name)
+
+    def register_warm_up(self, name: str, warm_up: Callable[[], Awaitable[Any]], depends_on: Tuple[str, ...] = ()):
+        """注册后台预热任务（就绪检查会等待其完成）"""
+        self.warm_ups[name] = WarmUpTask(name=name, warm_up=warm_up, depends_on=tuple(depends_on))
+
+    def register_background_build(self, name: str):
+        """注册后台预热任务：在线程中导入并构建指定组件"""
+        self.register_warm_up(f"build:{name}", lambda: asyncio.to_thread(self.get, name))
+
+    def get(self, name: str) -> Any:
+        """获取服务实例，未构建时导入模块并构建"""
+        component = self.components[name]
+        if component.instance is not None:
+            return component.instance
+        with self._locks[name]:
+            if component.instance is None:
+                self._build(component)
+        return component.instance
+
+    def is_built(self, name: str) -> bool:
+        """服务是否已构建"""
+        component = self.components.get(name)
+        return component is not None and component.instance is not None
+
+    def _build(self, component: ServiceComponent):
+        """导入模块并构建服务实例，分别计时"""
+        try:
+            module = None
+            if component.module:
+                already_imported = component.module in sys.modules
+                start_time = time.perf_counter()
+                module = importlib.import_module(component.module)
+                # 模块已被其他组件导入时记为0，导入耗时计入首个导入它的组件
+                component.import_seconds = 0.0 if already_imported else time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            if component.factory is not None:
+                instance = component.factory(module)
+            else:
+                instance = getattr(module, component.attribute)
+            component.build_seconds = time.perf_counter() - start_time
+
+            component.instance = instance
+            if component.state == ComponentState.REGISTERED:
+                component.state = ComponentState.BUILT
+            logger.info(
+                f"服务构建完成: {component.name} (导入 {component.import_seconds or 0:.3f}秒, "
+                f"构建 {component.build_seconds:.3f}秒)"
+            )
+        except Exception as e:
+            component.state = ComponentState.FAILED
+            component.error = str(e)
+            logger.error(f"服务构建失败: {component.name}, {e}")
+            raise
+
+    def _layers(self, names: List[str]) -> List[List[str]]:
+        """按依赖关系分层，同层组件互不依赖"""
+        remaining = {name: set(self.components[name].depends_on) & set(names) for name in names}
+        layers = []
+        while remaining:
+            layer = [name for name, deps in remaining.items() if not deps]
+            if not layer:
+                raise ValueError(f"服务依赖存在循环: {sorted(remaining)}")
+            layers.append(layer)
+            for name in layer:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(layer)
+        return layers
+
+    async def initialize(self):
+        """并发初始化所有带初始化器的组件：各组件只等待自身依赖，依赖失败的组件跳过"""
+        self._startup_started = time.perf_counter()
+        names = [name for name, component in self.components.items() if component.initializer is not None]
+        self._layers(names)  # 校验依赖无循环
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run(component: ServiceComponent):
+            # 只等待自身依赖，不等待同层其他组件
+            for dep in component.depends_on:
+                if dep in tasks:
+                    await tasks[dep]
+            await self._initialize_component(component)
+
+        for name in names:
+            tasks[name] = asyncio.create_task(run(self.components[name]))
+        await asyncio.gather(*tasks.values())
+        # 无初始化器的已构建组件视为就绪
+        for component in self.components.values():
+            if component.initializer is None and component.state == ComponentState.BUILT:
+                component.state = ComponentState.READY
+        self.startup_seconds = time.perf_counter() - self._startup_started
+        logger.info(f"服务初始化完成，耗时 {self.startup_seconds:.3f}秒")
+
+    async def _initialize_component(self, component: ServiceComponent):
+        """初始化单个组件（构建放到线程中，避免导入阻塞事件循环）"""
+        failed_deps = [
+            dep for dep in component.depends_on
+            if dep in self.components and self.components[dep].state == ComponentState.FAILED
+        ]
+        if failed_deps:
+            component.state = ComponentState.FAILED
+            component.error = f"依赖未就绪: {', '.join(failed_deps)}"
+            logger.error(f"服务初始化跳过: {component.name}, {component.error}")
+            return
+
+        component.state = ComponentState.INITIALIZING
+        start_time = time.perf_counter()
+        try:
+            instance = await asyncio.to_thread(self.get, component.name)
+            await component.initializer(instance)
+            component.state = ComponentState.READY
+            logger.info(f"服务初始化成功: {component.name}")
+        except Exception as e:
+            component.state = ComponentState.FAILED
+            component.error = str(e)
+            logger.error(f"服务初始化失败: {component.name}, {e}")
+        finally:
+            component.init_seconds = time.perf_counter() - start_time
+
+    def start_warm_up(self):
+        """启动所有后台预热任务"""
+        for warm_up in self.warm_ups.values():
+            if warm_up.task is None:
+                warm_up.task = asyncio.create_task(self._run_warm_up(warm_up))
+
+    async def _run_warm_up(self, warm_up: WarmUpTask):
+        """执行预热任务，依赖的预热任务先完成"""
+        for dep in warm_up.depends_on:
+            dependency = self.warm_ups.get(dep)
+            if dependency is not None and dependency.task is not None:
+                await asyncio.shield(dependency.task)
+        start_time = time.perf_counter()
+        try:
+            await warm_up.warm_up()
+            logger.info(f"后台预热完成: {warm_up.name}")
+        except Exception as e:
+            warm_up.error = str(e)
+            logger.error(f"后台预热失败: {warm_up.name}, {e}")
+        finally:
+            warm_up.seconds = time.perf_counter() - start_time
+            warm_up.done = True
+
+    async def shutdown(self):
+        """按注册的逆序关闭已构建的组件"""
+        for component in reversed(list(self.components.values())):
+            if component.instance is None or component.closer is None:
+                continue
+            try:
+                result = component.closer(component.instance)
+                if asyncio.iscoroutine(result):
+                    await result
+                logger.info(f"服务已关闭: {component.name}")
+            except Exception as e:
+                logger.error(f"服务关闭失败: {component.name}, {e}")
+        for warm_up in self.warm_ups.values():
+            if warm_up.task is not None and not warm_up.task.done():
+                warm_up.task.cancel()
+
+    def is_ready(self) -> bool:
+        """关键组件均已就绪且后台预热全部完成"""
+        if self.startup_seconds is None:
+            return False
+        critical_ready = all(
+            component.state == ComponentState.READY
+            for component in self.components.values()
+            if component.critical and component.initializer is not None
+        )
+        return critical_ready and all(warm_up.done for warm_up in self.warm_ups.values())
+
+    def get_report(self) -> Dict[str, Any]:
+        """各组件状态与耗时"""
+        return {
+            "ready": self.is_ready(),
+            "eager_import_seconds": self.eager_import_seconds,
+            "startup_seconds": self.startup_seconds,
+            "components": {
+                name: {
+                    "state": component.state.value,
+                    "critical": component.critical,
+                    "import_seconds": component.import_seconds,
+                    "build_seconds": component.build_seconds,
+                    "init_seconds": component.init_seconds,
+                    "error": component.error
+                }
+                for name, component in self.components.items()
+            },
+            "warm_ups": {
+                name: {
+                    "done": warm_up.done,
+                    "seconds": warm_up.seconds,
+                    "error": warm_up.error
+                }
+                for name, warm_up in self.warm_ups.items()
+            }
+        }
+
+
+# 全局实例
+service_registry = ServiceRegistry()
@@ -0,0 +1,166 @@
+"""
+请求合并（single-flight）
+相同缓存键的并发请求共享同一个进行中的查询，只有首个请求（leader）真正访问数据库或外网；
+缓存条目带软过期时间：临近过期时按概率提前刷新（XFetch），过期后在stale窗口内先返回旧值并后台刷新，
+避免热点键过期瞬间的缓存击穿
+"""
+
+import asyncio
+import copy
+import math
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from loguru import logger
+
+from .cache_service import cache_service
+
+
+@dataclass
+class SingleFlightStats:
+    """单个合并组的统计"""
+    calls: int = 0
+    leaders: int = 0
+    coalesced: int = 0
+    errors: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    stale_hits: int = 0
+    early_refreshes: int = 0
+    background_refreshes: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesce_ratio": self.coalesced / self.calls if self.calls else 0.0,
+            "errors": self.errors,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "stale_hits": self.stale_hits,
+            "early_refreshes": self.early_refreshes,
+            "background_refreshes": self.background_refreshes
+        }
+
+
+class SingleFlight:
+    """按键合并并发请求，可叠加防击穿缓存"""
+
+    def __init__(self, name: str, cache=None, stale_ttl: int = None, beta: float = None):
+        self.name = name
+        self.cache = cache or cache_service
+        # 软过期后仍可返回旧值的秒数
+        self.stale_ttl = stale_ttl if stale_ttl is not None else int(os.getenv("SINGLE_FLIGHT_STALE_SECONDS", "300"))
+        # XFetch提前刷新系数，越大越早刷新，0为关闭
+        self.beta = beta if beta is not None else float(os.getenv("SINGLE_FLIGHT_EARLY_REFRESH_BETA", "1.0"))
+        self.stats = SingleFlightStats()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """执行fn；相同key已有进行中的调用时等待其结果（合并的调用方得到结果的副本）"""
+        self.stats.calls += 1
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats.coalesced += 1
+            return copy.deepcopy(await asyncio.shield(task))
+
+        # leader被取消时查询继续执行，其他等待者仍能拿到结果
+        return await asyncio.shield(self._start(key, fn))
+
+    def _start(self, key: str, fn: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """启动调用并同步登记为进行中，之后到达的相同请求都会合并到该任务"""
+        self.stats.leaders += 1
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._on_done(key, done))
+        return task
+
+    def _on_done(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.stats.errors += 1
+
+    @staticmethod
+    def _is_entry(entry: Any) -> bool:
+        return isinstance(entry, dict) and "expires_at" in entry and "value" in entry
+
+    async def cached(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[Any]],
+        ttl: int,
+        cache_if: Callable[[Any], bool] = None
+    ) -> Any:
+        """带缓存的合并调用：命中直接返回，临近过期提前刷新，软过期返回旧值并后台刷新，未命中合并加载"""
+        entry = await self.cache.get(key)
+        if self._is_entry(entry):
+            remaining = entry["expires_at"] - time.time()
+            if remaining > 0:
+                self.stats.cache_hits += 1
+                # XFetch：剩余时间越短、加载越慢，越可能由某个请求提前刷新
+                if self.beta > 0 and entry.get("delta", 0.0) * self.beta * -math.log(1.0 - random.random()) >= remaining:
+                    self.stats.early_refreshes += 1
+                    self._refresh(key, fn, ttl, cache_if)
+            else:
+                self.stats.stale_hits += 1
+                self._refresh(key, fn, ttl, cache_if)
+            return entry["value"]
+
+        self.stats.cache_misses += 1
+        return await self.do(key, lambda: self._load(key, fn, ttl, cache_if))
+
+    async def _load(self, key: str, fn: Callable[[], Awaitable[Any]], ttl: int, cache_if: Optional[Callable[[Any], bool]]) -> Any:
+        """加载并写入缓存，记录加载耗时供提前刷新计算"""
+        start_time = time.perf_counter()
+        value = await fn()
+        delta = time.perf_counter() - start_time
+        if cache_if is None or cache_if(value):
+            await self.cache.set(
+                key,
+                {"value": value, "expires_at": time.time() + ttl, "delta": delta},
+                ttl=ttl + self.stale_ttl
+            )
+        return value
+
+    def _refresh(self, key: str, fn: Callable[[], Awaitable[Any]], ttl: int, cache_if: Optional[Callable[[Any], bool]]):
+        """后台刷新（同一键同时只有一个刷新）"""
+        if key in self._inflight:
+            return
+        self.stats.background_refreshes += 1
+        task = self._start(key, lambda: self._load(key, fn, ttl, cache_if))
+        self._background.add(task)
+        task.add_done_callback(self._on_refresh_done)
+
+    def _on_refresh_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"后台刷新缓存失败({self.name}): {task.exception()}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats.to_dict(), inflight=len(self._inflight), stale_ttl=self.stale_ttl, beta=self.beta)
+
+
+class SingleFlightManager:
+    """各合并组的注册与统计汇总"""
+
+    def __init__(self):
+        self.groups: Dict[str, SingleFlight] = {}
+
+    def group(self, name: str, **kwargs) -> SingleFlight:
+        """获取（不存在时创建）指定名称的合并组"""
+        if name not in self.groups:
+            self.groups[name] = SingleFlight(name, **kwargs)
+        return self.groups[name]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {name: group.get_stats() for name, group in self.groups.items()}
+
+
+# 全局实例
+single_flight_manager = SingleFlightManager()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+spawn方式的工作进程池
+spawn子进程启动时会先重新执行父进程的主模块；以 python main.py 启动时主模块即main.py，
+每个工作进程都会重复创建FastAPI应用、导入并实例化全部服务。这里在启动工作进程时
+以本模块代替主模块，子进程只导入本模块与任务函数所在的模块
+"""
+
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.context import SpawnContext, SpawnProcess
+from typing import Any, Callable, Optional, Tuple
+
+_main_lock = threading.Lock()
+
+
+class _WorkerProcess(SpawnProcess):
+    """启动时以本模块作为__main__的spawn进程"""
+
+    @staticmethod
+    def _Popen(process_obj):
+        # 子进程的主模块取自启动时刻的sys.modules["__main__"]
+        with _main_lock:
+            main_module = sys.modules["__main__"]
+            sys.modules["__main__"] = sys.modules[__name__]
+            try:
+                return SpawnProcess._Popen(process_obj)
+            finally:
+                sys.modules["__main__"] = main_module
+
+
+class _WorkerContext(SpawnContext):
+    Process = _WorkerProcess
+
+
+def create_spawn_executor(
+    max_workers: int,
+    initializer: Optional[Callable[..., Any]] = None,
+    initargs: Tuple = ()
+) -> ProcessPoolExecutor:
+    """创建spawn进程池（避免fork已加载模型/线程的进程），工作进程不重新导入主模块"""
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=_WorkerContext(),
+        initializer=initializer,
+        initargs=initargs
+    )
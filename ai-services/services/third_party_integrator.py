@@ -16,6 +16,17 @@ import hashlib
 import hmac
 import base64
 
+from .resilience import (
+    CircuitOpenError,
+    PolicyConfig,
+    RateLimitConfig,
+    RateLimiter,
+    ResilienceError,
+    ResiliencePolicy,
+    UpstreamHTTPError,
+    resilience_registry
+)
+
 class ServiceType(Enum):
     """服务类型"""
     CREDIT_BUREAU = "credit_bureau"
@@ -65,7 +76,7 @@ class ThirdPartyServiceIntegrator:
     def __init__(self):
         self.services: Dict[str, ServiceConfig] = {}
         self.session: Optional[aiohttp.ClientSession] = None
-        self.circuit_breakers: Dict[str, Dict[str, Any]] = {}
+        self.policies: Dict[str, ResiliencePolicy] = {}
         self._initialize_services()
     
     def _initialize_services(self):
@@ -168,15 +179,21 @@ class ThirdPartyServiceIntegrator:
             priority=1
         )
         
-        # 初始化熔断器
-        for service_name in self.services:
-            self.circuit_breakers[service_name] = {
-                "failure_count": 0,
-                "last_failure_time": None,
-                "state": "closed",  # closed, open, half-open
-                "failure_threshold": 5,
-                "timeout": 60
-            }
+        # 初始化熔断、限流与重试策略
+        for service_name, config in self.services.items():
+            self._build_policy(service_name, config)
+    
+    def _build_policy(self, service_name: str, config: ServiceConfig) -> ResiliencePolicy:
+        """按服务配置构建弹性策略：超时取timeout，重试取retry_count，rate_limit为每分钟调用上限"""
+        policy = ResiliencePolicy.from_config(f"third_party:{service_name}", PolicyConfig(
+            timeout=float(config.timeout),
+            max_retries=config.retry_count,
+            failure_threshold=5,
+            breaker_timeout=60
+        ))
+        policy.limiter = RateLimiter(policy.name, RateLimitConfig(max_requests=config.rate_limit, window_size=60))
+        self.policies[service_name] = resilience_registry.register(policy)
+        return policy
     
     async def initialize(self):
         """初始化HTTP会话"""
@@ -290,81 +307,38 @@ class ThirdPartyServiceIntegrator:
         request_id = str(uuid.uuid4())
         start_time = datetime.now()
         
-        # 检查熔断器状态
-        if self._is_circuit_breaker_open(service_name):
-            return ServiceResponse(
-                service_name=service_name,
-                success=False,
-                data={},
-                error_message="服务熔断器开启",
-                response_time=0.0,
-                timestamp=start_time,
-                request_id=request_id
-            )
+        url = f"{service_config.base_url}/{endpoint}"
         
-        try:
-            # 构建请求
-            url = f"{service_config.base_url}/{endpoint}"
+        async def send() -> Dict[str, Any]:
+            # 每次尝试重新签名，避免重试时复用时间戳与nonce
             headers = self._build_headers(service_config, data, request_id)
-            
-            # 发送请求
             async with self.session.post(url, json=data, headers=headers) as response:
-                response_time = (datetime.now() - start_time).total_seconds()
-                
-                if response.status == 200:
-                    result_data = await response.json()
-                    self._reset_circuit_breaker(service_name)
-                    
-                    return ServiceResponse(
-                        service_name=service_name,
-                        success=True,
-                        data=result_data,
-                        error_message="",
-                        response_time=response_time,
-                        timestamp=start_time,
-                        request_id=request_id
-                    )
-                else:
+                if response.status != 200:
                     error_text = await response.text()
-                    self._record_circuit_breaker_failure(service_name)
-                    
-                    return ServiceResponse(
-                        service_name=service_name,
-                        success=False,
-                        data={},
-                        error_message=f"HTTP {response.status}: {error_text}",
-                        response_time=response_time,
-                        timestamp=start_time,
-                        request_id=request_id
-                    )
-                    
+                    raise UpstreamHTTPError(response.status, f"HTTP {response.status}: {error_text}")
+                return await response.json()
+        
+        try:
+            result_data = await self.policies[service_name].call(send)
+            success, error_message = True, ""
+        except CircuitOpenError:
+            result_data, success, error_message = {}, False, "服务熔断器开启"
+        except ResilienceError as e:
+            result_data, success, error_message = {}, False, str(e)
         except asyncio.TimeoutError:
-            response_time = (datetime.now() - start_time).total_seconds()
-            self._record_circuit_breaker_failure(service_name)
-            
-            return ServiceResponse(
-                service_name=service_name,
-                success=False,
-                data={},
-                error_message="请求超时",
-                response_time=response_time,
-                timestamp=start_time,
-                request_id=request_id
-            )
-            
+            result_data, success, error_message = {}, False, "请求超时"
         except Exception as e:
-            response_time = (datetime.now() - start_time).total_seconds()
-            self._record_circuit_breaker_failure(service_name)
-            
-            return ServiceResponse(
-                service_name=service_name,
-                success=False,
-                data={},
-                error_message=str(e),
-                response_time=response_time,
-                timestamp=start_time,
-                request_id=request_id
-            )
+            result_data, success, error_message = {}, False, str(e)
+        
+        return ServiceResponse(
+            service_name=service_name,
+            success=success,
+            data=result_data,
+            error_message=error_message,
+            response_time=(datetime.now() - start_time).total_seconds(),
+            timestamp=start_time,
+            request_id=request_id
+        )
     
     def _build_headers(self, service_config: ServiceConfig, data: Dict[str, Any], request_id: str) -> Dict[str, str]:
         """构建请求头"""
@@ -389,59 +363,18 @@ class ThirdPartyServiceIntegrator:
             "User-Agent": "AI-Loan-Platform/2.1.0"
         }
     
-    def _is_circuit_breaker_open(self, service_name: str) -> bool:
-        """检查熔断器是否开启"""
-        if service_name not in self.circuit_breakers:
-            return False
-        
-        breaker = self.circuit_breakers[service_name]
-        
-        if breaker["state"] == "open":
-            # 检查是否可以尝试半开状态
-            if breaker["last_failure_time"]:
-                time_since_failure = (datetime.now() - breaker["last_failure_time"]).total_seconds()
-                if time_since_failure > breaker["timeout"]:
-                    breaker["state"] = "half-open"
-                    return False
-            return True
-        
-        return False
-    
-    def _record_circuit_breaker_failure(self, service_name: str):
-        """记录熔断器失败"""
-        if service_name not in self.circuit_breakers:
-            return
-        
-        breaker = self.circuit_breakers[service_name]
-        breaker["failure_count"] += 1
-        breaker["last_failure_time"] = datetime.now()
-        
-        if breaker["failure_count"] >= breaker["failure_threshold"]:
-            breaker["state"] = "open"
-            logger.warning(f"服务 {service_name} 熔断器开启")
-    
-    def _reset_circuit_breaker(self, service_name: str):
-        """重置熔断器"""
-        if service_name not in self.circuit_breakers:
-            return
-        
-        breaker = self.circuit_breakers[service_name]
-        breaker["failure_count"] = 0
-        breaker["last_failure_time"] = None
-        breaker["state"] = "closed"
-    
     async def get_service_status(self) -> Dict[str, Any]:
         """获取服务状态"""
         status_info = {}
         
         for service_name, config in self.services.items():
-            breaker = self.circuit_breakers.get(service_name, {})
+            breaker = self.policies[service_name].breaker
             status_info[service_name] = {
                 "service_name": config.service_name,
                 "service_type": config.service_type.value,
                 "status": config.status.value,
-                "circuit_breaker_state": breaker.get("state", "closed"),
-                "failure_count": breaker.get("failure_count", 0),
+                "circuit_breaker_state": breaker.state.value if breaker else "closed",
+                "failure_count": breaker.failure_count if breaker else 0,
                 "priority": config.priority,
                 "rate_limit": config.rate_limit,
                 "timeout": config.timeout
@@ -481,26 +414,23 @@ class ThirdPartyServiceIntegrator:
             for key, value in config_updates.items():
                 if hasattr(config, key):
                     setattr(config, key, value)
+            # 超时、重试或限流参数变化时重建策略
+            if {"timeout", "retry_count", "rate_limit"} & config_updates.keys():
+                self._build_policy(service_name, config)
             logger.info(f"服务 {service_name} 配置已更新")
     
     def add_service(self, service_name: str, config: ServiceConfig):
         """添加新服务"""
         self.services[service_name] = config
-        self.circuit_breakers[service_name] = {
-            "failure_count": 0,
-            "last_failure_time": None,
-            "state": "closed",
-            "failure_threshold": 5,
-            "timeout": 60
-        }
+        self._build_policy(service_name, config)
         logger.info(f"新服务 {service_name} 已添加")
     
     def remove_service(self, service_name: str):
         """移除服务"""
         if service_name in self.services:
             del self.services[service_name]
-            if service_name in self.circuit_breakers:
-                del self.circuit_breakers[service_name]
+            if service_name in self.policies:
+                resilience_registry.remove(self.policies.pop(service_name).name)
             logger.info(f"服务 {service_name} 已移除")
 
 # 全局实例
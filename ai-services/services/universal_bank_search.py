@@ -4,6 +4,8 @@
 
 import requests
 import json
+import hashlib
+import os
 import re
 import asyncio
 import aiohttp
@@ -13,12 +15,17 @@ from loguru import logger
 from datetime import datetime
 import time
 from .real_web_search import real_web_search_service
+from .resilience import fetch_web_text
+from .single_flight import single_flight_manager
 
 class UniversalBankSearchService:
     """通用银行搜索服务"""
     
     def __init__(self):
         self.session = None
+        # 搜索结果缓存时间（秒）与相同请求合并
+        self.cache_ttl = int(os.getenv("BANK_SEARCH_CACHE_TTL", "1800"))
+        self._search_flight = single_flight_manager.group("bank_info_search")
         # 银行关键词映射
         self.bank_keywords = {
             "人民银行": ["人民银行", "央行", "pboc", "中国人民银行", "央行", "人民银行", "人行"],
@@ -276,7 +283,22 @@ class UniversalBankSearchService:
             logger.error(f"LLM推理银行检测失败: {e}")
             return None
     
+    def _generate_cache_key(self, bank_name: str, query: str = "") -> str:
+        """生成缓存键"""
+        key_data = f"bank_info:{bank_name}:{query}"
+        return hashlib.md5(key_data.encode()).hexdigest()
+    
     async def search_bank_info(self, bank_name: str, query: str = "") -> Dict[str, Any]:
+        """搜索银行信息（带缓存），相同银行与问题的并发请求合并为一次外网请求"""
+        cache_key = self._generate_cache_key(bank_name, query)
+        return await self._search_flight.cached(
+            cache_key,
+            lambda: self._search_bank_info(bank_name, query),
+            ttl=self.cache_ttl,
+            cache_if=lambda result: not result.get("error")
+        )
+    
+    async def _search_bank_info(self, bank_name: str, query: str) -> Dict[str, Any]:
         """搜索银行信息"""
         try:
             # 检查是否是已知银行
@@ -336,13 +358,9 @@ class UniversalBankSearchService:
                 "category": "loan"
             }
             
-            async with self.session.get(search_url, params=params) as response:
-                if response.status == 200:
-                    content = await response.text()
-                    return await self._parse_bank_website(bank_name, content, query)
-                else:
-                    return {"error": f"HTTP {response.status}"}
-                    
+            content = await fetch_web_text(self.session, search_url, params=params)
+            return await self._parse_bank_website(bank_name, content, query)
+            
         except Exception as e:
             logger.error(f"实时获取银行信息失败: {e}")
             return {"error": str(e)}
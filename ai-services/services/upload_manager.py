@@ -0,0 +1,178 @@
+"""
+上传文件管理服务
+上传内容按固定大小分块流式写入唯一命名的临时文件，写入同时计算SHA-256；
+单请求与全局在途字节数由上传限额中间件在读取请求体之前检查（全局额度不足时等待释放，即背压），
+单文件限额在落盘时检查；请求结束后保证清理临时文件
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Any, List
+
+from fastapi import UploadFile
+from loguru import logger
+
+
+class UploadTooLargeError(Exception):
+    """上传超过单文件或单请求限额"""
+
+
+class UploadBudgetExhaustedError(Exception):
+    """全局在途字节额度在等待时间内未释放"""
+
+
+@dataclass
+class StoredUpload:
+    """已落盘的上传文件"""
+    path: str
+    filename: str
+    extension: str
+    content_type: str
+    size: int
+    sha256: str
+
+
+class UploadManager:
+    """上传文件管理器"""
+
+    def __init__(self):
+        self.upload_dir = os.getenv("UPLOAD_DIR", "uploads")
+        self.chunk_size = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+        self.max_file_bytes = int(os.getenv("UPLOAD_MAX_FILE_BYTES", str(100 * 1024 * 1024)))
+        self.max_request_bytes = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(500 * 1024 * 1024)))
+        self.max_inflight_bytes = int(os.getenv("UPLOAD_MAX_INFLIGHT_BYTES", str(1024 * 1024 * 1024)))
+        self.budget_wait_timeout = float(os.getenv("UPLOAD_BUDGET_WAIT_TIMEOUT", "30"))
+        self._inflight_bytes = 0
+        self._budget_changed: asyncio.Condition = None
+        self.stats = {
+            "uploads": 0,
+            "bytes_received": 0,
+            "rejected_too_large": 0,
+            "rejected_budget": 0,
+            "budget_waits": 0
+        }
+
+    @staticmethod
+    def _extension(filename: str) -> str:
+        """取扩展名并去除非法字符（文件名来自客户端，不参与落盘路径）"""
+        extension = os.path.splitext(filename or "")[1][1:].lower()
+        return re.sub(r'[^a-z0-9]', '', extension)[:16]
+
+    async def _reserve(self, size: int):
+        """占用全局在途额度，不足时等待其他上传释放"""
+        if self._budget_changed is None:
+            self._budget_changed = asyncio.Condition()
+        async with self._budget_changed:
+            if self._inflight_bytes + size > self.max_inflight_bytes:
+                self.stats["budget_waits"] += 1
+                try:
+                    await asyncio.wait_for(
+                        self._budget_changed.wait_for(
+                            lambda: self._inflight_bytes + size <= self.max_inflight_bytes
+                        ),
+                        timeout=self.budget_wait_timeout
+                    )
+                except asyncio.TimeoutError:
+                    self.stats["rejected_budget"] += 1
+                    raise UploadBudgetExhaustedError("上传服务繁忙，请稍后重试")
+            self._inflight_bytes += size
+
+    async def reserve_request(self, size: int) -> int:
+        """在读取请求体之前按声明长度占用全局在途额度，返回实际占用的字节数"""
+        size = min(max(size, 0), self.max_inflight_bytes)
+        await self._reserve(size)
+        return size
+
+    async def release_request(self, size: int):
+        """请求结束后释放占用的全局在途额度"""
+        await self._release(size)
+
+    async def _release(self, size: int):
+        """释放全局在途额度"""
+        if size <= 0 or self._budget_changed is None:
+            return
+        async with self._budget_changed:
+            self._inflight_bytes -= size
+            self._budget_changed.notify_all()
+
+    async def _save(self, file: UploadFile, request_remaining: int) -> StoredUpload:
+        """分块读取上传内容写入临时文件，边写边计算哈希"""
+        extension = self._extension(file.filename)
+        fd, path = tempfile.mkstemp(prefix="upload_", suffix=f".{extension}" if extension else "", dir=self.upload_dir)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as buffer:
+                while True:
+                    chunk = await file.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_file_bytes or size > request_remaining:
+                        self.stats["rejected_too_large"] += 1
+                        raise UploadTooLargeError(
+                            f"文件 {file.filename} 超过上传限额"
+                            f"（单文件 {self.max_file_bytes} 字节，单请求 {self.max_request_bytes} 字节）"
+                        )
+                    digest.update(chunk)
+                    buffer.write(chunk)
+        except BaseException:
+            os.remove(path)
+            raise
+        finally:
+            await file.close()
+
+        self.stats["uploads"] += 1
+        self.stats["bytes_received"] += size
+        return StoredUpload(
+            path=path,
+            filename=file.filename,
+            extension=extension,
+            content_type=file.content_type,
+            size=size,
+            sha256=digest.hexdigest()
+        )
+
+    @asynccontextmanager
+    async def receive(self, files: List[UploadFile]) -> AsyncIterator[List[StoredUpload]]:
+        """接收一个请求中的全部上传文件，退出上下文时删除临时文件"""
+        os.makedirs(self.upload_dir, exist_ok=True)
+        stored: List[StoredUpload] = []
+        try:
+            for file in files:
+                request_remaining = self.max_request_bytes - sum(upload.size for upload in stored)
+                stored.append(await self._save(file, request_remaining))
+            yield stored
+        finally:
+            for upload in stored:
+                try:
+                    os.remove(upload.path)
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    logger.warning(f"清理临时文件失败: {upload.path}, {e}")
+
+    @asynccontextmanager
+    async def receive_one(self, file: UploadFile) -> AsyncIterator[StoredUpload]:
+        """接收单个上传文件"""
+        async with self.receive([file]) as stored:
+            yield stored[0]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取上传统计"""
+        return {
+            **self.stats,
+            "inflight_bytes": self._inflight_bytes,
+            "max_inflight_bytes": self.max_inflight_bytes,
+            "max_file_bytes": self.max_file_bytes,
+            "max_request_bytes": self.max_request_bytes
+        }
+
+
+# 全局实例
+upload_manager = UploadManager()
@@ -0,0 +1,386 @@
+"""
+向量索引管理服务
+管理knowledge_base.embedding上的HNSW/IVFFlat近似最近邻索引：
+根据数据量推导建索引参数、按召回率目标设置查询参数、批量导入后并发重建，
+并提供与精确搜索对比的召回率-延迟基准测试
+"""
+
+import asyncio
+import math
+import os
+import re
+import time
+from dataclasses import dataclass, asdict
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+
+
+class IndexType(Enum):
+    """向量索引类型"""
+    HNSW = "hnsw"
+    IVFFLAT = "ivfflat"
+
+
+@dataclass
+class IndexParams:
+    """建索引参数"""
+    index_type: IndexType
+    lists: int = 0               # IVFFlat聚类中心数
+    m: int = 16                  # HNSW每层最大连接数
+    ef_construction: int = 64    # HNSW建图候选集大小
+
+
+@dataclass
+class SearchParams:
+    """查询参数"""
+    probes: int = 1              # IVFFlat探测的聚类数
+    ef_search: int = 40          # HNSW查询候选集大小
+
+
+# 召回率目标 -> (IVFFlat探测比例系数, HNSW ef_search)，两点之间线性插值
+_RECALL_CURVE = [
+    (0.80, 0.5, 20),
+    (0.90, 1.0, 40),
+    (0.95, 2.0, 80),
+    (0.98, 4.0, 160),
+    (0.99, 8.0, 256),
+]
+
+
+class VectorIndexManager:
+    """向量索引管理器"""
+
+    def __init__(
+        self,
+        table: str = "knowledge_base",
+        column: str = "embedding",
+        index_name: str = "knowledge_base_embedding_idx",
+        opclass: str = "vector_cosine_ops"
+    ):
+        self.table = table
+        self.column = column
+        self.index_name = index_name
+        self.opclass = opclass
+        self.index_type = self._configured_index_type()
+        self.recall_target = float(os.getenv("RAG_RECALL_TARGET", "0.95"))
+        # 新增行数超过已索引行数的该比例时重建IVFFlat索引
+        self.rebuild_ratio = float(os.getenv("RAG_INDEX_REBUILD_RATIO", "0.2"))
+        self.maintenance_work_mem = os.getenv("RAG_INDEX_MAINTENANCE_WORK_MEM", "512MB")
+        self.index_params: Optional[IndexParams] = None
+        self.indexed_rows = 0
+        self.pending_rows = 0
+        self.last_rebuild: Optional[Dict[str, Any]] = None
+        # 基准测试得到的 (参数值, 实测召回率)，按参数值升序
+        self.calibration: List[Dict[str, float]] = []
+        self._rebuild_lock = asyncio.Lock()
+
+    @staticmethod
+    def _configured_index_type() -> IndexType:
+        """RAG_VECTOR_INDEX_TYPE指定的索引类型，取值无效时使用HNSW"""
+        value = os.getenv("RAG_VECTOR_INDEX_TYPE", "hnsw").strip().lower()
+        try:
+            return IndexType(value)
+        except ValueError:
+            logger.warning(f"RAG_VECTOR_INDEX_TYPE={value} 不是有效的索引类型，使用hnsw")
+            return IndexType.HNSW
+
+    @staticmethod
+    def derive_index_params(row_count: int, index_type: IndexType) -> IndexParams:
+        """根据行数推导建索引参数（pgvector推荐值）"""
+        if index_type == IndexType.IVFFLAT:
+            if row_count <= 1_000_000:
+                lists = max(1, row_count // 1000)
+            else:
+                lists = int(math.sqrt(row_count))
+            return IndexParams(index_type=index_type, lists=lists)
+
+        if row_count < 100_000:
+            return IndexParams(index_type=index_type, m=16, ef_construction=64)
+        if row_count < 1_000_000:
+            return IndexParams(index_type=index_type, m=16, ef_construction=128)
+        return IndexParams(index_type=index_type, m=24, ef_construction=200)
+
+    def derive_search_params(self, recall_target: float = None, k: int = 10) -> SearchParams:
+        """根据召回率目标推导查询参数，有基准测试校准数据时优先使用"""
+        recall_target = recall_target or self.recall_target
+
+        if self.calibration:
+            chosen = self.calibration[-1]["value"]
+            for point in self.calibration:
+                if point["recall"] >= recall_target:
+                    chosen = point["value"]
+                    break
+            if self.index_type == IndexType.IVFFLAT:
+                return SearchParams(probes=int(chosen))
+            return SearchParams(ef_search=max(int(chosen), k))
+
+        probe_factor, ef_search = self._interpolate_curve(recall_target)
+        lists = self.index_params.lists if self.index_params and self.index_params.lists else 100
+        probes = min(lists, max(1, math.ceil(math.sqrt(lists) * probe_factor)))
+        return SearchParams(probes=probes, ef_search=max(int(ef_search), k))
+
+    @staticmethod
+    def _interpolate_curve(recall_target: float):
+        """在召回率曲线上线性插值"""
+        if recall_target <= _RECALL_CURVE[0][0]:
+            return _RECALL_CURVE[0][1], _RECALL_CURVE[0][2]
+        for (r0, p0, e0), (r1, p1, e1) in zip(_RECALL_CURVE, _RECALL_CURVE[1:]):
+            if recall_target <= r1:
+                t = (recall_target - r0) / (r1 - r0)
+                return p0 + t * (p1 - p0), e0 + t * (e1 - e0)
+        return _RECALL_CURVE[-1][1], _RECALL_CURVE[-1][2]
+
+    async def apply_search_params(self, conn, recall_target: float = None, k: int = 10) -> SearchParams:
+        """在当前事务内设置probes/ef_search（调用方需处于conn.transaction()中）"""
+        params = self.derive_search_params(recall_target, k)
+        if self.index_type == IndexType.IVFFLAT:
+            await conn.execute("SELECT set_config('ivfflat.probes', $1, true)", str(params.probes))
+        else:
+            await conn.execute("SELECT set_config('hnsw.ef_search', $1, true)", str(params.ef_search))
+        return params
+
+    def bind(self, column: str, index_name: str):
+        """切换管理的向量列（嵌入模型版本切换后），索引状态需重新读取"""
+        if column == self.column and index_name == self.index_name:
+            return
+        self.column = column
+        self.index_name = index_name
+        self.index_params = None
+        self.indexed_rows = 0
+        self.pending_rows = 0
+        self.calibration = []
+
+    async def refresh_state(self, pool):
+        """从数据库读取当前索引类型和已向量化行数"""
+        async with pool.acquire() as conn:
+            indexdef = await conn.fetchval(
+                "SELECT indexdef FROM pg_indexes WHERE tablename = $1 AND indexname = $2",
+                self.table, self.index_name
+            )
+            self.indexed_rows = await conn.fetchval(
+                f"SELECT COUNT(*) FROM {self.table} WHERE {self.column} IS NOT NULL"
+            )
+
+        if indexdef:
+            index_type = IndexType.HNSW if "USING hnsw" in indexdef else IndexType.IVFFLAT
+            self.index_type = index_type
+            params = self.derive_index_params(self.indexed_rows, index_type)
+            for field in ("lists", "m", "ef_construction"):
+                match = re.search(rf"\b{field}\s*=\s*'?(\d+)", indexdef)
+                if match:
+                    setattr(params, field, int(match.group(1)))
+            self.index_params = params
+        logger.info(
+            f"向量索引状态: {self.index_name} type={self.index_type.value} rows={self.indexed_rows}"
+        )
+
+    def record_bulk_load(self, rows: int):
+        """记录批量导入的行数"""
+        self.pending_rows += max(0, rows)
+
+    def needs_rebuild(self) -> bool:
+        """判断批量导入后是否需要重建索引
+
+        HNSW支持增量插入，只在索引缺失时重建；IVFFlat的聚类中心在建索引时
+        训练，新增数据超过阈值比例后召回率会下降，需要重建
+        """
+        if self.index_params is None:
+            return self.pending_rows > 0
+        if self.index_type == IndexType.HNSW:
+            return False
+        return self.pending_rows > max(1000, self.indexed_rows * self.rebuild_ratio)
+
+    async def maybe_rebuild(self, pool) -> Optional[Dict[str, Any]]:
+        """批量导入后按需并发重建索引"""
+        if not self.needs_rebuild() or self._rebuild_lock.locked():
+            return None
+        return await self.rebuild_index(pool)
+
+    def schedule_rebuild(self, pool) -> Optional[asyncio.Task]:
+        """批量导入结束后在后台触发按需重建"""
+        if not self.needs_rebuild():
+            return None
+
+        async def _run():
+            try:
+                await self.maybe_rebuild(pool)
+            except Exception as e:
+                logger.error(f"向量索引后台重建失败: {e}")
+
+        return asyncio.create_task(_run())
+
+    def _index_ddl(self, name: str, params: IndexParams, concurrently: bool) -> str:
+        """生成建索引语句"""
+        if params.index_type == IndexType.IVFFLAT:
+            with_clause = f"lists = {params.lists}"
+        else:
+            with_clause = f"m = {params.m}, ef_construction = {params.ef_construction}"
+        return (
+            f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}{name} "
+            f"ON {self.table} USING {params.index_type.value} ({self.column} {self.opclass}) "
+            f"WITH ({with_clause})"
+        )
+
+    async def rebuild_index(
+        self,
+        pool,
+        index_type: IndexType = None,
+        concurrently: bool = True
+    ) -> Dict[str, Any]:
+        """按当前数据量重建向量索引
+
+        新索引以临时名称并发创建，完成后在事务内替换旧索引，期间查询不受阻塞
+        """
+        async with self._rebuild_lock:
+            start_time = time.monotonic()
+            index_type = index_type or self.index_type
+            tmp_name = f"{self.index_name}_new"
+
+            async with pool.acquire() as conn:
+                row_count = await conn.fetchval(
+                    f"SELECT COUNT(*) FROM {self.table} WHERE {self.column} IS NOT NULL"
+                )
+                params = self.derive_index_params(row_count, index_type)
+
+                # 会话级设置，连接归还连接池前恢复默认值，避免影响后续借用该连接的请求
+                await conn.execute(f"SET maintenance_work_mem = '{self.maintenance_work_mem}'")
+                try:
+                    # 清理上次失败留下的无效索引
+                    await conn.execute(
+                        f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {tmp_name}"
+                    )
+                    logger.info(f"开始重建向量索引: {self._index_ddl(tmp_name, params, concurrently)}")
+                    await conn.execute(self._index_ddl(tmp_name, params, concurrently), timeout=None)
+
+                    async with conn.transaction():
+                        await conn.execute(f"DROP INDEX IF EXISTS {self.index_name}")
+                        await conn.execute(f"ALTER INDEX {tmp_name} RENAME TO {self.index_name}")
+                    await conn.execute(f"ANALYZE {self.table}")
+                finally:
+                    await conn.execute("RESET maintenance_work_mem")
+
+            self.index_type = index_type
+            self.index_params = params
+            self.indexed_rows = row_count
+            self.pending_rows = 0
+            self.calibration = []
+            self.last_rebuild = {
+                "index_type": index_type.value,
+                "params": {k: v for k, v in asdict(params).items() if k != "index_type"},
+                "rows": row_count,
+                "duration": time.monotonic() - start_time,
+                "concurrently": concurrently,
+                "finished_at": time.time()
+            }
+            logger.info(f"向量索引重建完成: rows={row_count}, 耗时 {self.last_rebuild['duration']:.2f}秒")
+            return self.last_rebuild
+
+    async def benchmark(
+        self,
+        pool,
+        num_queries: int = 50,
+        k: int = 10,
+        param_values: List[int] = None
+    ) -> Dict[str, Any]:
+        """召回率-延迟基准测试
+
+        随机抽取库内向量作为查询，先关闭索引扫描求精确top-k作为基准，
+        再逐个参数值执行ANN查询，统计recall@k与p50/p95延迟，并据此校准查询参数
+        """
+        if param_values is None:
+            if self.index_type == IndexType.IVFFLAT:
+                lists = self.index_params.lists if self.index_params else 100
+                param_values = sorted({max(1, min(lists, v)) for v in (1, 2, 4, 8, 16, 32, 64, lists)})
+            else:
+                param_values = [10, 20, 40, 80, 160, 320]
+        guc = "ivfflat.probes" if self.index_type == IndexType.IVFFLAT else "hnsw.ef_search"
+        search_sql = (
+            f"SELECT id FROM {self.table} WHERE {self.column} IS NOT NULL "
+            f"ORDER BY {self.column} <=> $1::vector LIMIT $2"
+        )
+
+        async with pool.acquire() as conn:
+            query_vectors = await conn.fetch(
+                f"SELECT {self.column}::text AS v FROM {self.table} "
+                f"WHERE {self.column} IS NOT NULL ORDER BY random() LIMIT $1",
+                num_queries
+            )
+            query_vectors = [row["v"] for row in query_vectors]
+            if not query_vectors:
+                return {"error": "知识库中没有向量数据"}
+
+            exact_ids = []
+            exact_latencies = []
+            for vector in query_vectors:
+                async with conn.transaction():
+                    await conn.execute("SELECT set_config('enable_indexscan', 'off', true)")
+                    started = time.perf_counter()
+                    rows = await conn.fetch(search_sql, vector, k)
+                    exact_latencies.append((time.perf_counter() - started) * 1000)
+                exact_ids.append({row["id"] for row in rows})
+
+            curve = []
+            for value in param_values:
+                recalls = []
+                latencies = []
+                for vector, truth in zip(query_vectors, exact_ids):
+                    async with conn.transaction():
+                        await conn.execute("SELECT set_config($1, $2, true)", guc, str(value))
+                        started = time.perf_counter()
+                        rows = await conn.fetch(search_sql, vector, k)
+                        latencies.append((time.perf_counter() - started) * 1000)
+                    if truth:
+                        recalls.append(len(truth & {row["id"] for row in rows}) / len(truth))
+                curve.append({
+                    "value": value,
+                    "recall": sum(recalls) / len(recalls) if recalls else 0.0,
+                    "p50_ms": _percentile(latencies, 50),
+                    "p95_ms": _percentile(latencies, 95)
+                })
+
+        self.calibration = [{"value": p["value"], "recall": p["recall"]} for p in curve]
+        return {
+            "index_type": self.index_type.value,
+            "parameter": guc,
+            "k": k,
+            "num_queries": len(query_vectors),
+            "exact": {
+                "p50_ms": _percentile(exact_latencies, 50),
+                "p95_ms": _percentile(exact_latencies, 95)
+            },
+            "curve": curve
+        }
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取索引状态"""
+        search_params = self.derive_search_params()
+        return {
+            "index_name": self.index_name,
+            "index_type": self.index_type.value,
+            "index_params": (
+                {k: v for k, v in asdict(self.index_params).items() if k != "index_type"}
+                if self.index_params else None
+            ),
+            "indexed_rows": self.indexed_rows,
+            "pending_rows": self.pending_rows,
+            "recall_target": self.recall_target,
+            "search_params": asdict(search_params),
+            "calibrated": bool(self.calibration),
+            "rebuilding": self._rebuild_lock.locked(),
+            "last_rebuild": self.last_rebuild
+        }
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    """计算百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(percentile / 100 * len(ordered)) - 1))
+    return round(ordered[index], 3)
+
+
+# 全局实例
+vector_index_manager = VectorIndexManager()
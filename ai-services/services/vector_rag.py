@@ -5,191 +5,416 @@
 
 import asyncio
 import asyncpg
+import threading
 import numpy as np
-from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from loguru import logger
 import os
+import time
 import json
 from datetime import datetime
 import hashlib
-from .cache_service import cache_service
+from .single_flight import single_flight_manager
+from .database import database
+from .embedding_models import (
+    MODEL_CHANGED_CHANNEL, EmbeddingModelVersion, embedding_model_registry, knowledge_embedding_text
+)
+from .onnx_embedding import load_embedding_model
+from .vector_index_manager import vector_index_manager
+from .memory_vector_index import memory_vector_index
+from .hybrid_retriever import HybridRetriever
 
 class VectorRAGService:
     """向量化RAG服务"""
     
     def __init__(self):
-        self.db_config = {
-            "host": os.getenv("POSTGRES_HOST", "ai-loan-postgresql"),
-            "port": int(os.getenv("POSTGRES_PORT", "5432")),
-            "database": os.getenv("POSTGRES_DB", "ai_loan_rag"),
-            "user": os.getenv("POSTGRES_USER", "ai_loan"),
-            "password": os.getenv("POSTGRES_PASSWORD", "ai_loan123")
-        }
+        # 共享统一数据库访问层（initialize后为services.database.database）
         self.connection_pool = None
-        self.embedding_model = None
-        self._initialize_embedding_model()
+        # 嵌入模型按版本在首次使用或后台预热时加载，不在导入时加载；加载失败记为None
+        self._embedding_models: Dict[str, Any] = {}
+        self._embedding_model_lock = threading.Lock()
+        self.embedding_model_load_seconds: Dict[str, float] = {}
+        # 文本检索模式: fts(tsvector + pg_trgm) 或 ilike
+        self.text_search_mode = os.getenv("RAG_TEXT_SEARCH_MODE", "fts")
+        self.fts_config = os.getenv("RAG_FTS_CONFIG", "chinese_zh")
+        # 全文排名与三元组相似度的融合权重
+        self.fts_weight = float(os.getenv("RAG_FTS_WEIGHT", "0.6"))
+        self.hybrid_retriever = HybridRetriever(self)
+        # 相同查询的并发请求合并（single-flight）
+        self._text_search_flight = single_flight_manager.group("knowledge_text_search")
+        self._hybrid_search_flight = single_flight_manager.group("knowledge_hybrid_search")
+        # (模型ID, 查询文本) -> 嵌入向量，避免同一问题在检索和语义缓存中重复编码
+        # 由工作线程并发读写（asyncio.to_thread），读写与淘汰都在锁内进行
+        self._embedding_cache: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._embedding_cache_lock = threading.Lock()
+        self.embedding_cache_size = int(os.getenv("RAG_EMBEDDING_CACHE_SIZE", "1024"))
+        # 知识库变更通知（LISTEN knowledge_base_changed）
+        self._listener_conn = None
+        self._change_handlers: List[Callable[[Dict[str, Any]], None]] = []
+        embedding_model_registry.add_change_handler(self._on_embedding_model_changed)
     
-    def _initialize_embedding_model(self):
-        """初始化嵌入模型"""
-        try:
-            # 使用sentence-transformers作为嵌入模型
-            from sentence_transformers import SentenceTransformer
-            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
-            # 注意：all-MiniLM-L6-v2生成384维向量，需要调整PostgreSQL schema
-            logger.info("嵌入模型初始化成功")
-        except ImportError:
-            logger.warning("sentence-transformers未安装，使用简单文本匹配")
-            self.embedding_model = None
-        except Exception as e:
-            logger.error(f"嵌入模型初始化失败: {e}")
-            self.embedding_model = None
+    @property
+    def embedding_model(self):
+        """当前读取版本（active）的嵌入模型（首次访问时加载，线程安全）"""
+        return self.get_embedding_model(embedding_model_registry.active)
+    
+    @embedding_model.setter
+    def embedding_model(self, model):
+        self._embedding_models[embedding_model_registry.active.model_id] = model
+    
+    def get_embedding_model(self, version: EmbeddingModelVersion):
+        """获取指定版本的嵌入模型，未加载时加载"""
+        if version.model_id not in self._embedding_models:
+            self._load_embedding_model(version)
+        return self._embedding_models[version.model_id]
+    
+    def _load_embedding_model(self, version: EmbeddingModelVersion):
+        """加载嵌入模型并校验维度与嵌入列一致"""
+        with self._embedding_model_lock:
+            if version.model_id in self._embedding_models:
+                return
+            start_time = time.perf_counter()
+            model = None
+            try:
+                # 按EMBEDDING_BACKEND选择sentence-transformers（PyTorch）或ONNX Runtime int8后端
+                model = load_embedding_model(version.model_id)
+                dimension = model.get_sentence_embedding_dimension()
+                if dimension != version.dimension:
+                    logger.error(
+                        f"嵌入模型维度不匹配: {version.model_id} 输出 {dimension} 维，"
+                        f"列 {version.column_name} 为 {version.dimension} 维"
+                    )
+                    model = None
+                else:
+                    logger.info(f"嵌入模型初始化成功: {version.model_id} ({dimension}维)")
+            except ImportError:
+                logger.warning("sentence-transformers未安装，使用简单文本匹配")
+            except Exception as e:
+                logger.error(f"嵌入模型初始化失败: {version.model_id}, {e}")
+                model = None
+            self.embedding_model_load_seconds[version.model_id] = time.perf_counter() - start_time
+            self._embedding_models[version.model_id] = model
+    
+    async def warm_up(self):
+        """后台加载需要写入的各版本嵌入模型并编码一次，使首个请求不承担模型加载耗时"""
+        for version in embedding_model_registry.write_versions:
+            model = await asyncio.to_thread(self.get_embedding_model, version)
+            if model is not None:
+                await asyncio.to_thread(model.encode, "预热")
+    
+    def _on_embedding_model_changed(self, previous: EmbeddingModelVersion, current: EmbeddingModelVersion):
+        """读取版本切换：释放查询嵌入缓存，通知语义缓存等下游失效"""
+        with self._embedding_cache_lock:
+            self._embedding_cache.clear()
+        self._dispatch_change({"op": "EMBEDDING_MODEL", "model_id": current.model_id})
     
     async def initialize(self):
-        """初始化数据库连接池"""
+        """初始化数据库连接（共享统一数据库访问层的连接池）"""
         try:
-            self.connection_pool = await asyncpg.create_pool(
-                host=self.db_config["host"],
-                port=self.db_config["port"],
-                database=self.db_config["database"],
-                user=self.db_config["user"],
-                password=self.db_config["password"],
-                min_size=10,  # 增加最小连接数
-                max_size=50,  # 增加最大连接数
-                max_queries=50000,  # 每个连接最大查询数
-                max_inactive_connection_lifetime=300.0,  # 非活跃连接最大生存时间
-                command_timeout=60,  # 命令超时时间
-                server_settings={
-                    'jit': 'off',  # 关闭JIT以提高连接速度
-                    'application_name': 'ai_loan_rag'
-                }
-            )
-            logger.info("PostgreSQL连接池初始化成功 - 配置: min=10, max=50")
+            await database.initialize()
+            self.connection_pool = database
         except Exception as e:
             logger.error(f"PostgreSQL连接池初始化失败: {e}")
             raise
+        
+        try:
+            await embedding_model_registry.refresh()
+        except Exception as e:
+            logger.warning(f"读取嵌入模型版本失败: {e}")
+        
+        try:
+            await vector_index_manager.refresh_state(self.connection_pool)
+        except Exception as e:
+            logger.warning(f"读取向量索引状态失败: {e}")
+        
+        await self._start_change_listener()
+        await memory_vector_index.start(self)
+    
+    async def _start_change_listener(self):
+        """监听knowledge_base变更通知（由迁移003中的触发器发出）"""
+        try:
+            self._listener_conn = await database.connect()
+            await self._listener_conn.add_listener("knowledge_base_changed", self._on_change_notification)
+            await self._listener_conn.add_listener(MODEL_CHANGED_CHANNEL, embedding_model_registry.on_notification)
+            logger.info("知识库变更监听已启动")
+        except Exception as e:
+            logger.warning(f"知识库变更监听启动失败: {e}")
+            self._listener_conn = None
+    
+    def add_change_handler(self, handler: Callable[[Dict[str, Any]], None]):
+        """注册知识库变更回调，回调参数为 {"op": ..., "id": ..., "category": ...}"""
+        self._change_handlers.append(handler)
+    
+    def _on_change_notification(self, connection, pid, channel, payload):
+        """asyncpg通知回调"""
+        try:
+            self._dispatch_change(json.loads(payload))
+        except Exception as e:
+            logger.error(f"处理知识库变更通知失败: {e}")
+    
+    def _dispatch_change(self, change: Dict[str, Any]):
+        """分发知识库变更事件"""
+        for handler in self._change_handlers:
+            try:
+                handler(change)
+            except Exception as e:
+                logger.error(f"知识库变更回调失败: {e}")
     
     def is_initialized(self):
         """检查服务是否已初始化"""
         return self.connection_pool is not None
     
     async def close(self):
-        """关闭数据库连接池"""
-        if self.connection_pool:
-            await self.connection_pool.close()
-            logger.info("PostgreSQL连接池已关闭")
-    
-    def _get_embedding(self, text: str) -> List[float]:
-        """获取文本的向量嵌入"""
-        if self.embedding_model:
-            try:
-                embedding = self.embedding_model.encode(text)
-                return embedding.tolist()
-            except Exception as e:
-                logger.error(f"生成嵌入向量失败: {e}")
-                return None
-        else:
-            # 简单的文本向量化（基于词频）
-            words = text.lower().split()
-            word_count = {}
-            for word in words:
-                word_count[word] = word_count.get(word, 0) + 1
-            
-            # 创建固定长度的向量（1536维，匹配OpenAI）
-            vector = [0.0] * 1536
-            for i, (word, count) in enumerate(word_count.items()):
-                if i < 1536:
-                    vector[i] = count / len(words)
-            
-            return vector
+        """关闭变更监听连接（共享连接池由数据库访问层关闭）"""
+        await memory_vector_index.stop()
+        if self._listener_conn:
+            await self._listener_conn.close()
+            self._listener_conn = None
+        self.connection_pool = None
+    
+    def _get_embedding(self, text: str, version: EmbeddingModelVersion = None) -> Optional[np.ndarray]:
+        """获取文本的向量嵌入（float32数组，由vector二进制编解码器直接编码），默认使用active版本
+        
+        嵌入模型不可用时返回None：检索回退到全文搜索，写入的行由回填工具补齐嵌入
+        """
+        version = version or embedding_model_registry.active
+        model = self.get_embedding_model(version)
+        if model is None:
+            return None
+        key = (version.model_id, text)
+        with self._embedding_cache_lock:
+            cached = self._embedding_cache.get(key)
+            if cached is not None:
+                self._embedding_cache.move_to_end(key)
+                return cached
+        try:
+            # 编码在锁外进行，不串行化并发请求
+            embedding = np.asarray(model.encode(text), dtype=np.float32)
+            # 缓存的数组在多个请求间共享，设为只读
+            embedding.flags.writeable = False
+            with self._embedding_cache_lock:
+                self._embedding_cache[key] = embedding
+                if len(self._embedding_cache) > self.embedding_cache_size:
+                    self._embedding_cache.popitem(last=False)
+            return embedding
+        except Exception as e:
+            logger.error(f"生成嵌入向量失败: {e}")
+            return None
+    
+    @staticmethod
+    def _model_tag(versions: List[EmbeddingModelVersion], embeddings: List[Any]) -> Optional[str]:
+        """主嵌入列的模型标注（embedding_model列），未写入主嵌入列或未执行迁移时为None"""
+        if not embedding_model_registry.registry_available:
+            return None
+        for version, embedding in zip(versions, embeddings):
+            if version.is_primary and embedding is not None:
+                return version.model_id
+        return None
     
     async def add_knowledge(self, category: str, title: str, content: str, metadata: Dict[str, Any] = None) -> int:
-        """添加知识到向量数据库"""
+        """添加知识到向量数据库，双写到active及回填中的各嵌入版本"""
         try:
-            embedding = self._get_embedding(content)
-            if not embedding:
-                logger.warning("无法生成嵌入向量，跳过添加")
-                return None
+            versions = embedding_model_registry.write_versions
+            text = knowledge_embedding_text(content)
+            embeddings = [await asyncio.to_thread(self._get_embedding, text, version) for version in versions]
+            if embeddings[0] is None:
+                logger.warning("无法生成嵌入向量，写入后由回填工具补齐")
             
+            # vector参数由连接上注册的二进制编解码器编码
+            columns = ["category", "title", "content", "metadata"]
+            values = [category, title, content, json.dumps(metadata) if metadata else None]
+            placeholders = ["$1", "$2", "$3", "$4"]
+            for version, embedding in zip(versions, embeddings):
+                columns.append(version.column_name)
+                values.append(embedding)
+                placeholders.append(f"${len(values)}::{version.vector_type}")
+            model_tag = self._model_tag(versions, embeddings)
+            if model_tag is not None:
+                columns.append("embedding_model")
+                values.append(model_tag)
+                placeholders.append(f"${len(values)}")
+            query = f"""
+            INSERT INTO knowledge_base ({', '.join(columns)})
+            VALUES ({', '.join(placeholders)})
+            RETURNING id
+            """
             async with self.connection_pool.acquire() as conn:
-                # 将embedding转换为PostgreSQL vector格式
-                embedding_str = '[' + ','.join(map(str, embedding)) + ']'
-                query = """
-                INSERT INTO knowledge_base (category, title, content, embedding, metadata)
-                VALUES ($1, $2, $3, $4::VECTOR(384), $5)
-                RETURNING id
-                """
-                result = await conn.fetchval(
-                    query, 
-                    category, 
-                    title, 
-                    content, 
-                    embedding_str, 
-                    json.dumps(metadata) if metadata else None
-                )
+                result = await database.fetchval(query, *values, name="knowledge.insert", conn=conn)
                 logger.info(f"知识添加成功: {title} (ID: {result})")
                 return result
         except Exception as e:
             logger.error(f"添加知识失败: {e}")
             return None
     
+    def _get_embeddings(
+        self, texts: List[str], batch_size: int = 32, version: EmbeddingModelVersion = None
+    ) -> List[Optional[np.ndarray]]:
+        """批量获取向量嵌入，整批文本一次模型调用编码（文档导入用，不写入查询嵌入缓存）"""
+        model = self.get_embedding_model(version or embedding_model_registry.active)
+        if model is None:
+            return [None] * len(texts)
+        try:
+            embeddings = model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+            # 逐行视图，不复制
+            return list(np.asarray(embeddings, dtype=np.float32))
+        except Exception as e:
+            logger.error(f"批量生成嵌入向量失败: {e}")
+            return [None] * len(texts)
+    
+    async def add_knowledge_batch(self, records: List[Dict[str, Any]], conn=None) -> List[int]:
+        """批量写入已计算嵌入的知识，一条INSERT ... SELECT FROM unnest完成整批写入
+        
+        records元素包含 category、title、content、embedding（active版本）、metadata，返回按输入顺序的ID；
+        有回填中的影子版本时在此补算其嵌入并双写
+        """
+        if not records:
+            return []
+        versions = embedding_model_registry.write_versions
+        vector_args = [[record["embedding"] for record in records]]
+        for version in versions[1:]:
+            vector_args.append(await asyncio.to_thread(
+                self._get_embeddings,
+                [knowledge_embedding_text(record["content"]) for record in records], 32, version
+            ))
+        
+        aliases = [f"vector_{index}" for index in range(len(versions))]
+        columns = [version.column_name for version in versions]
+        selects = list(aliases)
+        args = [
+            [record["category"] for record in records],
+            [record["title"] for record in records],
+            [record["content"] for record in records],
+            [json.dumps(record["metadata"]) if record.get("metadata") else None for record in records],
+            *vector_args
+        ]
+        model_tag = self._model_tag(versions, vector_args)
+        if model_tag is not None:
+            columns.append("embedding_model")
+            args.append(model_tag)
+            selects.append(f"${len(args)}::VARCHAR")
+        unnest_params = ", ".join(
+            [f"${index}::TEXT[]" for index in range(1, 5)]
+            + [f"${index + 5}::VECTOR[]" for index in range(len(versions))]
+        )
+        query = f"""
+        INSERT INTO knowledge_base (category, title, content, metadata, {', '.join(columns)})
+        SELECT category, title, content, metadata::JSONB, {', '.join(selects)}
+        FROM unnest({unnest_params})
+            WITH ORDINALITY AS batch(category, title, content, metadata, {', '.join(aliases)}, ord)
+        ORDER BY ord
+        RETURNING id
+        """
+        if conn is not None:
+            rows = await database.fetch(query, *args, name="knowledge.insert_batch", conn=conn)
+        else:
+            async with self.connection_pool.acquire() as conn:
+                rows = await database.fetch(query, *args, name="knowledge.insert_batch", conn=conn)
+        return [row["id"] for row in rows]
+    
     async def search_knowledge_vector(
         self, 
         query: str, 
         category: str = None, 
         similarity_threshold: float = 0.7,
-        max_results: int = 5
+        max_results: int = 5,
+        recall_target: float = None
     ) -> List[Dict[str, Any]]:
-        """使用向量搜索知识库"""
+        """使用向量搜索知识库
+        
+        recall_target为ANN索引召回率目标，决定本次查询的ivfflat.probes/hnsw.ef_search
+        """
         try:
             query_embedding = self._get_embedding(query)
-            if not query_embedding:
+            if query_embedding is None:
                 logger.warning("无法生成查询向量，使用文本搜索")
                 return await self.search_knowledge_text(query, category, max_results)
             
-            async with self.connection_pool.acquire() as conn:
-                # 将embedding转换为PostgreSQL vector格式
-                embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
-                if category:
-                    query_sql = """
-                    SELECT id, category, title, content, 
-                           1 - (embedding <=> $1::VECTOR(384)) as similarity_score, metadata
-                    FROM knowledge_base 
-                    WHERE category = $2 AND embedding IS NOT NULL
-                    AND 1 - (embedding <=> $1::VECTOR(384)) > $3
-                    ORDER BY embedding <=> $1::VECTOR(384)
-                    LIMIT $4
-                    """
-                    results = await conn.fetch(query_sql, embedding_str, category, similarity_threshold, max_results)
-                else:
-                    query_sql = """
-                    SELECT id, category, title, content, 
-                           1 - (embedding <=> $1::VECTOR(384)) as similarity_score, metadata
-                    FROM knowledge_base 
-                    WHERE embedding IS NOT NULL
-                    AND 1 - (embedding <=> $1::VECTOR(384)) > $2
-                    ORDER BY embedding <=> $1::VECTOR(384)
-                    LIMIT $3
-                    """
-                    results = await conn.fetch(query_sql, embedding_str, similarity_threshold, max_results)
-                
-                knowledge_results = []
-                for row in results:
-                    knowledge_results.append({
-                        "id": row["id"],
-                        "category": row["category"],
-                        "title": row["title"],
-                        "content": row["content"],
-                        "similarity_score": float(row["similarity_score"]),
-                        "metadata": json.loads(row["metadata"]) if row["metadata"] else {}
-                    })
-                
-                logger.info(f"向量搜索完成，找到 {len(knowledge_results)} 条结果")
-                return knowledge_results
+            knowledge_results = await self._search_vector(
+                query_embedding, category, similarity_threshold, max_results, recall_target
+            )
+            logger.info(f"向量搜索完成，找到 {len(knowledge_results)} 条结果")
+            return knowledge_results
                 
         except Exception as e:
             logger.error(f"向量搜索失败: {e}")
             return await self.search_knowledge_text(query, category, max_results)
     
+    async def _search_vector(
+        self,
+        query_embedding: np.ndarray,
+        category: str,
+        similarity_threshold: Optional[float],
+        max_results: int,
+        recall_target: float = None
+    ) -> List[Dict[str, Any]]:
+        """向量检索：热点分类走进程内精确索引，其余分类查询PostgreSQL"""
+        results = memory_vector_index.search(category, query_embedding, max_results, similarity_threshold)
+        if results is not None:
+            return results
+        async with self.connection_pool.acquire() as conn:
+            rows = await self._fetch_vector(
+                conn, query_embedding, category, similarity_threshold, max_results, recall_target
+            )
+        return [self._row_to_result(row, "similarity_score") for row in rows]
+    
+    async def _fetch_vector(
+        self,
+        conn,
+        query_embedding: np.ndarray,
+        category: str,
+        similarity_threshold: Optional[float],
+        max_results: int,
+        recall_target: float = None
+    ):
+        """向量近邻查询（active版本的嵌入列），similarity_threshold为None时不过滤相似度"""
+        version = embedding_model_registry.active
+        column = version.column_name
+        vector_param = f"$1::{version.vector_type}"
+        threshold = similarity_threshold if similarity_threshold is not None else -1.0
+        async with conn.transaction():
+            await vector_index_manager.apply_search_params(conn, recall_target, max_results)
+            if category:
+                query_sql = f"""
+                SELECT id, category, title, content, 
+                       1 - ({column} <=> {vector_param}) as similarity_score, metadata
+                FROM knowledge_base 
+                WHERE category = $2 AND {column} IS NOT NULL
+                AND 1 - ({column} <=> {vector_param}) > $3
+                ORDER BY {column} <=> {vector_param}
+                LIMIT $4
+                """
+                return await database.fetch(
+                    query_sql, query_embedding, category, threshold, max_results,
+                    name="knowledge.vector_search_category", conn=conn
+                )
+            
+            query_sql = f"""
+            SELECT id, category, title, content, 
+                   1 - ({column} <=> {vector_param}) as similarity_score, metadata
+            FROM knowledge_base 
+            WHERE {column} IS NOT NULL
+            AND 1 - ({column} <=> {vector_param}) > $2
+            ORDER BY {column} <=> {vector_param}
+            LIMIT $3
+            """
+            return await database.fetch(
+                query_sql, query_embedding, threshold, max_results,
+                name="knowledge.vector_search", conn=conn
+            )
+    
+    @staticmethod
+    def _row_to_result(row, score_field: str) -> Dict[str, Any]:
+        """将查询行转换为检索结果"""
+        return {
+            "id": row["id"],
+            "category": row["category"],
+            "title": row["title"],
+            "content": row["content"],
+            "similarity_score": float(row[score_field]),
+            "metadata": json.loads(row["metadata"]) if row["metadata"] else {}
+        }
+    
     def _generate_cache_key(self, query: str, category: str = None, max_results: int = 5, search_type: str = "text") -> str:
         """生成缓存键"""
         key_data = f"{search_type}:{query}:{category or ''}:{max_results}"
@@ -201,109 +426,118 @@ class VectorRAGService:
         category: str = None, 
         max_results: int = 5
     ) -> List[Dict[str, Any]]:
-        """使用ILIKE模糊搜索知识库（带缓存）"""
-        # 检查缓存
-        cache_key = self._generate_cache_key(query, category, max_results, "text")
-        cached_result = await cache_service.get(cache_key)
-        if cached_result is not None:
-            logger.info(f"从缓存获取搜索结果: {query}")
-            return cached_result
+        """全文搜索知识库（带缓存）
         
-        try:
+        fts模式使用content_tsv + ts_rank_cd和pg_trgm三元组索引，
+        数据库未执行全文检索迁移时自动回退到ILIKE模式
+        """
+        # 相同查询的并发请求合并为一次数据库查询；缓存1小时，临近过期提前刷新
+        cache_key = self._generate_cache_key(query, category, max_results, self.text_search_mode)
+        
+        async def fetch() -> List[Dict[str, Any]]:
             async with self.connection_pool.acquire() as conn:
-                if category:
-                    query_sql = """
-                    SELECT id, category, title, content, 
-                           CASE 
-                               WHEN content ILIKE $1 THEN 1.0
-                               ELSE 0.5
-                           END as relevance_score,
-                           metadata
-                    FROM knowledge_base 
-                    WHERE category = $2 
-                    AND content ILIKE $1
-                    ORDER BY relevance_score DESC, id DESC
-                    LIMIT $3::INTEGER
-                    """
-                    results = await conn.fetch(query_sql, f"%{query}%", category, max_results)
-                else:
-                    query_sql = """
-                    SELECT id, category, title, content, 
-                           CASE 
-                               WHEN content ILIKE $1 THEN 1.0
-                               ELSE 0.5
-                           END as relevance_score,
-                           metadata
-                    FROM knowledge_base 
-                    WHERE content ILIKE $1
-                    ORDER BY relevance_score DESC, id DESC
-                    LIMIT $2
-                    """
-                    results = await conn.fetch(query_sql, f"%{query}%", max_results)
-                
-                knowledge_results = []
-                for row in results:
-                    knowledge_results.append({
-                        "id": row["id"],
-                        "category": row["category"],
-                        "title": row["title"],
-                        "content": row["content"],
-                        "similarity_score": float(row["relevance_score"]),
-                        "metadata": json.loads(row["metadata"]) if row["metadata"] else {}
-                    })
-                
-                logger.info(f"全文搜索完成，找到 {len(knowledge_results)} 条结果")
-                
-                # 存储到缓存（缓存1小时）
-                await cache_service.set(cache_key, knowledge_results, ttl=3600)
-                
-                return knowledge_results
-                
+                results = await self._fetch_text(conn, query, category, max_results)
+            knowledge_results = [self._row_to_result(row, "relevance_score") for row in results]
+            logger.info(f"全文搜索完成，找到 {len(knowledge_results)} 条结果")
+            return knowledge_results
+        
+        try:
+            return await self._text_search_flight.cached(cache_key, fetch, ttl=3600)
         except Exception as e:
             logger.error(f"全文搜索失败: {e}")
             return []
     
+    async def _fetch_text(self, conn, query: str, category: str, max_results: int):
+        """按当前文本检索模式查询，迁移未执行时回退到ILIKE"""
+        if self.text_search_mode == "fts":
+            try:
+                return await self._fetch_fulltext(conn, query, category, max_results)
+            except (
+                asyncpg.exceptions.UndefinedColumnError,
+                asyncpg.exceptions.UndefinedObjectError,
+                asyncpg.exceptions.UndefinedFunctionError
+            ) as e:
+                logger.warning(f"全文检索迁移未执行，回退到ILIKE模式: {e}")
+                self.text_search_mode = "ilike"
+        return await self._fetch_ilike(conn, query, category, max_results)
+    
+    async def _fetch_fulltext(self, conn, query: str, category: str, max_results: int):
+        """tsvector/ts_rank_cd全文检索，pg_trgm补充中文子串和模糊匹配"""
+        query_sql = """
+        WITH q AS (SELECT websearch_to_tsquery($4::regconfig, $1) AS tsq)
+        SELECT id, category, title, content, metadata,
+               ts_rank_cd(content_tsv, q.tsq, 32) * $5
+               + word_similarity($1, content) * (1 - $5) AS relevance_score
+        FROM knowledge_base, q
+        WHERE ($2::VARCHAR IS NULL OR category = $2)
+        AND (content_tsv @@ q.tsq OR $1 <% content OR content ILIKE $6)
+        ORDER BY relevance_score DESC, id DESC
+        LIMIT $3::INTEGER
+        """
+        return await database.fetch(
+            query_sql,
+            query,
+            category,
+            max_results,
+            self.fts_config,
+            self.fts_weight,
+            f"%{query}%",
+            name="knowledge.fulltext_search",
+            conn=conn
+        )
+    
+    async def _fetch_ilike(self, conn, query: str, category: str, max_results: int):
+        """ILIKE模糊搜索（未执行全文检索迁移时使用）"""
+        if category:
+            query_sql = """
+            SELECT id, category, title, content, 
+                   CASE 
+                       WHEN content ILIKE $1 THEN 1.0
+                       ELSE 0.5
+                   END as relevance_score,
+                   metadata
+            FROM knowledge_base 
+            WHERE category = $2 
+            AND content ILIKE $1
+            ORDER BY relevance_score DESC, id DESC
+            LIMIT $3::INTEGER
+            """
+            return await database.fetch(
+                query_sql, f"%{query}%", category, max_results,
+                name="knowledge.ilike_search_category", conn=conn
+            )
+        
+        query_sql = """
+        SELECT id, category, title, content, 
+               CASE 
+                   WHEN content ILIKE $1 THEN 1.0
+                   ELSE 0.5
+               END as relevance_score,
+               metadata
+        FROM knowledge_base 
+        WHERE content ILIKE $1
+        ORDER BY relevance_score DESC, id DESC
+        LIMIT $2
+        """
+        return await database.fetch(
+            query_sql, f"%{query}%", max_results,
+            name="knowledge.ilike_search", conn=conn
+        )
+    
     async def search_knowledge_hybrid(
         self, 
         query: str, 
         category: str = None, 
-        max_results: int = 5
+        max_results: int = 5,
+        rerank: bool = None
     ) -> List[Dict[str, Any]]:
-        """混合搜索（向量+全文）"""
+        """混合搜索（向量+全文并发检索，倒数排名融合），相同查询的并发请求合并为一次检索"""
         try:
-            # 首先尝试向量搜索
-            query_embedding = self._get_embedding(query)
-            if query_embedding:
-                try:
-                    async with self.connection_pool.acquire() as conn:
-                        # 将embedding转换为PostgreSQL vector格式
-                        embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
-                        query_sql = """
-                        SELECT id, category, title, content, relevance_score, metadata
-                        FROM search_knowledge_hybrid($1, $2::VECTOR(384), $3, $4)
-                        """
-                        results = await conn.fetch(query_sql, query, embedding_str, category or '', max_results)
-                        
-                        knowledge_results = []
-                        for row in results:
-                            knowledge_results.append({
-                                "id": row["id"],
-                                "category": row["category"],
-                                "title": row["title"],
-                                "content": row["content"],
-                                "similarity_score": float(row["relevance_score"]),
-                                "metadata": json.loads(row["metadata"]) if row["metadata"] else {}
-                            })
-                        
-                        if knowledge_results:
-                            logger.info(f"混合搜索完成，找到 {len(knowledge_results)} 条结果")
-                            return knowledge_results
-                except Exception as e:
-                    logger.warning(f"向量搜索失败，回退到文本搜索: {e}")
-            
-            # 回退到文本搜索
-            return await self.search_knowledge_text(query, category, max_results)
-                
+            cache_key = self._generate_cache_key(query, category, max_results, f"hybrid:{rerank}")
+            result = await self._hybrid_search_flight.do(
+                cache_key, lambda: self.hybrid_retriever.retrieve(query, category, max_results, rerank)
+            )
+            return result["results"]
         except Exception as e:
             logger.error(f"混合搜索失败: {e}")
             return await self.search_knowledge_text(query, category, max_results)
@@ -317,7 +551,7 @@ class VectorRAGService:
                 FROM knowledge_base 
                 WHERE id = $1
                 """
-                result = await conn.fetchrow(query, knowledge_id)
+                result = await database.fetchrow(query, knowledge_id, name="knowledge.get_by_id", conn=conn)
                 
                 if result:
                     return {
@@ -360,12 +594,18 @@ class VectorRAGService:
                     update_fields.append(f"content = ${param_count}")
                     params.append(content)
                     
-                    # 重新生成嵌入向量
-                    embedding = self._get_embedding(content)
-                    if embedding:
+                    # 重新生成各写入版本的嵌入向量；生成失败时置空，由回填工具补齐，避免保留过期嵌入
+                    versions = embedding_model_registry.write_versions
+                    text = knowledge_embedding_text(content)
+                    embeddings = [await asyncio.to_thread(self._get_embedding, text, version) for version in versions]
+                    for version, embedding in zip(versions, embeddings):
                         param_count += 1
-                        update_fields.append(f"embedding = ${param_count}")
+                        update_fields.append(f"{version.column_name} = ${param_count}::{version.vector_type}")
                         params.append(embedding)
+                    if embedding_model_registry.registry_available and any(v.is_primary for v in versions):
+                        param_count += 1
+                        update_fields.append(f"embedding_model = ${param_count}")
+                        params.append(self._model_tag(versions, embeddings))
                 
                 if metadata:
                     param_count += 1
@@ -385,9 +625,12 @@ class VectorRAGService:
                 WHERE id = $1
                 """
                 
-                result = await conn.execute(query, *params)
+                result = await database.execute(query, *params, name="knowledge.update", conn=conn)
                 logger.info(f"知识更新成功: ID {knowledge_id}")
-                return True
+            
+            # 触发器未安装时也能保证本进程缓存失效
+            self._dispatch_change({"op": "UPDATE", "id": knowledge_id})
+            return True
                 
         except Exception as e:
             logger.error(f"更新知识失败: {e}")
@@ -398,14 +641,55 @@ class VectorRAGService:
         try:
             async with self.connection_pool.acquire() as conn:
                 query = "DELETE FROM knowledge_base WHERE id = $1"
-                result = await conn.execute(query, knowledge_id)
+                result = await database.execute(query, knowledge_id, name="knowledge.delete", conn=conn)
                 logger.info(f"知识删除成功: ID {knowledge_id}")
-                return True
+            
+            self._dispatch_change({"op": "DELETE", "id": knowledge_id})
+            return True
                 
         except Exception as e:
             logger.error(f"删除知识失败: {e}")
             return False
     
+    async def delete_knowledge_by_document(self, document_id: str) -> int:
+        """删除同一文档写入的全部知识块（按metadata中的document_id），返回删除条数"""
+        try:
+            async with self.connection_pool.acquire() as conn:
+                query = "DELETE FROM knowledge_base WHERE metadata->>'document_id' = $1 RETURNING id"
+                rows = await database.fetch(query, document_id, name="knowledge.delete_document", conn=conn)
+            
+            for row in rows:
+                self._dispatch_change({"op": "DELETE", "id": row["id"]})
+            logger.info(f"文档知识块删除成功: document_id {document_id}, 共{len(rows)}条")
+            return len(rows)
+            
+        except Exception as e:
+            logger.error(f"删除文档知识块失败: {e}")
+            return 0
+    
+    async def update_document_metadata(self, document_id: str, patch: Dict[str, Any]) -> int:
+        """合并更新同一文档全部知识块的metadata（按metadata中的document_id），返回更新条数"""
+        try:
+            async with self.connection_pool.acquire() as conn:
+                query = """
+                UPDATE knowledge_base
+                SET metadata = metadata || $2::jsonb, updated_at = $3
+                WHERE metadata->>'document_id' = $1
+                RETURNING id
+                """
+                rows = await database.fetch(
+                    query, document_id, json.dumps(patch), datetime.now(),
+                    name="knowledge.update_document_metadata", conn=conn
+                )
+            
+            for row in rows:
+                self._dispatch_change({"op": "UPDATE", "id": row["id"]})
+            return len(rows)
+            
+        except Exception as e:
+            logger.error(f"更新文档知识块元数据失败: {e}")
+            return 0
+    
     async def get_knowledge_stats(self) -> Dict[str, Any]:
         """获取知识库统计信息"""
         try:
@@ -421,14 +705,16 @@ class VectorRAGService:
                     ORDER BY count DESC
                 """)
                 
-                # 有嵌入向量的数量
-                embedded_count = await conn.fetchval("""
-                    SELECT COUNT(*) FROM knowledge_base WHERE embedding IS NOT NULL
-                """)
+                # 读取版本嵌入列中有嵌入向量的数量
+                active = embedding_model_registry.active
+                embedded_count = await conn.fetchval(
+                    f"SELECT COUNT(*) FROM knowledge_base WHERE {active.column_name} IS NOT NULL"
+                )
                 
                 return {
                     "total_count": total_count,
                     "embedded_count": embedded_count,
+                    "embedding_model": active.model_id,
                     "category_stats": {row["category"]: row["count"] for row in category_stats}
                 }
                 
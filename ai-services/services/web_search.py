@@ -11,6 +11,8 @@ from loguru import logger
 import asyncio
 import aiohttp
 
+from .resilience import fetch_web_text
+
 class WebSearchService:
     """网络搜索服务"""
     
@@ -73,13 +75,9 @@ class WebSearchService:
             search_url = f"{bank_info['website']}/search"
             params = {"q": query or "贷款产品"}
             
-            async with self.session.get(search_url, params=params) as response:
-                if response.status == 200:
-                    content = await response.text()
-                    return await self._parse_bank_content(bank_name, content, query)
-                else:
-                    return {"error": f"搜索失败: HTTP {response.status}"}
-                    
+            content = await fetch_web_text(self.session, search_url, params=params)
+            return await self._parse_bank_content(bank_name, content, query)
+            
         except Exception as e:
             logger.error(f"搜索银行信息失败: {e}")
             return {"error": str(e)}
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试自适应并发限制：不排队（max_queue=0）时超出上限的请求立即被拒绝
+"""
+
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.adaptive_concurrency import (
+    AdaptiveConcurrencyLimiter, AdaptiveLimitConfig, LoadShedError, RequestPriority
+)
+
+
+def test_zero_queue_sheds_immediately():
+    """max_queue=0且并发已满：抛出LoadShedError而非ValueError，释放后可再次获取"""
+    async def run():
+        limiter = AdaptiveConcurrencyLimiter(
+            "test", AdaptiveLimitConfig(initial_limit=1, min_limit=1, max_limit=1, max_queue=0)
+        )
+        permit = await limiter.acquire(RequestPriority.INTERACTIVE)
+
+        try:
+            await limiter.acquire(RequestPriority.INTERACTIVE)
+            raise AssertionError("并发已满时应被拒绝")
+        except LoadShedError as e:
+            assert e.reason == "排队已满"
+            assert e.retry_after >= 1
+
+        assert limiter.stats["rejected"]["interactive"] == 1
+        assert limiter._waiters == []
+
+        permit.release()
+        permit = await limiter.acquire(RequestPriority.INTERACTIVE)
+        permit.release()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_zero_queue_sheds_immediately()
+    print("✅ 自适应并发限制测试通过")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试批量审批：单笔申请含非数值字段时只影响该申请自身的规则结果
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.approval_workflow_engine import ApprovalRule, ApprovalWorkflowEngine
+
+
+def _application(application_id: str, **overrides):
+    application = {
+        "application_id": application_id,
+        "credit_score": 720,
+        "monthly_income": 20000,
+        "monthly_debt": 4000,
+        "loan_amount": 300000,
+        "employment_years": 5,
+        "age": 35
+    }
+    application.update(overrides)
+    return application
+
+
+def test_malformed_row_in_batch():
+    """批量中含credit_score为'N/A'的申请：该申请信用规则未通过，其余申请与规则正常评估"""
+    engine = ApprovalWorkflowEngine()
+    applications = [
+        _application("good-1"),
+        _application("bad-1", credit_score="N/A", age=None),
+        _application("good-2", monthly_income="unknown")
+    ]
+    risk_assessments = [{"overall_risk_score": 0.2} for _ in applications]
+
+    result = engine.process_applications_batch(applications, risk_assessments, store_decisions=False)
+    decisions = {decision["application_id"]: decision for decision in result["decisions"]}
+
+    assert result["summary"]["total"] == 3
+    assert decisions["good-1"]["failed_rules"] == []
+    assert set(decisions["bad-1"]["failed_rules"]) == {
+        ApprovalRule.CREDIT_SCORE_MIN.value, ApprovalRule.AGE_RANGE.value
+    }
+    assert decisions["good-2"]["failed_rules"] == [ApprovalRule.INCOME_DEBT_RATIO_MAX.value]
+
+
+def test_malformed_row_single_application():
+    """单笔申请路径与批量一致：脏字段对应的规则未通过，其余规则照常评估而非返回默认PENDING"""
+    engine = ApprovalWorkflowEngine()
+    rule_results = engine._check_approval_rules(
+        _application("bad-2", credit_score="N/A"), {"overall_risk_score": 0.2}
+    )
+
+    assert rule_results[ApprovalRule.CREDIT_SCORE_MIN] is False
+    assert rule_results[ApprovalRule.LOAN_AMOUNT_MAX] is True
+    assert rule_results[ApprovalRule.AGE_RANGE] is True
+
+    decision = engine.process_application(_application("bad-2", credit_score="N/A"), {"overall_risk_score": 0.2})
+    assert decision.decision_reason != "系统处理中"
+
+
+if __name__ == "__main__":
+    test_malformed_row_in_batch()
+    test_malformed_row_single_application()
+    print("✅ 批量审批脏数据测试通过")
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试ONNX嵌入后端：int8量化后的嵌入与PyTorch嵌入逐条余弦相似度不低于阈值
+缺少onnxruntime、sentence-transformers或无法获取模型时跳过（模型可由EMBEDDING_PARITY_MODEL指定）
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.onnx_embedding import PARITY_THRESHOLD, OnnxEmbeddingBackend, cosine_parity
+
+
+def test_cosine_parity_statistics():
+    """同向向量余弦为1，正交向量为0，与向量长度无关"""
+    reference = np.array([[1.0, 0.0], [0.0, 2.0]], dtype=np.float32)
+    candidate = np.array([[3.0, 0.0], [1.0, 0.0]], dtype=np.float32)
+    parity = cosine_parity(reference, candidate)
+    assert parity["min_cosine"] == pytest.approx(0.0)
+    assert parity["mean_cosine"] == pytest.approx(0.5)
+
+
+def test_onnx_embeddings_match_torch(tmp_path):
+    """导出并量化模型后，ONNX嵌入与PyTorch嵌入的最小余弦不低于阈值"""
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("torch")
+    sentence_transformers = pytest.importorskip("sentence_transformers")
+    model_id = os.getenv("EMBEDDING_PARITY_MODEL", "all-MiniLM-L6-v2")
+    try:
+        sentence_transformers.SentenceTransformer(model_id, device="cpu")
+    except Exception as e:
+        pytest.skip(f"嵌入模型不可用: {model_id}, {e}")
+
+    backend = OnnxEmbeddingBackend()
+    backend.cache_dir = str(tmp_path)
+    parity = backend.check_parity(model_id)
+
+    assert parity["threshold"] == PARITY_THRESHOLD
+    assert parity["min_cosine"] >= PARITY_THRESHOLD, parity
+    assert parity["passed"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
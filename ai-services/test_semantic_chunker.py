@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试语义分块：普通文本相邻块按句子重叠，交易记录不重叠，块偏移与原文一致
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.semantic_chunker import SemanticChunker
+
+
+def test_general_text_overlaps_whole_sentences():
+    """普通文本：后一块以前一块末尾的完整句子开头，重叠不超过预算"""
+    chunker = SemanticChunker(max_tokens=240)
+    text = "".join(f"第{i}句话内容比较长一些。" for i in range(60))
+    chunks = chunker.chunk(text)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert text[chunk.start:chunk.end] == chunk.text
+        assert chunk.token_count <= chunker.max_tokens
+    for previous, current in zip(chunks, chunks[1:]):
+        assert previous.start < current.start < previous.end
+        overlap = text[current.start:previous.end]
+        assert overlap.endswith("。")
+        assert chunker._count_tokens([overlap])[0] <= chunker.overlap_tokens
+
+
+def test_transactions_do_not_overlap():
+    """银行流水：交易记录各自完整成块，块之间不重复"""
+    chunker = SemanticChunker(max_tokens=40)
+    text = "2024-01-01 工资收入 8000.00 余额 12000.00\n备注 代发工资\n" * 20
+    chunks = chunker.chunk(text, "bank_statement")
+
+    assert len(chunks) > 1
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.start >= previous.end
+        assert current.text.startswith("2024-01-01")
+
+
+if __name__ == "__main__":
+    test_general_text_overlaps_whole_sentences()
+    test_transactions_do_not_overlap()
+    print("✅ 语义分块测试通过")
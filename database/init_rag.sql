@@ -18,9 +18,10 @@ CREATE TABLE IF NOT EXISTS knowledge_base (
 );
 
 -- 创建向量索引
+-- HNSW支持在空表上建索引并增量插入；参数随数据量的调整与重建由VectorIndexManager负责
 CREATE INDEX IF NOT EXISTS knowledge_base_embedding_idx 
-ON knowledge_base USING ivfflat (embedding vector_cosine_ops) 
-WITH (lists = 100);
+ON knowledge_base USING hnsw (embedding vector_cosine_ops) 
+WITH (m = 16, ef_construction = 64);
 
 -- 创建分类索引
 CREATE INDEX IF NOT EXISTS knowledge_base_category_idx 
@@ -103,7 +104,7 @@ $$ LANGUAGE plpgsql;
 
 -- 创建函数：向量相似度搜索
 CREATE OR REPLACE FUNCTION search_knowledge_by_vector(
-    query_embedding VECTOR(1536),
+    query_embedding VECTOR(384),
     similarity_threshold FLOAT DEFAULT 0.7,
     max_results INTEGER DEFAULT 5
 )
@@ -135,7 +136,7 @@ $$ LANGUAGE plpgsql;
 -- 创建函数：混合搜索（向量+全文）
 CREATE OR REPLACE FUNCTION search_knowledge_hybrid(
     query_text TEXT,
-    query_embedding VECTOR(1536),
+    query_embedding VECTOR(384),
     category_filter VARCHAR(50) DEFAULT NULL,
     max_results INTEGER DEFAULT 5
 )
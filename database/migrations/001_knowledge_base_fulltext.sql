@@ -0,0 +1,46 @@
+-- 知识库全文检索迁移
+-- 1. 启用pg_trgm，为模糊匹配提供三元组GIN索引
+-- 2. 创建中文分词配置chinese_zh（优先使用zhparser，不可用时退化为simple）
+-- 3. 增加由数据库自动维护的content_tsv存储列及其GIN索引
+-- 可重复执行
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- 创建中文分词配置
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'chinese_zh') THEN
+        BEGIN
+            CREATE EXTENSION IF NOT EXISTS zhparser;
+            CREATE TEXT SEARCH CONFIGURATION chinese_zh (PARSER = zhparser);
+            -- 名词、动词、形容词、成语、习用语、简称、其他专名等词性
+            ALTER TEXT SEARCH CONFIGURATION chinese_zh ADD MAPPING FOR n,v,a,i,e,l,j,nr,ns,nt,nz WITH simple;
+            RAISE NOTICE 'chinese_zh使用zhparser分词';
+        EXCEPTION WHEN OTHERS THEN
+            CREATE TEXT SEARCH CONFIGURATION chinese_zh (COPY = simple);
+            RAISE NOTICE 'zhparser不可用，chinese_zh退化为simple分词，中文模糊匹配依赖三元组索引';
+        END;
+    END IF;
+END
+$$;
+
+-- 存储的tsvector列：标题权重A，正文权重B
+ALTER TABLE knowledge_base
+    ADD COLUMN IF NOT EXISTS content_tsv tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('chinese_zh'::regconfig, coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('chinese_zh'::regconfig, coalesce(content, '')), 'B')
+    ) STORED;
+
+-- 全文检索索引
+CREATE INDEX IF NOT EXISTS knowledge_base_content_tsv_idx
+ON knowledge_base USING gin (content_tsv);
+
+-- 三元组索引：支持ILIKE子串匹配与word_similarity模糊匹配
+CREATE INDEX IF NOT EXISTS knowledge_base_content_trgm_idx
+ON knowledge_base USING gin (content gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS knowledge_base_title_trgm_idx
+ON knowledge_base USING gin (title gin_trgm_ops);
+
+ANALYZE knowledge_base;
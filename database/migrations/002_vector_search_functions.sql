@@ -0,0 +1,101 @@
+-- 向量检索函数维度修正迁移
+-- search_knowledge_by_vector/search_knowledge_hybrid的向量参数与knowledge_base.embedding
+-- 及Python端保持一致（all-MiniLM-L6-v2，384维）
+-- 向量索引类型与参数由ai-services/services/vector_index_manager.py按数据量重建
+-- 可重复执行
+
+-- 创建函数：向量相似度搜索
+CREATE OR REPLACE FUNCTION search_knowledge_by_vector(
+    query_embedding VECTOR(384),
+    similarity_threshold FLOAT DEFAULT 0.7,
+    max_results INTEGER DEFAULT 5
+)
+RETURNS TABLE (
+    id INTEGER,
+    category VARCHAR(50),
+    title VARCHAR(200),
+    content TEXT,
+    similarity_score FLOAT,
+    metadata JSONB
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT 
+        kb.id,
+        kb.category,
+        kb.title,
+        kb.content,
+        1 - (kb.embedding <=> query_embedding) AS similarity_score,
+        kb.metadata
+    FROM knowledge_base kb
+    WHERE kb.embedding IS NOT NULL
+    AND 1 - (kb.embedding <=> query_embedding) > similarity_threshold
+    ORDER BY kb.embedding <=> query_embedding
+    LIMIT max_results;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 创建函数：混合搜索（向量+全文）
+CREATE OR REPLACE FUNCTION search_knowledge_hybrid(
+    query_text TEXT,
+    query_embedding VECTOR(384),
+    category_filter VARCHAR(50) DEFAULT NULL,
+    max_results INTEGER DEFAULT 5
+)
+RETURNS TABLE (
+    id INTEGER,
+    category VARCHAR(50),
+    title VARCHAR(200),
+    content TEXT,
+    relevance_score FLOAT,
+    metadata JSONB
+) AS $$
+BEGIN
+    RETURN QUERY
+    WITH vector_search AS (
+        SELECT 
+            kb.id,
+            kb.category,
+            kb.title,
+            kb.content,
+            1 - (kb.embedding <=> query_embedding) AS vector_score,
+            kb.metadata
+        FROM knowledge_base kb
+        WHERE kb.embedding IS NOT NULL
+        AND (category_filter IS NULL OR kb.category = category_filter)
+    ),
+    text_search AS (
+        SELECT 
+            kb.id,
+            kb.category,
+            kb.title,
+            kb.content,
+            ts_rank(to_tsvector('chinese', kb.content), plainto_tsquery('chinese', query_text)) AS text_score,
+            kb.metadata
+        FROM knowledge_base kb
+        WHERE to_tsvector('chinese', kb.content) @@ plainto_tsquery('chinese', query_text)
+        AND (category_filter IS NULL OR kb.category = category_filter)
+    ),
+    combined_results AS (
+        SELECT 
+            COALESCE(vs.id, ts.id) AS id,
+            COALESCE(vs.category, ts.category) AS category,
+            COALESCE(vs.title, ts.title) AS title,
+            COALESCE(vs.content, ts.content) AS content,
+            COALESCE(vs.vector_score, 0) * 0.7 + COALESCE(ts.text_score, 0) * 0.3 AS relevance_score,
+            COALESCE(vs.metadata, ts.metadata) AS metadata
+        FROM vector_search vs
+        FULL OUTER JOIN text_search ts ON vs.id = ts.id
+    )
+    SELECT 
+        cr.id,
+        cr.category,
+        cr.title,
+        cr.content,
+        cr.relevance_score,
+        cr.metadata
+    FROM combined_results cr
+    ORDER BY cr.relevance_score DESC
+    LIMIT max_results;
+END;
+$$ LANGUAGE plpgsql;
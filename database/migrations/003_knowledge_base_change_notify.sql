@@ -0,0 +1,51 @@
+-- 知识库变更通知迁移
+-- knowledge_base行插入/更新/删除时通过NOTIFY knowledge_base_changed广播，
+-- AI服务据此使语义答案缓存等进程内缓存失效；
+-- UPDATE只在影响检索的列（分类、标题、正文、元数据、读取版本的嵌入列）变化时通知，
+-- 影子列回填、双写与模型标注等整表更新不产生通知
+-- 可重复执行
+
+CREATE OR REPLACE FUNCTION notify_knowledge_base_changed()
+RETURNS TRIGGER AS $$
+DECLARE
+    row_id INTEGER;
+    row_category VARCHAR(50);
+    read_column TEXT;
+    read_changed BOOLEAN;
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND OLD.category IS NOT DISTINCT FROM NEW.category
+       AND OLD.title IS NOT DISTINCT FROM NEW.title
+       AND OLD.content IS NOT DISTINCT FROM NEW.content
+       AND OLD.metadata IS NOT DISTINCT FROM NEW.metadata THEN
+        -- 读取版本的嵌入列（迁移006之前为embedding）
+        IF to_regclass('embedding_models') IS NOT NULL THEN
+            SELECT column_name INTO read_column FROM embedding_models WHERE status = 'active';
+        END IF;
+        read_column := COALESCE(read_column, 'embedding');
+        EXECUTE format('SELECT ($1).%I IS DISTINCT FROM ($2).%I', read_column, read_column)
+            INTO read_changed USING OLD, NEW;
+        IF NOT read_changed THEN
+            RETURN NULL;
+        END IF;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        row_id := OLD.id;
+        row_category := OLD.category;
+    ELSE
+        row_id := NEW.id;
+        row_category := NEW.category;
+    END IF;
+    PERFORM pg_notify(
+        'knowledge_base_changed',
+        json_build_object('op', TG_OP, 'id', row_id, 'category', row_category)::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS knowledge_base_changed_trigger ON knowledge_base;
+CREATE TRIGGER knowledge_base_changed_trigger
+AFTER INSERT OR UPDATE OR DELETE ON knowledge_base
+FOR EACH ROW EXECUTE FUNCTION notify_knowledge_base_changed();
@@ -0,0 +1,31 @@
+-- 文档导入任务队列迁移
+-- 上传文件先入队立即返回任务ID，由AI服务的工作协程异步完成提取、OCR、分块、嵌入与索引；
+-- 工作协程以 FOR UPDATE SKIP LOCKED 领取任务，心跳超时的running任务可被其他实例重新领取
+-- 可重复执行
+
+CREATE TABLE IF NOT EXISTS ingestion_jobs (
+    id UUID PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    stage VARCHAR(30) NOT NULL DEFAULT 'queued',
+    progress JSONB NOT NULL DEFAULT '{}'::jsonb,
+    file_path TEXT NOT NULL,
+    file_name TEXT,
+    file_type VARCHAR(20),
+    file_sha256 VARCHAR(64),
+    owns_file BOOLEAN NOT NULL DEFAULT FALSE,
+    category VARCHAR(50) NOT NULL DEFAULT 'documents',
+    metadata JSONB NOT NULL DEFAULT '{}'::jsonb,
+    result JSONB,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    worker_id VARCHAR(100),
+    heartbeat_at TIMESTAMP,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ingestion_jobs_claim_idx
+    ON ingestion_jobs (status, created_at)
+    WHERE status IN ('queued', 'running');
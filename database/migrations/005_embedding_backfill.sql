@@ -0,0 +1,21 @@
+-- 嵌入向量回填迁移
+-- knowledge_base记录生成嵌入所用的模型，模型变更后可只重新生成旧模型的行；
+-- 回填工具每批提交时推进检查点，中断后从最后写回的ID继续
+-- 可重复执行
+
+ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS embedding_model VARCHAR(100);
+
+CREATE TABLE IF NOT EXISTS embedding_backfill_checkpoints (
+    job_name VARCHAR(150) PRIMARY KEY,
+    model VARCHAR(100) NOT NULL,
+    last_id INTEGER NOT NULL DEFAULT 0,
+    rows_done BIGINT NOT NULL DEFAULT 0,
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+-- 待回填行的keyset扫描：缺少嵌入的行走部分索引
+CREATE INDEX IF NOT EXISTS knowledge_base_missing_embedding_idx
+    ON knowledge_base (id)
+    WHERE embedding IS NULL;
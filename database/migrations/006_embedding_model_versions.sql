@@ -0,0 +1,31 @@
+-- 嵌入模型版本迁移
+-- 每个嵌入列对应一个模型版本（模型ID + 维度）：active为读取版本，backfilling为双写并回填中的影子列；
+-- 新模型的影子列由AI服务登记时添加（可空、无默认值，只改系统目录），索引并发创建，
+-- 切换active只更新本表一行并 NOTIFY embedding_model_changed，无需整表锁
+-- 依赖迁移005（knowledge_base.embedding_model），可重复执行
+
+CREATE TABLE IF NOT EXISTS embedding_models (
+    model_id VARCHAR(100) PRIMARY KEY,
+    dimension INTEGER NOT NULL CHECK (dimension > 0),
+    column_name VARCHAR(63) NOT NULL UNIQUE,
+    status VARCHAR(20) NOT NULL DEFAULT 'backfilling'
+        CHECK (status IN ('backfilling', 'active', 'retired')),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    activated_at TIMESTAMP
+);
+
+-- 同一时刻只有一个active版本
+CREATE UNIQUE INDEX IF NOT EXISTS embedding_models_single_active_idx
+    ON embedding_models (status)
+    WHERE status = 'active';
+
+-- 现有主嵌入列登记为active版本
+INSERT INTO embedding_models (model_id, dimension, column_name, status, activated_at)
+SELECT 'all-MiniLM-L6-v2', 384, 'embedding', 'active', CURRENT_TIMESTAMP
+WHERE NOT EXISTS (SELECT 1 FROM embedding_models WHERE status = 'active')
+ON CONFLICT (model_id) DO NOTHING;
+
+-- 标注存量嵌入的模型
+UPDATE knowledge_base
+SET embedding_model = 'all-MiniLM-L6-v2'
+WHERE embedding IS NOT NULL AND embedding_model IS NULL;